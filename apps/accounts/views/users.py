@@ -9,6 +9,7 @@ from django.contrib.auth import get_user_model
 from django.db.models import Q, Count
 from django.core.paginator import Paginator
 from apps.labs.models import AuditLog, TestResult
+from apps.core.services.log_writer import log_writer
 from apps.labs.decorators import require_capability
 
 User = get_user_model()
@@ -117,7 +118,9 @@ def user_create(request):
                 )
                 
                 # 3. High-Integrity Audit Log
-                AuditLog.objects.create(
+                log_writer.write(
+                    AuditLog,
+                    critical=True,
                     vendor=request.user.vendor,
                     user=request.user,
                     action=f"STAFF CREATED: {user.email} (Role: {user.get_role_display_name()})",
@@ -158,7 +161,9 @@ def user_change_role(request, user_id):
     staff_member.role = new_role
     staff_member.save()
 
-    AuditLog.objects.create(
+    log_writer.write(
+        AuditLog,
+        critical=True,
         vendor=request.user.vendor,
         user=request.user,
         action=f"ROLE CHANGE: {staff_member.email} from {old_role_display} to {staff_member.get_role_display_name()}",
@@ -184,7 +189,9 @@ def user_toggle_status(request, user_id):
     staff_member.save()
     
     status_str = "ACTIVATED" if staff_member.is_active else "DEACTIVATED"
-    AuditLog.objects.create(
+    log_writer.write(
+        AuditLog,
+        critical=True,
         vendor=request.user.vendor,
         user=request.user,
         action=f"STATUS CHANGE: {staff_member.email} set to {status_str}",
@@ -219,7 +226,9 @@ def user_suspend(request, user_id):
             staff_member.save(update_fields=['is_active'])
             
             # Detailed Audit Log for Suspension
-            AuditLog.objects.create(
+            log_writer.write(
+                AuditLog,
+                critical=True,
                 vendor=request.user.vendor,
                 user=request.user,
                 action=f"SUSPENDED USER: {staff_member.email}. Reason: {reason}",
@@ -250,7 +259,9 @@ def user_deactivate(request, user_id):
     staff_member.is_active = False
     staff_member.save(update_fields=['is_active'])
 
-    AuditLog.objects.create(
+    log_writer.write(
+        AuditLog,
+        critical=True,
         vendor=request.user.vendor,
         user=request.user,
         action=f"DEACTIVATED ACCOUNT: {staff_member.get_full_name()} ({staff_member.email})",
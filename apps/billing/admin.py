@@ -3,7 +3,7 @@ from django.db.models import Sum
 from django.utils.html import format_html
 from .models import (
     PriceList, InsuranceProvider, TestPrice,
-    BillingInformation, Payment, Invoice, InvoicePayment,
+    BillingInformation, BillingLineItem, Payment, Invoice, InvoicePayment,
     Referrer
 )
 
@@ -167,6 +167,14 @@ class PaymentInline(admin.TabularInline):
              'payment_date', 'collected_by', 'notes')
 
 
+class BillingLineItemInline(admin.TabularInline):
+    model = BillingLineItem
+    extra = 0
+    can_delete = False
+    fields = ('test_code', 'test_name', 'unit_price', 'discount_amount', 'tax_amount', 'line_total')
+    readonly_fields = fields
+
+
 @admin.register(BillingInformation)
 class BillingInformationAdmin(admin.ModelAdmin):
     list_display = ('request_id_display', 'billing_type', 'total_amount', 
@@ -176,7 +184,7 @@ class BillingInformationAdmin(admin.ModelAdmin):
     readonly_fields = ('subtotal', 'discount', 'tax', 'total_amount', 
                       'patient_portion', 'insurance_portion', 'created_at', 'updated_at',
                       'balance_due_display')
-    inlines = [PaymentInline]
+    inlines = [BillingLineItemInline, PaymentInline]
     
     fieldsets = (
         ('Request Information', {
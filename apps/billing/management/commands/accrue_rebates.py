@@ -0,0 +1,39 @@
+"""
+Accrue referral rebates for every newly cleared billing record.
+
+Payments no longer create rebates inline; schedule this nightly:
+
+    python manage.py accrue_rebates
+    python manage.py accrue_rebates --vendor <tenant_id> --reconcile
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.billing.services.rebate_accrual import accrue_pending, reconcile_totals
+from apps.tenants.models import Vendor
+
+
+class Command(BaseCommand):
+    help = "Create RebateRecords in bulk for cleared, referred billings and update referrer totals."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--vendor', help="Only this vendor (tenant_id).")
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--reconcile', action='store_true',
+            help="Also recompute referrer running totals from the rebate ledger.",
+        )
+
+    def handle(self, *args, **options):
+        vendor = None
+        if options['vendor']:
+            try:
+                vendor = Vendor.objects.get(tenant_id=options['vendor'])
+            except Vendor.DoesNotExist:
+                raise CommandError(f"Vendor {options['vendor']} not found.")
+
+        created = accrue_pending(vendor=vendor, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Accrued {created} rebate record(s)."))
+
+        if options['reconcile']:
+            fixed = reconcile_totals(vendor=vendor)
+            self.stdout.write(f"Reconciled referrer totals; {fixed} corrected.")
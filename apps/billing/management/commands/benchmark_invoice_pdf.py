@@ -0,0 +1,104 @@
+"""
+Time and peak memory of the streaming invoice PDF as the line count grows.
+
+    python manage.py benchmark_invoice_pdf
+    python manage.py benchmark_invoice_pdf --lines 1000 10000 50000 --compare
+
+Rows are synthetic (no database), so the numbers isolate the PDF writer.
+--compare also runs the same rows through a Platypus table the way
+build_invoice_pdf does.
+"""
+import io
+import time
+import tracemalloc
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.billing.models import InsuranceProvider, Invoice
+from apps.billing.services.invoice_pdf_stream import INVOICE_COLUMNS, write_invoice_pdf
+from apps.billing.services.invoice_pdf_view import _ngn
+from apps.tenants.models import Vendor
+
+
+class _Sink:
+    """Counts bytes instead of keeping them, like a response being sent."""
+
+    def __init__(self):
+        self.size = 0
+
+    def write(self, data):
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+
+def _rows(count):
+    day = timezone.localdate()
+    for n in range(count):
+        total = Decimal(5000 + n % 97 * 250)
+        yield (
+            f"REQ-{n:07d}", f"Patient {n % 4000} Okafor-Adeyemi", (day - timedelta(days=n % 30)).strftime('%d %b %Y'),
+            _ngn(total), _ngn(total * Decimal('0.1')), _ngn(total * Decimal('0.9')),
+        )
+
+
+def _invoice(count):
+    today = date.today()
+    return Invoice(
+        vendor=Vendor(name="Benchmark Diagnostics"),
+        insurance_provider=InsuranceProvider(name="Benchmark HMO", payment_terms_days=30),
+        invoice_number="INV-BENCH-0001",
+        invoice_date=today, due_date=today + timedelta(days=30),
+        period_start=today.replace(day=1), period_end=today,
+        status='DRAFT', total_amount=Decimal(count * 5000), amount_paid=Decimal('0.00'),
+    )
+
+
+def _platypus(count):
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.lib.units import mm
+    from reportlab.platypus import Paragraph, SimpleDocTemplate, Table
+
+    style = getSampleStyleSheet()['BodyText']
+    width = A4[0] - 40 * mm
+    data = [[Paragraph(h, style) for h, _, _ in INVOICE_COLUMNS]]
+    data += [[Paragraph(str(v), style) for v in row] for row in _rows(count)]
+    doc = SimpleDocTemplate(io.BytesIO(), pagesize=A4)
+    doc.build([Table(data, colWidths=[width * frac for _, frac, _ in INVOICE_COLUMNS], repeatRows=1)])
+
+
+def _measure(fn):
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak / 2**20
+
+
+class Command(BaseCommand):
+    help = "Benchmark the streaming invoice PDF writer (time and peak memory per line count)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lines', type=int, nargs='+', default=[1000, 5000, 20000])
+        parser.add_argument('--compare', action='store_true', help="Also time a Platypus table with the same rows.")
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'lines':>8} {'pages':>6} {'KB':>8} {'seconds':>8} {'peak MiB':>9}")
+        for count in options['lines']:
+            sink = _Sink()
+            pages, elapsed, peak = _measure(lambda: write_invoice_pdf(_invoice(count), sink, rows=_rows(count)))
+            self.stdout.write(f"{count:>8} {pages:>6} {sink.size // 1024:>8} {elapsed:>8.2f} {peak:>9.1f}")
+
+        if options['compare']:
+            self.stdout.write("\nPlatypus table (build_invoice_pdf layout):")
+            for count in options['lines']:
+                _, elapsed, peak = _measure(lambda: _platypus(count))
+                self.stdout.write(f"{count:>8} {'':>6} {'':>8} {elapsed:>8.2f} {peak:>9.1f}")
@@ -0,0 +1,75 @@
+"""
+Write payer claim files (one per provider, zipped) for an invoice or a period.
+
+    python manage.py export_claims --invoice INV-AVON-2026-0008 --format xml
+    python manage.py export_claims --vendor <tenant_id> --month 2026-03 --format fixed
+    python manage.py export_claims --vendor <tenant_id> --start 2026-03-01 --end 2026-03-15 --provider AVON -o claims.zip
+"""
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.billing.models import Invoice
+from apps.billing.services.claims import FORMATTERS, claims_for_invoice, claims_for_period, write_claims_zip
+from apps.tenants.models import Vendor
+
+
+def _parse(value, fmt):
+    try:
+        return datetime.strptime(value, fmt).date()
+    except ValueError:
+        raise CommandError(f"Invalid date '{value}' (expected {fmt}).")
+
+
+class Command(BaseCommand):
+    help = "Export zipped claim files for an invoice or a billing period."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--invoice', help="Invoice number.")
+        parser.add_argument('--vendor', help="Vendor tenant_id (required for a period).")
+        parser.add_argument('--month', help="Period as YYYY-MM.")
+        parser.add_argument('--start', help="Period start (YYYY-MM-DD); use with --end.")
+        parser.add_argument('--end', help="Period end (YYYY-MM-DD); use with --start.")
+        parser.add_argument('--provider', action='append', help="Provider code; repeat for several.")
+        parser.add_argument('--format', default='csv', choices=sorted(FORMATTERS))
+        parser.add_argument('-o', '--output', help="Zip path. Default: <name>-<format>.zip")
+
+    def handle(self, *args, **options):
+        fmt = options['format']
+        if options['invoice']:
+            invoices = Invoice.objects.filter(invoice_number=options['invoice'])
+            if options['vendor']:
+                invoices = invoices.filter(vendor__tenant_id=options['vendor'])
+            invoice = invoices.first()
+            if invoice is None:
+                raise CommandError(f"Invoice {options['invoice']} not found.")
+            billings, name, batch = claims_for_invoice(invoice), invoice.invoice_number, invoice.invoice_number
+        else:
+            if not options['vendor']:
+                raise CommandError("--vendor is required without --invoice.")
+            try:
+                vendor = Vendor.objects.get(tenant_id=options['vendor'])
+            except Vendor.DoesNotExist:
+                raise CommandError(f"Vendor {options['vendor']} not found.")
+
+            if options['start'] or options['end']:
+                if not (options['start'] and options['end']):
+                    raise CommandError("--start and --end go together.")
+                start, end = _parse(options['start'], '%Y-%m-%d'), _parse(options['end'], '%Y-%m-%d')
+            elif options['month']:
+                start = _parse(options['month'], '%Y-%m')
+                end = (start.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+            else:
+                raise CommandError("Give --invoice, --month or --start/--end.")
+
+            providers = None
+            if options['provider']:
+                providers = vendor.insurance_providers.filter(code__in=options['provider'])
+            billings = claims_for_period(vendor, start, end, providers=providers)
+            batch = f"{start:%Y%m%d}-{end:%Y%m%d}"
+            name = f"claims-{vendor.tenant_id}-{batch}"
+
+        path = options['output'] or f"{name}-{fmt}.zip"
+        with open(path, 'wb') as out:
+            write_claims_zip(billings, out, fmt=fmt, batch=batch)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {path}"))
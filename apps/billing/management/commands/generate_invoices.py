@@ -0,0 +1,63 @@
+"""
+Month-end invoicing: one DRAFT invoice per payer with unbilled records.
+
+    python manage.py generate_invoices                      # last month, every vendor
+    python manage.py generate_invoices --month 2026-03 --vendor <tenant_id>
+    python manage.py generate_invoices --start 2026-03-01 --end 2026-03-15 --send
+"""
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from apps.billing.services.batch_invoicing import deliver, invoice_period, unbilled
+from apps.tenants.models import Vendor
+
+
+def _parse(value, fmt):
+    try:
+        return datetime.strptime(value, fmt).date()
+    except ValueError:
+        raise CommandError(f"Invalid date '{value}' (expected {fmt}).")
+
+
+class Command(BaseCommand):
+    help = "Create invoices for every insurance provider with unbilled records in a period."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--month', help="Invoice this month (YYYY-MM). Default: last month.")
+        parser.add_argument('--start', help="Period start (YYYY-MM-DD); use with --end.")
+        parser.add_argument('--end', help="Period end (YYYY-MM-DD); use with --start.")
+        parser.add_argument('--vendor', help="Only this vendor (tenant_id).")
+        parser.add_argument('--send', action='store_true', help="Mark the new invoices SENT and email them.")
+
+    def handle(self, *args, **options):
+        if options['start'] or options['end']:
+            if not (options['start'] and options['end']):
+                raise CommandError("--start and --end go together.")
+            start, end = _parse(options['start'], '%Y-%m-%d'), _parse(options['end'], '%Y-%m-%d')
+        else:
+            if options['month']:
+                start = _parse(options['month'], '%Y-%m')
+            else:
+                start = (timezone.localdate().replace(day=1) - timedelta(days=1)).replace(day=1)
+            end = (start.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+
+        vendors = Vendor.objects.all()
+        if options['vendor']:
+            vendors = vendors.filter(tenant_id=options['vendor'])
+            if not vendors.exists():
+                raise CommandError(f"Vendor {options['vendor']} not found.")
+
+        total = 0
+        for vendor in vendors:
+            if not unbilled(vendor, start, end).exists():
+                continue
+            invoices = invoice_period(vendor, start, end)
+            total += len(invoices)
+            self.stdout.write(f"{vendor.name}: {len(invoices)} invoice(s).")
+            if options['send']:
+                sent = deliver(invoices)
+                self.stdout.write(f"  emailed {sent} of {len(invoices)}.")
+
+        self.stdout.write(self.style.SUCCESS(f"Created {total} invoice(s) for {start} – {end}."))
@@ -0,0 +1,36 @@
+"""
+Apply queued Paystack webhook events (PaystackWebhookEvent, status PENDING).
+
+Run from cron, or as a long-lived worker:
+
+    python manage.py process_paystack_webhooks --once
+    python manage.py process_paystack_webhooks --sleep 5
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.billing.services.paystack_inbox import BATCH_SIZE, process_pending
+
+
+class Command(BaseCommand):
+    help = "Turn pending Paystack webhook events into Payments, in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--once', action='store_true', help="Drain the inbox once and exit.")
+        parser.add_argument('--sleep', type=float, default=5.0, help="Seconds to wait when the inbox is empty.")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        total = 0
+        while True:
+            done = process_pending(batch_size=batch_size)
+            total += done
+            if done == batch_size:
+                continue
+            if options['once']:
+                break
+            time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(f"Processed {total} Paystack event(s)."))
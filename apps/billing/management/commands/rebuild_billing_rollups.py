@@ -0,0 +1,42 @@
+"""
+Recompute BillingDailyRollup from BillingInformation.
+
+Run nightly to reconcile the incrementally maintained rollup with the
+source records (bulk edits, raw SQL fixes, deleted payers, …):
+
+    python manage.py rebuild_billing_rollups              # last 90 days
+    python manage.py rebuild_billing_rollups --all
+    python manage.py rebuild_billing_rollups --vendor <tenant_id> --days 7
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from apps.billing.services.rollup import rebuild
+from apps.tenants.models import Vendor
+
+
+class Command(BaseCommand):
+    help = "Rebuild the daily billing revenue rollup used by the billing dashboards."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=90, help="Rebuild this many trailing days (default 90).")
+        parser.add_argument('--all', action='store_true', help="Rebuild the full history.")
+        parser.add_argument('--vendor', help="Only this vendor (tenant_id).")
+
+    def handle(self, *args, **options):
+        vendor = None
+        if options['vendor']:
+            try:
+                vendor = Vendor.objects.get(tenant_id=options['vendor'])
+            except Vendor.DoesNotExist:
+                raise CommandError(f"Vendor {options['vendor']} not found.")
+
+        since = None
+        if not options['all']:
+            since = timezone.localdate() - timedelta(days=options['days'])
+
+        rows = rebuild(vendor=vendor, since=since)
+        scope = "all history" if since is None else f"since {since}"
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rows} rollup rows ({scope})."))
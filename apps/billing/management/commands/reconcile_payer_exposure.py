@@ -0,0 +1,33 @@
+"""
+Recompute InsuranceProvider exposure counters from BillingInformation.
+
+The counters are maintained incrementally (services/exposure.py); run this
+nightly to correct drift from bulk edits or raw SQL fixes:
+
+    python manage.py reconcile_payer_exposure
+    python manage.py reconcile_payer_exposure --vendor <tenant_id>
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.billing.services.exposure import reconcile
+from apps.tenants.models import Vendor
+
+
+class Command(BaseCommand):
+    help = "Reconcile running payer exposure (owed, paid, invoiced, overdue) on insurance providers."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--vendor', help="Only this vendor (tenant_id).")
+
+    def handle(self, *args, **options):
+        vendor = None
+        if options['vendor']:
+            try:
+                vendor = Vendor.objects.get(tenant_id=options['vendor'])
+            except Vendor.DoesNotExist:
+                raise CommandError(f"Vendor {options['vendor']} not found.")
+
+        drifted = reconcile(vendor=vendor)
+        for provider in drifted:
+            self.stdout.write(f"  corrected {provider.name} ({provider.code})")
+        self.stdout.write(self.style.SUCCESS(f"Reconciled payer exposure; {len(drifted)} provider(s) had drifted."))
@@ -0,0 +1,46 @@
+"""
+Re-verify Paystack references and apply the ones that were paid.
+
+Without arguments: FAILED events, and PENDING events the worker has not
+picked up within --older-than minutes. With references: exactly those,
+including charges whose webhook never reached us (needs --vendor):
+
+    python manage.py replay_paystack_webhooks
+    python manage.py replay_paystack_webhooks REQ-123-20250101120000 --vendor <tenant_id>
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.billing.services.paystack_inbox import REPLAY_AFTER, replay
+from apps.tenants.models import Vendor
+
+
+class Command(BaseCommand):
+    help = "Reconcile the Paystack webhook inbox against Paystack's verify endpoint."
+
+    def add_arguments(self, parser):
+        parser.add_argument('references', nargs='*')
+        parser.add_argument('--vendor', help="Vendor (tenant_id) whose keys verify unknown references.")
+        parser.add_argument(
+            '--older-than', type=int, default=int(REPLAY_AFTER.total_seconds() // 60),
+            help="Minutes a PENDING event may wait before it is replayed.",
+        )
+
+    def handle(self, *args, **options):
+        vendor = None
+        if options['vendor']:
+            try:
+                vendor = Vendor.objects.get(tenant_id=options['vendor'])
+            except Vendor.DoesNotExist:
+                raise CommandError(f"Vendor {options['vendor']} not found.")
+
+        stats = replay(
+            references=options['references'] or None,
+            vendor=vendor,
+            older_than=timedelta(minutes=options['older_than']),
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Verified {stats['verified']}, ignored {stats['ignored']}, "
+            f"errors {stats['errors']}; processed {stats['processed']} event(s)."
+        ))
@@ -0,0 +1,60 @@
+"""
+Re-price open (UNPAID / PARTIAL) billing records after price list edits.
+
+By default every price list edited since its last run is processed; schedule
+it every few minutes or nightly:
+
+    python manage.py reprice_billings
+    python manage.py reprice_billings --price-list <uuid> --dry-run --report diff.csv
+"""
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.billing.models import PriceList
+from apps.billing.services.repricing import TOTAL_FIELDS, reprice, stale_price_lists
+from apps.tenants.models import Vendor
+
+
+class Command(BaseCommand):
+    help = "Recompute totals of open billing records on edited price lists and report the differences."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--price-list', help="Only this price list (id), even if not edited.")
+        parser.add_argument('--vendor', help="Only this vendor (tenant_id).")
+        parser.add_argument('--dry-run', action='store_true', help="Report the differences without saving.")
+        parser.add_argument('--report', help="Write the diff report to this CSV file.")
+
+    def handle(self, *args, **options):
+        vendor = None
+        if options['vendor']:
+            try:
+                vendor = Vendor.objects.get(tenant_id=options['vendor'])
+            except Vendor.DoesNotExist:
+                raise CommandError(f"Vendor {options['vendor']} not found.")
+
+        if options['price_list']:
+            price_lists = PriceList.objects.filter(pk=options['price_list'])
+            if not price_lists.exists():
+                raise CommandError(f"Price list {options['price_list']} not found.")
+        else:
+            price_lists = stale_price_lists(vendor)
+
+        rows = []
+        for price_list in price_lists:
+            changes = reprice(price_list, dry_run=options['dry_run'])
+            for change in changes:
+                change['price_list'] = price_list.name
+            rows.extend(changes)
+            self.stdout.write(f"{price_list.name}: {len(changes)} record(s) repriced.")
+
+        if options['report'] and rows:
+            fields = ['price_list', 'request_id', 'billing_id', 'locked']
+            fields += [f'{side}_{f}' for f in TOTAL_FIELDS for side in ('old', 'new')]
+            with open(options['report'], 'w', newline='') as fh:
+                writer = csv.DictWriter(fh, fieldnames=fields)
+                writer.writeheader()
+                writer.writerows(rows)
+
+        verb = "Would reprice" if options['dry_run'] else "Repriced"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {len(rows)} record(s)."))
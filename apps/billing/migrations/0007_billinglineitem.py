@@ -0,0 +1,103 @@
+# Generated by Django 5.2.7 on 2026-10-18 21:05
+
+import django.db.models.deletion
+import uuid
+from decimal import ROUND_HALF_UP, Decimal
+from django.db import migrations, models
+
+CENT = Decimal('0.01')
+
+
+def _allocate(amount, weights):
+    # Same split as billing.models.allocate: proportional, remainder to the largest weight
+    total = sum(weights, Decimal('0.00'))
+    if total <= 0:
+        return [amount] + [Decimal('0.00')] * (len(weights) - 1)
+    parts = [(amount * w / total).quantize(CENT, rounding=ROUND_HALF_UP) for w in weights]
+    remainder = amount - sum(parts, Decimal('0.00'))
+    if remainder:
+        parts[max(range(len(weights)), key=weights.__getitem__)] += remainder
+    return parts
+
+
+def backfill_line_items(apps, schema_editor):
+    """
+    One line per requested test for existing billing records. Unit prices
+    are weighted by the price list (retail price when unlisted) and scaled
+    to the stored subtotal; stored discount and tax are spread the same
+    way, so header totals are left exactly as they are.
+    """
+    BillingInformation = apps.get_model('billing', 'BillingInformation')
+    BillingLineItem = apps.get_model('billing', 'BillingLineItem')
+    TestPrice = apps.get_model('billing', 'TestPrice')
+
+    matrices = {}
+    batch = []
+    records = BillingInformation.objects.select_related('request').prefetch_related(
+        'request__requested_tests',
+    ).order_by('pk')
+    for billing in records.iterator(chunk_size=500):
+        tests = list(billing.request.requested_tests.all()) if billing.request_id else []
+        if not tests:
+            continue
+        if billing.price_list_id not in matrices:
+            matrices[billing.price_list_id] = dict(
+                TestPrice.objects.filter(price_list_id=billing.price_list_id).values_list('test_id', 'price')
+            ) if billing.price_list_id else {}
+        matrix = matrices[billing.price_list_id]
+
+        weights = [Decimal(matrix.get(test.pk, test.price or 0)) for test in tests]
+        units = _allocate(billing.subtotal or Decimal('0.00'), weights)
+        discounts = _allocate(billing.discount or Decimal('0.00'), units)
+        taxes = _allocate(billing.tax or Decimal('0.00'), units)
+        for test, unit, discount, tax in zip(tests, units, discounts, taxes):
+            batch.append(BillingLineItem(
+                vendor_id=billing.vendor_id,
+                billing_id=billing.pk,
+                test_id=test.pk,
+                department_id=test.assigned_department_id,
+                test_code=test.code,
+                test_name=test.name,
+                unit_price=unit,
+                discount_amount=discount,
+                tax_amount=tax,
+                line_total=unit - discount + tax,
+            ))
+        if len(batch) >= 1000:
+            BillingLineItem.objects.bulk_create(batch)
+            batch = []
+    BillingLineItem.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0006_alter_billinginformation_payment_status'),
+        ('labs', '0003_vendortest_tea_percent'),
+        ('tenants', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BillingLineItem',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('test_code', models.CharField(max_length=64)),
+                ('test_name', models.CharField(max_length=150)),
+                ('unit_price', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('discount_amount', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('tax_amount', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('line_total', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('billing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='line_items', to='billing.billinginformation')),
+                ('department', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='billing_line_items', to='labs.department')),
+                ('test', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='billing_line_items', to='labs.vendortest')),
+                ('vendor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='billing_line_items', to='tenants.vendor')),
+            ],
+            options={
+                'ordering': ['test_name'],
+                'indexes': [models.Index(fields=['vendor', 'test'], name='billing_bil_vendor__108b65_idx'), models.Index(fields=['vendor', 'department'], name='billing_bil_vendor__f3f7b1_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_line_items, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,90 @@
+# Generated by Django 5.2.7 on 2026-10-18 21:10
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Case, Count, DecimalField, F, Q, Sum, Value, When
+from django.db.models.functions import TruncDate
+
+
+def build_rollups(apps, schema_editor):
+    # Same aggregation as billing.services.rollup.rebuild()
+    BillingInformation = apps.get_model('billing', 'BillingInformation')
+    BillingDailyRollup = apps.get_model('billing', 'BillingDailyRollup')
+
+    money = DecimalField(max_digits=16, decimal_places=2)
+    outstanding = Q(payment_status__in=['UNPAID', 'PARTIAL', 'AUTHORIZED', 'INVOICED', 'OVERDUE'])
+    rows = BillingInformation.objects.annotate(day=TruncDate('created_at')).values(
+        'vendor_id', 'day', 'billing_type', 'payment_status', 'insurance_provider_id',
+    ).annotate(
+        billing_count=Count('id'),
+        total=Sum('total_amount'),
+        patient=Sum('patient_portion'),
+        insurance=Sum('insurance_portion'),
+        patient_paid=Sum('patient_amount_paid'),
+        insurance_paid=Sum('insurance_amount_paid'),
+        patient_outstanding=Sum(Case(
+            When(outstanding, then=F('patient_portion') - F('patient_amount_paid')),
+            default=Value(0), output_field=money,
+        )),
+        insurance_outstanding=Sum(Case(
+            When(outstanding, then=F('insurance_portion') - F('insurance_amount_paid')),
+            default=Value(0), output_field=money,
+        )),
+    ).order_by()
+
+    BillingDailyRollup.objects.bulk_create([
+        BillingDailyRollup(
+            vendor_id=row['vendor_id'],
+            day=row['day'],
+            billing_type=row['billing_type'],
+            payment_status=row['payment_status'],
+            insurance_provider_id=row['insurance_provider_id'],
+            billing_count=row['billing_count'],
+            total_amount=row['total'] or 0,
+            patient_portion=row['patient'] or 0,
+            insurance_portion=row['insurance'] or 0,
+            patient_paid=row['patient_paid'] or 0,
+            insurance_paid=row['insurance_paid'] or 0,
+            patient_outstanding=row['patient_outstanding'] or 0,
+            insurance_outstanding=row['insurance_outstanding'] or 0,
+        )
+        for row in rows
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0007_billinglineitem'),
+        ('tenants', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BillingDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('billing_type', models.CharField(choices=[('CASH', 'Cash / Self-Pay'), ('HMO', 'HMO / Insurance'), ('CORPORATE', 'Corporate / Wellness'), ('NHIS', 'NHIS (Government)'), ('STAFF', 'Staff (Internal)')], max_length=20)),
+                ('payment_status', models.CharField(choices=[('UNPAID', 'Unpaid'), ('PARTIAL', 'Partially Paid'), ('AUTHORIZED', 'Authorized to Proceed'), ('PAID', 'Fully Paid'), ('INVOICED', 'Invoiced'), ('OVERDUE', 'Overdue'), ('WAIVED', 'Waived / Written Off')], max_length=20)),
+                ('billing_count', models.IntegerField(default=0)),
+                ('total_amount', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=16)),
+                ('patient_portion', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=16)),
+                ('insurance_portion', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=16)),
+                ('patient_paid', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=16)),
+                ('insurance_paid', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=16)),
+                ('patient_outstanding', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=16)),
+                ('insurance_outstanding', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=16)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('insurance_provider', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='billing_rollups', to='billing.insuranceprovider')),
+                ('vendor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='billing_rollups', to='tenants.vendor')),
+            ],
+            options={
+                'ordering': ['-day'],
+                'indexes': [models.Index(fields=['vendor', 'day'], name='billing_bil_vendor__acd6a5_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('insurance_provider__isnull', False)), fields=('vendor', 'day', 'billing_type', 'payment_status', 'insurance_provider'), name='unique_billing_rollup_payer'), models.UniqueConstraint(condition=models.Q(('insurance_provider__isnull', True)), fields=('vendor', 'day', 'billing_type', 'payment_status'), name='unique_billing_rollup_self_pay')],
+            },
+        ),
+        migrations.RunPython(build_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.2.7 on 2026-10-18 21:16
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Case, DecimalField, Exists, F, OuterRef, Sum, When
+
+
+def backfill_exposure(apps, schema_editor):
+    InsuranceProvider = apps.get_model('billing', 'InsuranceProvider')
+    BillingInformation = apps.get_model('billing', 'BillingInformation')
+    Invoice = apps.get_model('billing', 'Invoice')
+
+    money = DecimalField(max_digits=16, decimal_places=2)
+    unpaid = F('insurance_portion') - F('insurance_amount_paid')
+    invoices = Invoice.objects.filter(billing_records=OuterRef('pk'))
+    rows = BillingInformation.objects.filter(
+        insurance_provider__isnull=False,
+        payment_status__in=['UNPAID', 'PARTIAL', 'AUTHORIZED', 'INVOICED', 'OVERDUE'],
+    ).annotate(
+        on_invoice=Exists(invoices.exclude(status='CANCELLED')),
+        on_overdue=Exists(invoices.filter(status='OVERDUE')),
+    ).values('insurance_provider_id').annotate(
+        owed=Sum('insurance_portion'),
+        paid=Sum('insurance_amount_paid'),
+        invoiced=Sum(Case(When(on_invoice=True, then=unpaid), default=0, output_field=money)),
+        overdue=Sum(Case(When(on_overdue=True, then=unpaid), default=0, output_field=money)),
+    ).order_by()
+
+    for row in rows:
+        InsuranceProvider.objects.filter(pk=row['insurance_provider_id']).update(
+            exposure_owed=row['owed'] or 0,
+            exposure_paid=row['paid'] or 0,
+            exposure_invoiced=row['invoiced'] or 0,
+            exposure_overdue=row['overdue'] or 0,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0008_billingdailyrollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='insuranceprovider',
+            name='exposure_invoiced',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), help_text='Unpaid insurance portion of records on a live (not cancelled) invoice', max_digits=16),
+        ),
+        migrations.AddField(
+            model_name='insuranceprovider',
+            name='exposure_overdue',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), help_text='Unpaid insurance portion of records on an OVERDUE invoice', max_digits=16),
+        ),
+        migrations.AddField(
+            model_name='insuranceprovider',
+            name='exposure_owed',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), help_text='Insurance portion of open billing records', max_digits=16),
+        ),
+        migrations.AddField(
+            model_name='insuranceprovider',
+            name='exposure_paid',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), help_text='Already paid against open billing records', max_digits=16),
+        ),
+        migrations.AddField(
+            model_name='insuranceprovider',
+            name='exposure_reconciled_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_exposure, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.7 on 2026-10-18 21:19
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def backfill_rebate_totals(apps, schema_editor):
+    Referrer = apps.get_model('billing', 'Referrer')
+    RebateRecord = apps.get_model('billing', 'RebateRecord')
+
+    unpaid = Q(status='UNPAID')
+    rows = RebateRecord.objects.values('referrer_id').annotate(
+        earned=Sum('rebate_amount'), earned_n=Count('id'),
+        unpaid=Sum('rebate_amount', filter=unpaid), unpaid_n=Count('id', filter=unpaid),
+    ).order_by()
+
+    for row in rows:
+        Referrer.objects.filter(pk=row['referrer_id']).update(
+            rebate_earned_total=row['earned'] or 0,
+            rebate_earned_count=row['earned_n'],
+            rebate_unpaid_total=row['unpaid'] or 0,
+            rebate_unpaid_count=row['unpaid_n'],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0009_insuranceprovider_exposure'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='referrer',
+            name='rebate_earned_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='referrer',
+            name='rebate_earned_total',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='referrer',
+            name='rebate_unpaid_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='referrer',
+            name='rebate_unpaid_total',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='referrer',
+            name='rebates_accrued_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_rebate_totals, migrations.RunPython.noop),
+    ]
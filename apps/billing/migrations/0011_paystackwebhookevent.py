@@ -0,0 +1,35 @@
+# Generated by Django 5.2.7 on 2026-10-18 21:23
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0010_referrer_rebate_totals'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaystackWebhookEvent',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('reference', models.CharField(max_length=100, unique=True)),
+                ('event', models.CharField(max_length=50)),
+                ('payload', models.JSONField(default=dict)),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('PROCESSED', 'Processed'), ('IGNORED', 'Ignored'), ('FAILED', 'Failed')], default='PENDING', max_length=20)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+                ('billing', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='paystack_events', to='billing.billinginformation')),
+                ('payment', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='paystack_event', to='billing.payment')),
+            ],
+            options={
+                'ordering': ['received_at'],
+                'indexes': [models.Index(fields=['status', 'received_at'], name='billing_pay_status_3a88f5_idx')],
+            },
+        ),
+    ]
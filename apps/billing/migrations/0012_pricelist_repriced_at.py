@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 21:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0011_paystackwebhookevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pricelist',
+            name='repriced_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -23,6 +23,7 @@ from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
 from django.conf import settings
 from django.db import models
 from django.db.models import Sum
+from django.db.models.functions import Coalesce, Greatest
 from django.utils import timezone
 
 logger = logging.getLogger(__name__)
@@ -38,6 +39,29 @@ def D(value) -> Decimal:
     return result.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
 
 
+def allocate(amount, weights) -> list:
+    """
+    Split ``amount`` across ``weights`` proportionally, rounded to 2 dp.
+    The rounding remainder goes to the largest weight so parts sum exactly.
+    """
+    amount = D(amount)
+    weights = [D(w) for w in weights]
+    total = sum(weights, D('0.00'))
+    if not weights:
+        return []
+    if total <= 0:
+        parts = [D('0.00')] * len(weights)
+        parts[0] = amount
+        return parts
+
+    parts = [D(amount * w / total) for w in weights]
+    remainder = amount - sum(parts, D('0.00'))
+    if remainder:
+        largest = max(range(len(weights)), key=weights.__getitem__)
+        parts[largest] += remainder
+    return parts
+
+
 # ─────────────────────────────────
 # 1. PriceList
 # ─────────────────────────────────
@@ -88,6 +112,9 @@ class PriceList(models.Model):
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Last run of the re-pricing job (services/repricing.py); open bills are
+    # stale while updated_at is newer
+    repriced_at = models.DateTimeField(null=True, blank=True, editable=False)
 
     class Meta:
         unique_together = ('vendor', 'name')
@@ -180,6 +207,29 @@ class InsuranceProvider(models.Model):
         help_text="Negotiated rate price list for this provider"
     )
 
+    # ── Running exposure (services/exposure.py) ──────────────────────────────
+    # Over the provider's open billing records (UNPAID … OVERDUE). Owed/paid
+    # move with F() updates on every billing transition; invoiced/overdue are
+    # re-summed for the provider when its invoiced records or invoices change.
+    # reconcile_payer_exposure recomputes all four from source.
+    exposure_owed = models.DecimalField(
+        max_digits=16, decimal_places=2, default=Decimal('0.00'),
+        help_text="Insurance portion of open billing records"
+    )
+    exposure_paid = models.DecimalField(
+        max_digits=16, decimal_places=2, default=Decimal('0.00'),
+        help_text="Already paid against open billing records"
+    )
+    exposure_invoiced = models.DecimalField(
+        max_digits=16, decimal_places=2, default=Decimal('0.00'),
+        help_text="Unpaid insurance portion of records on a live (not cancelled) invoice"
+    )
+    exposure_overdue = models.DecimalField(
+        max_digits=16, decimal_places=2, default=Decimal('0.00'),
+        help_text="Unpaid insurance portion of records on an OVERDUE invoice"
+    )
+    exposure_reconciled_at = models.DateTimeField(null=True, blank=True)
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -191,20 +241,13 @@ class InsuranceProvider(models.Model):
 
     def get_outstanding_balance(self) -> Decimal:
         """Amount the provider owes the lab (insurance_portion minus what they've paid)."""
-        stats = self.billing_records.filter(
-            payment_status__in=['UNPAID', 'PARTIAL', 'AUTHORIZED', 'INVOICED', 'OVERDUE']
-        ).aggregate(
-            total_owed=Sum('insurance_portion'),
-            total_paid=Sum('insurance_amount_paid'),
-        )
-        owed = D(stats['total_owed'] or 0)
-        paid = D(stats['total_paid'] or 0)
-        return D(owed - paid)
+        return D(self.exposure_owed - self.exposure_paid)
 
-    def is_over_credit_limit(self) -> bool:
+    def is_over_credit_limit(self, additional=0) -> bool:
+        """``additional`` = exposure about to be added (e.g. a new order's insurance portion)."""
         if self.credit_limit <= 0:
             return False  # 0 = unlimited
-        return self.get_outstanding_balance() > D(self.credit_limit)
+        return self.get_outstanding_balance() + D(additional) > D(self.credit_limit)
 
     def get_utilization_percentage(self) -> Decimal:
         if self.credit_limit <= 0:
@@ -245,6 +288,61 @@ class InsuranceProvider(models.Model):
     """
 
 
+class BillingInformationQuerySet(models.QuerySet):
+    """
+    SQL versions of the per-record payment helpers, for lists and bulk checks.
+
+    with_balance()    → payments_total, balance_due, patient_balance, insurance_balance
+    with_clearance()  → payment_cleared (is_payment_cleared), fully_paid (is_fully_paid)
+    cleared()         → only records with payment_cleared
+    """
+
+    # Mirrors BillingInformation.is_payment_cleared
+    CLEARED = (
+        models.Q(payment_status__in=('PAID', 'AUTHORIZED', 'WAIVED'))
+        | models.Q(billing_type__in=('HMO', 'NHIS'), patient_amount_paid__gte=models.F('patient_portion'))
+        | models.Q(billing_type__in=('CORPORATE', 'STAFF'))
+    )
+
+    def with_balance(self):
+        money = models.DecimalField(max_digits=14, decimal_places=2)
+        zero = models.Value(Decimal('0.00'), output_field=money)
+        paid = (
+            Payment.objects.filter(billing=models.OuterRef('pk'))
+            .order_by().values('billing').annotate(total=Sum('amount')).values('total')
+        )
+        return self.annotate(
+            payments_total=Coalesce(models.Subquery(paid, output_field=money), zero),
+            balance_due=models.ExpressionWrapper(models.F('total_amount') - models.F('payments_total'), output_field=money),
+            patient_balance=Greatest(
+                models.F('patient_portion') - models.F('patient_amount_paid'), zero, output_field=money,
+            ),
+            insurance_balance=Greatest(
+                models.F('insurance_portion') - models.F('insurance_amount_paid'), zero, output_field=money,
+            ),
+        )
+
+    def with_clearance(self):
+        qs = self if 'payments_total' in self.query.annotations else self.with_balance()
+        fully_paid = (
+            models.Q(payment_status__in=('PAID', 'WAIVED'))
+            | models.Q(total_amount__gt=0, balance_due__lte=0)
+        )
+        return qs.annotate(
+            payment_cleared=models.Case(
+                models.When(self.CLEARED, then=models.Value(True)),
+                default=models.Value(False), output_field=models.BooleanField(),
+            ),
+            fully_paid=models.Case(
+                models.When(fully_paid, then=models.Value(True)),
+                default=models.Value(False), output_field=models.BooleanField(),
+            ),
+        )
+
+    def cleared(self):
+        return self.filter(self.CLEARED)
+
+
 class BillingInformation(models.Model):
 
     BILLING_TYPES = [
@@ -258,6 +356,9 @@ class BillingInformation(models.Model):
     # Insurance-type billing types — all require an InsuranceProvider FK
     INSURANCE_TYPES = {'HMO', 'NHIS', 'CORPORATE', 'STAFF'}
 
+    # Statuses with money still to collect
+    OUTSTANDING_STATUSES = ('UNPAID', 'PARTIAL', 'AUTHORIZED', 'INVOICED', 'OVERDUE')
+
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     vendor = models.ForeignKey(
         'tenants.Vendor', on_delete=models.CASCADE, related_name='billing_records'
@@ -363,6 +464,8 @@ class BillingInformation(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = BillingInformationQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created_at']
         indexes = [
@@ -389,30 +492,16 @@ class BillingInformation(models.Model):
           - waiver_amount   : applied AFTER the split (reduces patient_portion only)
         """
 
-        # ── Fetch tests ───────────────────────────
-        try:
-            tests = list(self.request.requested_tests.all())
-        except AttributeError:
-            tests = []
+        # ── Step A: subtotal is maintained from BillingLineItem rows ─────────
+        # (see _build_line_items — the M2M is only re-read when re-pricing)
+        running_subtotal = D(self.subtotal)
 
-        if not tests:
+        if running_subtotal <= 0:
             for field in ('subtotal', 'discount', 'tax', 'total_amount',
                           'patient_portion', 'insurance_portion'):
                 setattr(self, field, D('0.00'))
             return
 
-        # ── Step A: Build subtotal from the correct price list ───────────────
-        running_subtotal = D('0.00')
-
-        for lab_test in tests:
-            if self.price_list and callable(getattr(lab_test, 'get_price_from_price_list', None)):
-                price = D(lab_test.get_price_from_price_list(self.price_list))
-            else:
-                price = D(getattr(lab_test, 'price', 0))
-            running_subtotal += price
-
-        self.subtotal = running_subtotal
-
         # ── Step A: Negotiated rate discount (price list %) ──────────────────
         negotiated_discount = D('0.00')
         if self.price_list and self.price_list.discount_percentage:
@@ -476,19 +565,107 @@ class BillingInformation(models.Model):
             self.patient_portion = effective_contract_price
             self.insurance_portion = D('0.00')
 
+    # ── Line items ───────────────────────────────────────────────────────────
+
+    # Changing any of these means totals must be re-derived
+    PRICING_FIELDS = {'price_list', 'billing_type', 'insurance_provider',
+                      'manual_discount', 'waiver_amount', 'subtotal'}
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._pricing_snapshot = instance._pricing_key()
+        instance._rollup_snapshot = instance._rollup_state()
+        return instance
+
+    def _pricing_key(self):
+        data = self.__dict__
+        return (data.get('price_list_id'), data.get('discount'), data.get('tax'))
+
+    ROLLUP_FIELDS = ('created_at', 'vendor_id', 'billing_type', 'payment_status',
+                     'insurance_provider_id', 'total_amount', 'patient_portion',
+                     'insurance_portion', 'patient_amount_paid', 'insurance_amount_paid')
+
+    def _rollup_state(self):
+        """What this record contributes to BillingDailyRollup (None if fields are deferred)."""
+        data = self.__dict__
+        if any(f not in data for f in self.ROLLUP_FIELDS):
+            return None
+        return tuple(data[f] for f in self.ROLLUP_FIELDS)
+
+    def _build_line_items(self) -> list:
+        """
+        Price the request's tests (one cached matrix lookup) into unsaved
+        BillingLineItem rows and set subtotal from them.
+        """
+        from .services.pricing import price_many
+
+        try:
+            tests = list(self.request.requested_tests.all())
+        except AttributeError:
+            tests = []
+
+        prices = price_many(tests, self.price_list)
+        lines = [
+            BillingLineItem(
+                vendor_id=self.vendor_id,
+                billing=self,
+                test=test,
+                department_id=test.assigned_department_id,
+                test_code=test.code,
+                test_name=test.name,
+                unit_price=prices[test.pk],
+            )
+            for test in tests
+        ]
+        self.subtotal = sum((line.unit_price for line in lines), D('0.00'))
+        return lines
+
+    def _allocate_to_lines(self, lines) -> None:
+        """Spread header discount and tax across lines (exact to the kobo)."""
+        weights = [line.unit_price for line in lines]
+        for line, discount, tax in zip(
+            lines, allocate(self.discount, weights), allocate(self.tax, weights)
+        ):
+            line.discount_amount = discount
+            line.tax_amount = tax
+            line.line_total = D(line.unit_price - discount + tax)
+
+    def rebuild_line_items(self) -> None:
+        """Re-price every test (e.g. after the requested tests changed) and save."""
+        self._force_reprice = True
+        self.save()
+
     # ── Save ────────────────────────────────────
 
     def save(self, *args, **kwargs):
         """
-        Always recalculate before persisting.
+        Totals are derived from BillingLineItem rows.
 
-        For existing records, explicitly list update_fields to avoid
-        accidentally overwriting fields managed by other processes
-        (e.g. payment_status updated by Payment.save()).
+        - New record            → price tests once, bulk_create line items
+        - price_list changed    → re-price line items
+        - other full saves      → re-derive discount/tax/split from the stored subtotal
+        - update_fields without any pricing field (payment status, notes, …)
+                                → plain UPDATE, no recalculation at all
         """
+        update_fields = kwargs.get('update_fields')
+        if (not self._state.adding and update_fields is not None
+                and not set(update_fields) & self.PRICING_FIELDS):
+            super().save(*args, **kwargs)
+            return
+
+        creating = self._state.adding
+        snapshot = getattr(self, '_pricing_snapshot', None)
+        reprice = (
+            creating
+            or getattr(self, '_force_reprice', False)
+            or (snapshot is not None and snapshot[0] != self.price_list_id)
+        )
+
+        lines = self._build_line_items() if reprice else None
         self._calculate_totals_internal()
 
-        if not self.pk:
+        if creating:
             # New record — full INSERT
             super().save(*args, **kwargs)
         else:
@@ -512,6 +689,19 @@ class BillingInformation(models.Model):
             ]
             super().save(update_fields=update_fields)
 
+        if lines is not None:
+            self._allocate_to_lines(lines)
+            if not creating:
+                self.line_items.all().delete()
+            BillingLineItem.objects.bulk_create(lines)
+        elif snapshot is not None and snapshot[1:] != (self.discount, self.tax):
+            lines = list(self.line_items.all())
+            self._allocate_to_lines(lines)
+            BillingLineItem.objects.bulk_update(lines, ['discount_amount', 'tax_amount', 'line_total'])
+
+        self._force_reprice = False
+        self._pricing_snapshot = self._pricing_key()
+
     # ── Status helpers ───────────────────────────────────────────────────────
 
     @property
@@ -557,6 +747,8 @@ class BillingInformation(models.Model):
 
     def get_balance_due(self) -> Decimal:
         """Balance based on actual Payment records (source of truth)."""
+        if hasattr(self, 'payments_total'):  # annotated by with_balance()
+            return D(self.total_amount) - D(self.payments_total)
         total_paid = (
             self.payments.aggregate(total=Sum('amount'))['total']
             or Decimal('0.00')
@@ -577,6 +769,140 @@ class BillingInformation(models.Model):
         )
 
 
+# ────────────────────────────────────────
+# 3b. BillingLineItem  (per-test snapshot at billing time)
+# ────────────────────────────────────────
+
+class BillingLineItemQuerySet(models.QuerySet):
+
+    def revenue_by_test(self):
+        return self.values('test_id', 'test_code', 'test_name').annotate(
+            count=models.Count('id'),
+            gross=Sum('unit_price'),
+            discount=Sum('discount_amount'),
+            tax=Sum('tax_amount'),
+            revenue=Sum('line_total'),
+        ).order_by('-revenue')
+
+    def revenue_by_department(self):
+        return self.values('department_id', 'department__name').annotate(
+            count=models.Count('id'),
+            gross=Sum('unit_price'),
+            revenue=Sum('line_total'),
+        ).order_by('-revenue')
+
+
+class BillingLineItem(models.Model):
+    """
+    One priced test on a BillingInformation record.
+
+    Prices are snapshotted when the record is created (or explicitly
+    re-priced), so later price-list edits never rewrite history.
+    BillingInformation.subtotal is the sum of unit_price; the header discount
+    and tax are allocated across lines to the kobo. waiver_amount is a
+    write-off and stays on the header only.
+    """
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    vendor = models.ForeignKey(
+        'tenants.Vendor', on_delete=models.CASCADE, related_name='billing_line_items'
+    )
+    billing = models.ForeignKey(
+        BillingInformation, on_delete=models.CASCADE, related_name='line_items'
+    )
+    test = models.ForeignKey(
+        'labs.VendorTest', on_delete=models.SET_NULL, null=True, related_name='billing_line_items'
+    )
+    department = models.ForeignKey(
+        'labs.Department', on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='billing_line_items'
+    )
+
+    test_code = models.CharField(max_length=64)
+    test_name = models.CharField(max_length=150)
+
+    unit_price = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    discount_amount = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    tax_amount = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    line_total = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = BillingLineItemQuerySet.as_manager()
+
+    class Meta:
+        ordering = ['test_name']
+        indexes = [
+            models.Index(fields=['vendor', 'test']),
+            models.Index(fields=['vendor', 'department']),
+        ]
+
+    def __str__(self):
+        return f"{self.test_code} — ₦{self.line_total}"
+
+
+# ────────────────────────────────────────
+# 3c. BillingDailyRollup  (dashboard aggregates per day)
+# ────────────────────────────────────────
+
+class BillingDailyRollup(models.Model):
+    """
+    Pre-aggregated BillingInformation totals per vendor, day (of created_at),
+    billing type, payment status and payer.
+
+    Kept current by services/rollup.py: every billing save/delete moves its
+    contribution between buckets with F() updates, so Payment / InvoicePayment
+    propagation and status changes are reflected immediately. Rows are
+    derived data — `manage.py rebuild_billing_rollups` recomputes them.
+
+    Outstanding columns hold portion − paid for outstanding statuses only
+    (UNPAID, PARTIAL, AUTHORIZED, INVOICED, OVERDUE) and 0 otherwise.
+    """
+
+    vendor = models.ForeignKey(
+        'tenants.Vendor', on_delete=models.CASCADE, related_name='billing_rollups'
+    )
+    day = models.DateField()
+    billing_type = models.CharField(max_length=20, choices=BillingInformation.BILLING_TYPES)
+    payment_status = models.CharField(max_length=20, choices=BillingInformation.PAYMENT_STATUS)
+    insurance_provider = models.ForeignKey(
+        InsuranceProvider, on_delete=models.CASCADE, null=True, blank=True,
+        related_name='billing_rollups'
+    )
+
+    billing_count = models.IntegerField(default=0)
+    total_amount = models.DecimalField(max_digits=16, decimal_places=2, default=Decimal('0.00'))
+    patient_portion = models.DecimalField(max_digits=16, decimal_places=2, default=Decimal('0.00'))
+    insurance_portion = models.DecimalField(max_digits=16, decimal_places=2, default=Decimal('0.00'))
+    patient_paid = models.DecimalField(max_digits=16, decimal_places=2, default=Decimal('0.00'))
+    insurance_paid = models.DecimalField(max_digits=16, decimal_places=2, default=Decimal('0.00'))
+    patient_outstanding = models.DecimalField(max_digits=16, decimal_places=2, default=Decimal('0.00'))
+    insurance_outstanding = models.DecimalField(max_digits=16, decimal_places=2, default=Decimal('0.00'))
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-day']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['vendor', 'day', 'billing_type', 'payment_status', 'insurance_provider'],
+                condition=models.Q(insurance_provider__isnull=False),
+                name='unique_billing_rollup_payer',
+            ),
+            models.UniqueConstraint(
+                fields=['vendor', 'day', 'billing_type', 'payment_status'],
+                condition=models.Q(insurance_provider__isnull=True),
+                name='unique_billing_rollup_self_pay',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['vendor', 'day']),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.billing_type}/{self.payment_status} — ₦{self.total_amount}"
+
+
 # ────────────────────────────────────────
 # 4. Invoice  (HMO / Corporate — bills the insurance_portion in bulk)
 # ─────────────────────────────────────────────
@@ -666,8 +992,9 @@ class Invoice(models.Model):
         )
 
         if eligible.exists():
+            from .services.rollup import update_status
             self.billing_records.add(*eligible)
-            eligible.update(payment_status='INVOICED')
+            update_status(eligible, 'INVOICED')
             self.calculate_totals()
 
     def balance_due(self) -> Decimal:
@@ -718,13 +1045,10 @@ class Payment(models.Model):
         ordering = ['-payment_date']
         
     def save(self, *args, **kwargs):
-        # 1. Track if this is a new payment before saving
-        is_new = self._state.adding 
-        
-        # 2. Save the payment record first
+        # 1. Save the payment record first
         super().save(*args, **kwargs)
 
-        # 3. RECOMPUTE BILLING STATUS (Existing Logic)
+        # 2. RECOMPUTE BILLING STATUS (Existing Logic)
         # We aggregate all payments associated with this billing record
         from django.db.models import Sum
         
@@ -747,25 +1071,7 @@ class Payment(models.Model):
         self.billing.payment_status = new_status
         self.billing.save(update_fields=['patient_amount_paid', 'payment_status', 'updated_at'])
 
-        # 4. REBATE CALCULATION (New Logic)
-        # We only calculate rebates on the FIRST save of a payment to avoid duplicates
-        if is_new and self.billing.referrer:
-            referrer = self.billing.referrer
-            
-            # Use the method from your Referrer model
-            earned_amount = referrer.calculate_rebate(self.amount)
-            
-            if earned_amount > 0:
-                # Assuming RebateRecord is imported or available in the namespace
-                from referral.models import RebateRecord 
-                RebateRecord.objects.create(
-                    vendor=self.billing.vendor, # For multi-tenant filtering
-                    referrer=referrer,
-                    billing=self.billing,
-                    payment=self,
-                    rebate_amount=earned_amount,
-                    status='UNPAID'
-                )
+        # Rebates are accrued in batch (manage.py accrue_rebates), not here
 
     def __str__(self):
         return f"₦{self.amount} — {self.get_payment_method_display()} — {self.payment_date.date()}"
@@ -836,81 +1142,65 @@ class InvoicePayment(models.Model):
         super().save(*args, **kwargs)
 
         # Update invoice totals and propagate to individual billing records
-        total_paid = (
-            self.invoice.payments.aggregate(total=Sum('amount'))['total']
-            or Decimal('0.00')
-        )
-        self.invoice.amount_paid = D(total_paid)
+        # so insurance_amount_paid stays accurate for reconciliation reports.
+        # Idempotent — see billing/services/invoice_payments.py.
+        from .services.invoice_payments import propagate_invoice_payment
+        propagate_invoice_payment(self.invoice)
+
+    def __str__(self):
+        return f"₦{self.amount} — {self.invoice.invoice_number} — {self.payment_date}"
 
-        if D(total_paid) >= D(self.invoice.total_amount) and self.invoice.total_amount > 0:
-            self.invoice.status = 'PAID'
-        elif D(total_paid) > 0:
-            self.invoice.status = 'PARTIAL'
 
-        self.invoice.save(update_fields=['amount_paid', 'status', 'updated_at'])
+# ─────────────────────────────────────────────
+# 6b. PaystackWebhookEvent  (webhook inbox — one row per charge reference)
+# ────────────────────────────────────────────────────
 
-        # Propagate insurance payment back to individual billing records
-        # so insurance_amount_paid stays accurate for reconciliation reports
-        self._propagate_to_billing_records(D(total_paid))
+class PaystackWebhookEvent(models.Model):
+    """
+    Paystack `charge.success` notifications, stored on receipt and
+    acknowledged straight away. services/paystack_inbox.py turns PENDING
+    rows into Payments in batches.
 
-    def _propagate_to_billing_records(self, total_invoice_paid: Decimal) -> None:
-        """
-        Distribute the invoice payment proportionally across attached billing records.
+    The unique reference makes Paystack's retries (and the browser callback
+    racing the webhook) land on the same row, so a charge is applied once.
+    """
 
-        Uses each record's share of the invoice total as the allocation weight.
-        This ensures insurance_amount_paid on each BillingInformation is accurate
-        for per-patient reconciliation without double-counting.
-        """
-        # invoice_total = D(self.invoice.total_amount)
-        # if invoice_total <= 0:
-        #     return
-
-        # records = self.invoice.billing_records.all()
-        # for record in records:
-        #     if invoice_total > 0:
-        #         share = D(record.insurance_portion) / invoice_total
-        #     else:
-        #         share = D('0.00')
-        
+    STATUS_CHOICES = [
+        ('PENDING',   'Pending'),
+        ('PROCESSED', 'Processed'),
+        ('IGNORED',   'Ignored'),
+        ('FAILED',    'Failed'),
+    ]
 
-        #     record.insurance_amount_paid = D(total_invoice_paid * share)
-        #     record.save(update_fields=['insurance_amount_paid', 'updated_at'])
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    reference = models.CharField(max_length=100, unique=True)
+    event = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict)
 
-        invoice_total = D(self.invoice.total_amount)
-        if invoice_total <= 0:
-            return
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
 
-        records = self.invoice.billing_records.all()
-        for record in records:
-            share = (
-                D(record.insurance_portion) / invoice_total
-                if invoice_total > 0 else D('0.00')
-            )
-            record.insurance_amount_paid = D(total_invoice_paid * share)
-
-            # Derive the correct payment_status from the updated totals.
-            # Do NOT call update_payment_status() here — it issues its own
-            # save() and would double-hit the DB. Compute inline instead.
-            total_paid = (
-                D(record.patient_amount_paid or 0) +
-                record.insurance_amount_paid
-            )
-            if total_paid >= D(record.total_amount) and D(record.total_amount) > 0:
-                new_status = 'PAID'
-            elif total_paid > 0:
-                new_status = 'PARTIAL'
-            else:
-                new_status = 'INVOICED'
-
-            record.payment_status = new_status
-            record.save(update_fields=[
-                'insurance_amount_paid',
-                'payment_status',
-                'updated_at',
-            ])
+    billing = models.ForeignKey(
+        BillingInformation, on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='paystack_events'
+    )
+    payment = models.OneToOneField(
+        'billing.Payment', on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='paystack_event'
+    )
+
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['received_at']
+        indexes = [
+            models.Index(fields=['status', 'received_at']),
+        ]
 
     def __str__(self):
-        return f"₦{self.amount} — {self.invoice.invoice_number} — {self.payment_date}"
+        return f"{self.event} {self.reference} ({self.status})"
 
 
 # 7. REBATE MODELS
@@ -955,6 +1245,13 @@ class Referrer(models.Model):
         default=30, help_text="Days after statement date when payment is due"
     )
 
+    # ── Running rebate totals (services/rebate_accrual.py) ───────────────
+    rebate_earned_total = models.DecimalField(max_digits=14, decimal_places=2, default=D('0.00'))
+    rebate_earned_count = models.IntegerField(default=0)
+    rebate_unpaid_total = models.DecimalField(max_digits=14, decimal_places=2, default=D('0.00'))
+    rebate_unpaid_count = models.IntegerField(default=0)
+    rebates_accrued_at  = models.DateTimeField(null=True, blank=True)
+
     is_active  = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -993,15 +1290,11 @@ class Referrer(models.Model):
 
     def get_unpaid_balance(self) -> D:
         """Total rebate owed to this referrer (unpaid RebateRecords)."""
-        result = self.rebate_records.filter(
-            status='UNPAID'
-        ).aggregate(total=Sum('rebate_amount'))
-        return D(result['total'] or 0).quantize(D('0.01'))
+        return D(self.rebate_unpaid_total)
 
     def get_lifetime_earned(self) -> D:
         """Total rebate ever earned (all statuses)."""
-        result = self.rebate_records.aggregate(total=Sum('rebate_amount'))
-        return D(result['total'] or 0).quantize(D('0.01'))
+        return D(self.rebate_earned_total)
 
 
 # ──────────────────────────────────────
@@ -220,66 +220,36 @@ class PaystackAPI:
 
 def process_paystack_webhook(request):
     """
-    Process Paystack webhook notifications.
-    
-    This should be called from a webhook view that receives POST requests
-    from Paystack when payment status changes.
-    
+    Store a Paystack webhook notification in the inbox.
+
+    Payments are created later by the inbox worker
+    (`manage.py process_paystack_webhooks`), so the view can answer Paystack
+    immediately; retries of the same reference are absorbed by the inbox.
+
     Args:
         request: Django HttpRequest with webhook payload
-    
+
     Returns:
         tuple: (success: bool, message: str)
     """
-    
-    # Verify signature
+
+    # Verified against the billing vendor's key inside record_webhook
     signature = request.headers.get('X-Paystack-Signature', '')
-    
-    # Note: Signature verification requires vendor context
-    # This is a simplified version - you'll need to determine vendor from payload
-    
+
+    from apps.billing.services.paystack_inbox import InvalidSignature, record_webhook
+
     try:
-        import json
-        payload = json.loads(request.body)
-        
-        event = payload.get('event')
-        data = payload.get('data', {})
-        
-        if event == 'charge.success':
-            # Payment successful
-            reference = data.get('reference')
-            metadata = data.get('metadata', {})
-            billing_id = metadata.get('billing_id')
-            
-            if billing_id:
-                from apps.billing.models import BillingInformation, Payment
-                
-                try:
-                    billing = BillingInformation.objects.get(id=billing_id)
-                    
-                    # Create payment record
-                    Payment.objects.create(
-                        billing=billing,
-                        amount=Decimal(data['amount']) / 100,  # Convert from kobo
-                        payment_method='TRANSFER',  # Or map from data['channel']
-                        transaction_reference=reference,
-                        payment_date=timezone.now(),
-                        notes=f"Paystack payment - Channel: {data.get('channel')}"
-                    )
-                    # Payment.save() automatically updates billing.payment_status
-                    
-                    logger.info(f"Webhook: Payment recorded for billing {billing_id}")
-                    return True, 'Payment processed successfully'
-                
-                except BillingInformation.DoesNotExist:
-                    logger.error(f"Webhook: Billing {billing_id} not found")
-                    return False, 'Billing record not found'
-        
-        return True, 'Event processed'
-    
-    except Exception as e:
-        logger.error(f"Webhook processing error: {e}", exc_info=True)
-        return False, str(e)
+        event = record_webhook(request.body, signature)
+    except InvalidSignature as e:
+        logger.warning(f"Webhook: {e}")
+        return False, 'Invalid signature'
+    except ValueError as e:
+        logger.error(f"Webhook: malformed payload: {e}")
+        return False, 'Malformed payload'
+
+    if event is None:
+        return True, 'Event ignored'
+    return True, f'Event {event.reference} queued'
 
 
 # ========================================
@@ -0,0 +1,145 @@
+"""
+billing/services/batch_invoicing.py
+
+Month-end invoicing for every payer in one pass (`manage.py generate_invoices`).
+
+    unbilled(vendor, start, end)           → records a payer could be invoiced for
+    invoice_period(vendor, start, end, …)  → one DRAFT invoice per payer
+    deliver(invoices)                      → mark SENT and email the PDFs
+
+invoice_period is the bulk counterpart of generate_invoice_view +
+Invoice.add_billing_records, with the same eligibility rules. It locks and
+reads the eligible records once, allocates every invoice number in one query,
+bulk-creates the invoices and their M2M rows, flips the records to INVOICED
+with one UPDATE (rollup and payer exposure follow), and totals all invoices
+with one grouped SUM.
+
+Delivery runs after the transaction commits, so a slow PDF or a broken SMTP
+server never holds the locks or undoes the invoicing, and shares one
+throttled SMTP session (notification.transport) across the batch.
+"""
+
+import logging
+from collections import defaultdict
+from datetime import timedelta
+from typing import List
+
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from ..models import D, BillingInformation, InsuranceProvider, Invoice
+from .helper import _allocate_invoice_numbers
+from .rollup import apply_transitions
+
+logger = logging.getLogger(__name__)
+
+ELIGIBLE_STATUSES = ('UNPAID', 'PARTIAL', 'AUTHORIZED')
+INVOICE_BATCH_SIZE = 1000
+
+
+def unbilled(vendor, start, end):
+    return BillingInformation.objects.filter(
+        vendor=vendor,
+        insurance_provider__isnull=False,
+        created_at__date__range=[start, end],
+        insurance_portion__gt=0,
+        payment_status__in=ELIGIBLE_STATUSES,
+    )
+
+
+@transaction.atomic
+def invoice_period(vendor, start, end, user=None, providers=None) -> List[Invoice]:
+    """
+    Create a DRAFT invoice for each payer with unbilled records in
+    [start, end]. ``providers`` narrows the run to those InsuranceProviders.
+    """
+    records = unbilled(vendor, start, end)
+    if providers is not None:
+        records = records.filter(insurance_provider__in=providers)
+    records = list(records.select_for_update(of=('self',)).order_by('created_at'))
+    if not records:
+        return []
+
+    by_provider = defaultdict(list)
+    for record in records:
+        by_provider[record.insurance_provider_id].append(record)
+
+    payers = InsuranceProvider.objects.in_bulk(list(by_provider))
+    numbers = _allocate_invoice_numbers(vendor, payers.values())
+
+    today = timezone.now().date()
+    invoices = [
+        Invoice(
+            vendor=vendor,
+            invoice_number=numbers[provider_id],
+            insurance_provider=payers[provider_id],
+            invoice_date=today,
+            due_date=today + timedelta(days=payers[provider_id].payment_terms_days),
+            period_start=start,
+            period_end=end,
+            created_by=user,
+            status='DRAFT',
+        )
+        for provider_id in sorted(by_provider, key=lambda pk: payers[pk].code)
+    ]
+    Invoice.objects.bulk_create(invoices, batch_size=INVOICE_BATCH_SIZE)
+
+    Through = Invoice.billing_records.through
+    Through.objects.bulk_create([
+        Through(invoice_id=invoice.pk, billinginformation_id=record.pk)
+        for invoice in invoices
+        for record in by_provider[invoice.insurance_provider_id]
+    ], batch_size=INVOICE_BATCH_SIZE)
+
+    # Same status move as rollup.update_status, on rows already in memory
+    now = timezone.now()
+    transitions = []
+    for record in records:
+        old = record._rollup_state()
+        record.payment_status = 'INVOICED'
+        transitions.append((old, record._rollup_state()))
+    BillingInformation.objects.filter(pk__in=[r.pk for r in records]).update(
+        payment_status='INVOICED', updated_at=now,
+    )
+    apply_transitions(transitions)
+
+    sums = {
+        row['invoice_id']: row
+        for row in Through.objects.filter(invoice__in=invoices).values('invoice_id').annotate(
+            total=Sum('billinginformation__insurance_portion'),
+            tax=Sum('billinginformation__tax'),
+        ).order_by()
+    }
+    for invoice in invoices:
+        invoice.total_amount = D(sums[invoice.pk]['total'] or 0)
+        invoice.tax = D(sums[invoice.pk]['tax'] or 0)
+        invoice.updated_at = now
+    Invoice.objects.bulk_update(invoices, ['total_amount', 'tax', 'updated_at'], batch_size=INVOICE_BATCH_SIZE)
+
+    logger.info(
+        "Invoiced %d record(s) for %s into %d invoice(s), %s – %s",
+        len(records), vendor, len(invoices), start, end,
+    )
+    return invoices
+
+
+def deliver(invoices) -> int:
+    """
+    Mark DRAFT invoices SENT and email them over one SMTP session;
+    returns how many emails went out.
+    """
+    from apps.notification.transport import MailTransport
+
+    from .invoice_email import send_invoice_email
+
+    sent = 0
+    with MailTransport() as transport:
+        for invoice in invoices:
+            if invoice.status != 'DRAFT' or invoice.total_amount <= 0:
+                continue
+            invoice.status = 'SENT'
+            invoice.save(update_fields=['status', 'updated_at'])
+            if send_invoice_email(invoice, transport=transport):
+                sent += 1
+    return sent
@@ -0,0 +1,346 @@
+"""
+billing/services/claims.py
+
+Claim files for HMO / NHIS payers, one file per provider, zipped.
+
+    claims_for_invoice(invoice)              → the invoice's billing records
+    claims_for_period(vendor, start, end, …) → third-party records in a period
+    stream_claims_zip(billings, fmt)         → zip bytes as claims are read
+    claims_response(billings, fmt, name)     → StreamingHttpResponse
+
+Formats are ClaimFormatter subclasses registered in FORMATTERS by name
+('csv', 'fixed', 'xml', 'json'); a payer-specific layout is one more
+@register class. A formatter turns claims into text: begin() once per
+provider file, claim() per record, end() with the count and total.
+
+Records are read ordered by provider with values().iterator(chunk_size=…).
+Line items and invoice numbers come in one query per chunk. Each provider's
+file is written into the zip while its rows are read. Claims that fail
+validate() (missing policy number, or missing pre-authorisation code for
+a provider with requires_preauth) are left out and written to
+rejected.csv as they are found. A zip can only have one member open for
+writing, so those rows go to a spooled temp file that is copied into the
+rejected.csv member at the end. manifest.json records the count and
+total for each file.
+"""
+
+import csv
+import io
+import json
+import tempfile
+import unicodedata
+import zipfile
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from decimal import Decimal
+from itertools import islice
+from typing import Dict, Iterator, List
+from xml.sax.saxutils import escape, quoteattr
+
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from ..models import BillingInformation, BillingLineItem, Invoice
+from .export import _Buffer
+
+CLAIM_CHUNK_SIZE = 2000
+REJECTED_SPOOL_SIZE = 1024 * 1024  # bytes kept in memory before spilling to disk
+
+CLAIM_FIELDS = (
+    'claim_id', 'service_date', 'patient_id', 'patient_name', 'date_of_birth', 'gender',
+    'policy_number', 'pre_authorization_code', 'employee_id', 'billing_type',
+    'invoice_number', 'tests', 'total_amount', 'patient_portion', 'claim_amount',
+)
+
+VALUES = (
+    'id', 'created_at', 'billing_type', 'policy_number', 'pre_authorization_code', 'employee_id',
+    'insurance_provider_id', 'insurance_provider__code', 'insurance_provider__requires_preauth',
+    'request__request_id', 'request__patient__patient_id', 'request__patient__first_name',
+    'request__patient__last_name', 'request__patient__date_of_birth', 'request__patient__gender',
+    'total_amount', 'patient_portion', 'insurance_portion',
+)
+
+
+# ── Sources ──────────────────────────────────────────────────────────────────
+
+def claims_for_invoice(invoice):
+    return invoice.billing_records.all()
+
+
+def claims_for_period(vendor, start, end, providers=None):
+    billings = BillingInformation.objects.filter(
+        vendor=vendor,
+        insurance_provider__isnull=False,
+        created_at__date__range=[start, end],
+        insurance_portion__gt=0,
+    ).exclude(payment_status='WAIVED')
+    if providers is not None:
+        billings = billings.filter(insurance_provider__in=providers)
+    return billings
+
+
+# ── Claims ───────────────────────────────────────────────────────────────────
+
+def _related(ids):
+    tests, invoices = defaultdict(list), {}
+    for billing_id, code in BillingLineItem.objects.filter(
+        billing_id__in=ids
+    ).order_by('test_code').values_list('billing_id', 'test_code'):
+        tests[billing_id].append(code)
+    for billing_id, number in Invoice.billing_records.through.objects.filter(
+        billinginformation_id__in=ids
+    ).exclude(invoice__status='CANCELLED').values_list('billinginformation_id', 'invoice__invoice_number'):
+        invoices[billing_id] = number
+    return tests, invoices
+
+
+def iter_claims(billings, chunk_size: int = CLAIM_CHUNK_SIZE) -> Iterator[Dict]:
+    """Claim dicts (CLAIM_FIELDS plus provider keys), grouped by provider."""
+    records = billings.filter(insurance_provider__isnull=False).order_by(
+        'insurance_provider__code', 'insurance_provider_id', 'created_at', 'id',
+    ).values(*VALUES).iterator(chunk_size=chunk_size)
+
+    while True:
+        chunk = list(islice(records, chunk_size))
+        if not chunk:
+            return
+        tests, invoices = _related([r['id'] for r in chunk])
+        for r in chunk:
+            dob = r['request__patient__date_of_birth']
+            yield {
+                'provider_id': r['insurance_provider_id'],
+                'provider_code': r['insurance_provider__code'],
+                'requires_preauth': r['insurance_provider__requires_preauth'],
+                'claim_id': r['request__request_id'],
+                'service_date': timezone.localtime(r['created_at']).date(),
+                'patient_id': r['request__patient__patient_id'],
+                'patient_name': f"{r['request__patient__first_name']} {r['request__patient__last_name']}",
+                'date_of_birth': dob,
+                'gender': r['request__patient__gender'],
+                'policy_number': r['policy_number'].strip(),
+                'pre_authorization_code': r['pre_authorization_code'].strip(),
+                'employee_id': r['employee_id'],
+                'billing_type': r['billing_type'],
+                'invoice_number': invoices.get(r['id'], ''),
+                'tests': tests[r['id']],
+                'total_amount': r['total_amount'],
+                'patient_portion': r['patient_portion'],
+                'claim_amount': r['insurance_portion'],
+            }
+
+
+def validate(claim) -> List[str]:
+    problems = []
+    if not claim['policy_number']:
+        problems.append('missing policy number')
+    if claim['requires_preauth'] and not claim['pre_authorization_code']:
+        problems.append('missing pre-authorisation code')
+    if claim['claim_amount'] <= 0:
+        problems.append('nothing to claim')
+    return problems
+
+
+# ── Formatters ───────────────────────────────────────────────────────────────
+
+FORMATTERS: Dict[str, type] = {}
+
+
+def register(cls):
+    FORMATTERS[cls.name] = cls
+    return cls
+
+
+class ClaimFormatter(ABC):
+    name = ''
+    extension = ''
+
+    def begin(self, provider_code: str) -> str:
+        return ''
+
+    @abstractmethod
+    def claim(self, claim: Dict) -> str:
+        """One record's text."""
+
+    def end(self, provider_code: str, count: int, total: Decimal) -> str:
+        return ''
+
+    @staticmethod
+    def text(claim, field) -> str:
+        value = claim[field]
+        if value is None:
+            return ''
+        if field == 'tests':
+            return '|'.join(value)
+        if hasattr(value, 'isoformat'):
+            return value.isoformat()
+        return str(value)
+
+
+@register
+class CSVClaimFormatter(ClaimFormatter):
+    name = 'csv'
+    extension = 'csv'
+
+    def _line(self, values) -> str:
+        out = io.StringIO()
+        csv.writer(out).writerow(values)
+        return out.getvalue()
+
+    def begin(self, provider_code):
+        return self._line(CLAIM_FIELDS)
+
+    def claim(self, claim):
+        return self._line([self.text(claim, f) for f in CLAIM_FIELDS])
+
+
+@register
+class FixedWidthClaimFormatter(ClaimFormatter):
+    """
+    H / D / T records, CRLF, ASCII only. Amounts are kobo, zero-padded
+    right-aligned; dates YYYYMMDD; text left-aligned and cut to width.
+    """
+    name = 'fixed'
+    extension = 'txt'
+
+    LAYOUT = (
+        ('claim_id', 20, 'A'), ('service_date', 8, 'D'), ('patient_id', 12, 'A'),
+        ('patient_name', 40, 'A'), ('date_of_birth', 8, 'D'), ('gender', 1, 'A'),
+        ('policy_number', 25, 'A'), ('pre_authorization_code', 25, 'A'), ('employee_id', 20, 'A'),
+        ('billing_type', 10, 'A'), ('invoice_number', 30, 'A'), ('tests', 60, 'A'),
+        ('total_amount', 14, 'N'), ('patient_portion', 14, 'N'), ('claim_amount', 14, 'N'),
+    )
+
+    @staticmethod
+    def _field(value, width, kind) -> str:
+        if kind == 'N':
+            return str(int((value or 0) * 100)).rjust(width, '0')[-width:]
+        if kind == 'D':
+            return value.strftime('%Y%m%d') if value else ' ' * width
+        ascii_text = unicodedata.normalize('NFKD', value).encode('ascii', 'ignore').decode()
+        return ascii_text.upper()[:width].ljust(width)
+
+    def begin(self, provider_code):
+        return 'H' + self._field(provider_code, 20, 'A') + timezone.localdate().strftime('%Y%m%d') + '\r\n'
+
+    def claim(self, claim):
+        return 'D' + ''.join(
+            self._field(self.text(claim, f) if kind == 'A' else claim[f], width, kind)
+            for f, width, kind in self.LAYOUT
+        ) + '\r\n'
+
+    def end(self, provider_code, count, total):
+        return 'T' + str(count).rjust(9, '0') + self._field(total, 16, 'N') + '\r\n'
+
+
+@register
+class XMLClaimFormatter(ClaimFormatter):
+    name = 'xml'
+    extension = 'xml'
+
+    def begin(self, provider_code):
+        return (
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            f'<ClaimBatch provider={quoteattr(provider_code)} generated="{timezone.localdate().isoformat()}">\n'
+        )
+
+    def claim(self, claim):
+        parts = [f'  <Claim id={quoteattr(self.text(claim, "claim_id"))}>']
+        for field in CLAIM_FIELDS[1:]:
+            if field == 'tests':
+                parts.append('    <Tests>' + ''.join(
+                    f'<Test code={quoteattr(code)}/>' for code in claim['tests']
+                ) + '</Tests>')
+            else:
+                parts.append(f'    <{field}>{escape(self.text(claim, field))}</{field}>')
+        parts.append('  </Claim>\n')
+        return '\n'.join(parts)
+
+    def end(self, provider_code, count, total):
+        return f'  <Summary count="{count}" total="{total}"/>\n</ClaimBatch>\n'
+
+
+@register
+class JSONClaimFormatter(ClaimFormatter):
+    name = 'json'
+    extension = 'json'
+
+    def begin(self, provider_code):
+        self.first = True
+        return '{"provider": %s, "claims": [\n' % json.dumps(provider_code)
+
+    def claim(self, claim):
+        data = {f: (claim['tests'] if f == 'tests' else self.text(claim, f)) for f in CLAIM_FIELDS}
+        sep, self.first = ('' if self.first else ',\n'), False
+        return sep + json.dumps(data, ensure_ascii=False)
+
+    def end(self, provider_code, count, total):
+        return '\n], "count": %d, "total": "%s"}\n' % (count, total)
+
+
+# ── Package ──────────────────────────────────────────────────────────────────
+
+def stream_claims_zip(billings, fmt: str = 'csv', batch: str = '', flush_every: int = 500) -> Iterator[bytes]:
+    """
+    Zip with one claim file per provider, rejected.csv and manifest.json.
+    ``batch`` goes into the file names (defaults to today's date).
+    """
+    formatter = FORMATTERS[fmt]()
+    batch = batch or timezone.localdate().strftime('%Y%m%d')
+    manifest = {'format': fmt, 'batch': batch, 'files': [], 'rejected': 0}
+
+    rejected = tempfile.SpooledTemporaryFile(max_size=REJECTED_SPOOL_SIZE, mode='w+', newline='')
+    rejected_writer = csv.writer(rejected)
+    rejected_writer.writerow(('provider', 'claim_id', 'problems'))
+
+    buffer = _Buffer()
+    with rejected, zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as package:
+        current, member, count, total = None, None, 0, Decimal('0.00')
+
+        def close():
+            member.write(formatter.end(current, count, total).encode())
+            member.close()
+            manifest['files'].append({
+                'name': f"{current}-{batch}.{formatter.extension}",
+                'provider': current, 'claims': count, 'total': str(total),
+            })
+
+        for n, claim in enumerate(iter_claims(billings), 1):
+            problems = validate(claim)
+            if problems:
+                rejected_writer.writerow((claim['provider_code'], claim['claim_id'], '; '.join(problems)))
+                manifest['rejected'] += 1
+                continue
+            if claim['provider_code'] != current:
+                if member is not None:
+                    close()
+                current, count, total = claim['provider_code'], 0, Decimal('0.00')
+                member = package.open(f"{current}-{batch}.{formatter.extension}", 'w')
+                member.write(formatter.begin(current).encode())
+            member.write(formatter.claim(claim).encode())
+            count += 1
+            total += claim['claim_amount']
+            if n % flush_every == 0:
+                yield buffer.take()
+        if member is not None:
+            close()
+
+        rejected.seek(0)
+        with package.open('rejected.csv', 'w') as member:
+            for block in iter(lambda: rejected.read(64 * 1024), ''):
+                member.write(block.encode())
+        yield buffer.take()
+
+        package.writestr('manifest.json', json.dumps(manifest, indent=2))
+    yield buffer.take()
+
+
+def write_claims_zip(billings, out, fmt: str = 'csv', batch: str = '') -> None:
+    for chunk in stream_claims_zip(billings, fmt, batch):
+        out.write(chunk)
+
+
+def claims_response(billings, fmt: str = 'csv', name: str = 'claims') -> StreamingHttpResponse:
+    fmt = fmt if fmt in FORMATTERS else 'csv'
+    response = StreamingHttpResponse(stream_claims_zip(billings, fmt), content_type='application/zip')
+    response['Content-Disposition'] = f'attachment; filename="{name}-{fmt}.zip"'
+    return response
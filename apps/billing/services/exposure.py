@@ -0,0 +1,122 @@
+"""
+billing/services/exposure.py
+
+Running payer exposure on InsuranceProvider.
+
+    exposure_owed      Σ insurance_portion        of open records
+    exposure_paid      Σ insurance_amount_paid    of open records
+    exposure_invoiced  Σ portion − paid           of open records on a live invoice
+    exposure_overdue   Σ portion − paid           of open records on an OVERDUE invoice
+
+Open = BillingInformation.OUTSTANDING_STATUSES; a live invoice is any
+invoice that is not CANCELLED. Outstanding balance is owed − paid, so
+credit-limit checks read two columns instead of running a SUM over the
+provider's billing history.
+
+Owed and paid move with the same per-record deltas as BillingDailyRollup
+(services/rollup.py → add()), one F() UPDATE per affected provider.
+Invoiced and overdue depend on the invoice, not the record's status (a
+partly paid record is PARTIAL but still on its invoice; invoices go
+OVERDUE without touching their records), so refresh_invoiced() re-sums
+them for a provider whenever its invoiced records or invoices change.
+refresh() re-sums a provider when a record was saved without a snapshot
+to take a delta from (billing/signals.py). reconcile() recomputes
+everything from source for the nightly command.
+"""
+
+import logging
+from decimal import Decimal
+from typing import Dict, List
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, Exists, F, OuterRef, Sum, When
+from django.utils import timezone
+
+from ..models import D, BillingInformation, InsuranceProvider, Invoice
+
+logger = logging.getLogger(__name__)
+
+EXPOSURE_FIELDS = ('exposure_owed', 'exposure_paid', 'exposure_invoiced', 'exposure_overdue')
+
+
+def add(deltas: Dict) -> None:
+    """``deltas`` = {provider_id: {exposure field: Decimal}}; zero entries are skipped."""
+    for provider_id in sorted(deltas, key=str):
+        updates = {f: F(f) + d for f, d in deltas[provider_id].items() if d}
+        if updates:
+            InsuranceProvider.objects.filter(pk=provider_id).update(**updates)
+
+
+def _source(billings):
+    money = DecimalField(max_digits=16, decimal_places=2)
+    unpaid = F('insurance_portion') - F('insurance_amount_paid')
+    invoices = Invoice.objects.filter(billing_records=OuterRef('pk'))
+    return billings.filter(
+        insurance_provider__isnull=False,
+        payment_status__in=BillingInformation.OUTSTANDING_STATUSES,
+    ).annotate(
+        on_invoice=Exists(invoices.exclude(status='CANCELLED')),
+        on_overdue=Exists(invoices.filter(status='OVERDUE')),
+    ).values('insurance_provider_id').annotate(
+        owed=Sum('insurance_portion'),
+        paid=Sum('insurance_amount_paid'),
+        invoiced=Sum(Case(When(on_invoice=True, then=unpaid), default=0, output_field=money)),
+        overdue=Sum(Case(When(on_overdue=True, then=unpaid), default=0, output_field=money)),
+    ).order_by()
+
+
+def refresh(provider_ids, fields=EXPOSURE_FIELDS) -> None:
+    """Re-sum ``fields`` from source for these providers."""
+    provider_ids = sorted({pk for pk in provider_ids if pk}, key=str)
+    if not provider_ids:
+        return
+    actual = {
+        row['insurance_provider_id']: row
+        for row in _source(BillingInformation.objects.filter(insurance_provider_id__in=provider_ids))
+    }
+    for provider_id in provider_ids:
+        row = actual.get(provider_id, {})
+        InsuranceProvider.objects.filter(pk=provider_id).update(**{
+            field: D(row.get(field.removeprefix('exposure_')) or 0) for field in fields
+        })
+
+
+def refresh_invoiced(provider_ids) -> None:
+    """Re-sum exposure_invoiced / exposure_overdue for these providers."""
+    refresh(provider_ids, fields=('exposure_invoiced', 'exposure_overdue'))
+
+
+@transaction.atomic
+def reconcile(vendor=None) -> List[InsuranceProvider]:
+    """Recompute every provider's counters; returns the providers that had drifted."""
+    providers = InsuranceProvider.objects.select_for_update()
+    billings = BillingInformation.objects.all()
+    if vendor is not None:
+        providers = providers.filter(vendor=vendor)
+        billings = billings.filter(vendor=vendor)
+
+    actual = {
+        row['insurance_provider_id']: (
+            D(row['owed'] or 0), D(row['paid'] or 0), D(row['invoiced'] or 0), D(row['overdue'] or 0),
+        )
+        for row in _source(billings)
+    }
+
+    zero = (Decimal('0.00'),) * len(EXPOSURE_FIELDS)
+    now = timezone.now()
+    providers = list(providers)
+    drifted = []
+    for provider in providers:
+        values = actual.get(provider.pk, zero)
+        if tuple(D(getattr(provider, f)) for f in EXPOSURE_FIELDS) != values:
+            drifted.append(provider)
+        for field, value in zip(EXPOSURE_FIELDS, values):
+            setattr(provider, field, value)
+        provider.exposure_reconciled_at = now
+
+    InsuranceProvider.objects.bulk_update(
+        providers, EXPOSURE_FIELDS + ('exposure_reconciled_at',), batch_size=500,
+    )
+    if drifted:
+        logger.warning("Payer exposure drift corrected for %d provider(s)", len(drifted))
+    return drifted
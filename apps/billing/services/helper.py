@@ -93,16 +93,51 @@ def _generate_invoice_number(vendor, provider) -> str:
     return f"INV-{provider.code}-{year}-{seq:04d}"
 
 
+def _allocate_invoice_numbers(vendor, providers) -> dict:
+    """
+    Next invoice number for each provider in one locked query —
+    the batch counterpart of _generate_invoice_number.
+
+    Returns {provider.pk: "INV-{CODE}-{YEAR}-{SEQ:04d}"}.
+    Must be called inside a transaction.atomic() block.
+    """
+    year = timezone.now().year
+    last = {}
+    for number in (
+        Invoice.objects
+        .select_for_update()
+        .filter(vendor=vendor, invoice_number__startswith="INV-", invoice_number__contains=f"-{year}-")
+        .values_list('invoice_number', flat=True)
+    ):
+        prefix, _, seq = number.rpartition('-')
+        try:
+            last[prefix] = max(last.get(prefix, 0), int(seq))
+        except ValueError:
+            continue
+
+    return {
+        provider.pk: f"INV-{provider.code}-{year}-{last.get(f'INV-{provider.code}-{year}', 0) + 1:04d}"
+        for provider in providers
+    }
+
+
 def _auto_mark_overdue(vendor) -> int:
     """
     Mark SENT invoices past their due date as OVERDUE.
     Called on list load — a lightweight background-less alternative to Celery
     for small deployments. Returns count of invoices updated.
     """
-    updated = Invoice.objects.filter(
+    from .exposure import refresh_invoiced
+
+    due = Invoice.objects.filter(
         vendor=vendor,
         status='SENT',
         due_date__lt=timezone.now().date(),
-    ).update(status='OVERDUE')
+    )
+    provider_ids = set(due.values_list('insurance_provider_id', flat=True))
+    updated = due.update(status='OVERDUE')
+    if updated:
+        # The records keep their status; the payer's overdue exposure moves
+        refresh_invoiced(provider_ids)
     return updated
 
@@ -9,6 +9,8 @@ from django.core.mail import EmailMessage
 from django.template.loader import render_to_string
 from django.utils import timezone
 
+from apps.notification.transport import send_now
+
 from ..models import Invoice, InvoicePayment, D
 from .invoice_pdf_view import build_invoice_pdf, build_receipt_pdf
 
@@ -27,6 +29,10 @@ Both functions are deliberately separated from views so they can be:
   - Tested independently
   - Called from management commands for re-sends
 
+Both take an optional notification.transport.MailTransport so a batch
+(batch_invoicing.deliver) shares one SMTP session and the tenant's rate
+limit; without one, each send opens its own.
+
 """
 
 logger = logging.getLogger(__name__)
@@ -46,7 +52,7 @@ def _get_receipt_pdf_builder():
 # Send Invoice Email
 # ─────────────────────────
 
-def send_invoice_email(invoice: Invoice) -> bool:
+def send_invoice_email(invoice: Invoice, transport=None) -> bool:
     """
     Email an invoice PDF to the insurance provider.
 
@@ -117,7 +123,7 @@ def send_invoice_email(invoice: Invoice) -> bool:
         )
         email_alt.attach_alternative(html_body, 'text/html')
         email_alt.attach(filename, pdf_bytes, 'application/pdf')
-        email_alt.send(fail_silently=False)
+        send_now(email_alt, vendor=invoice.vendor_id, transport=transport)
 
         logger.info(
             "Invoice %s emailed to %s successfully.",
@@ -138,7 +144,7 @@ def send_invoice_email(invoice: Invoice) -> bool:
 # Send Payment Receipt Email
 # ────────────────────────────────
 
-def send_receipt_email(payment: InvoicePayment) -> bool:
+def send_receipt_email(payment: InvoicePayment, transport=None) -> bool:
     """
     Email a payment receipt PDF to the insurance provider.
 
@@ -195,7 +201,7 @@ def send_receipt_email(payment: InvoicePayment) -> bool:
         )
         email.attach_alternative(html_body, 'text/html')
         email.attach(filename, pdf_bytes, 'application/pdf')
-        email.send(fail_silently=False)
+        send_now(email, vendor=invoice.vendor_id, transport=transport)
 
         logger.info(
             "Receipt for payment %s on invoice %s emailed to %s.",
@@ -0,0 +1,95 @@
+"""
+billing/services/invoice_payments.py
+
+Propagation of payer (InvoicePayment) money onto the invoice's billing records.
+
+    propagate_invoice_payment(invoice)     → recompute invoice.amount_paid/status
+                                             and every record's insurance_amount_paid
+    propagate_invoice_payment_by_id(pk)    → same, for a background worker
+
+The whole invoice is settled from the payment ledger each time (one SUM),
+allocated across records in memory in proportion to insurance_portion — the
+rounding remainder goes to the largest portion so the parts add up to the
+kobo — and written with one bulk_update. Running it twice changes nothing,
+so it can be retried or moved off the request path safely.
+"""
+
+import logging
+
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from ..models import D, BillingInformation, Invoice, allocate
+from .rollup import apply_transitions
+
+logger = logging.getLogger(__name__)
+
+PROPAGATE_BATCH_SIZE = 500
+
+
+def _record_status(record, insurance_paid) -> str:
+    total = D(record.total_amount)
+    paid = D(record.patient_amount_paid or 0) + insurance_paid
+    if total > 0 and paid >= total:
+        return 'PAID'
+    if paid > 0:
+        return 'PARTIAL'
+    return 'INVOICED'
+
+
+@transaction.atomic
+def propagate_invoice_payment(invoice) -> int:
+    """Returns the number of billing records whose payment figures changed."""
+    # Serialise concurrent payments on the same invoice
+    list(Invoice.objects.select_for_update().filter(pk=invoice.pk).values_list('pk', flat=True))
+
+    total_paid = D(invoice.payments.aggregate(total=Sum('amount'))['total'] or 0)
+    invoice.amount_paid = total_paid
+    if total_paid >= D(invoice.total_amount) and invoice.total_amount > 0:
+        invoice.status = 'PAID'
+    elif total_paid > 0:
+        invoice.status = 'PARTIAL'
+    invoice.save(update_fields=['amount_paid', 'status', 'updated_at'])
+
+    if D(invoice.total_amount) <= 0:
+        return 0
+
+    records = list(
+        BillingInformation.objects.select_for_update()
+        .filter(invoices=invoice)
+        .order_by('pk')
+    )
+    if not records:
+        return 0
+
+    shares = allocate(total_paid, [r.insurance_portion for r in records])
+
+    now = timezone.now()
+    changed, transitions = [], []
+    for record, paid in zip(records, shares):
+        status = _record_status(record, paid)
+        if D(record.insurance_amount_paid) == paid and record.payment_status == status:
+            continue
+        old = record._rollup_state()
+        record.insurance_amount_paid = paid
+        record.payment_status = status
+        record.updated_at = now
+        transitions.append((old, record._rollup_state()))
+        changed.append(record)
+
+    BillingInformation.objects.bulk_update(
+        changed, ['insurance_amount_paid', 'payment_status', 'updated_at'],
+        batch_size=PROPAGATE_BATCH_SIZE,
+    )
+    apply_transitions(transitions)
+
+    logger.info(
+        "Invoice %s: ₦%s spread over %d records (%d changed)",
+        invoice.invoice_number, total_paid, len(records), len(changed),
+    )
+    return len(changed)
+
+
+def propagate_invoice_payment_by_id(invoice_id) -> int:
+    return propagate_invoice_payment(Invoice.objects.get(pk=invoice_id))
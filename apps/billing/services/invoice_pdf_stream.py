@@ -0,0 +1,267 @@
+"""
+billing/services/invoice_pdf_stream.py
+
+Page-at-a-time PDF for invoices with many billing records.
+
+    invoice_rows(invoice)             → record tuples from a DB cursor
+    write_invoice_pdf(invoice, out)   → write the PDF to a file-like object
+    PagedTablePDF                     → the underlying writer (also for claims)
+
+build_invoice_pdf (invoice_pdf_view.py) lays out a Platypus story: every row
+becomes six Paragraph flowables and the whole table is measured before the
+first page is drawn, so time and memory grow with the line count. Here rows
+are read with values_list().iterator(), drawn straight onto the ReportLab
+canvas at a fixed row height, and each page is compressed and released on
+showPage(). Only the compressed page streams are held until save(), a few
+KB per page, independent of how the rows were produced.
+
+The look follows invoice_pdf_view.py (same palette, fonts and NGN
+formatting). `manage.py benchmark_invoice_pdf` prints time and peak memory
+per line count.
+"""
+
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import mm
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.pdfgen import canvas
+
+from django.utils import timezone
+
+from .invoice_pdf_view import BLUE, BORDER, DARK, LIGHT_GREY, MUTED, SUCCESS, WHITE, _ngn
+
+STREAM_CHUNK_SIZE = 2000
+# build_invoice_pdf hands over to this writer above this many records
+STREAM_THRESHOLD = 300
+
+MARGIN = 20 * mm
+ROW_HEIGHT = 14
+FOOTER_HEIGHT = 12 * mm
+
+
+class PagedTablePDF:
+    """
+    A titled document with a long table, drawn one row at a time.
+
+        pdf = PagedTablePDF(out, vendor_name, 'INVOICE', 'INV-AVON-2026-0001', columns)
+        pdf.start(meta=[...], left=[...], right=(label, amount))
+        for row in rows: pdf.add_row(row)
+        pdf.finish(totals=[...], notes='')
+
+    ``columns`` = [(heading, width fraction, 'L' | 'R'), ...]
+    """
+
+    def __init__(self, out, vendor_name: str, title: str, reference: str, columns):
+        self.canvas = canvas.Canvas(out, pagesize=A4, pageCompression=1)
+        self.canvas.setTitle(f"{title.title()} {reference}")
+        self.width, self.height = A4
+        self.inner = self.width - 2 * MARGIN
+        self.vendor_name, self.title, self.reference = vendor_name, title, reference
+        self.columns = [(heading, self.inner * frac, align) for heading, frac, align in columns]
+        self.page = 0
+        self.rows = 0
+        self.generated = timezone.now().strftime('%d %b %Y %H:%M')
+
+    # ── Page furniture ───────────────────────────────────────────────────────
+
+    def _new_page(self, first=False):
+        c = self.canvas
+        if self.page:
+            self._footer()
+            c.showPage()
+        self.page += 1
+        self.y = self.height - MARGIN
+
+        c.setFillColor(DARK)
+        c.setFont('Helvetica-Bold', 18 if first else 11)
+        c.drawString(MARGIN, self.y - 16, self.vendor_name[:60])
+        c.drawRightString(self.width - MARGIN, self.y - 16, self.title)
+        c.setFont('Courier', 9)
+        c.drawRightString(self.width - MARGIN, self.y - 28, self.reference)
+        self.y -= 34
+        c.setStrokeColor(BLUE)
+        c.setLineWidth(1.5)
+        c.line(MARGIN, self.y, self.width - MARGIN, self.y)
+        self.y -= 10
+
+    def _footer(self):
+        c = self.canvas
+        c.setFillColor(MUTED)
+        c.setFont('Helvetica', 7)
+        c.drawCentredString(
+            self.width / 2, MARGIN / 2,
+            f"Generated {self.generated} · {self.reference} · Page {self.page}",
+        )
+
+    def _table_header(self):
+        c = self.canvas
+        c.setFillColor(DARK)
+        c.rect(MARGIN, self.y - ROW_HEIGHT, self.inner, ROW_HEIGHT, stroke=0, fill=1)
+        c.setFillColor(WHITE)
+        c.setFont('Helvetica-Bold', 7)
+        self._cells([heading for heading, _, _ in self.columns], 'Helvetica-Bold', 7)
+        self.y -= ROW_HEIGHT
+
+    def _cells(self, values, font, size):
+        c = self.canvas
+        x = MARGIN
+        baseline = self.y - ROW_HEIGHT + 4
+        for value, (_, width, align) in zip(values, self.columns):
+            text = self._fit(str(value), font, size, width - 8)
+            if align == 'R':
+                c.drawRightString(x + width - 4, baseline, text)
+            else:
+                c.drawString(x + 4, baseline, text)
+            x += width
+
+    @staticmethod
+    def _fit(text, font, size, width):
+        if stringWidth(text, font, size) <= width:
+            return text
+        while text and stringWidth(text + '…', font, size) > width:
+            text = text[:-1]
+        return text + '…'
+
+    def _room(self, height) -> bool:
+        return self.y - height >= MARGIN + FOOTER_HEIGHT
+
+    # ── Public API ───────────────────────────────────────────────────────────
+
+    def start(self, meta, left, right):
+        """
+        First page: ``meta`` = [(label, value)] strip, ``left`` = lines of the
+        addressee block (first is bold), ``right`` = (label, amount) headline.
+        """
+        c = self.canvas
+        self._new_page(first=True)
+
+        band = 30
+        c.setFillColor(LIGHT_GREY)
+        c.setStrokeColor(BORDER)
+        c.setLineWidth(0.5)
+        c.rect(MARGIN, self.y - band, self.inner, band, stroke=1, fill=1)
+        cell = self.inner / len(meta)
+        for i, (label, value) in enumerate(meta):
+            x = MARGIN + i * cell + 8
+            c.setFillColor(MUTED)
+            c.setFont('Helvetica-Bold', 7)
+            c.drawString(x, self.y - 11, label.upper())
+            c.setFillColor(DARK)
+            c.setFont('Helvetica', 9)
+            c.drawString(x, self.y - 23, self._fit(value, 'Helvetica', 9, cell - 12))
+        self.y -= band + 18
+
+        top = self.y
+        for i, line in enumerate(left):
+            c.setFillColor(MUTED if i == 0 else DARK)
+            c.setFont('Helvetica-Bold' if i < 2 else 'Helvetica', 7 if i == 0 else 9)
+            c.drawString(MARGIN, self.y, self._fit(line, 'Helvetica', 9, self.inner / 2))
+            self.y -= 12
+        label, amount = right
+        c.setFillColor(MUTED)
+        c.setFont('Helvetica-Bold', 7)
+        c.drawRightString(self.width - MARGIN, top, label.upper())
+        c.setFillColor(SUCCESS)
+        c.setFont('Helvetica-Bold', 14)
+        c.drawRightString(self.width - MARGIN, top - 18, amount)
+
+        self.y = min(self.y, top - 30) - 10
+        self._table_header()
+
+    def add_row(self, values):
+        if not self._room(ROW_HEIGHT):
+            self._new_page()
+            self._table_header()
+        c = self.canvas
+        if self.rows % 2:
+            c.setFillColor(LIGHT_GREY)
+            c.rect(MARGIN, self.y - ROW_HEIGHT, self.inner, ROW_HEIGHT, stroke=0, fill=1)
+        c.setFillColor(DARK)
+        c.setFont('Helvetica', 8)
+        self._cells(values, 'Helvetica', 8)
+        self.rows += 1
+        self.y -= ROW_HEIGHT
+
+    def finish(self, totals, notes: str = ''):
+        """``totals`` = [(label, amount, bold)], drawn right-aligned under the table."""
+        c = self.canvas
+        needed = 16 * len(totals) + 20 + (30 if notes else 0)
+        if not self._room(needed):
+            self._new_page()
+        self.y -= 14
+        for label, amount, bold in totals:
+            c.setFillColor(DARK)
+            c.setFont('Helvetica-Bold' if bold else 'Helvetica', 9)
+            c.drawRightString(self.width - MARGIN - self.inner * 0.3, self.y, label)
+            c.drawRightString(self.width - MARGIN, self.y, amount)
+            self.y -= 16
+        if notes:
+            self.y -= 6
+            c.setFillColor(MUTED)
+            c.setFont('Helvetica-Bold', 7)
+            c.drawString(MARGIN, self.y, 'NOTES')
+            c.setFillColor(DARK)
+            c.setFont('Helvetica', 9)
+            c.drawString(MARGIN, self.y - 12, self._fit(notes.replace('\n', ' '), 'Helvetica', 9, self.inner))
+        self._footer()
+        c.save()
+
+
+# ── Invoices ─────────────────────────────────────────────────────────────────
+
+INVOICE_COLUMNS = [
+    ('Request',    0.14, 'L'),
+    ('Patient',    0.26, 'L'),
+    ('Date',       0.12, 'L'),
+    ('Contract',   0.16, 'R'),
+    ('Pt Portion', 0.16, 'R'),
+    ('Insurance',  0.16, 'R'),
+]
+
+
+def invoice_rows(invoice, chunk_size: int = STREAM_CHUNK_SIZE):
+    records = invoice.billing_records.order_by('created_at').values_list(
+        'request__request_id', 'request__patient__first_name', 'request__patient__last_name',
+        'created_at', 'total_amount', 'patient_portion', 'insurance_portion',
+    ).iterator(chunk_size=chunk_size)
+    for request_id, first, last, created, total, patient, insurance in records:
+        yield (
+            request_id, f"{first} {last}", created.strftime('%d %b %Y'),
+            _ngn(total), _ngn(patient), _ngn(insurance),
+        )
+
+
+def write_invoice_pdf(invoice, out, rows=None) -> int:
+    """
+    Write the invoice PDF to ``out`` (file, BytesIO, HttpResponse, …).
+    ``rows`` defaults to invoice_rows(invoice). Returns the number of pages.
+    """
+    provider = invoice.insurance_provider
+    pdf = PagedTablePDF(
+        out, getattr(invoice.vendor, 'name', 'Laboratory'), 'INVOICE', invoice.invoice_number, INVOICE_COLUMNS,
+    )
+    bill_to = ['BILL TO', provider.name if provider else '—']
+    if provider:
+        bill_to += [line for line in (provider.address, provider.contact_person, provider.email) if line]
+
+    pdf.start(
+        meta=[
+            ('Invoice Date', invoice.invoice_date.strftime('%d %b %Y')),
+            ('Due Date', invoice.due_date.strftime('%d %b %Y')),
+            ('Period', f"{invoice.period_start.strftime('%d %b')} – {invoice.period_end.strftime('%d %b %Y')}"),
+            ('Status', invoice.get_status_display()),
+            ('Payment Terms', f"{provider.payment_terms_days} days" if provider else '—'),
+        ],
+        left=bill_to,
+        right=('Amount due', _ngn(invoice.total_amount)),
+    )
+    for row in (invoice_rows(invoice) if rows is None else rows):
+        pdf.add_row(row)
+    pdf.finish(
+        totals=[
+            ('Insurance Payable:', _ngn(invoice.total_amount), True),
+            ('Amount Received:', _ngn(invoice.amount_paid), False),
+            ('Balance Due:', _ngn(invoice.balance_due()), True),
+        ],
+        notes=invoice.notes,
+    )
+    return pdf.page
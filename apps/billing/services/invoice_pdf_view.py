@@ -16,7 +16,8 @@ from reportlab.platypus import (
 """
 
 PDF builders for:
-  - build_invoice_pdf(invoice)   → Invoice PDF (existing, unchanged)
+  - build_invoice_pdf(invoice)   → Invoice PDF (large invoices go through
+                                   invoice_pdf_stream.write_invoice_pdf)
   - build_receipt_pdf(payment)   → Payment Receipt PDF (new)
 
 Both return raw bytes and are called by:
@@ -158,7 +159,13 @@ def _two_col(W, S, left_paras, right_paras) -> Table:
 
 def build_invoice_pdf(invoice) -> bytes:
     """Return PDF bytes for an Invoice."""
+    from .invoice_pdf_stream import STREAM_THRESHOLD, write_invoice_pdf
+
     buf = io.BytesIO()
+    if invoice.billing_records.count() > STREAM_THRESHOLD:
+        write_invoice_pdf(invoice, buf)
+        return buf.getvalue()
+
     W   = PAGE_WIDTH - 40 * mm
     S   = _styles()
     vendor   = invoice.vendor
@@ -0,0 +1,264 @@
+"""
+billing/services/paystack_inbox.py
+
+Paystack webhook inbox.
+
+    record_webhook(body, signature)   → verify and store a charge.success event (webhook view)
+    record_verified(result, billing)  → store an event from verify_payment()
+    process_pending(batch_size)       → PENDING events → Payments (worker)
+    replay(references=None, …)        → re-verify stuck/failed references through
+                                        PaystackAPI.verify_payment, then process
+
+The webhook view only checks x-paystack-signature (HMAC-SHA512 of the raw
+body with the vendor's secret key), inserts a row and returns 200, so
+Paystack is never kept waiting on billing work. Unsigned or forged bodies
+never reach the inbox. PaystackWebhookEvent.reference is unique:
+retries and the browser callback collapse onto one row, and a reference
+that already has a Payment is linked instead of paid twice.
+"""
+
+import hashlib
+import hmac
+import json
+import logging
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+from typing import Dict, Iterable, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from ..models import BillingInformation, Payment, PaystackWebhookEvent
+
+logger = logging.getLogger(__name__)
+
+CHARGE_SUCCESS = 'charge.success'
+BATCH_SIZE = getattr(settings, 'PAYSTACK_WEBHOOK_BATCH_SIZE', 100)
+REPLAY_AFTER = timedelta(minutes=getattr(settings, 'PAYSTACK_WEBHOOK_REPLAY_AFTER_MINUTES', 10))
+
+CHANNEL_METHODS = {
+    'card': 'POS',
+    'bank': 'TRANSFER',
+    'bank_transfer': 'TRANSFER',
+    'ussd': 'MOBILE',
+    'mobile_money': 'MOBILE',
+}
+
+
+class InvalidSignature(ValueError):
+    """x-paystack-signature does not match the body."""
+
+
+def _store(reference: str, payload: Dict) -> PaystackWebhookEvent:
+    event, _ = PaystackWebhookEvent.objects.get_or_create(
+        reference=reference,
+        defaults={'event': payload.get('event', CHARGE_SUCCESS), 'payload': payload},
+    )
+    return event
+
+
+def _secret_key(payload: Dict) -> str:
+    """The billing vendor's Paystack secret key, else the global one."""
+    billing_id = _billing_id(payload)
+    billing = BillingInformation.objects.select_related('vendor').filter(pk=billing_id).first() if billing_id else None
+    profile = getattr(billing.vendor, 'profile', None) if billing else None
+    return getattr(profile, 'paystack_secret_key', '') or getattr(settings, 'PAYSTACK_SECRET_KEY', '')
+
+
+def signature_valid(body: bytes, signature: str, secret_key: str) -> bool:
+    if not signature or not secret_key:
+        return False
+    expected = hmac.new(secret_key.encode('utf-8'), body, hashlib.sha512).hexdigest()
+    return hmac.compare_digest(expected, signature)
+
+
+def record_webhook(body: bytes, signature: str) -> Optional[PaystackWebhookEvent]:
+    """
+    Persist a signed webhook body. Returns None for events we do not act on.
+    Raises ValueError for a body that is not JSON, InvalidSignature when
+    ``signature`` does not match it.
+    """
+    payload = json.loads(body)
+    data = payload.get('data') or {}
+    reference = data.get('reference')
+    if payload.get('event') != CHARGE_SUCCESS or not reference:
+        return None
+    if not signature_valid(body, signature, _secret_key(payload)):
+        raise InvalidSignature(f"Bad signature for {reference}")
+    return _store(reference, payload)
+
+
+def record_verified(result: Dict, billing=None, collected_by=None) -> Optional[PaystackWebhookEvent]:
+    """
+    Store (or refresh) an event from a successful PaystackAPI.verify_payment
+    result. ``billing`` fills in metadata.billing_id when Paystack has none;
+    ``collected_by`` (the staff user on the callback) is kept on the Payment.
+    """
+    if not result.get('success') or result.get('status') != 'success':
+        return None
+    metadata = dict(result.get('metadata') or {})
+    if billing is not None:
+        metadata.setdefault('billing_id', str(billing.pk))
+    payload = {
+        'event': CHARGE_SUCCESS,
+        'data': {
+            'reference': result['reference'],
+            'amount': int(Decimal(result['amount']) * 100),
+            'channel': result.get('channel'),
+            'metadata': metadata,
+        },
+    }
+    if collected_by is not None:
+        payload['collected_by_id'] = str(collected_by.pk)
+    event = _store(result['reference'], payload)
+    if event.status != 'PROCESSED' and event.payload != payload:
+        # Verified figures are authoritative over whatever the webhook said
+        event.payload = payload
+        event.save(update_fields=['payload'])
+    return event
+
+
+def _billing_id(payload: Dict):
+    metadata = (payload.get('data') or {}).get('metadata') or {}
+    try:
+        return uuid.UUID(str(metadata.get('billing_id')))
+    except (TypeError, ValueError):
+        return None
+
+
+def _apply(event, billings, paid_refs, now) -> None:
+    event.attempts += 1
+    data = event.payload.get('data') or {}
+    billing = billings.get(_billing_id(event.payload))
+
+    if billing is None:
+        event.status, event.last_error = 'IGNORED', "No billing record for metadata.billing_id"
+        return
+    event.billing = billing
+
+    if event.reference in paid_refs:
+        event.payment_id = paid_refs[event.reference]
+        event.status, event.processed_at = 'PROCESSED', now
+        return
+
+    try:
+        with transaction.atomic():
+            payment = Payment.objects.create(
+                billing=billing,
+                amount=Decimal(data['amount']) / 100,  # kobo → naira
+                payment_method=CHANNEL_METHODS.get(data.get('channel'), 'TRANSFER'),
+                transaction_reference=event.reference,
+                payment_date=now,
+                collected_by_id=event.payload.get('collected_by_id'),
+                notes=f"Paystack payment - Channel: {data.get('channel')}",
+            )
+    except Exception as exc:
+        logger.exception("Paystack event %s failed", event.reference)
+        event.status, event.last_error = 'FAILED', str(exc)
+        return
+
+    event.payment = payment
+    event.status, event.last_error, event.processed_at = 'PROCESSED', '', now
+
+
+def process_pending(batch_size: int = BATCH_SIZE, references: Iterable[str] = None) -> int:
+    """Apply one batch of PENDING events; returns how many were handled."""
+    with transaction.atomic():
+        events = PaystackWebhookEvent.objects.select_for_update(skip_locked=True).filter(status='PENDING')
+        if references is not None:
+            events = events.filter(reference__in=list(references))
+        events = list(events.order_by('received_at')[:batch_size])
+        if not events:
+            return 0
+
+        ids = {_billing_id(e.payload) for e in events} - {None}
+        billings = BillingInformation.objects.in_bulk(ids)
+        paid_refs = dict(
+            Payment.objects.filter(
+                transaction_reference__in=[e.reference for e in events]
+            ).values_list('transaction_reference', 'id')
+        )
+
+        now = timezone.now()
+        for event in events:
+            _apply(event, billings, paid_refs, now)
+            if event.payment_id:
+                paid_refs[event.reference] = event.payment_id
+
+        PaystackWebhookEvent.objects.bulk_update(events, [
+            'status', 'attempts', 'last_error', 'billing', 'payment', 'processed_at',
+        ])
+
+    logger.info("Processed %d Paystack event(s)", len(events))
+    return len(events)
+
+
+def replay(references: Iterable[str] = None, vendor=None,
+           older_than: timedelta = REPLAY_AFTER, api_class=None) -> Dict[str, int]:
+    """
+    Verify references with Paystack and re-queue them.
+
+    Without ``references``: FAILED events, and PENDING ones older than
+    ``older_than`` (the worker should have taken them). With ``references``:
+    exactly those — references missing from the inbox are looked up with
+    ``vendor``'s keys, so charges whose webhook never arrived are recovered.
+    """
+    if api_class is None:
+        from ..paystack import PaystackAPI as api_class
+
+    if references:
+        references = list(references)
+        known = PaystackWebhookEvent.objects.filter(reference__in=references)
+    else:
+        cutoff = timezone.now() - older_than
+        known = PaystackWebhookEvent.objects.filter(status='FAILED') | PaystackWebhookEvent.objects.filter(
+            status='PENDING', received_at__lt=cutoff,
+        )
+        references = list(known.values_list('reference', flat=True))
+
+    events = {e.reference: e for e in known.exclude(status='PROCESSED')}
+    unknown = set(references) - set(known.values_list('reference', flat=True))
+    billings = BillingInformation.objects.select_related('vendor').in_bulk(
+        {_billing_id(e.payload) for e in events.values()} - {None}
+    )
+
+    stats = {'verified': 0, 'ignored': 0, 'errors': 0}
+    for reference in references:
+        event = events.get(reference)
+        if event is None and reference not in unknown:
+            continue  # already processed
+
+        billing = billings.get(_billing_id(event.payload)) if event else None
+        owner = billing.vendor if billing else vendor
+        if owner is None:
+            stats['errors'] += 1
+            continue
+
+        result = api_class(owner).verify_payment(reference)
+        if result.get('success') and result.get('status') == 'success':
+            event = record_verified(result)
+            if event.status != 'PENDING':
+                event.status = 'PENDING'
+                event.save(update_fields=['status'])
+            stats['verified'] += 1
+        elif result.get('success'):
+            if event:
+                event.status, event.last_error = 'IGNORED', f"Paystack status: {result.get('status')}"
+                event.save(update_fields=['status', 'last_error'])
+            stats['ignored'] += 1
+        else:
+            if event:
+                event.last_error = result.get('error', 'Verification failed')
+                event.save(update_fields=['last_error'])
+            stats['errors'] += 1
+
+    processed = 0
+    while True:
+        done = process_pending(references=references)
+        processed += done
+        if done < BATCH_SIZE:
+            break
+    stats['processed'] = processed
+    return stats
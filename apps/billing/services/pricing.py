@@ -0,0 +1,80 @@
+"""
+billing/services/pricing.py
+
+Price resolution for lab tests against a PriceList.
+
+Every test used to be priced with its own TestPrice.objects.get(), and
+BillingInformation re-priced all of them on every save. A price list is now
+loaded once into a {test_id: price} matrix and kept in the Django cache:
+
+    price_matrix(price_list)        → {test_id: Decimal}   (one query on a miss)
+    price_many(tests, price_list)   → {test_id: Decimal}   (falls back to retail price)
+    price_for(test, price_list)     → Decimal
+
+Cache keys carry a per-price-list version token. Any TestPrice save/delete or
+PriceList edit bumps the token (see billing/signals.py), so stale matrices are
+never read — they simply age out.
+"""
+
+import uuid
+from decimal import Decimal
+from typing import Dict, Iterable
+
+from django.core.cache import cache
+
+from ..models import D, TestPrice
+
+MATRIX_KEY = "price_matrix:{pk}:{version}"
+VERSION_KEY = "price_matrix_version:{pk}"
+MATRIX_TIMEOUT = 60 * 60 * 24
+
+
+def _version(price_list_id) -> str:
+    key = VERSION_KEY.format(pk=price_list_id)
+    version = cache.get(key)
+    if version is None:
+        version = uuid.uuid4().hex
+        # add() keeps whichever token another process stored first
+        if not cache.add(key, version, None):
+            version = cache.get(key, version)
+    return version
+
+
+def invalidate_price_list(price_list_id) -> None:
+    """Start a new matrix version for this price list."""
+    if price_list_id:
+        cache.set(VERSION_KEY.format(pk=price_list_id), uuid.uuid4().hex, None)
+
+
+def price_matrix(price_list) -> Dict[int, Decimal]:
+    """All negotiated prices of ``price_list`` keyed by VendorTest id."""
+    if not price_list:
+        return {}
+
+    key = MATRIX_KEY.format(pk=price_list.pk, version=_version(price_list.pk))
+    matrix = cache.get(key)
+    if matrix is None:
+        matrix = {
+            test_id: D(price)
+            for test_id, price in TestPrice.objects.filter(
+                price_list_id=price_list.pk
+            ).values_list('test_id', 'price')
+        }
+        cache.set(key, matrix, MATRIX_TIMEOUT)
+    return matrix
+
+
+def price_many(tests: Iterable, price_list=None) -> Dict[int, Decimal]:
+    """
+    Resolve every test's price in one cached lookup.
+    Tests without a TestPrice row (or with no price list) use their retail price.
+    """
+    matrix = price_matrix(price_list)
+    return {
+        test.pk: matrix.get(test.pk, D(getattr(test, 'price', 0)))
+        for test in tests
+    }
+
+
+def price_for(test, price_list=None) -> Decimal:
+    return price_many([test], price_list)[test.pk]
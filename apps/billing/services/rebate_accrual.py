@@ -0,0 +1,174 @@
+"""
+billing/services/rebate_accrual.py
+
+Batch rebate accrual (run nightly via `manage.py accrue_rebates`).
+
+    pending_billings(vendor=None)  → cleared, referred billings with money
+                                     collected and no RebateRecord — one query
+    accrue_rebates(billings)       → RebateRecords for those billings
+    accrue_pending(vendor=None)    → both, in chunks
+    adjust_unpaid(referrer_id, …)  → keep running totals in step with
+                                     settlement status moves
+    reconcile_totals(vendor=None)  → recompute Referrer running totals
+
+Rebates are computed in memory with Referrer.calculate_rebate and written
+with bulk_create; the OneToOne on RebateRecord.billing plus ignore_conflicts
+makes re-runs harmless, and totals only count the rows that were inserted. Each referrer's rebate_earned_* / rebate_unpaid_*
+columns move with one F() UPDATE per batch, so statements and partner lists
+read totals instead of aggregating the ledger.
+"""
+
+import logging
+from collections import defaultdict
+from typing import Iterable, List
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from ..models import D, BillingInformation, RebateRecord, Referrer
+
+logger = logging.getLogger(__name__)
+
+ACCRUAL_BATCH_SIZE = 1000
+
+def pending_billings(vendor=None):
+    billings = BillingInformation.objects.cleared().filter(
+        referrer__isnull=False,
+        referrer__is_active=True,
+        referrer__rebate_value__gt=0,
+        rebate_record__isnull=True,
+    ).annotate(
+        basis=F('patient_amount_paid') + F('insurance_amount_paid'),
+    ).filter(basis__gt=0)
+    if vendor is not None:
+        billings = billings.filter(vendor=vendor)
+    return billings.only(
+        'id', 'vendor_id', 'referrer_id', 'billing_type', 'payment_status',
+        'patient_portion', 'patient_amount_paid', 'insurance_amount_paid',
+    ).order_by('created_at')
+
+
+@transaction.atomic
+def accrue_rebates(billings: Iterable) -> List[RebateRecord]:
+    billings = [b for b in billings if b.referrer_id]
+    if not billings:
+        return []
+
+    done = set(
+        RebateRecord.objects.filter(
+            billing_id__in=[b.pk for b in billings]
+        ).values_list('billing_id', flat=True)
+    )
+    referrers = Referrer.objects.in_bulk({b.referrer_id for b in billings})
+
+    now = timezone.now()
+    records = []
+    for billing in billings:
+        if billing.pk in done or not billing.is_payment_cleared:
+            continue
+        referrer = referrers.get(billing.referrer_id)
+        if referrer is None:
+            continue
+
+        basis = D(billing.patient_amount_paid or 0) + D(billing.insurance_amount_paid or 0)
+        amount = referrer.calculate_rebate(basis)
+        if amount <= 0:
+            continue
+
+        records.append(RebateRecord(
+            referrer=referrer,
+            billing_id=billing.pk,
+            payment_basis=basis,
+            rebate_amount=amount,
+            rebate_type=referrer.rebate_type,
+            rebate_value=referrer.rebate_value,
+            status='UNPAID',
+            earned_at=now,
+        ))
+
+    RebateRecord.objects.bulk_create(records, batch_size=500, ignore_conflicts=True)
+
+    # A concurrent run may have accrued some of these billings first: their
+    # rows were skipped, so only count the ids that were actually written.
+    inserted = set(
+        RebateRecord.objects.filter(pk__in=[r.pk for r in records]).values_list('pk', flat=True)
+    )
+    records = [r for r in records if r.pk in inserted]
+
+    totals = defaultdict(lambda: [D('0.00'), 0])
+    for record in records:
+        totals[record.referrer_id][0] += record.rebate_amount
+        totals[record.referrer_id][1] += 1
+
+    for referrer_id, (amount, count) in totals.items():
+        Referrer.objects.filter(pk=referrer_id).update(
+            rebate_earned_total=F('rebate_earned_total') + amount,
+            rebate_earned_count=F('rebate_earned_count') + count,
+            rebate_unpaid_total=F('rebate_unpaid_total') + amount,
+            rebate_unpaid_count=F('rebate_unpaid_count') + count,
+            rebates_accrued_at=now,
+        )
+    return records
+
+
+def accrue_pending(vendor=None, batch_size: int = ACCRUAL_BATCH_SIZE) -> int:
+    """Accrue every pending rebate; returns the number of RebateRecords created."""
+    created = 0
+    batch = []
+    for billing in pending_billings(vendor).iterator(chunk_size=batch_size):
+        batch.append(billing)
+        if len(batch) >= batch_size:
+            created += len(accrue_rebates(batch))
+            batch = []
+    if batch:
+        created += len(accrue_rebates(batch))
+    logger.info("Accrued %d rebate record(s)", created)
+    return created
+
+
+def adjust_unpaid(referrer_id, amount, count: int) -> None:
+    """Move records in (+) or out (−) of a referrer's unpaid pool."""
+    if count:
+        Referrer.objects.filter(pk=referrer_id).update(
+            rebate_unpaid_total=F('rebate_unpaid_total') + D(amount),
+            rebate_unpaid_count=F('rebate_unpaid_count') + count,
+        )
+
+
+@transaction.atomic
+def reconcile_totals(vendor=None) -> int:
+    """Recompute running totals from RebateRecord; returns referrers corrected."""
+    referrers = Referrer.objects.select_for_update()
+    if vendor is not None:
+        referrers = referrers.filter(vendor=vendor)
+
+    unpaid = Q(status='UNPAID')
+    actual = {
+        row['referrer_id']: row
+        for row in RebateRecord.objects.filter(referrer__in=referrers).values('referrer_id').annotate(
+            earned=Sum('rebate_amount'), earned_n=Count('id'),
+            unpaid=Sum('rebate_amount', filter=unpaid), unpaid_n=Count('id', filter=unpaid),
+        ).order_by()
+    }
+
+    changed = []
+    for referrer in referrers:
+        row = actual.get(referrer.pk, {})
+        values = (
+            D(row.get('earned') or 0), row.get('earned_n') or 0,
+            D(row.get('unpaid') or 0), row.get('unpaid_n') or 0,
+        )
+        current = (
+            D(referrer.rebate_earned_total), referrer.rebate_earned_count,
+            D(referrer.rebate_unpaid_total), referrer.rebate_unpaid_count,
+        )
+        if values != current:
+            (referrer.rebate_earned_total, referrer.rebate_earned_count,
+             referrer.rebate_unpaid_total, referrer.rebate_unpaid_count) = values
+            changed.append(referrer)
+
+    Referrer.objects.bulk_update(changed, [
+        'rebate_earned_total', 'rebate_earned_count', 'rebate_unpaid_total', 'rebate_unpaid_count',
+    ])
+    return len(changed)
@@ -0,0 +1,114 @@
+"""
+billing/services/repricing.py
+
+Bulk re-pricing of open bills after a price list changes.
+
+    open_billings(price_list)          → UNPAID / PARTIAL records on the list
+    reprice(price_list, dry_run=False) → diff report, one dict per changed record
+    stale_price_lists(vendor=None)     → lists edited since their last re-price
+
+PriceList edits and TestPrice saves/deletes bump PriceList.updated_at
+(see billing/signals.py); `manage.py reprice_billings` reprices every list
+whose updated_at is newer than repriced_at.
+
+Records and their line items are loaded in two queries. Line prices come
+from the cached price matrix, then each record runs the model's own
+_calculate_totals_internal (A → B → C, portions locked once the insurer has
+paid) and _allocate_to_lines in memory. Changed rows go back with
+bulk_update and move the rollup / payer exposure through apply_transitions.
+"""
+
+import logging
+from collections import defaultdict
+from typing import Dict, List
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from ..models import D, BillingInformation, BillingLineItem, PriceList
+from .pricing import price_matrix
+from .rollup import apply_transitions
+
+logger = logging.getLogger(__name__)
+
+OPEN_STATUSES = ('UNPAID', 'PARTIAL')
+TOTAL_FIELDS = ('subtotal', 'discount', 'tax', 'total_amount', 'patient_portion', 'insurance_portion')
+LINE_FIELDS = ('unit_price', 'discount_amount', 'tax_amount', 'line_total')
+REPRICE_BATCH_SIZE = 500
+
+
+def open_billings(price_list):
+    return BillingInformation.objects.filter(price_list=price_list, payment_status__in=OPEN_STATUSES)
+
+
+def stale_price_lists(vendor=None):
+    lists = PriceList.objects.filter(Q(repriced_at__isnull=True) | Q(repriced_at__lt=F('updated_at')))
+    if vendor is not None:
+        lists = lists.filter(vendor=vendor)
+    return lists
+
+
+def reprice(price_list, dry_run: bool = False) -> List[Dict]:
+    with transaction.atomic():
+        records = open_billings(price_list).select_related('insurance_provider').annotate(
+            request_code=F('request__request_id'),
+        ).order_by('created_at')
+        if not dry_run:
+            records = records.select_for_update(of=('self',))
+        records = list(records)
+
+        lines = defaultdict(list)
+        for line in BillingLineItem.objects.filter(
+            billing__in=[r.pk for r in records]
+        ).select_related('test').order_by('pk'):
+            lines[line.billing_id].append(line)
+
+        matrix = price_matrix(price_list)
+        now = timezone.now()
+        report, changed, changed_lines, transitions = [], [], [], []
+
+        for record in records:
+            before = tuple(D(getattr(record, f)) for f in TOTAL_FIELDS)
+            state = record._rollup_state()
+
+            record_lines = lines.get(record.pk, [])
+            for line in record_lines:
+                if line.test is not None:
+                    line.unit_price = matrix.get(line.test_id, D(line.test.price))
+            if record_lines:
+                record.subtotal = sum((line.unit_price for line in record_lines), D('0.00'))
+
+            record.price_list = price_list  # shared instance — no per-record lookup
+            record._calculate_totals_internal()
+
+            after = tuple(D(getattr(record, f)) for f in TOTAL_FIELDS)
+            if after == before:
+                continue
+
+            record._allocate_to_lines(record_lines)
+            record.updated_at = now
+            changed.append(record)
+            changed_lines.extend(record_lines)
+            transitions.append((state, record._rollup_state()))
+            report.append({
+                'billing_id': record.pk,
+                'request_id': record.request_code,
+                'locked': record.insurance_amount_paid > 0,
+                **{f'old_{f}': old for f, old in zip(TOTAL_FIELDS, before)},
+                **{f'new_{f}': new for f, new in zip(TOTAL_FIELDS, after)},
+            })
+
+        if not dry_run:
+            BillingInformation.objects.bulk_update(
+                changed, TOTAL_FIELDS + ('updated_at',), batch_size=REPRICE_BATCH_SIZE,
+            )
+            BillingLineItem.objects.bulk_update(changed_lines, LINE_FIELDS, batch_size=REPRICE_BATCH_SIZE)
+            apply_transitions(transitions)
+            PriceList.objects.filter(pk=price_list.pk).update(repriced_at=now)
+
+    logger.info(
+        "Price list %s: %d open record(s), %d repriced%s",
+        price_list.pk, len(records), len(report), " (dry run)" if dry_run else "",
+    )
+    return report
@@ -0,0 +1,280 @@
+"""
+billing/services/rollup.py
+
+BillingDailyRollup maintenance.
+
+Each BillingInformation contributes one row's worth of money to exactly one
+bucket (vendor, day, billing_type, payment_status, insurance_provider). When a
+record is saved, its old contribution (snapshotted in from_db) is subtracted
+from the old bucket and the new one added to the new bucket — two F() updates,
+no re-aggregation. Payment / InvoicePayment propagation and status changes all
+go through BillingInformation.save(), so they are covered by the same hook
+(billing/signals.py). The same deltas drive the payer exposure counters on
+InsuranceProvider (services/exposure.py).
+
+    apply_change(old_state, new_state)   → incremental delta (save / delete)
+    apply_transitions(pairs)             → merged deltas for bulk writes
+    refresh_days(vendor_id, days)        → recompute buckets from source rows
+    rebuild(vendor=None, since=None)     → full reconciliation (nightly command)
+"""
+
+import logging
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+from typing import Dict, Iterable, Optional, Tuple
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, DecimalField, F, Q, Sum, Value, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from ..models import D, BillingDailyRollup, BillingInformation
+from . import exposure
+
+logger = logging.getLogger(__name__)
+
+OUTSTANDING_STATUSES = BillingInformation.OUTSTANDING_STATUSES
+
+AMOUNT_FIELDS = (
+    'total_amount', 'patient_portion', 'insurance_portion',
+    'patient_paid', 'insurance_paid',
+    'patient_outstanding', 'insurance_outstanding',
+)
+METRIC_FIELDS = ('billing_count',) + AMOUNT_FIELDS
+
+BUCKET_FIELDS = ('vendor_id', 'day', 'billing_type', 'payment_status', 'insurance_provider_id')
+
+Bucket = Tuple
+Vector = Tuple
+
+
+def day_of(created_at) -> date:
+    if timezone.is_aware(created_at):
+        return timezone.localdate(created_at)
+    return created_at.date()
+
+
+def contribution(state) -> Optional[Tuple[Bucket, Vector]]:
+    """(bucket, metric vector) for a BillingInformation._rollup_state() tuple."""
+    if state is None:
+        return None
+    (created_at, vendor_id, billing_type, status, provider_id,
+     total, patient_portion, insurance_portion, patient_paid, insurance_paid) = state
+    if created_at is None:
+        return None
+
+    outstanding = status in OUTSTANDING_STATUSES
+    vector = (
+        1,
+        D(total), D(patient_portion), D(insurance_portion),
+        D(patient_paid), D(insurance_paid),
+        D(patient_portion) - D(patient_paid) if outstanding else D('0.00'),
+        D(insurance_portion) - D(insurance_paid) if outstanding else D('0.00'),
+    )
+    return (vendor_id, day_of(created_at), billing_type, status, provider_id), vector
+
+
+def diff(old_state, new_state) -> Dict[Bucket, list]:
+    """Per-bucket deltas that turn ``old_state``'s contribution into ``new_state``'s."""
+    deltas = defaultdict(lambda: [0] * len(METRIC_FIELDS))
+    for state, sign in ((old_state, -1), (new_state, 1)):
+        item = contribution(state)
+        if item is None:
+            continue
+        bucket, vector = item
+        for i, value in enumerate(vector):
+            deltas[bucket][i] += sign * value
+    return {bucket: delta for bucket, delta in deltas.items() if any(delta)}
+
+
+# Record statuses a record can have while it sits on an invoice
+INVOICE_STATUSES = ('INVOICED', 'PARTIAL', 'OVERDUE')
+
+
+def exposure_deltas(deltas: Dict[Bucket, list]) -> Dict:
+    """Owed / paid changes implied by bucket deltas (see services/exposure.py)."""
+    out = defaultdict(lambda: defaultdict(Decimal))
+    for (_, _, _, status, provider_id), delta in deltas.items():
+        if provider_id is None or status not in OUTSTANDING_STATUSES:
+            continue
+        metrics = dict(zip(METRIC_FIELDS, delta))
+        out[provider_id]['exposure_owed'] += metrics['insurance_portion']
+        out[provider_id]['exposure_paid'] += metrics['insurance_paid']
+    return out
+
+
+def invoiced_providers(deltas: Dict[Bucket, list]) -> set:
+    """
+    Providers whose invoiced records moved, so invoiced/overdue need a re-sum:
+    records going INVOICED, or changing / leaving a status they can hold on
+    an invoice. A record only entering PARTIAL (a first patient payment)
+    is not on an invoice yet and costs nothing extra.
+    """
+    return {
+        provider_id for (_, _, _, status, provider_id), delta in deltas.items()
+        if provider_id is not None and (
+            status == 'INVOICED' or (status in INVOICE_STATUSES and delta[0] <= 0)
+        )
+    }
+
+
+def apply_deltas(deltas: Dict[Bucket, list]) -> None:
+    """Add each delta to its bucket (creating it on first use) and to payer exposure."""
+    exposure.add(exposure_deltas(deltas))
+    exposure.refresh_invoiced(invoiced_providers(deltas))
+    for bucket, delta in deltas.items():
+        lookup = dict(zip(BUCKET_FIELDS, bucket))
+        updates = {f: F(f) + d for f, d in zip(METRIC_FIELDS, delta) if d}
+        if BillingDailyRollup.objects.filter(**lookup).update(**updates):
+            continue
+        if delta[0] < 0:
+            # Removing from a bucket that is not there (e.g. vendor being
+            # deleted, or rows never built) — the nightly rebuild settles it.
+            continue
+        try:
+            with transaction.atomic():
+                BillingDailyRollup.objects.create(**lookup, **dict(zip(METRIC_FIELDS, delta)))
+        except IntegrityError:
+            # Another transaction created the bucket first
+            BillingDailyRollup.objects.filter(**lookup).update(**updates)
+
+
+def apply_change(old_state, new_state) -> None:
+    apply_deltas(diff(old_state, new_state))
+
+
+def apply_transitions(transitions: Iterable[Tuple]) -> None:
+    """
+    Bulk counterpart of apply_change for (old_state, new_state) pairs written
+    with queryset.update()/bulk_update() (which bypass save()): deltas are
+    merged and written once per bucket.
+    """
+    merged = defaultdict(lambda: [0] * len(METRIC_FIELDS))
+    for old, new in transitions:
+        for bucket, delta in diff(old, new).items():
+            merged[bucket] = [a + b for a, b in zip(merged[bucket], delta)]
+    apply_deltas({b: d for b, d in merged.items() if any(d)})
+
+
+@transaction.atomic
+def update_status(billings, payment_status: str) -> int:
+    """queryset.update(payment_status=...) that keeps the rollup in step."""
+    records = list(billings.select_for_update())
+    if not records:
+        return 0
+    transitions = []
+    for record in records:
+        old = record._rollup_state()
+        record.payment_status = payment_status
+        transitions.append((old, record._rollup_state()))
+
+    count = BillingInformation.objects.filter(pk__in=[r.pk for r in records]).update(
+        payment_status=payment_status, updated_at=timezone.now(),
+    )
+    apply_transitions(transitions)
+    return count
+
+
+# ── Reconciliation ───────────────────────────────────────────────────────────
+
+def _source_rows(billings):
+    money = DecimalField(max_digits=16, decimal_places=2)
+    outstanding = Q(payment_status__in=OUTSTANDING_STATUSES)
+    return billings.annotate(day=TruncDate('created_at')).values(
+        'vendor_id', 'day', 'billing_type', 'payment_status', 'insurance_provider_id',
+    ).annotate(
+        billing_count=Count('id'),
+        total_amount_sum=Sum('total_amount'),
+        patient_portion_sum=Sum('patient_portion'),
+        insurance_portion_sum=Sum('insurance_portion'),
+        patient_paid=Sum('patient_amount_paid'),
+        insurance_paid=Sum('insurance_amount_paid'),
+        patient_outstanding=Sum(Case(
+            When(outstanding, then=F('patient_portion') - F('patient_amount_paid')),
+            default=Value(0), output_field=money,
+        )),
+        insurance_outstanding=Sum(Case(
+            When(outstanding, then=F('insurance_portion') - F('insurance_amount_paid')),
+            default=Value(0), output_field=money,
+        )),
+    ).order_by()
+
+
+def _build(billings) -> list:
+    return [
+        BillingDailyRollup(
+            vendor_id=row['vendor_id'],
+            day=row['day'],
+            billing_type=row['billing_type'],
+            payment_status=row['payment_status'],
+            insurance_provider_id=row['insurance_provider_id'],
+            billing_count=row['billing_count'],
+            total_amount=D(row['total_amount_sum'] or 0),
+            patient_portion=D(row['patient_portion_sum'] or 0),
+            insurance_portion=D(row['insurance_portion_sum'] or 0),
+            patient_paid=D(row['patient_paid'] or 0),
+            insurance_paid=D(row['insurance_paid'] or 0),
+            patient_outstanding=D(row['patient_outstanding'] or 0),
+            insurance_outstanding=D(row['insurance_outstanding'] or 0),
+        )
+        for row in _source_rows(billings)
+    ]
+
+
+@transaction.atomic
+def refresh_days(vendor_id, days: Iterable[date]) -> int:
+    """Recompute every bucket of ``vendor_id`` on ``days`` from BillingInformation."""
+    days = sorted(set(days))
+    if not days:
+        return 0
+    billings = BillingInformation.objects.filter(vendor_id=vendor_id).annotate(
+        created_day=TruncDate('created_at')
+    ).filter(created_day__in=days)
+    BillingDailyRollup.objects.filter(vendor_id=vendor_id, day__in=days).delete()
+    rows = BillingDailyRollup.objects.bulk_create(_build(billings), batch_size=1000)
+    return len(rows)
+
+
+@transaction.atomic
+def rebuild(vendor=None, since: Optional[date] = None) -> int:
+    """Drop and recompute all buckets (optionally one vendor / from ``since``)."""
+    billings = BillingInformation.objects.all()
+    rollups = BillingDailyRollup.objects.all()
+    if vendor is not None:
+        billings = billings.filter(vendor=vendor)
+        rollups = rollups.filter(vendor=vendor)
+    if since is not None:
+        billings = billings.annotate(created_day=TruncDate('created_at')).filter(created_day__gte=since)
+        rollups = rollups.filter(day__gte=since)
+
+    rollups.delete()
+    rows = BillingDailyRollup.objects.bulk_create(_build(billings), batch_size=1000)
+    logger.info("Rebuilt %d billing rollup rows", len(rows))
+    return len(rows)
+
+
+# ── Reading ──────────────────────────────────────────────────────────────────
+
+def rollups_for(vendor, start: date, end: date):
+    return BillingDailyRollup.objects.filter(vendor=vendor, day__range=[start, end])
+
+
+def totals(rollups) -> Dict:
+    """All dashboard totals for a rollup queryset in one aggregate."""
+    agg = rollups.aggregate(
+        billing_count=Sum('billing_count'),
+        **{f: Sum(f) for f in AMOUNT_FIELDS},
+    )
+    result = {f: D(agg[f] or 0) for f in AMOUNT_FIELDS}
+    result['billing_count'] = agg['billing_count'] or 0
+    return result
+
+
+def breakdown(rollups, field: str):
+    """count/total per ``field`` value (billing_type, payment_status, …)."""
+    # buckets emptied by status moves stay at 0 until the nightly rebuild
+    return rollups.values(field).annotate(
+        count=Sum('billing_count'),
+        total=Sum('total_amount'),
+    ).filter(count__gt=0).order_by(field)
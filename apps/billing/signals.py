@@ -1,45 +1,80 @@
 import logging
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
 from django.dispatch import receiver
+from django.utils import timezone
 
 logger = logging.getLogger(__name__)
 
 
-# Triggered when a patient Payment is recorded at the front desk
-@receiver(post_save, sender='billing.Payment')
-def create_rebate_on_patient_payment(sender, instance, created, **kwargs):
-    billing = instance.billing
-    if billing.referrer_id and billing.is_payment_cleared:
-        try:
-            record = billing.calculate_and_create_rebate()
-            if record:
-                logger.info(
-                    "Rebate ₦%s created for billing %s → referrer %s",
-                    record.rebate_amount, billing.pk, billing.referrer.name,
-                )
-        except Exception:
-            logger.exception(
-                "Failed to create rebate record for billing %s", billing.pk
-            )
-
-
-# Triggered when an InvoicePayment propagates back to billing records
-
-@receiver(post_save, sender='billing.InvoicePayment')
-def create_rebate_on_insurance_payment(sender, instance, created, **kwargs):
-    invoice = instance.invoice
-    for billing in invoice.billing_records.filter(referrer__isnull=False):
-        if billing.is_payment_cleared:
-            try:
-                record = billing.calculate_and_create_rebate()
-                if record:
-                    logger.info(
-                        "Rebate ₦%s created for billing %s → referrer %s",
-                        record.rebate_amount, billing.pk, billing.referrer.name,
-                    )
-            except Exception:
-                logger.exception(
-                    "Failed to create rebate for billing %s on invoice %s",
-                    billing.pk, invoice.pk,
-                )
+# Rebates are no longer created on the payment path — see
+# billing/services/rebate_accrual.py and `manage.py accrue_rebates`.
 
+
+# Price matrix versioning — any negotiated price or price list edit
+# starts a new cached matrix (billing/services/pricing.py). The version is
+# bumped after commit, so a concurrent reader can't cache the old rows
+# under the new version.
+
+@receiver(post_save, sender='billing.TestPrice')
+@receiver(post_delete, sender='billing.TestPrice')
+def invalidate_price_matrix_on_test_price(sender, instance, **kwargs):
+    from .models import PriceList
+    from .services.pricing import invalidate_price_list
+    price_list_id = instance.price_list_id
+    transaction.on_commit(lambda: invalidate_price_list(price_list_id))
+    # Flags the list for `manage.py reprice_billings`
+    PriceList.objects.filter(pk=instance.price_list_id).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender='billing.PriceList')
+@receiver(post_delete, sender='billing.PriceList')
+def invalidate_price_matrix_on_price_list(sender, instance, **kwargs):
+    from .services.pricing import invalidate_price_list
+    price_list_id = instance.pk
+    transaction.on_commit(lambda: invalidate_price_list(price_list_id))
+
+
+# Daily revenue rollup — move each billing record's contribution between
+# BillingDailyRollup buckets (billing/services/rollup.py)
+
+@receiver(post_save, sender='billing.BillingInformation')
+def update_rollup_on_billing_save(sender, instance, created, **kwargs):
+    from .services import exposure
+    from .services.rollup import apply_change, day_of, refresh_days
+    old = None if created else getattr(instance, '_rollup_snapshot', None)
+    if instance._rollup_state() is None:
+        # Saved from a deferred-field load — read the rest back for the new state
+        deferred = [f.removesuffix('_id') for f in instance.ROLLUP_FIELDS if f not in instance.__dict__]
+        instance.refresh_from_db(fields=deferred)
+
+    if old is None and not created:
+        # No snapshot of what the record contributed before — recompute its
+        # day and its payer's exposure from source instead of a delta
+        refresh_days(instance.vendor_id, [day_of(instance.created_at)])
+        exposure.refresh([instance.insurance_provider_id])
+    else:
+        apply_change(old, instance._rollup_state())
+    instance._rollup_snapshot = instance._rollup_state()
+
+
+@receiver(post_delete, sender='billing.BillingInformation')
+def update_rollup_on_billing_delete(sender, instance, **kwargs):
+    from .services.rollup import apply_change
+    apply_change(getattr(instance, '_rollup_snapshot', None) or instance._rollup_state(), None)
+
+
+@receiver(pre_delete, sender='billing.InsuranceProvider')
+def remember_rollup_days_of_provider(sender, instance, **kwargs):
+    instance._rollup_days = list(
+        instance.billing_rollups.values_list('day', flat=True).distinct()
+    )
+
+
+@receiver(post_delete, sender='billing.InsuranceProvider')
+def refresh_rollup_after_provider_delete(sender, instance, **kwargs):
+    # billing_records were SET_NULL without save(); their buckets cascaded away
+    from .services.rollup import refresh_days
+    days = getattr(instance, '_rollup_days', None)
+    if days:
+        refresh_days(instance.vendor_id, days)
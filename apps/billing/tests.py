@@ -1,3 +1,663 @@
-from django.test import TestCase
+import hashlib
+import hmac
+import io
+import json
+import zipfile
+from datetime import date
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from apps.billing.models import (
+    BillingDailyRollup, BillingInformation, BillingLineItem, InsuranceProvider, Invoice, InvoicePayment, Payment,
+    PaystackWebhookEvent, PriceList, RebateRecord, Referrer, TestPrice, allocate,
+)
+from apps.billing.services.batch_invoicing import invoice_period
+from apps.billing.services.claims import claims_for_period, iter_claims, stream_claims_zip
+from apps.billing.services.exposure import reconcile
+from apps.billing.services.helper import _auto_mark_overdue
+from apps.billing.services.export import export_rows, stream_csv, stream_xlsx
+from apps.billing.services.invoice_payments import propagate_invoice_payment
+from apps.billing.services.invoice_pdf_stream import invoice_rows, write_invoice_pdf
+from apps.billing.services.paystack_inbox import (
+    InvalidSignature, process_pending, record_verified, record_webhook, replay,
+)
+from apps.billing.services.pricing import price_many
+from apps.billing.services.rebate_accrual import accrue_pending, accrue_rebates, pending_billings, reconcile_totals
+from apps.billing.services.repricing import reprice, stale_price_lists
+from apps.billing.services.rollup import rebuild, totals
+from apps.labs.models import Department, Patient, TestRequest, VendorTest
+from apps.tenants.models import Vendor
+
+
+class PriceResolutionTest(TestCase):
+    def setUp(self):
+        self.vendor = Vendor.objects.create(name="Price Vendor", contact_email="price@vendor.test")
+        dept = Department.objects.create(vendor=self.vendor, name="Chemistry")
+        self.tests = [
+            VendorTest.objects.create(
+                vendor=self.vendor, code=f"T{i}", name=f"Test {i}",
+                assigned_department=dept, price=Decimal("1000.00"),
+            )
+            for i in range(40)
+        ]
+        self.price_list = PriceList.objects.create(vendor=self.vendor, name="HMO Rates", price_type="HMO")
+        TestPrice.objects.bulk_create([
+            TestPrice(price_list=self.price_list, test=t, price=Decimal("800.00"))
+            for t in self.tests[:20]
+        ])
+
+    def test_panel_resolves_in_one_cached_lookup(self):
+        with self.assertNumQueries(1):
+            prices = price_many(self.tests, self.price_list)
+        self.assertEqual(prices[self.tests[0].pk], Decimal("800.00"))
+        self.assertEqual(prices[self.tests[39].pk], Decimal("1000.00"))
+
+        with self.assertNumQueries(0):
+            price_many(self.tests, self.price_list)
+
+    def test_price_edit_invalidates_matrix(self):
+        price_many(self.tests, self.price_list)
+        with self.captureOnCommitCallbacks(execute=True):
+            TestPrice.objects.filter(test=self.tests[0]).get().delete()
+            TestPrice.objects.create(price_list=self.price_list, test=self.tests[0], price=Decimal("750.00"))
+
+        self.assertEqual(price_many(self.tests, self.price_list)[self.tests[0].pk], Decimal("750.00"))
+
+
+class BillingLineItemTest(TestCase):
+    def setUp(self):
+        self.vendor = Vendor.objects.create(name="Line Vendor", contact_email="lines@vendor.test")
+        self.chem = Department.objects.create(vendor=self.vendor, name="Chemistry")
+        self.haem = Department.objects.create(vendor=self.vendor, name="Haematology")
+        self.glu = VendorTest.objects.create(
+            vendor=self.vendor, code="GLU", name="Glucose", assigned_department=self.chem, price=Decimal("1000.00")
+        )
+        self.fbc = VendorTest.objects.create(
+            vendor=self.vendor, code="FBC", name="Full Blood Count", assigned_department=self.haem, price=Decimal("2000.00")
+        )
+        self.price_list = PriceList.objects.create(
+            vendor=self.vendor, name="HMO", price_type="HMO",
+            discount_percentage=Decimal("10"), tax_percentage=Decimal("2"),
+        )
+        self.provider = InsuranceProvider.objects.create(
+            vendor=self.vendor, name="Avon", code="AVON", price_list=self.price_list,
+        )
+        patient = Patient.objects.create(vendor=self.vendor, first_name="Ada", last_name="Obi", gender="F")
+        self.test_request = TestRequest.objects.create(vendor=self.vendor, patient=patient, request_id="REQ-1")
+        self.test_request.requested_tests.set([self.glu, self.fbc])
+
+    def _bill(self):
+        return BillingInformation.objects.create(
+            vendor=self.vendor, request=self.test_request, billing_type="HMO",
+            price_list=self.price_list, insurance_provider=self.provider,
+        )
+
+    def test_lines_snapshot_prices_and_match_header(self):
+        billing = self._bill()
+
+        lines = list(billing.line_items.all())
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(billing.subtotal, Decimal("3000.00"))
+        self.assertEqual(billing.total_amount, Decimal("2754.00"))
+        self.assertEqual(sum(l.line_total for l in lines), billing.total_amount)
+
+        by_dept = {r['department__name']: r['revenue'] for r in BillingLineItem.objects.revenue_by_department()}
+        self.assertEqual(by_dept["Haematology"], Decimal("1836.00"))
+
+    def test_routine_status_save_skips_pricing(self):
+        billing = self._bill()
+        billing = BillingInformation.objects.get(pk=billing.pk)
+        billing.payment_status = 'PARTIAL'
+        with CaptureQueriesContext(connection) as ctx:
+            billing.save(update_fields=['payment_status', 'updated_at'])
+        # one UPDATE of the record; the rest only moves its rollup bucket
+        tables = [q['sql'].split('"')[1] for q in ctx.captured_queries if q['sql'].startswith(('UPDATE', 'INSERT', 'SELECT'))]
+        self.assertEqual(tables.count('billing_billinginformation'), 1)
+        self.assertEqual(set(tables), {'billing_billinginformation', 'billing_billingdailyrollup'})
+
+    def test_backfill_spreads_stored_totals(self):
+        from importlib import import_module
+        from django.apps import apps
+        backfill = import_module('apps.billing.migrations.0007_billinglineitem').backfill_line_items
+
+        billing = self._bill()
+        billing.line_items.all().delete()
+        VendorTest.objects.filter(pk=self.glu.pk).update(price=Decimal("1500.00"))  # priced since
+        backfill(apps, None)
+
+        billing.refresh_from_db()
+        lines = list(billing.line_items.all())
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(billing.total_amount, Decimal("2754.00"))
+        self.assertEqual(sum(l.unit_price for l in lines), billing.subtotal)
+        self.assertEqual(sum(l.discount_amount for l in lines), billing.discount)
+        self.assertEqual(sum(l.tax_amount for l in lines), billing.tax)
+        self.assertEqual(sum(l.line_total for l in lines), billing.total_amount)
+
+    def test_allocate_is_exact(self):
+        parts = allocate(Decimal("100.00"), [Decimal("1"), Decimal("1"), Decimal("1")])
+        self.assertEqual(sum(parts), Decimal("100.00"))
+
+
+class BillingDailyRollupTest(TestCase):
+    def setUp(self):
+        self.vendor = Vendor.objects.create(name="Rollup Vendor", contact_email="rollup@vendor.test")
+        dept = Department.objects.create(vendor=self.vendor, name="Chemistry")
+        self.test = VendorTest.objects.create(
+            vendor=self.vendor, code="GLU", name="Glucose", assigned_department=dept, price=Decimal("1000.00")
+        )
+        self.patient = Patient.objects.create(vendor=self.vendor, first_name="Ada", last_name="Obi", gender="F")
+
+    def _bill(self, n):
+        test_request = TestRequest.objects.create(vendor=self.vendor, patient=self.patient, request_id=f"REQ-{n}")
+        test_request.requested_tests.set([self.test])
+        return BillingInformation.objects.create(vendor=self.vendor, request=test_request, billing_type="CASH")
+
+    def _snapshot(self):
+        return sorted(
+            BillingDailyRollup.objects.filter(vendor=self.vendor).values_list(
+                'payment_status', 'billing_count', 'total_amount', 'patient_paid', 'patient_outstanding',
+            )
+        )
+
+    def test_payments_move_records_between_buckets(self):
+        first, second = self._bill(1), self._bill(2)
+        Payment.objects.create(billing=first, amount=Decimal("1000.00"), payment_method="CASH")
+        Payment.objects.create(billing=second, amount=Decimal("400.00"), payment_method="CASH")
+
+        stats = totals(BillingDailyRollup.objects.filter(vendor=self.vendor))
+        self.assertEqual(stats['billing_count'], 2)
+        self.assertEqual(stats['total_amount'], Decimal("2000.00"))
+        self.assertEqual(stats['patient_paid'], Decimal("1400.00"))
+        self.assertEqual(stats['patient_outstanding'], Decimal("600.00"))
+
+        incremental = self._snapshot()
+        self.assertEqual([row[0] for row in incremental if row[1]], ['PAID', 'PARTIAL'])
+
+        rebuild(vendor=self.vendor)
+        self.assertEqual([r for r in self._snapshot() if r[1]], [r for r in incremental if r[1]])
+
+        # the 0008 data migration builds the same buckets from scratch
+        from importlib import import_module
+        from django.apps import apps
+        BillingDailyRollup.objects.all().delete()
+        import_module('apps.billing.migrations.0008_billingdailyrollup').build_rollups(apps, None)
+        self.assertEqual([r for r in self._snapshot() if r[1]], [r for r in incremental if r[1]])
+
+    def test_delete_removes_contribution(self):
+        billing = self._bill(1)
+        billing.delete()
+        stats = totals(BillingDailyRollup.objects.filter(vendor=self.vendor))
+        self.assertEqual(stats['billing_count'], 0)
+        self.assertEqual(stats['total_amount'], Decimal("0.00"))
+
+
+class InvoicePaymentPropagationTest(TestCase):
+    def setUp(self):
+        self.vendor = Vendor.objects.create(name="Payer Vendor", contact_email="payer@vendor.test")
+        dept = Department.objects.create(vendor=self.vendor, name="Chemistry")
+        test = VendorTest.objects.create(
+            vendor=self.vendor, code="GLU", name="Glucose", assigned_department=dept, price=Decimal("1000.00")
+        )
+        self.provider = InsuranceProvider.objects.create(
+            vendor=self.vendor, name="Avon", code="AVON", patient_copay_percentage=Decimal("0"),
+        )
+        self.referrer = Referrer.objects.create(
+            vendor=self.vendor, name="General Hospital", code="GH", rebate_value=Decimal("10"),
+        )
+        patient = Patient.objects.create(vendor=self.vendor, first_name="Ada", last_name="Obi", gender="F")
+        self.billings = []
+        for i in range(3):
+            test_request = TestRequest.objects.create(vendor=self.vendor, patient=patient, request_id=f"REQ-{i}")
+            test_request.requested_tests.set([test])
+            self.billings.append(BillingInformation.objects.create(
+                vendor=self.vendor, request=test_request, billing_type="HMO",
+                insurance_provider=self.provider, referrer=self.referrer if i == 0 else None,
+            ))
+        self.invoice = Invoice.objects.create(
+            vendor=self.vendor, invoice_number="INV-1", insurance_provider=self.provider,
+            due_date=date(2030, 1, 31), period_start=date(2030, 1, 1), period_end=date(2030, 1, 31),
+        )
+        self.invoice.add_billing_records([b.pk for b in self.billings])
+
+    def test_partial_payment_is_split_to_the_kobo(self):
+        InvoicePayment.objects.create(invoice=self.invoice, amount=Decimal("1000.00"), payment_method="TRANSFER")
+
+        paid = list(BillingInformation.objects.filter(invoices=self.invoice).values_list('insurance_amount_paid', flat=True))
+        self.assertEqual(sum(paid), Decimal("1000.00"))
+        self.assertEqual(sorted(paid), [Decimal("333.33"), Decimal("333.33"), Decimal("333.34")])
+        self.assertEqual(self.invoice.status, 'PARTIAL')
+
+        # re-running is a no-op and costs the same few queries however many records
+        with self.assertNumQueries(6):
+            self.assertEqual(propagate_invoice_payment(self.invoice), 0)
+
+    def test_full_payment_clears_records_and_nightly_accrual_creates_rebates_once(self):
+        InvoicePayment.objects.create(invoice=self.invoice, amount=Decimal("3000.00"), payment_method="TRANSFER")
+
+        statuses = set(BillingInformation.objects.filter(invoices=self.invoice).values_list('payment_status', flat=True))
+        self.assertEqual(statuses, {'PAID'})
+        self.assertFalse(RebateRecord.objects.exists())
+
+        self.assertEqual(accrue_pending(vendor=self.vendor), 1)
+        rebate = RebateRecord.objects.get()
+        self.assertEqual(rebate.billing_id, self.billings[0].pk)
+        self.assertEqual(rebate.rebate_amount, Decimal("100.00"))
+
+        self.assertEqual(accrue_pending(vendor=self.vendor), 0)
+        self.referrer.refresh_from_db()
+        self.assertEqual(self.referrer.get_unpaid_balance(), Decimal("100.00"))
+        self.assertEqual(self.referrer.rebate_earned_count, 1)
+        self.assertEqual(reconcile_totals(vendor=self.vendor), 0)
+
+    def test_accrual_totals_skip_conflicting_rows(self):
+        InvoicePayment.objects.create(invoice=self.invoice, amount=Decimal("3000.00"), payment_method="TRANSFER")
+        billings = list(pending_billings(vendor=self.vendor))
+        # the same billing twice stands in for a concurrent run inserting first
+        self.assertEqual(len(accrue_rebates(billings * 2)), 1)
+
+        self.referrer.refresh_from_db()
+        self.assertEqual(self.referrer.rebate_earned_count, 1)
+        self.assertEqual(self.referrer.get_unpaid_balance(), Decimal("100.00"))
+
+    def test_payer_exposure_tracks_transitions(self):
+        self.provider.refresh_from_db()
+        self.assertEqual(self.provider.exposure_owed, Decimal("3000.00"))
+        self.assertEqual(self.provider.exposure_invoiced, Decimal("3000.00"))
+
+        InvoicePayment.objects.create(invoice=self.invoice, amount=Decimal("1000.00"), payment_method="TRANSFER")
+        self.provider.refresh_from_db()
+        self.assertEqual(self.provider.get_outstanding_balance(), Decimal("2000.00"))
+        # records are PARTIAL now but the invoice is still unpaid for the rest
+        self.assertEqual(self.provider.exposure_invoiced, Decimal("2000.00"))
+
+        self.provider.credit_limit = Decimal("2500.00")
+        with self.assertNumQueries(0):
+            self.assertFalse(self.provider.is_over_credit_limit())
+            self.assertTrue(self.provider.is_over_credit_limit(additional=Decimal("600.00")))
+
+        self.assertEqual(reconcile(vendor=self.vendor), [])
+
+    def test_save_from_deferred_load_keeps_exposure(self):
+        record = BillingInformation.objects.only('id', 'vendor_id', 'payment_status').get(pk=self.billings[1].pk)
+        record.payment_status = 'WAIVED'
+        record.save(update_fields=['payment_status'])
+
+        self.provider.refresh_from_db()
+        self.assertEqual(self.provider.exposure_owed, Decimal("2000.00"))
+        self.assertEqual(reconcile(vendor=self.vendor), [])
+
+    def test_overdue_invoice_moves_overdue_exposure(self):
+        Invoice.objects.filter(pk=self.invoice.pk).update(status='SENT', due_date=date(2020, 1, 31))
+        self.assertEqual(_auto_mark_overdue(self.vendor), 1)
+
+        self.provider.refresh_from_db()
+        self.assertEqual(self.provider.exposure_overdue, Decimal("3000.00"))
+        self.assertEqual(self.provider.exposure_invoiced, Decimal("3000.00"))
+        self.assertEqual(
+            set(BillingInformation.objects.filter(invoices=self.invoice).values_list('payment_status', flat=True)),
+            {'INVOICED'},
+        )
+        self.assertEqual(reconcile(vendor=self.vendor), [])
+
+
+class StubPaystackAPI:
+    """Stands in for PaystackAPI: every reference verifies as a ₦1,000 card charge."""
+    calls = []
+
+    def __init__(self, vendor):
+        self.vendor = vendor
+
+    def verify_payment(self, reference):
+        self.calls.append(reference)
+        return {
+            'success': True, 'status': 'success', 'reference': reference,
+            'amount': Decimal("1000.00"), 'channel': 'card', 'metadata': {'billing_id': self.billing_id},
+        }
+
+
+@override_settings(PAYSTACK_SECRET_KEY="sk_test_inbox")
+class PaystackWebhookInboxTest(TestCase):
+    def setUp(self):
+        self.vendor = Vendor.objects.create(name="Inbox Vendor", contact_email="inbox@vendor.test")
+        dept = Department.objects.create(vendor=self.vendor, name="Chemistry")
+        test = VendorTest.objects.create(
+            vendor=self.vendor, code="GLU", name="Glucose", assigned_department=dept, price=Decimal("1000.00")
+        )
+        patient = Patient.objects.create(vendor=self.vendor, first_name="Ada", last_name="Obi", gender="F")
+        test_request = TestRequest.objects.create(vendor=self.vendor, patient=patient, request_id="REQ-1")
+        test_request.requested_tests.set([test])
+        self.billing = BillingInformation.objects.create(vendor=self.vendor, request=test_request, billing_type="CASH")
+        StubPaystackAPI.billing_id = str(self.billing.pk)
+        StubPaystackAPI.calls = []
+
+    def _body(self, reference):
+        return json.dumps({
+            'event': 'charge.success',
+            'data': {
+                'reference': reference, 'amount': 100000, 'channel': 'card',
+                'metadata': {'billing_id': str(self.billing.pk)},
+            },
+        }).encode()
+
+    def _sign(self, body, key="sk_test_inbox"):
+        return hmac.new(key.encode(), body, hashlib.sha512).hexdigest()
+
+    def test_retried_webhook_creates_one_payment(self):
+        body = self._body("PSK-1")
+        record_webhook(body, self._sign(body))
+        record_webhook(body, self._sign(body))
+        self.assertIsNone(record_webhook(b'{"event": "transfer.success", "data": {}}', ''))
+        self.assertEqual(PaystackWebhookEvent.objects.count(), 1)
+
+        self.assertEqual(process_pending(), 1)
+        self.assertEqual(process_pending(), 0)
+
+        event = PaystackWebhookEvent.objects.get()
+        self.assertEqual(event.status, 'PROCESSED')
+        self.assertEqual(event.payment.payment_method, 'POS')
+        self.assertEqual(Payment.objects.filter(transaction_reference="PSK-1").count(), 1)
+        self.billing.refresh_from_db()
+        self.assertEqual(self.billing.payment_status, 'PAID')
+
+    def test_unsigned_or_forged_webhook_is_not_queued(self):
+        body = self._body("PSK-FORGED")
+        for signature in ('', self._sign(body, key="sk_test_other")):
+            with self.assertRaises(InvalidSignature):
+                record_webhook(body, signature)
+        self.assertFalse(PaystackWebhookEvent.objects.exists())
+
+    def test_callback_payment_keeps_collecting_user(self):
+        user = get_user_model().objects.create_user(email="cashier@inbox.test", vendor=self.vendor, role="technologist")
+        record_verified(StubPaystackAPI(self.vendor).verify_payment("PSK-CB"), billing=self.billing, collected_by=user)
+        process_pending(references=["PSK-CB"])
+        self.assertEqual(Payment.objects.get(transaction_reference="PSK-CB").collected_by, user)
+
+    def test_replay_recovers_missed_and_failed_references(self):
+        Payment.objects.create(
+            billing=self.billing, amount=Decimal("1000.00"), payment_method="POS", transaction_reference="PSK-OLD",
+        )
+        PaystackWebhookEvent.objects.create(reference="PSK-OLD", event='charge.success', status='FAILED', payload={})
+
+        stats = replay(references=["PSK-OLD", "PSK-MISSED"], vendor=self.vendor, api_class=StubPaystackAPI)
+
+        self.assertEqual(stats['verified'], 2)
+        self.assertEqual(sorted(StubPaystackAPI.calls), ["PSK-MISSED", "PSK-OLD"])
+        self.assertEqual(
+            set(PaystackWebhookEvent.objects.values_list('reference', 'status')),
+            {("PSK-OLD", 'PROCESSED'), ("PSK-MISSED", 'PROCESSED')},
+        )
+        # The already-recorded charge is linked, not paid again
+        self.assertEqual(Payment.objects.filter(transaction_reference="PSK-OLD").count(), 1)
+        self.assertEqual(Payment.objects.filter(transaction_reference="PSK-MISSED").count(), 1)
+
+
+class BillingExportTest(TestCase):
+    def setUp(self):
+        self.vendor = Vendor.objects.create(name="Export Vendor", contact_email="export@vendor.test")
+        dept = Department.objects.create(vendor=self.vendor, name="Chemistry")
+        tests = [
+            VendorTest.objects.create(
+                vendor=self.vendor, code=code, name=code, assigned_department=dept, price=Decimal("500.00")
+            )
+            for code in ("FBC", "GLU")
+        ]
+        patient = Patient.objects.create(vendor=self.vendor, first_name="Ada", last_name="Obi", gender="F")
+        for n in range(5):
+            test_request = TestRequest.objects.create(vendor=self.vendor, patient=patient, request_id=f"REQ-{n}")
+            test_request.requested_tests.set(tests)
+            billing = BillingInformation.objects.create(vendor=self.vendor, request=test_request, billing_type="CASH")
+            billing.rebuild_line_items()
+        Payment.objects.create(
+            billing=billing, amount=Decimal("400.00"), payment_method="CASH", transaction_reference="RCPT-9",
+        )
+        self.billings = BillingInformation.objects.filter(vendor=self.vendor)
+
+    def test_queries_are_per_chunk_not_per_row(self):
+        # One cursor over the records, then tests + payments + invoices per chunk of 2
+        with self.assertNumQueries(1 + 3 * 3):
+            rows = list(export_rows(self.billings, chunk_size=2))
+
+        self.assertEqual(len(rows), 6)
+        last = dict(zip(rows[0], rows[-1]))
+        self.assertEqual(last['Tests'], "FBC, GLU")
+        self.assertEqual(last['Patient Paid'], Decimal("400.00"))
+        self.assertEqual(last['Balance'], Decimal("600.00"))
+        self.assertEqual(last['Payments'], "CASH 400.00 (RCPT-9)")
+
+    def test_csv_and_xlsx_streams(self):
+        text = b''.join(stream_csv(export_rows(self.billings))).decode('utf-8-sig')
+        self.assertEqual(len(text.splitlines()), 6)
+        self.assertTrue(text.startswith("Request ID,Date,"))
+
+        package = zipfile.ZipFile(io.BytesIO(b''.join(stream_xlsx(export_rows(self.billings), flush_every=2))))
+        self.assertIsNone(package.testzip())
+        sheet = package.read('xl/worksheets/sheet1.xml').decode()
+        self.assertEqual(sheet.count('<row>'), 6)
+        self.assertIn('<t xml:space="preserve">FBC, GLU</t>', sheet)
+
+
+class PaymentClearanceAnnotationTest(TestCase):
+    def setUp(self):
+        self.vendor = Vendor.objects.create(name="Clearance Vendor", contact_email="clear@vendor.test")
+        dept = Department.objects.create(vendor=self.vendor, name="Chemistry")
+        self.test = VendorTest.objects.create(
+            vendor=self.vendor, code="GLU", name="Glucose", assigned_department=dept, price=Decimal("1000.00")
+        )
+        self.patient = Patient.objects.create(vendor=self.vendor, first_name="Ada", last_name="Obi", gender="F")
+        self.hmo = InsuranceProvider.objects.create(
+            vendor=self.vendor, name="Care HMO", code="CARE", provider_type="HMO", patient_copay_percentage=Decimal("20"),
+        )
+
+    def _bill(self, n, **kwargs):
+        test_request = TestRequest.objects.create(vendor=self.vendor, patient=self.patient, request_id=f"REQ-{n}")
+        test_request.requested_tests.set([self.test])
+        return BillingInformation.objects.create(vendor=self.vendor, request=test_request, **kwargs)
+
+    def test_annotations_match_python_helpers(self):
+        unpaid = self._bill(1, billing_type="CASH")
+        partial = self._bill(2, billing_type="CASH")
+        Payment.objects.create(billing=partial, amount=Decimal("300.00"), payment_method="CASH")
+        paid = self._bill(3, billing_type="CASH")
+        Payment.objects.create(billing=paid, amount=Decimal("1000.00"), payment_method="CASH")
+        copay = self._bill(4, billing_type="HMO", insurance_provider=self.hmo)
+        Payment.objects.create(billing=copay, amount=copay.patient_portion, payment_method="CASH")
+
+        with self.assertNumQueries(1):
+            annotated = list(BillingInformation.objects.filter(vendor=self.vendor).with_clearance())
+
+        for billing in annotated:
+            plain = BillingInformation.objects.get(pk=billing.pk)
+            self.assertEqual(billing.balance_due, plain.get_balance_due())
+            self.assertEqual(billing.payment_cleared, plain.is_payment_cleared)
+            self.assertEqual(billing.fully_paid, plain.is_fully_paid())
+
+        cleared = set(BillingInformation.objects.filter(vendor=self.vendor).cleared().values_list('pk', flat=True))
+        self.assertEqual(cleared, {paid.pk, copay.pk})
+        self.assertNotIn(unpaid.pk, cleared)
+
+
+class RepricingTest(TestCase):
+    def setUp(self):
+        self.vendor = Vendor.objects.create(name="Reprice Vendor", contact_email="reprice@vendor.test")
+        dept = Department.objects.create(vendor=self.vendor, name="Chemistry")
+        self.test = VendorTest.objects.create(
+            vendor=self.vendor, code="GLU", name="Glucose", assigned_department=dept, price=Decimal("1000.00")
+        )
+        self.patient = Patient.objects.create(vendor=self.vendor, first_name="Ada", last_name="Obi", gender="F")
+        self.price_list = PriceList.objects.create(vendor=self.vendor, name="HMO Rates", price_type="HMO")
+        self.price = TestPrice.objects.create(price_list=self.price_list, test=self.test, price=Decimal("800.00"))
+        self.hmo = InsuranceProvider.objects.create(
+            vendor=self.vendor, name="Care HMO", code="CARE", provider_type="HMO",
+            price_list=self.price_list, patient_copay_percentage=Decimal("0.2500"),
+        )
+
+    def _bill(self, n):
+        test_request = TestRequest.objects.create(vendor=self.vendor, patient=self.patient, request_id=f"REQ-{n}")
+        test_request.requested_tests.set([self.test])
+        return BillingInformation.objects.create(
+            vendor=self.vendor, request=test_request, billing_type="HMO",
+            insurance_provider=self.hmo, price_list=self.price_list,
+        )
+
+    def test_open_records_follow_price_edits(self):
+        unpaid, locked, paid = self._bill(1), self._bill(2), self._bill(3)
+        BillingInformation.objects.filter(pk=locked.pk).update(
+            payment_status='PARTIAL', insurance_amount_paid=Decimal("100.00"),
+        )
+        BillingInformation.objects.filter(pk=paid.pk).update(payment_status='PAID')
+        rebuild(vendor=self.vendor)  # queryset updates bypass the rollup
+        reprice(self.price_list)
+        self.assertFalse(stale_price_lists(self.vendor).exists())
+
+        self.price.price = Decimal("1200.00")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.price.save()
+        self.assertTrue(stale_price_lists(self.vendor).exists())
+
+        report = reprice(self.price_list)
+        self.assertEqual({row['request_id'] for row in report}, {"REQ-1", "REQ-2"})
+        self.assertFalse(stale_price_lists(self.vendor).exists())
+
+        unpaid.refresh_from_db()
+        self.assertEqual(unpaid.total_amount, Decimal("1200.00"))
+        self.assertEqual(unpaid.patient_portion, Decimal("300.00"))
+        self.assertEqual(unpaid.line_items.get().line_total, Decimal("1200.00"))
+
+        locked.refresh_from_db()
+        self.assertEqual(locked.total_amount, Decimal("1200.00"))
+        self.assertEqual(locked.patient_portion, Decimal("200.00"))  # split kept once the insurer paid
+
+        paid.refresh_from_db()
+        self.assertEqual(paid.total_amount, Decimal("800.00"))
+
+        rollup = totals(BillingDailyRollup.objects.filter(vendor=self.vendor))
+        rebuild(vendor=self.vendor)
+        self.assertEqual(totals(BillingDailyRollup.objects.filter(vendor=self.vendor)), rollup)
+
+
+class BatchInvoicingTest(TestCase):
+    def setUp(self):
+        self.vendor = Vendor.objects.create(name="Month End Vendor", contact_email="close@vendor.test")
+        dept = Department.objects.create(vendor=self.vendor, name="Chemistry")
+        test = VendorTest.objects.create(
+            vendor=self.vendor, code="GLU", name="Glucose", assigned_department=dept, price=Decimal("1000.00")
+        )
+        patient = Patient.objects.create(vendor=self.vendor, first_name="Ada", last_name="Obi", gender="F")
+        self.avon = InsuranceProvider.objects.create(
+            vendor=self.vendor, name="Avon", code="AVON", patient_copay_percentage=Decimal("0.1000"),
+        )
+        self.hygeia = InsuranceProvider.objects.create(
+            vendor=self.vendor, name="Hygeia", code="HYG", patient_copay_percentage=Decimal("0"),
+        )
+        for i, provider in enumerate([self.avon, self.avon, self.hygeia, None]):
+            test_request = TestRequest.objects.create(vendor=self.vendor, patient=patient, request_id=f"REQ-{i}")
+            test_request.requested_tests.set([test])
+            BillingInformation.objects.create(
+                vendor=self.vendor, request=test_request,
+                billing_type="HMO" if provider else "CASH", insurance_provider=provider,
+            )
+        year = timezone.now().year
+        Invoice.objects.create(
+            vendor=self.vendor, invoice_number=f"INV-AVON-{year}-0007", insurance_provider=self.avon,
+            due_date=date(year, 1, 31), period_start=date(year, 1, 1), period_end=date(year, 1, 31),
+        )
+
+    def test_one_invoice_per_payer_in_one_pass(self):
+        today = timezone.localdate()
+        invoices = invoice_period(self.vendor, today, today)
+
+        self.assertEqual(
+            [(i.invoice_number, i.total_amount) for i in invoices],
+            [(f"INV-AVON-{today.year}-0008", Decimal("1800.00")), (f"INV-HYG-{today.year}-0001", Decimal("1000.00"))],
+        )
+        self.assertEqual(Invoice.objects.get(pk=invoices[0].pk).billing_records.count(), 2)
+        self.assertEqual(
+            sorted(BillingInformation.objects.filter(vendor=self.vendor).values_list('payment_status', flat=True)),
+            ['INVOICED', 'INVOICED', 'INVOICED', 'UNPAID'],
+        )
+
+        self.avon.refresh_from_db()
+        self.assertEqual(self.avon.exposure_invoiced, Decimal("1800.00"))
+        self.assertEqual(invoice_period(self.vendor, today, today), [])
+
+    def test_streamed_pdf_pages_through_records(self):
+        today = timezone.localdate()
+        avon_invoice = invoice_period(self.vendor, today, today)[0]
+
+        self.assertEqual([row[0] for row in invoice_rows(avon_invoice)], ["REQ-0", "REQ-1"])
+        out = io.BytesIO()
+        self.assertEqual(write_invoice_pdf(avon_invoice, out), 1)
+        self.assertTrue(out.getvalue().startswith(b'%PDF'))
+
+        rows = (("REQ", "Patient", "01 Jan 2026", "NGN 1.00", "NGN 0.10", "NGN 0.90") for _ in range(500))
+        out = io.BytesIO()
+        pages = write_invoice_pdf(avon_invoice, out, rows=rows)
+        self.assertGreater(pages, 10)
+        self.assertEqual(out.getvalue().count(b'/Type /Page\n'), pages)
+
+
+class ClaimExportTest(TestCase):
+    def setUp(self):
+        self.vendor = Vendor.objects.create(name="Claims Vendor", contact_email="claims@vendor.test")
+        dept = Department.objects.create(vendor=self.vendor, name="Chemistry")
+        test = VendorTest.objects.create(
+            vendor=self.vendor, code="GLU", name="Glucose", assigned_department=dept, price=Decimal("1000.00")
+        )
+        patient = Patient.objects.create(vendor=self.vendor, first_name="Adaeze", last_name="Obi", gender="F")
+        avon = InsuranceProvider.objects.create(
+            vendor=self.vendor, name="Avon", code="AVON", patient_copay_percentage=Decimal("0.1000"),
+            requires_preauth=True,
+        )
+        nhis = InsuranceProvider.objects.create(
+            vendor=self.vendor, name="NHIS", code="NHIS", provider_type="NHIS", patient_copay_percentage=Decimal("0"),
+        )
+        for i, (provider, policy, preauth) in enumerate([
+            (avon, "AV-1", "PA-1"), (avon, "AV-2", ""), (nhis, "NH-1", ""), (nhis, "", ""), (None, "", ""),
+        ]):
+            test_request = TestRequest.objects.create(vendor=self.vendor, patient=patient, request_id=f"REQ-{i}")
+            test_request.requested_tests.set([test])
+            billing = BillingInformation.objects.create(
+                vendor=self.vendor, request=test_request, billing_type="HMO" if provider else "CASH",
+                insurance_provider=provider, policy_number=policy, pre_authorization_code=preauth,
+            )
+            billing.rebuild_line_items()
+        today = timezone.localdate()
+        self.billings = claims_for_period(self.vendor, today, today)
+
+    def test_claims_are_grouped_by_provider_with_one_query_per_chunk(self):
+        with self.assertNumQueries(1 + 2 * 2):
+            claims = list(iter_claims(self.billings, chunk_size=2))
+        self.assertEqual([(c['provider_code'], c['claim_id']) for c in claims], [
+            ("AVON", "REQ-0"), ("AVON", "REQ-1"), ("NHIS", "REQ-2"), ("NHIS", "REQ-3"),
+        ])
+        self.assertEqual(claims[0]['tests'], ["GLU"])
+        self.assertEqual(claims[0]['claim_amount'], Decimal("900.00"))
+
+    def test_zip_holds_one_file_per_provider_and_rejections(self):
+        for fmt, name in [('csv', 'AVON-B1.csv'), ('fixed', 'AVON-B1.txt'), ('xml', 'AVON-B1.xml'), ('json', 'AVON-B1.json')]:
+            package = zipfile.ZipFile(io.BytesIO(b''.join(stream_claims_zip(self.billings, fmt, batch='B1'))))
+            self.assertIsNone(package.testzip())
+            manifest = json.loads(package.read('manifest.json'))
+            self.assertEqual(
+                [(f['name'], f['claims'], f['total']) for f in manifest['files']],
+                [(name, 1, "900.00"), (name.replace('AVON', 'NHIS'), 1, "1000.00")],
+            )
+            self.assertEqual(manifest['rejected'], 2)
+
+        rejected = package.read('rejected.csv').decode().splitlines()
+        self.assertEqual(rejected[1:], [
+            "AVON,REQ-1,missing pre-authorisation code", "NHIS,REQ-3,missing policy number",
+        ])
+        self.assertEqual(json.loads(package.read('NHIS-B1.json'))['claims'][0]['policy_number'], "NH-1")
+
+        package = zipfile.ZipFile(io.BytesIO(b''.join(stream_claims_zip(self.billings, 'fixed', batch='B1'))))
+        lines = package.read('AVON-B1.txt').decode('ascii').split('\r\n')
+        self.assertEqual([line[0] for line in lines if line], ['H', 'D', 'T'])
+        self.assertEqual(len({len(line) for line in lines if line.startswith('D')}), 1)
+        self.assertTrue(lines[2].endswith('90000'))
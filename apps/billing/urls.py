@@ -39,6 +39,7 @@ urlpatterns = [
     path('billings/summary/', billing_task.billing_summary_view, name='billing_summary'),
     
     path('billings/bulk-action/', billing_task.billing_bulk_action_view, name='billing_bulk_action'),
+    path('billings/export/', billing_task.billing_export_view, name='billing_export'),
     
 
     # Payment Actions
@@ -84,6 +85,8 @@ urlpatterns = [
     
     path('invoices/<uuid:pk>/pdf/', invoicing.download_invoice_pdf_view, name='invoice_pdf'),
 
+    path('invoices/<uuid:pk>/claims/', invoicing.download_invoice_claims_view, name='invoice_claims'),
+
     path('invoices/<uuid:pk>/payments/<uuid:payment_pk>/receipt/', invoicing.download_receipt_pdf_view, name='invoice_receipt'),
 
 
@@ -27,6 +27,9 @@ from django.utils import timezone
 from datetime import datetime
 from ..models import BillingInformation, Payment, InsuranceProvider, Invoice, D
 from ..forms import BillingInformationForm, BillingFilterForm, PaymentForm
+from ..services.export import export_response
+from ..services.pricing import price_many
+from ..services.rollup import breakdown as rollup_breakdown, rollups_for, totals as rollup_totals, update_status
 from apps.accounts.decorators import require_capability
 
 from django.utils import timezone
@@ -116,34 +119,16 @@ class BillingDashboardView(LoginRequiredMixin, View):
             vendor=vendor,
             created_at__date__range=[start_date, end_date],
         )
+        # Every figure below comes from the daily rollup in one aggregate
+        rollups = rollups_for(vendor, start_date, end_date)
+        stats = rollup_totals(rollups)
 
         # ── Revenue: actual cash collected, not contract value ───────────────
-        collected = billing_qs.aggregate(
-            patient_collected=Sum('patient_amount_paid'),
-            insurance_collected=Sum('insurance_amount_paid'),
-        )
-        total_revenue = (
-            D(collected['patient_collected'] or 0)
-            + D(collected['insurance_collected'] or 0)
-        )
+        total_revenue = stats['patient_paid'] + stats['insurance_paid']
 
         # ── Outstanding: split by party ──────────────────────────────────────
-        outstanding = billing_qs.filter(
-            payment_status__in=['UNPAID', 'PARTIAL', 'AUTHORIZED', 'INVOICED', 'OVERDUE'],
-        ).aggregate(
-            patient_owed=Sum('patient_portion'),
-            patient_paid=Sum('patient_amount_paid'),
-            insurance_owed=Sum('insurance_portion'),
-            insurance_paid=Sum('insurance_amount_paid'),
-        )
-        patient_outstanding = max(
-            D(outstanding['patient_owed'] or 0) - D(outstanding['patient_paid'] or 0),
-            D('0.00'),
-        )
-        insurance_outstanding = max(
-            D(outstanding['insurance_owed'] or 0) - D(outstanding['insurance_paid'] or 0),
-            D('0.00'),
-        )
+        patient_outstanding = max(stats['patient_outstanding'], D('0.00'))
+        insurance_outstanding = max(stats['insurance_outstanding'], D('0.00'))
         total_outstanding = patient_outstanding + insurance_outstanding
 
         # ── Unpaid payer invoices ────────────────────────────────────────────
@@ -163,55 +148,40 @@ class BillingDashboardView(LoginRequiredMixin, View):
         )
 
         # Patient collection rate = patient_paid / patient_portion × 100
-        total_patient_portion = D(
-            billing_qs.aggregate(s=Sum('patient_portion'))['s'] or 0
-        )
+        total_patient_portion = stats['patient_portion']
         patient_collection_pct = (
-            round(float(
-                D(collected['patient_collected'] or 0) / total_patient_portion
-            ) * 100, 1)
+            round(float(stats['patient_paid'] / total_patient_portion) * 100, 1)
             if total_patient_portion > 0 else 0.0
         )
 
         # Insurance collection rate = insurance_paid / insurance_portion × 100
-        total_insurance_portion = D(
-            billing_qs.aggregate(s=Sum('insurance_portion'))['s'] or 0
-        )
+        total_insurance_portion = stats['insurance_portion']
         insurance_collection_pct = (
-            round(float(
-                D(collected['insurance_collected'] or 0) / total_insurance_portion
-            ) * 100, 1)
+            round(float(stats['insurance_paid'] / total_insurance_portion) * 100, 1)
             if total_insurance_portion > 0 else 0.0
         )
 
         # Average billing amount across the period
-        avg_billing = D(
-            billing_qs.aggregate(avg=Avg('total_amount'))['avg'] or 0
+        avg_billing = (
+            D(stats['total_amount'] / stats['billing_count'])
+            if stats['billing_count'] else D('0.00')
         )
 
         # Total contract value (sum of all billing records in range)
-        total_contract_value = D(
-            billing_qs.aggregate(s=Sum('total_amount'))['s'] or 0
-        )
+        total_contract_value = stats['total_amount']
 
         # ── Recent billing records ───────────────────────────────────────────
         recent_billings = (
             billing_qs
             .select_related('request', 'request__patient', 'insurance_provider')
             .prefetch_related('payments')
+            .with_balance()   # is_fully_paid in the template reads payments_total
             .order_by('-created_at')[:10]
         )
  
         # ── Breakdown tables ──────────────────────────────────
-        payment_breakdown = billing_qs.values('payment_status').annotate(
-            count=Count('id'),
-            total=Sum('total_amount'),
-        ).order_by('payment_status')
-
-        billing_breakdown = billing_qs.values('billing_type').annotate(
-            count=Count('id'),
-            total=Sum('total_amount'),
-        ).order_by('billing_type')
+        payment_breakdown = rollup_breakdown(rollups, 'payment_status')
+        billing_breakdown = rollup_breakdown(rollups, 'billing_type')
 
         context = {
             # Filter state
@@ -251,35 +221,10 @@ class BillingDashboardView(LoginRequiredMixin, View):
 # Billing List
 # ──────────────────────────
 
-@login_required
-def billing_list_view(request):
-    """
-    Filterable, searchable, paginated billing record list.
-
-    Filters:
-      - Full-text search (request ID, patient name, policy number, employee ID)
-      - Billing type
-      - Payment status
-      - Date range (created_at)
-      - Insurance / corporate provider
-    """
-    vendor = getattr(request.user, 'vendor', None)
-    if vendor is None:
-        raise PermissionDenied("Only vendor accounts can access billing records.")
-
-    queryset = (
-        BillingInformation.objects
-        .filter(vendor=vendor)
-        .select_related(
-            'request',
-            'request__patient',
-            'price_list',
-            'insurance_provider',   # covers HMO, NHIS, Corporate, Staff
-        )
-    )
-
+def _filter_billings(queryset, params):
+    """Search and filters shared by the billing list and the billing export."""
     # ── Search ───────────────────────────────────────────────────────────────
-    q = request.GET.get('q', '').strip()
+    q = params.get('q', '').strip()
     if q:
         queryset = queryset.filter(
             Q(request__request_id__icontains=q)        |
@@ -290,17 +235,17 @@ def billing_list_view(request):
         )
 
     # ── Filters ──────────────────────────────────────────────────────────────
-    billing_type = request.GET.get('billing_type', '').strip()
+    billing_type = params.get('billing_type', '').strip()
     if billing_type:
         queryset = queryset.filter(billing_type=billing_type)
 
-    payment_status = request.GET.get('payment_status', '').strip()
+    payment_status = params.get('payment_status', '').strip()
     if payment_status:
         queryset = queryset.filter(payment_status=payment_status)
 
     # Date parsing — strptime parses a string into a date; strftime formats a date
     # into a string. The original code had these backwards.
-    date_from_str = request.GET.get('date_from', '').strip()
+    date_from_str = params.get('date_from', '').strip()
     if date_from_str:
         try:
             date_from_obj = datetime.strptime(date_from_str, '%Y-%m-%d').date()
@@ -308,7 +253,7 @@ def billing_list_view(request):
         except ValueError:
             pass  # silently ignore malformed date rather than crashing
 
-    date_to_str = request.GET.get('date_to', '').strip()
+    date_to_str = params.get('date_to', '').strip()
     if date_to_str:
         try:
             date_to_obj = datetime.strptime(date_to_str, '%Y-%m-%d').date()
@@ -317,10 +262,48 @@ def billing_list_view(request):
             pass
 
     # Provider filter — insurance_provider only; corporate_client FK no longer exists
-    provider_id = request.GET.get('provider', '').strip()
+    provider_id = params.get('provider', '').strip()
     if provider_id:
         queryset = queryset.filter(insurance_provider_id=provider_id)
 
+    return queryset
+
+
+@login_required
+def billing_list_view(request):
+    """
+    Filterable, searchable, paginated billing record list.
+
+    Filters:
+      - Full-text search (request ID, patient name, policy number, employee ID)
+      - Billing type
+      - Payment status
+      - Date range (created_at)
+      - Insurance / corporate provider
+    """
+    vendor = getattr(request.user, 'vendor', None)
+    if vendor is None:
+        raise PermissionDenied("Only vendor accounts can access billing records.")
+
+    queryset = (
+        BillingInformation.objects
+        .filter(vendor=vendor)
+        .select_related(
+            'request',
+            'request__patient',
+            'price_list',
+            'insurance_provider',   # covers HMO, NHIS, Corporate, Staff
+        )
+    )
+
+    queryset = _filter_billings(queryset, request.GET)
+    q              = request.GET.get('q', '').strip()
+    billing_type   = request.GET.get('billing_type', '').strip()
+    payment_status = request.GET.get('payment_status', '').strip()
+    date_from_str  = request.GET.get('date_from', '').strip()
+    date_to_str    = request.GET.get('date_to', '').strip()
+    provider_id    = request.GET.get('provider', '').strip()
+
     # ── Summary statistics ───────────────────────────────────────────────────
     summary = queryset.aggregate(
         total_billings=Count('id'),
@@ -378,18 +361,13 @@ def billing_list_view(request):
     queryset = queryset.order_by(sort)
 
     # ── Pagination ───────────────────────────────────────────────────────────
-    paginator = Paginator(queryset, 25)
+    # Balances come from with_balance() — no per-row payment aggregate
+    paginator = Paginator(queryset.with_balance(), 25)
     page_obj = paginator.get_page(request.GET.get('page'))
 
     # Annotate each row with derived display values
     for billing in page_obj:
-        billing.balance = billing.get_balance_due()
-        billing.patient_balance = max(
-            D(billing.patient_portion) - D(billing.patient_amount_paid), D('0.00')
-        )
-        billing.insurance_balance = max(
-            D(billing.insurance_portion) - D(billing.insurance_amount_paid), D('0.00')
-        )
+        billing.balance = billing.balance_due
         billing.is_overdue_flag = (
             billing.payment_status in ('UNPAID', 'PARTIAL')
             and (timezone.now().date() - billing.created_at.date()).days > 30
@@ -745,22 +723,12 @@ def billing_detail_view(request, pk):
         hmo_percentage   = round((1 - rate) * 100, 1)  # e.g. 40.0
 
     # ── Test breakdown ───────────────────────────────────────────────────────
-    test_details = []
-    for lab_test in test_request.requested_tests.all():
-        if billing.price_list and callable(
-            getattr(lab_test, 'get_price_from_price_list', None)
-        ):
-            try:
-                price = D(lab_test.get_price_from_price_list(billing.price_list))
-            except Exception:
-                price = D(getattr(lab_test, 'price', 0))
-        else:
-            price = D(getattr(lab_test, 'price', 0))
-
-        test_details.append({
-            'test':  lab_test,
-            'price': price,
-        })
+    requested_tests = list(test_request.requested_tests.all())
+    prices = price_many(requested_tests, billing.price_list)
+    test_details = [
+        {'test': lab_test, 'price': prices[lab_test.pk]}
+        for lab_test in requested_tests
+    ]
 
     # ── Timeline ─────────────────────────────────────────────────────────────
     _epoch = timezone.make_aware(datetime(2000, 1, 1))   # safe sort sentinel
@@ -954,68 +922,58 @@ def billing_summary_view(request):
     else:
         date_to = today
     
-    # Base queryset
-    queryset = BillingInformation.objects.filter(
-        vendor=vendor,
-        created_at__date__range=[date_from, date_to]
-    )
-    
+    # Base queryset — the daily rollup, not individual billing records
+    rollups = rollups_for(vendor, date_from, date_to)
+
     # Revenue by billing type
-    revenue_by_type = queryset.values('billing_type').annotate(
-        count=Count('id'),
-        total=Sum('total_amount'),
-        avg=Avg('total_amount')
-    ).order_by('-total')
-    
+    revenue_by_type = list(rollup_breakdown(rollups, 'billing_type').order_by('-total'))
+    for item in revenue_by_type:
+        item['avg'] = item['total'] / item['count'] if item['count'] else Decimal('0')
+
     # Payment status distribution
-    payment_distribution = queryset.values('payment_status').annotate(
-        count=Count('id'),
-        total=Sum('total_amount')
-    )
-    
+    payment_distribution = rollup_breakdown(rollups, 'payment_status')
+
     # Top insurance providers
-    top_insurance = queryset.filter(
+    top_insurance = rollups.filter(
         billing_type='HMO'
     ).values(
         'insurance_provider__name'
     ).annotate(
-        count=Count('id'),
+        count=Sum('billing_count'),
         total=Sum('total_amount')
-    ).order_by('-total')[:10]
-    
-    # Top corporate clients
-    top_corporate = queryset.filter(
+    ).filter(count__gt=0).order_by('-total')[:10]
+
+    # Top corporate clients (corporate payers are InsuranceProvider rows)
+    top_corporate = rollups.filter(
         billing_type='CORPORATE'
     ).values(
-        'corporate_client__company_name'
+        corporate_client__company_name=F('insurance_provider__name')
     ).annotate(
-        count=Count('id'),
+        count=Sum('billing_count'),
         total=Sum('total_amount')
-    ).order_by('-total')[:10]
-    
-    # Daily trend (last 30 days)
-    daily_trend = []
-    for i in range(30):
-        day = today - timedelta(days=29-i)
-        day_total = queryset.filter(
-            created_at__date=day
-        ).aggregate(total=Sum('total_amount'))['total'] or Decimal('0')
-        
-        daily_trend.append({
-            'date': day,
-            'total': day_total
-        })
-    
+    ).filter(count__gt=0).order_by('-total')[:10]
+
+    # Daily trend (last 30 days) — one grouped query
+    trend_start = today - timedelta(days=29)
+    day_totals = dict(
+        rollups.filter(day__gte=trend_start).values('day').annotate(
+            total=Sum('total_amount')
+        ).values_list('day', 'total')
+    )
+    daily_trend = [
+        {'date': day, 'total': day_totals.get(day) or Decimal('0')}
+        for day in (trend_start + timedelta(days=i) for i in range(30))
+    ]
+
     # Overall stats
-    overall = queryset.aggregate(
-        total_billings=Count('id'),
+    overall = rollups.aggregate(
+        total_billings=Sum('billing_count'),
         total_revenue_sum=Sum('total_amount'),
-        avg_billing=Avg('total_amount'),
         unpaid=Sum(
             Case(
                 When(payment_status='UNPAID', then=F('total_amount')),
                 default=0,
-                output_field=DecimalField(max_digits=14, decimal_places=2)
+                output_field=DecimalField(max_digits=16, decimal_places=2)
             )
         ),
         paid=Sum(
@@ -1026,6 +984,10 @@ def billing_summary_view(request):
             )
         ),
     )
+    overall['avg_billing'] = (
+        overall['total_revenue_sum'] / overall['total_billings']
+        if overall['total_billings'] else None
+    )
     
     context = {
         "date_from": date_from,
@@ -1049,7 +1011,7 @@ def billing_bulk_action_view(request):
     Actions:
     - Mark as invoiced
     - Send reminders
-    - Export to CSV
+    - Export to CSV / XLSX (streamed)
     """
     
     vendor = getattr(request.user, "vendor", None)
@@ -1058,7 +1020,8 @@ def billing_bulk_action_view(request):
     
     if request.method == "POST":
         action = request.POST.get('action')
-        billing_ids = request.POST.getlist('billing_ids')
+        # The list page posts the selection as one comma-separated value
+        billing_ids = [pk for value in request.POST.getlist('billing_ids') for pk in value.split(',') if pk]
         
         if not billing_ids:
             messages.warning(request, 'No billing records selected.')
@@ -1070,12 +1033,11 @@ def billing_bulk_action_view(request):
         )
         
         if action == 'mark_invoiced':
-            count = billings.update(payment_status='INVOICED')
+            count = update_status(billings, 'INVOICED')
             messages.success(request, f'{count} billing record(s) marked as invoiced.')
         
-        elif action == 'export_csv':
-            # Future: Generate CSV export
-            messages.info(request, 'CSV export feature coming soon!')
+        elif action in ('export_csv', 'export_xlsx'):
+            return export_response(billings, fmt=action.split('_')[1], name='billing-selection')
         
         else:
             messages.warning(request, 'Invalid action selected.')
@@ -1083,6 +1045,20 @@ def billing_bulk_action_view(request):
     return redirect('billing:billing_list')
 
 
+@login_required
+def billing_export_view(request):
+    """
+    Stream the filtered billing list as CSV (?format=csv) or XLSX
+    (?format=xlsx). Takes the same filters as billing_list_view.
+    """
+    vendor = getattr(request.user, "vendor", None)
+    if vendor is None:
+        raise PermissionDenied("Only vendors can export billing records.")
+
+    billings = _filter_billings(BillingInformation.objects.filter(vendor=vendor), request.GET)
+    return export_response(billings, fmt=request.GET.get('format', 'csv'))
+
+
 # ==========================================
 # BILLING RECALCULATE VIEW
 # ==========================================
@@ -1107,8 +1083,8 @@ def billing_recalculate_view(request, pk):
     if request.method == "POST":
         old_total = billing.total_amount
         
-        # Force recalculation by saving
-        billing.save()
+        # Re-price every test into fresh line items
+        billing.rebuild_line_items()
         
         new_total = billing.total_amount
         
@@ -1158,17 +1134,12 @@ def billing_print_view(request, pk):
         return redirect('billing:billing_list')
     
     # Get test details
-    test_details = []
-    for assignment in billing.request.test_assignments.all():
-        if billing.price_list:
-            price = assignment.test.get_price_from_price_list(billing.price_list)
-        else:
-            price = assignment.test.price
-        
-        test_details.append({
-            'test': assignment.test,
-            'price': price,
-        })
+    assigned_tests = [assignment.test for assignment in billing.request.test_assignments.all()]
+    prices = price_many(assigned_tests, billing.price_list)
+    test_details = [
+        {'test': test, 'price': prices[test.pk]}
+        for test in assigned_tests
+    ]
     
     context = {
         "billing": billing,
@@ -4,7 +4,7 @@ from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.core.exceptions import PermissionDenied
 from django.core.paginator import Paginator
-from django.db.models import Q, Sum, Count
+from django.db.models import F, Q, Sum, Count
 from django.http import HttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.urls import reverse_lazy, reverse
@@ -67,8 +67,9 @@ def insurance_list_view(request):
     if sort == "name":
         queryset = queryset.order_by("name")
     elif sort == "outstanding":
-        # This would need annotation - simplified for now
-        queryset = queryset.order_by("name")
+        queryset = queryset.order_by(
+            (F("exposure_owed") - F("exposure_paid")).desc(), "name"
+        )
     elif sort == "recent":
         queryset = queryset.order_by("-created_at")
     
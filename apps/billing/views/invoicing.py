@@ -14,9 +14,13 @@ from django.utils import timezone
 # ----- Local app -----
 from ..forms import InvoiceGenerationForm, InvoicePaymentForm
 from ..models import BillingInformation, InsuranceProvider, Invoice, InvoicePayment, D
+from ..services.claims import FORMATTERS, claims_for_invoice, claims_response
+from ..services.exposure import refresh_invoiced
 from ..services.helper import _auto_mark_overdue, _generate_invoice_number
 from ..services.invoice_email import send_invoice_email, send_receipt_email
+from ..services.invoice_pdf_stream import STREAM_THRESHOLD, write_invoice_pdf
 from ..services.invoice_pdf_view import build_invoice_pdf, build_receipt_pdf
+from ..services.rollup import update_status
 
 logger = logging.getLogger(__name__)
 
@@ -490,12 +494,14 @@ def cancel_invoice_view(request, pk):
     try:
         with transaction.atomic():
             # Release billing records so they can be included in a future invoice
-            invoice.billing_records.filter(
-                payment_status='INVOICED'
-            ).update(payment_status='AUTHORIZED')
+            update_status(
+                invoice.billing_records.filter(payment_status='INVOICED'),
+                'AUTHORIZED',
+            )
 
             invoice.status = 'CANCELLED'
             invoice.save(update_fields=['status', 'updated_at'])
+            refresh_invoiced([invoice.insurance_provider_id])
 
         messages.success(
             request,
@@ -613,26 +619,44 @@ def download_invoice_pdf_view(request, pk):
         from django.core.exceptions import PermissionDenied
         raise PermissionDenied
 
+    # Records are read by the PDF builders themselves — no prefetch here
     invoice = get_object_or_404(
-        Invoice.objects.select_related(
-            'insurance_provider', 'vendor', 'created_by'
-        ).prefetch_related(
-            'billing_records',
-            'billing_records__request',
-            'billing_records__request__patient',
-        ),
+        Invoice.objects.select_related('insurance_provider', 'vendor', 'created_by'),
         pk=pk,
         vendor=vendor,
     )
 
-    pdf_bytes = build_invoice_pdf(invoice)
-
     filename = f"Invoice-{invoice.invoice_number}.pdf"
-    response = HttpResponse(pdf_bytes, content_type='application/pdf')
+    if invoice.billing_records.count() > STREAM_THRESHOLD:
+        # Page-at-a-time writer, straight into the response body
+        response = HttpResponse(content_type='application/pdf')
+        write_invoice_pdf(invoice, response)
+    else:
+        response = HttpResponse(build_invoice_pdf(invoice), content_type='application/pdf')
     response['Content-Disposition'] = f'attachment; filename="{filename}"'
     return response
 
 
+@login_required
+def download_invoice_claims_view(request, pk):
+    """
+    The invoice's claims as a zipped claim file (?format=csv|fixed|xml|json).
+
+    URL: /billing/invoices/<uuid:pk>/claims/
+    Name: billing:invoice_claims
+    """
+    vendor = getattr(request.user, 'vendor', None)
+    if not vendor:
+        from django.core.exceptions import PermissionDenied
+        raise PermissionDenied
+
+    invoice = get_object_or_404(Invoice, pk=pk, vendor=vendor)
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in FORMATTERS:
+        fmt = 'csv'
+    return claims_response(claims_for_invoice(invoice), fmt, name=f"Claims-{invoice.invoice_number}")
+
+
 @login_required
 def download_receipt_pdf_view(request, pk, payment_pk):
     """
@@ -26,6 +26,7 @@ from ..forms import (
 )
 # Initialize Paystack payment
 from ..paystack import PaystackAPI, process_paystack_webhook
+from ..services.paystack_inbox import process_pending, record_verified
 
 import logging
 logger = logging.getLogger(__name__)
@@ -120,19 +121,11 @@ def payment_callback_view(request, billing_pk):
     result = paystack.verify_payment(reference)
     
     if result['success'] and result['status'] == 'success':
-        # Create payment record
-        with transaction.atomic():
-            Payment.objects.create(
-                billing=billing,
-                amount=result['amount'],
-                payment_method='TRANSFER',
-                transaction_reference=reference,
-                payment_date=timezone.now(),
-                collected_by=request.user,
-                notes=f"Paystack payment - Channel: {result.get('channel', 'online')}"
-            )
-            # Payment.save() updates billing.payment_status automatically
-        
+        # Goes through the webhook inbox so a webhook for the same reference
+        # (before or after this redirect) cannot record the payment twice
+        record_verified(result, billing=billing, collected_by=request.user)
+        process_pending(references=[reference])
+
         messages.success(
             request,
             f"Payment of ₦{result['amount']:,.2f} received successfully! "
@@ -158,12 +151,13 @@ def payment_callback_view(request, billing_pk):
 def paystack_webhook_view(request):
     """
     Receive Paystack webhook notifications.
-    This handles automatic payment updates.
+    The event is queued in the inbox and acknowledged at once; payments are
+    applied by `manage.py process_paystack_webhooks`.
     """
     if request.method != 'POST':
         return HttpResponse(status=405)
     
-    # Process webhook    
+    # Queue webhook
     success, message = process_paystack_webhook(request)
     
     if success:
@@ -23,11 +23,12 @@ from decimal import Decimal as D
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.db import transaction
-from django.db.models import Count, Sum, Q
+from django.db.models import Count, F, Sum, Q
 from django.shortcuts import get_object_or_404, redirect, render
 from django.utils import timezone
 from ..models import RebateRecord, RebateSettlement, Referrer
 from ..forms import ReferrerForm
+from ..services.rebate_accrual import adjust_unpaid
 
 logger = logging.getLogger(__name__)
 
@@ -129,12 +130,7 @@ def rebate_statement_view(request):
         referrer_balances = (
             Referrer.objects
             .filter(vendor=vendor, is_active=True)
-            .annotate(
-                unpaid_total=Sum(
-                    'rebate_records__rebate_amount',
-                    filter=Q(rebate_records__status='UNPAID')
-                )
-            )
+            .annotate(unpaid_total=F('rebate_unpaid_total'))
         )
 
         return render(request, 'billing/rebate/statement_rebate1.html', {
@@ -183,7 +179,9 @@ def rebate_statement_view(request):
                 if not eligible.exists():
                     raise ValueError("No eligible unpaid records found.")
 
+                moved = eligible.aggregate(total=Sum('rebate_amount'), count=Count('id'))
                 eligible.update(status='INCLUDED', settlement=settlement)
+                adjust_unpaid(referrer.pk, -D(moved['total'] or 0), -moved['count'])
                 settlement.recalculate_totals()
 
             messages.success(
@@ -209,8 +207,6 @@ def settlement_detail_view(request, pk):
     View a RebateSettlement.
     POST actions: approve, mark_paid, cancel.
     """
-    from billing.models.referrer import RebateSettlement
-
     vendor = getattr(request.user, 'vendor', None)
     if not vendor:
         return redirect('dashboard')
@@ -266,7 +262,9 @@ def settlement_detail_view(request, pk):
 
         elif action == 'cancel' and settlement.status in ('DRAFT', 'APPROVED'):
             with transaction.atomic():
+                returned = settlement.rebate_records.aggregate(total=Sum('rebate_amount'), count=Count('id'))
                 settlement.rebate_records.update(status='UNPAID', settlement=None)
+                adjust_unpaid(settlement.referrer_id, D(returned['total'] or 0), returned['count'])
                 settlement.status = 'CANCELLED'
                 settlement.save(update_fields=['status', 'updated_at'])
             messages.warning(
@@ -336,36 +334,25 @@ def referrer_list_view(request):
         Referrer.objects
         .filter(vendor=vendor)
         .annotate(
-            # referral_count=Count('billing_records', distinct=True),
-            referral_count=Count('rebate_records', distinct=True),
-            unpaid_count=Count(
-                'rebate_records',
-                filter=Q(rebate_records__status='UNPAID'),
-                distinct=True,
-            ),
-            unpaid_total=Sum(
-                'rebate_records__rebate_amount',
-                filter=Q(rebate_records__status='UNPAID'),
-            ),
-            lifetime_earned=Sum('rebate_records__rebate_amount'),
+            # Running totals maintained by services/rebate_accrual.py
+            referral_count=F('rebate_earned_count'),
+            unpaid_count=F('rebate_unpaid_count'),
+            unpaid_total=F('rebate_unpaid_total'),
+            lifetime_earned=F('rebate_earned_total'),
         )
         .order_by('name')
     )
 
     # Overall summary for the top metrics strip
+    totals = Referrer.objects.filter(vendor=vendor).aggregate(
+        unpaid=Sum('rebate_unpaid_total'),
+        lifetime=Sum('rebate_earned_total'),
+    )
     summary = {
         'total_partners': referrers.count(),
         'active_partners': referrers.filter(is_active=True).count(),
-        'total_unpaid': D(
-            RebateRecord.objects.filter(
-                referrer__vendor=vendor, status='UNPAID'
-            ).aggregate(t=Sum('rebate_amount'))['t'] or 0
-        ),
-        'total_lifetime': D(
-            RebateRecord.objects.filter(
-                referrer__vendor=vendor
-            ).aggregate(t=Sum('rebate_amount'))['t'] or 0
-        ),
+        'total_unpaid': D(totals['unpaid'] or 0),
+        'total_lifetime': D(totals['lifetime'] or 0),
     }
 
     return render(request, 'billing/rebate/referrer_list.html', {
@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.core'
+
+    def ready(self):
+        # Guarantee buffered log records are written before a Celery worker exits
+        from celery.signals import worker_process_shutdown, worker_shutdown
+        from apps.core.services.log_writer import flush_on_shutdown
+
+        worker_shutdown.connect(flush_on_shutdown, weak=False)
+        worker_process_shutdown.connect(flush_on_shutdown, weak=False)
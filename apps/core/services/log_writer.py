@@ -0,0 +1,243 @@
+"""
+Shared buffered writer for high-volume log tables.
+
+AuditLog, InstrumentLog and DocumentAuditLog rows used to be INSERTed one at
+a time on the request path. Callers now hand records to ``log_writer`` which
+buffers them and flushes with ``bulk_create`` once either threshold is hit:
+
+  - LOG_WRITER_BATCH_SIZE      records waiting for one model (default 100)
+  - LOG_WRITER_FLUSH_INTERVAL  seconds since the first buffered record (default 5)
+
+Backends (LOG_WRITER_BACKEND):
+  - 'memory' : per-process buffer (default)
+  - 'redis'  : shared Redis list per model, drained by whichever process flushes
+  - 'sync'   : no buffering, one INSERT per record (tests / debugging)
+
+Compliance-critical events (result release, amendments, access changes,
+document approvals) pass ``critical=True`` and are written synchronously,
+inside the caller's transaction, exactly as before.
+
+Each record's created_at / timestamp is taken when write() is called, not
+when the buffer is flushed, so the audit trail keeps event order.
+
+Buffered records are only enqueued once the surrounding transaction commits,
+so a rolled-back request never leaves an orphan log row behind.
+
+Usage:
+    from apps.core.services.log_writer import log_writer
+
+    log_writer.write(AuditLog, vendor=vendor, user=user, action="...")
+    log_writer.write(AuditLog, critical=True, vendor=vendor, user=user, action="...")
+"""
+import atexit
+import json
+import logging
+import threading
+from collections import defaultdict
+
+from django.apps import apps
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+REDIS_KEY_PREFIX = "log_writer"
+
+# Event-time fields, set in write(); the models default them to timezone.now
+# rather than auto_now_add, which bulk_create would overwrite with flush time
+TIMESTAMP_FIELDS = ('created_at', 'timestamp')
+
+
+class BufferedLogWriter:
+    """Buffers unsaved log model instances and flushes them in bulk."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._buffers = defaultdict(list)   # model label -> [unsaved instances]
+        self._timer = None
+
+    # ── Configuration ────────────────────────────────────────────────────────
+
+    @property
+    def backend(self) -> str:
+        return getattr(settings, 'LOG_WRITER_BACKEND', 'memory')
+
+    @property
+    def batch_size(self) -> int:
+        return getattr(settings, 'LOG_WRITER_BATCH_SIZE', 100)
+
+    @property
+    def flush_interval(self) -> float:
+        return getattr(settings, 'LOG_WRITER_FLUSH_INTERVAL', 5)
+
+    # ── Public API ───────────────────────────────────────────────────────────
+
+    def write(self, model, critical: bool = False, **fields):
+        """
+        Record one log row for ``model``.
+
+        ``fields`` are the model's constructor kwargs (FK objects or *_id both work).
+        Returns the saved instance for critical/sync writes, otherwise None.
+        """
+        instance = model(**fields)
+        self._stamp(instance, fields, timezone.now())
+
+        if critical or self.backend == 'sync':
+            instance.save()
+            return instance
+
+        transaction.on_commit(lambda: self._enqueue(instance))
+        return None
+
+    @staticmethod
+    def _stamp(instance, fields, now):
+        """Fix the event time now, so rows flushed later keep it (and their order)."""
+        for name in TIMESTAMP_FIELDS:
+            if name not in fields and any(f.name == name for f in instance._meta.concrete_fields):
+                setattr(instance, name, now)
+
+    def flush(self, model=None) -> int:
+        """
+        Write every buffered record (or only those of ``model``) to the database.
+        Returns the number of rows written.
+        """
+        labels = [model._meta.label] if model else None
+
+        if self.backend == 'redis':
+            return self._flush_redis(labels)
+
+        with self._lock:
+            if labels is None:
+                labels = list(self._buffers)
+            pending = {label: self._buffers.pop(label, []) for label in labels}
+            if not self._buffers:
+                self._cancel_timer()
+
+        written = 0
+        for label, instances in pending.items():
+            written += self._bulk_write(apps.get_model(label), instances)
+        return written
+
+    def pending_count(self) -> int:
+        """Number of records waiting in this process's buffer (memory backend)."""
+        with self._lock:
+            return sum(len(items) for items in self._buffers.values())
+
+    # ── Buffering ────────────────────────────────────────────────────────────
+
+    def _enqueue(self, instance):
+        label = instance._meta.label
+
+        if self.backend == 'redis':
+            size = self._redis_push(label, instance)
+        else:
+            with self._lock:
+                self._buffers[label].append(instance)
+                size = len(self._buffers[label])
+
+        if size >= self.batch_size:
+            self.flush(type(instance))
+        else:
+            self._schedule_timer()
+
+    def _schedule_timer(self):
+        with self._lock:
+            if self._timer is not None:
+                return
+            self._timer = threading.Timer(self.flush_interval, self._timed_flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _cancel_timer(self):
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = None
+
+    def _timed_flush(self):
+        with self._lock:
+            self._timer = None
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("Timed log flush failed")
+        finally:
+            # Timer threads get their own DB connection — release it.
+            connection.close()
+
+    # ── Persistence ──────────────────────────────────────────────────────────
+
+    def _bulk_write(self, model, instances) -> int:
+        if not instances:
+            return 0
+        try:
+            model.objects.bulk_create(instances, batch_size=self.batch_size)
+            return len(instances)
+        except Exception:
+            logger.exception(
+                "bulk_create of %s %s rows failed; retrying row by row",
+                len(instances), model._meta.label,
+            )
+
+        written = 0
+        for instance in instances:
+            try:
+                instance.save()
+                written += 1
+            except Exception:
+                logger.exception("Dropping unwritable %s record", model._meta.label)
+        return written
+
+    # ── Redis backend ────────────────────────────────────────────────────────
+
+    def _redis(self):
+        from django_redis import get_redis_connection
+        return get_redis_connection('default')
+
+    def _redis_key(self, label: str) -> str:
+        return f"{REDIS_KEY_PREFIX}:{label}"
+
+    def _redis_push(self, label: str, instance) -> int:
+        row = {
+            field.attname: getattr(instance, field.attname)
+            for field in instance._meta.concrete_fields
+            if not field.primary_key
+        }
+        return self._redis().rpush(self._redis_key(label), json.dumps(row, cls=DjangoJSONEncoder))
+
+    def _flush_redis(self, labels=None) -> int:
+        client = self._redis()
+        if labels is None:
+            labels = [
+                key.decode().split(':', 1)[1]
+                for key in client.scan_iter(match=f"{REDIS_KEY_PREFIX}:*")
+            ]
+
+        with self._lock:
+            self._cancel_timer()
+
+        written = 0
+        for label in labels:
+            model = apps.get_model(label)
+            while True:
+                raw = client.lpop(self._redis_key(label), self.batch_size)
+                if not raw:
+                    break
+                instances = [model(**json.loads(item)) for item in raw]
+                written += self._bulk_write(model, instances)
+        return written
+
+
+log_writer = BufferedLogWriter()
+
+
+def flush_on_shutdown(*args, **kwargs):
+    """Drain every buffer; connected to process exit and Celery worker shutdown."""
+    try:
+        log_writer.flush()
+    except Exception:
+        logger.exception("Log flush on shutdown failed")
+
+
+atexit.register(flush_on_shutdown)
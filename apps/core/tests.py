@@ -1,3 +1,56 @@
-from django.test import TestCase
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from apps.core.services.log_writer import log_writer
+from apps.labs.models import AuditLog
+from apps.tenants.models import Vendor
+
+
+@override_settings(LOG_WRITER_BACKEND='memory', LOG_WRITER_BATCH_SIZE=3, LOG_WRITER_FLUSH_INTERVAL=60)
+class BufferedLogWriterTest(TestCase):
+    def setUp(self):
+        self.vendor = Vendor.objects.create(name="Log Vendor", contact_email="logs@vendor.test")
+        log_writer.flush()
+
+    def tearDown(self):
+        log_writer.flush()
+
+    def test_critical_write_is_synchronous(self):
+        log_writer.write(AuditLog, critical=True, vendor=self.vendor, action="RESULT RELEASED")
+        self.assertEqual(AuditLog.objects.filter(vendor=self.vendor).count(), 1)
+
+    def test_routine_writes_wait_for_commit_and_batch_size(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            log_writer.write(AuditLog, vendor=self.vendor, action="first")
+            log_writer.write(AuditLog, vendor=self.vendor, action="second")
+            # Nothing is enqueued until the transaction commits
+            self.assertEqual(log_writer.pending_count(), 0)
+
+        self.assertEqual(log_writer.pending_count(), 2)
+        self.assertEqual(AuditLog.objects.filter(vendor=self.vendor).count(), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            log_writer.write(AuditLog, vendor=self.vendor, action="third")
+
+        # Third record reached the batch size and triggered a bulk flush
+        self.assertEqual(log_writer.pending_count(), 0)
+        self.assertEqual(AuditLog.objects.filter(vendor=self.vendor).count(), 3)
+
+    def test_explicit_flush_drains_buffer(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            log_writer.write(AuditLog, vendor=self.vendor, action="pending")
+
+        self.assertEqual(log_writer.flush(), 1)
+        self.assertEqual(AuditLog.objects.filter(vendor=self.vendor).count(), 1)
+
+    def test_buffered_rows_keep_event_time(self):
+        logged_at = timezone.now() - timedelta(minutes=5)
+        with mock.patch('apps.core.services.log_writer.timezone.now', return_value=logged_at):
+            with self.captureOnCommitCallbacks(execute=True):
+                log_writer.write(AuditLog, vendor=self.vendor, action="earlier")
+
+        log_writer.flush()
+        self.assertEqual(AuditLog.objects.get(vendor=self.vendor).created_at, logged_at)
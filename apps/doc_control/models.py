@@ -388,7 +388,7 @@ class DocumentAuditLog(models.Model):
     user_agent = models.CharField(max_length=255, blank=True)
     
     # Timestamp
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(default=timezone.now)  # set when logged, not when log_writer flushes
     
     class Meta:
         ordering = ['-timestamp']
@@ -6,6 +6,8 @@ from .models import (
     DocumentApproval, DocumentDistribution, DocumentTraining,
     DocumentAuditLog
 )
+from apps.core.services.log_writer import log_writer
+from apps.notification.outbox import enqueue_email
 
 
 @receiver(post_save, sender=ControlledDocument)
@@ -26,7 +28,8 @@ def document_post_save(sender, instance, created, **kwargs):
     
     # Only create audit log if we have the necessary information
     if instance.vendor and instance.updated_by:
-        DocumentAuditLog.objects.create(
+        log_writer.write(
+            DocumentAuditLog,
             vendor=instance.vendor,
             document=instance,
             action=action,
@@ -42,7 +45,8 @@ def document_post_save(sender, instance, created, **kwargs):
 def document_version_created(sender, instance, created, **kwargs):
     """Create audit log when new version is created"""
     if created and instance.document:
-        DocumentAuditLog.objects.create(
+        log_writer.write(
+            DocumentAuditLog,
             vendor=instance.vendor,
             document=instance.document,
             action='updated',
@@ -61,7 +65,9 @@ def document_approval_created(sender, instance, created, **kwargs):
         action = 'approved' if instance.approval_status == 'approved' else 'rejected'
         description = f'Document {action} by {instance.approver.get_full_name() or instance.approver.username}'
         
-        DocumentAuditLog.objects.create(
+        log_writer.write(
+            DocumentAuditLog,
+            critical=True,
             vendor=instance.vendor,
             document=instance.document,
             action=action,
@@ -85,7 +91,8 @@ def document_approval_created(sender, instance, created, **kwargs):
 def document_distribution_created(sender, instance, created, **kwargs):
     """Create audit log when document is distributed"""
     if created:
-        DocumentAuditLog.objects.create(
+        log_writer.write(
+            DocumentAuditLog,
             vendor=instance.vendor,
             document=instance.document,
             action='distributed',
@@ -105,7 +112,8 @@ def document_acknowledged(sender, instance, created, **kwargs):
         try:
             old_instance = DocumentDistribution.objects.get(pk=instance.pk)
             if not old_instance.acknowledged:  # This is a new acknowledgment
-                DocumentAuditLog.objects.create(
+                log_writer.write(
+                    DocumentAuditLog,
                     vendor=instance.vendor,
                     document=instance.document,
                     action='viewed',  # Using 'viewed' action for acknowledgment
@@ -148,7 +156,9 @@ def document_deleted(sender, instance, **kwargs):
     # Note: In production, you might want to use soft delete instead of hard delete
     # This is just for tracking if hard delete is used
     if instance.vendor:
-        DocumentAuditLog.objects.create(
+        log_writer.write(
+            DocumentAuditLog,
+            critical=True,
             vendor=instance.vendor,
             document=None,  # Document is deleted
             action='retired',
@@ -252,20 +262,20 @@ def verify_file_integrity(sender, instance, **kwargs):
             pass
 
 
-# Notification triggers (placeholder for email/notification system)
+# Notification triggers (queued on the notification outbox)
 @receiver(post_save, sender=DocumentReview)
 def send_review_notification(sender, instance, created, **kwargs):
     """
     Send notification to reviewer when review is assigned
     """
     if created:
-        # TODO: Implement email notification
-        # send_mail(
-        #     subject=f'Document Review Assigned: {instance.document.document_number}',
-        #     message=f'You have been assigned to review {instance.document.title}',
-        #     recipient_list=[instance.reviewer.email]
-        # )
-        pass
+        enqueue_email(
+            f'Document Review Assigned: {instance.document.document_number}',
+            f'You have been assigned to review {instance.document.title} (due {instance.due_date}).',
+            [instance.reviewer.email],
+            dedupe_key=f"doc-review:{instance.pk}",
+            vendor=instance.vendor,
+        )
 
 
 @receiver(post_save, sender=DocumentDistribution)
@@ -274,10 +284,10 @@ def send_distribution_notification(sender, instance, created, **kwargs):
     Send notification when document is distributed
     """
     if created:
-        # TODO: Implement email notification
-        # send_mail(
-        #     subject=f'New Document: {instance.document.document_number}',
-        #     message=f'A new document has been distributed to you: {instance.document.title}',
-        #     recipient_list=[instance.distributed_to.email]
-        # )
-        pass
\ No newline at end of file
+        enqueue_email(
+            f'New Document: {instance.document.document_number}',
+            f'A new document has been distributed to you: {instance.document.title}',
+            [instance.distributed_to.email],
+            dedupe_key=f"doc-distribution:{instance.pk}",
+            vendor=instance.vendor,
+        )
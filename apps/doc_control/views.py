@@ -8,6 +8,8 @@ from django.core.paginator import Paginator
 from datetime import timedelta
 import hashlib
 
+from apps.core.services.log_writer import log_writer
+
 from .models import (
     DocumentCategory, ControlledDocument, DocumentVersion,
     DocumentReview, DocumentApproval, DocumentDistribution,
@@ -29,15 +31,26 @@ def get_user_vendor(request):
     return None
 
 
+# Audit actions that must hit the database before the response is returned
+CRITICAL_AUDIT_ACTIONS = {'approved', 'rejected', 'obsoleted', 'retired'}
+
+
 def create_audit_log(document, action, user, description, request, old_value='', new_value=''):
-    """Helper function to create audit log entries"""
+    """
+    Helper function to create audit log entries.
+
+    Routine entries (views, downloads, edits) go through the buffered log writer;
+    approval-type actions are written synchronously.
+    """
     x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
     if x_forwarded_for:
         ip_address = x_forwarded_for.split(',')[0]
     else:
         ip_address = request.META.get('REMOTE_ADDR', '0.0.0.0')
     
-    DocumentAuditLog.objects.create(
+    log_writer.write(
+        DocumentAuditLog,
+        critical=action in CRITICAL_AUDIT_ACTIONS,
         vendor=document.vendor,
         document=document,
         action=action,
@@ -0,0 +1,43 @@
+# apps/labs/consumers.py
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+
+from .models import Department
+from .services import worklist
+
+
+class WorklistConsumer(AsyncJsonWebsocketConsumer):
+    """
+    Live worklist for bench screens: ws/worklist/ (whole lab) or
+    ws/worklist/<department_id>/. Sends a stats snapshot on connect, then
+    forwards worklist deltas (labs/services/worklist.py).
+    """
+
+    async def connect(self):
+        user = self.scope["user"]
+        vendor_id = getattr(user, "vendor_id", None)
+        if user.is_anonymous or not vendor_id:
+            await self.close()
+            return
+
+        department_id = self.scope["url_route"]["kwargs"].get("department_id")
+        if department_id and not await self._department_exists(vendor_id, department_id):
+            await self.close()
+            return
+
+        self.group_name = worklist.group_name(vendor_id, department_id)
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+        stats = await database_sync_to_async(worklist.snapshot)(vendor_id, department_id)
+        await self.send_json({"kind": "snapshot", "department": department_id, "stats": stats})
+
+    async def disconnect(self, code):
+        if hasattr(self, "group_name"):
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def worklist_delta(self, event):
+        await self.send_json(event["delta"])
+
+    @database_sync_to_async
+    def _department_exists(self, vendor_id, department_id):
+        return Department.objects.filter(pk=department_id, vendor_id=vendor_id).exists()
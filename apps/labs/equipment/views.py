@@ -8,6 +8,7 @@ from django.db import transaction
 from django.views.decorators.http import require_http_methods
 from django.http import JsonResponse
 from labs.models import Equipment, Department, AuditLog
+from apps.core.services.log_writer import log_writer
 from ..forms import EquipmentForm
 
 
@@ -42,7 +43,8 @@ def equipment_create(request):
                     equipment.save()
 
                     # Log audit
-                    AuditLog.objects.create(
+                    log_writer.write(
+                        AuditLog,
                         vendor=request.user.vendor,
                         user=request.user,
                         action=f"Created equipment: {equipment.name} ({equipment.serial_number})",
@@ -150,7 +152,8 @@ def equipment_update(request, equipment_id):
             
             # Log the changes
             if changes:
-                AuditLog.objects.create(
+                log_writer.write(
+                    AuditLog,
                     vendor=request.user.vendor,
                     user=request.user,
                     action=f"Updated equipment {equipment.name}: {', '.join(changes)}",
@@ -190,7 +193,8 @@ def equipment_calibrate(request, equipment_id):
     equipment.last_calibrated = timezone.now().date()
     equipment.save(update_fields=['last_calibrated'])
     
-    AuditLog.objects.create(
+    log_writer.write(
+        AuditLog,
         vendor=request.user.vendor,
         user=request.user,
         action=f"Calibrated equipment: {equipment.name}",
@@ -215,7 +219,8 @@ def equipment_deactivate(request, equipment_id):
     equipment.status = new_status
     equipment.save(update_fields=['status'])
     
-    AuditLog.objects.create(
+    log_writer.write(
+        AuditLog,
         vendor=request.user.vendor,
         user=request.user,
         action=f"Changed equipment {equipment.name} status to {new_status}",
@@ -70,6 +70,7 @@ class VendorLabTestForm(forms.ModelForm):
             'amr_low', 'amr_high',
             'reportable_low', 'reportable_high',
             'panic_low_value', 'panic_high_value',
+            'tea_percent',
             
             # Advanced
             'general_comment_template',
@@ -658,14 +659,9 @@ class TestRequestForm(forms.ModelForm):
             provider = self.cleaned_data.get('insurance_provider')
             price_list = getattr(provider, 'price_list', None)
 
-        total = Decimal('0.00')
-        for test in tests:
-            if price_list and callable(getattr(test, 'get_price_from_price_list', None)):
-                total += Decimal(test.get_price_from_price_list(price_list))
-            else:
-                total += Decimal(getattr(test, 'price', 0))
+        from apps.billing.services.pricing import price_many
 
-        return total
+        return sum(price_many(tests, price_list).values(), Decimal('0.00'))
 
     # ─────────────────────────────────────────────
     # Save
@@ -1142,6 +1138,27 @@ class QCEntryForm(forms.ModelForm):
             raise forms.ValidationError("Invalid numeric value")
 
 
+
+class QCImportForm(forms.Form):
+    FORMAT_CHOICES = [
+        ('', 'Auto-detect'),
+        ('csv', 'CSV'),
+        ('json', 'JSON'),
+        ('astm', 'ASTM (E1394)'),
+    ]
+
+    file = forms.FileField(widget=forms.ClearableFileInput(attrs={'class': 'file-input file-input-bordered w-full'}))
+    format = forms.ChoiceField(choices=FORMAT_CHOICES, required=False,
+                               widget=forms.Select(attrs={'class': 'form-select'}))
+    instrument = forms.ModelChoiceField(queryset=None, required=False,
+                                        help_text="Used when the file does not name an instrument",
+                                        widget=forms.Select(attrs={'class': 'form-select'}))
+
+    def __init__(self, vendor, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['instrument'].queryset = vendor.equipment_set.all()
+
+
 class QCActionForm(forms.ModelForm):
     class Meta:
         model = QCAction
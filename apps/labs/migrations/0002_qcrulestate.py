@@ -0,0 +1,30 @@
+# Generated by Django 5.2.7 on 2026-10-18 20:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('labs', '0001_initial'),
+        ('tenants', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QCRuleState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(choices=[('LOT', 'Per QC lot'), ('TEST', 'Per test (all levels)')], max_length=4)),
+                ('window', models.JSONField(blank=True, default=list)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('qc_lot', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='rule_states', to='labs.qclot')),
+                ('test', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='qc_rule_states', to='labs.vendortest')),
+                ('vendor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='qc_rule_states', to='tenants.vendor')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(condition=models.Q(('scope', 'LOT')), fields=('vendor', 'qc_lot'), name='unique_qc_rule_state_lot'), models.UniqueConstraint(condition=models.Q(('scope', 'TEST')), fields=('vendor', 'test'), name='unique_qc_rule_state_test')],
+            },
+        ),
+    ]
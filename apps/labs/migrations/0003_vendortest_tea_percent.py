@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 21:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('labs', '0002_qcrulestate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vendortest',
+            name='tea_percent',
+            field=models.DecimalField(blank=True, decimal_places=2, help_text='Total allowable error (TEa, %) used for QC Sigma metrics, e.g. 10 for glucose (CLIA)', max_digits=5, null=True),
+        ),
+    ]
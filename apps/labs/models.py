@@ -6,6 +6,7 @@ import uuid
 from django.db.models import Max
 from django.utils.text import slugify
 from .utils import get_next_sequence
+from apps.core.services.log_writer import log_writer
 from decimal import Decimal
 from datetime import date
 
@@ -122,6 +123,10 @@ class VendorTest(models.Model):
     # Panic / critical values
     panic_low_value = models.DecimalField(max_digits=12, decimal_places=6, null=True, blank=True, help_text="Critical low (panic) threshold")
     panic_high_value = models.DecimalField(max_digits=12, decimal_places=6, null=True, blank=True, help_text="Critical high (panic) threshold")
+
+    # Quality goal for Sigma metrics
+    tea_percent = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True,
+        help_text="Total allowable error (TEa, %) used for QC Sigma metrics, e.g. 10 for glucose (CLIA)")
     
     # 🆕 PATIENT PREPARATION & INFORMATION
     preparation_required = models.BooleanField(
@@ -217,19 +222,13 @@ class VendorTest(models.Model):
         Get test price from a specific price list.
         Returns default price if not found in price list.
         """
-        from apps.billing.models import TestPrice
-        
+        from apps.billing.services.pricing import price_for
+
         if not price_list:
             return self.price
-        
-        try:
-            test_price = TestPrice.objects.get(
-                price_list=price_list,
-                test=self
-            )
-            return test_price.price
-        except TestPrice.DoesNotExist:
-            return self.price
+
+        # Cached per-price-list matrix — see billing/services/pricing.py
+        return price_for(self, price_list)
     
     # 🆕 ORDERING HELPERS
     def can_be_ordered_by_patient(self):
@@ -408,6 +407,13 @@ class Sample(models.Model):
             )
         ]
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if 'status' in instance.__dict__:
+            instance._worklist_status = instance.status  # live worklist deltas (labs/signals.py)
+        return instance
+
     def save(self, *args, **kwargs):
         """Auto-generate unique sample ID if not set."""
         if not self.sample_id:
@@ -420,7 +426,8 @@ class Sample(models.Model):
         self.verified_at = timezone.now()
         self.save(update_fields=['verified_by', 'verified_at'])
 
-        AuditLog.objects.create(
+        log_writer.write(
+            AuditLog,
             vendor=self.vendor,
             user=user,
             action=f"Sample {self.sample_id} verified for TestRequest {self.test_request.request_id}.",
@@ -441,7 +448,8 @@ class Sample(models.Model):
         for assignment in test_request.assignments.filter(sample=self, status='P'):
             assignment.mark_queued()
 
-        AuditLog.objects.create(
+        log_writer.write(
+            AuditLog,
             vendor=self.vendor,
             user=user,
             action=f"Sample {self.sample_id} accepted and queued for analysis.",
@@ -461,7 +469,8 @@ class Sample(models.Model):
             test_request.status = 'RJ'
             test_request.save(update_fields=['status'])
 
-        AuditLog.objects.create(
+        log_writer.write(
+            AuditLog,
             vendor=self.vendor,
             user=user,
             action=f"Sample {self.sample_id} rejected.",
@@ -472,7 +481,8 @@ class Sample(models.Model):
         self.status = 'ST'
         self.save(update_fields=['status'])
 
-        AuditLog.objects.create(
+        log_writer.write(
+            AuditLog,
             vendor=self.vendor,
             user=user,
             action=f"Sample {self.sample_id} stored post-analysis."
@@ -483,7 +493,8 @@ class Sample(models.Model):
         self.status = 'CO'
         self.save(update_fields=['status'])
 
-        AuditLog.objects.create(
+        log_writer.write(
+            AuditLog,
             vendor=self.vendor,
             user=user,
             action=f"Sample {self.sample_id} marked as consumed."
@@ -769,6 +780,13 @@ class TestAssignment(models.Model):
             models.Index(fields=['external_id']),
         ]
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if 'status' in instance.__dict__:
+            instance._worklist_status = instance.status  # live worklist deltas (labs/signals.py)
+        return instance
+
     def can_send_to_instrument(self):
         """Check if assignment can be sent to instrument"""
         return (
@@ -961,6 +979,13 @@ class TestResult(models.Model):
             models.Index(fields=['flag', 'data_source']),
         ]
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if 'status' in instance.__dict__:
+            instance._worklist_status = instance.status  # live worklist deltas (labs/signals.py)
+        return instance
+
     # ===========================
     # STATE TRANSITIONS (STRICT)
     # ===========================
@@ -1223,7 +1248,7 @@ class InstrumentLog(models.Model):
     response_code = models.IntegerField(null=True, blank=True)
     error_message = models.TextField(blank=True)
     
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(default=timezone.now)  # set when logged, not when log_writer flushes
     
     class Meta:
         ordering = ['-created_at']
@@ -1241,7 +1266,7 @@ class AuditLog(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, on_delete=models.SET_NULL)
     action = models.TextField()
     ip_address = models.GenericIPAddressField(null=True, blank=True)
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(default=timezone.now)  # set when logged, not when log_writer flushes
     
     class Meta:
         ordering = ['-created_at']
@@ -1491,6 +1516,38 @@ class QCResult(models.Model):
     # MAIN SAVE: ALWAYS SAFE
     # ---------------------------
     def save(self, *args, **kwargs):
+        self.calculate_metrics()
+
+        # Partial saves that don't touch the value (e.g. corrective_action) skip the rules
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'result_value' not in update_fields:
+            super().save(*args, **kwargs)
+            return
+
+        # Westgard rules are evaluated BEFORE saving so violations go out in the same write
+        from .services.westgard import WestgardEngine
+
+        with transaction.atomic():
+            engine = WestgardEngine(self.vendor)
+            engine.load([self.qc_lot])
+            self.rule_violations = engine.record(self)
+
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | {'z_score', 'status', 'rule_violations'}
+            super().save(*args, **kwargs)
+
+            engine.assign_ids()
+            engine.persist()
+
+    def delete(self, *args, **kwargs):
+        from .services.westgard import invalidate
+
+        with transaction.atomic():
+            invalidate(self.qc_lot)
+            return super().delete(*args, **kwargs)
+
+    def calculate_metrics(self):
+        """Validate the value and set z_score, status and PASS auto-approval (no queries)."""
         # Validate result_value
         result = to_decimal(self.result_value)
         if result is None:
@@ -1514,12 +1571,6 @@ class QCResult(models.Model):
             self.is_approved = True
             self.approved_at = timezone.now()
 
-        # Save the QC result
-        super().save(*args, **kwargs)
-
-        # Only AFTER saving: apply Westgard rules
-        self.apply_westgard()
-
     # ---------------------------
     # STATUS DECISION
     # ---------------------------
@@ -1542,52 +1593,51 @@ class QCResult(models.Model):
 
         return 'PASS'
 
-    # ---------------------------
-    # WESTGARD RULES
-    # ---------------------------
-    def apply_westgard(self):
-        recent = QCResult.objects.filter(
-            qc_lot=self.qc_lot
-        ).order_by('-run_date', '-run_time')[:10]
-
-        if len(recent) < 2:
-            return
-
-        values = [to_decimal(r.result_value) for r in recent if to_decimal(r.result_value) is not None]
-        z = [to_decimal(r.z_score) or Decimal(0) for r in recent]
-
-        v = []
+    def __str__(self):
+        return f"{self.qc_lot} – {self.result_value}"
 
-        # 1-3s
-        if abs(z[0]) > 3:
-            v.append("1₃ₛ: |Z| > 3")
+class QCRuleState(models.Model):
+    """
+    Rolling Westgard window, maintained incrementally by services/westgard.py.
 
-        # 2-2s
-        if len(z) >= 2 and ((z[0] > 2 and z[1] > 2) or (z[0] < -2 and z[1] < -2)):
-            v.append("2₂ₛ: Two values > ±2")
+    scope LOT  -> last runs of one QC lot (single level)
+    scope TEST -> last runs of a test across all of its levels/lots
+    Rows are a cache: deleting them is safe, they are rebuilt from QCResult.
+    """
+    SCOPE_CHOICES = [
+        ('LOT', 'Per QC lot'),
+        ('TEST', 'Per test (all levels)'),
+    ]
 
-        # R-4s
-        sd = to_decimal(self.qc_lot.sd)
-        if len(values) >= 2 and sd:
-            if abs(values[0] - values[1]) > 4 * sd:
-                v.append("R₄ₛ: Range > 4SD")
+    vendor = models.ForeignKey(Vendor, on_delete=models.CASCADE, related_name='qc_rule_states')
+    test = models.ForeignKey(VendorTest, on_delete=models.CASCADE, related_name='qc_rule_states')
+    qc_lot = models.ForeignKey(QCLot, null=True, blank=True, on_delete=models.CASCADE, related_name='rule_states')
+    scope = models.CharField(max_length=4, choices=SCOPE_CHOICES)
+    window = models.JSONField(default=list, blank=True)
 
-        # 4-1s
-        if len(z) >= 4:
-            if all(x > 1 for x in z[:4]) or all(x < -1 for x in z[:4]):
-                v.append("4₁ₛ: Four values > ±1 (same side)")
+    updated_at = models.DateTimeField(auto_now=True)
 
-        # 10x
-        if len(z) >= 10:
-            if all(x > 0 for x in z[:10]) or all(x < 0 for x in z[:10]):
-                v.append("10x: Ten on same side of mean")
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['vendor', 'qc_lot'],
+                condition=models.Q(scope='LOT'),
+                name='unique_qc_rule_state_lot',
+            ),
+            models.UniqueConstraint(
+                fields=['vendor', 'test'],
+                condition=models.Q(scope='TEST'),
+                name='unique_qc_rule_state_test',
+            ),
+        ]
 
-        if v != self.rule_violations:
-            self.rule_violations = v
-            super().save(update_fields=['rule_violations'])
+    @property
+    def key(self):
+        return (self.scope, self.qc_lot_id if self.scope == 'LOT' else self.test_id)
 
     def __str__(self):
-        return f"{self.qc_lot} – {self.result_value}"
+        return f"{self.scope} window – {self.qc_lot or self.test}"
+
 
 class QCAction(models.Model):
     """
@@ -0,0 +1,8 @@
+# apps/labs/routing.py
+from django.urls import path
+from .consumers import WorklistConsumer
+
+websocket_urlpatterns = [
+    path("ws/worklist/", WorklistConsumer.as_asgi()),
+    path("ws/worklist/<int:department_id>/", WorklistConsumer.as_asgi()),
+]
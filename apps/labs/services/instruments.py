@@ -7,6 +7,7 @@ import logging
 from typing import Optional, Dict, Any
 from django.conf import settings
 from django.utils import timezone
+from apps.core.services.log_writer import log_writer
 from ..models import TestAssignment, TestResult, InstrumentLog, Equipment
 
 logger = logging.getLogger(__name__)
@@ -48,8 +49,9 @@ class InstrumentService:
         response_code: Optional[int] = None,
         error_message: str = ""
     ):
-        """Log all instrument communications"""
-        InstrumentLog.objects.create(
+        """Log all instrument communications (buffered, flushed in bulk)"""
+        log_writer.write(
+            InstrumentLog,
             assignment=assignment,
             instrument=self.instrument,
             log_type=log_type,
@@ -0,0 +1,394 @@
+"""
+Bulk QC import from instrument exports.
+
+Accepts three feeds and normalises them to the same row dict:
+  - CSV  : header row with lot_number, test_code, level, value, run_date, run_time,
+           run_number, instrument (serial number), comments — only lot_number and
+           value are required
+  - JSON : a list of row objects, or {"results": [...]} with the same keys
+  - ASTM : raw E1394 message text as relayed by an instrument interface.
+           O record specimen ID = QC lot number (optionally "LOT^L2"),
+           R record = ^^^TESTCODE | value | units | ... | completed date/time
+
+The whole batch is processed with a fixed number of queries:
+  1. QC lots for every lot number in the file (one query)
+  2. instruments by serial number (one query)
+  3. existing run counts per lot/day (one aggregate query)
+  4. Westgard state for all affected lots/tests (services/westgard.py)
+  5. bulk_create of the QCResult rows
+  6. one QCTestApproval refresh per test per day (bulk create/update + one M2M insert)
+"""
+import csv
+import io
+import json
+import logging
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import date, datetime, time
+from typing import Dict, Iterable, List, Optional
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from apps.core.services.log_writer import log_writer
+from ..models import AuditLog, Equipment, QCLot, QCResult, QCTestApproval, to_decimal
+from .westgard import WestgardEngine
+
+logger = logging.getLogger(__name__)
+
+IMPORT_FORMATS = ('csv', 'json', 'astm')
+
+
+@dataclass
+class QCImportResult:
+    """Outcome of a bulk QC import."""
+    created: List[QCResult] = field(default_factory=list)
+    errors: List[str] = field(default_factory=list)
+    approvals_updated: int = 0
+
+    @property
+    def created_count(self) -> int:
+        return len(self.created)
+
+    @property
+    def failed_count(self) -> int:
+        return len(self.errors)
+
+    @property
+    def violation_count(self) -> int:
+        return sum(1 for r in self.created if r.rule_violations)
+
+
+# ─────────────────────────────────────────
+# Parsers
+# ─────────────────────────────────────────
+
+def _clean(value) -> str:
+    return str(value).strip() if value is not None else ''
+
+
+def parse_csv(content: str) -> List[Dict]:
+    reader = csv.DictReader(io.StringIO(content))
+    return [
+        {(key or '').strip().lower(): _clean(value) for key, value in row.items()}
+        for row in reader
+    ]
+
+
+def parse_json(content: str) -> List[Dict]:
+    data = json.loads(content)
+    if isinstance(data, dict):
+        data = data.get('results', [])
+    if not isinstance(data, list):
+        raise ValueError("JSON QC import must be a list of results")
+    return [{str(k).lower(): v for k, v in row.items()} for row in data if isinstance(row, dict)]
+
+
+def _astm_datetime(value: str):
+    """YYYYMMDD[HHMMSS] → (date, time) or (None, None)."""
+    value = value.strip()
+    try:
+        if len(value) >= 14:
+            dt = datetime.strptime(value[:14], '%Y%m%d%H%M%S')
+            return dt.date(), dt.time()
+        if len(value) >= 8:
+            return datetime.strptime(value[:8], '%Y%m%d').date(), None
+    except ValueError:
+        pass
+    return None, None
+
+
+def parse_astm(content: str) -> List[Dict]:
+    """Extract QC results from ASTM E1394 records (frame numbers/control chars tolerated)."""
+    rows = []
+    lot_number, level = '', ''
+
+    for raw in content.replace('\r\n', '\n').replace('\r', '\n').split('\n'):
+        line = ''.join(ch for ch in raw if ch >= ' ' or ch == '\t').strip()
+        # Drop the frame number in front of the record type ("1H|...", "2O|...")
+        if len(line) > 1 and line[0].isdigit() and line[1].isalpha():
+            line = line[1:]
+        if len(line) < 2 or line[1] != '|':
+            continue
+
+        fields = line.split('|')
+        record_type = fields[0].upper()
+
+        if record_type == 'O':
+            specimen = fields[2] if len(fields) > 2 else ''
+            parts = specimen.split('^')
+            lot_number = parts[0].strip()
+            level = parts[1].strip() if len(parts) > 1 else ''
+
+        elif record_type == 'R' and lot_number:
+            test_id = fields[2] if len(fields) > 2 else ''
+            components = [c for c in test_id.split('^') if c]
+            run_date, run_time = _astm_datetime(fields[12] if len(fields) > 12 else '')
+            rows.append({
+                'lot_number': lot_number,
+                'level': level,
+                'test_code': components[0] if components else '',
+                'value': fields[3] if len(fields) > 3 else '',
+                'run_date': run_date,
+                'run_time': run_time,
+            })
+
+        elif record_type == 'L':
+            lot_number, level = '', ''
+
+    return rows
+
+
+PARSERS = {
+    'csv': parse_csv,
+    'json': parse_json,
+    'astm': parse_astm,
+}
+
+
+def detect_format(filename: str = '', content: str = '') -> str:
+    name = (filename or '').lower()
+    if name.endswith('.json'):
+        return 'json'
+    if name.endswith(('.astm', '.txt', '.log')):
+        return 'astm'
+    if name.endswith('.csv'):
+        return 'csv'
+    stripped = content.lstrip()
+    if stripped.startswith(('[', '{')):
+        return 'json'
+    if stripped[:2] in ('H|', '1H'):
+        return 'astm'
+    return 'csv'
+
+
+def parse_rows(content: str, fmt: str) -> List[Dict]:
+    if fmt not in PARSERS:
+        raise ValueError(f"Unsupported QC import format: {fmt}")
+    return PARSERS[fmt](content)
+
+
+# ─────────────────────────────────────────
+# Import
+# ─────────────────────────────────────────
+
+def _parse_date(value, default: date) -> date:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if value:
+        return date.fromisoformat(str(value)[:10])
+    return default
+
+
+def _parse_time(value, default: time) -> time:
+    if isinstance(value, time):
+        return value
+    if value:
+        return time.fromisoformat(str(value))
+    return default
+
+
+class _LotIndex:
+    """Resolves (lot_number, test_code, level) against the lots loaded in one query."""
+
+    def __init__(self, vendor, lot_numbers: Iterable[str]):
+        self.by_number: Dict[str, List[QCLot]] = defaultdict(list)
+        lots = QCLot.objects.filter(
+            vendor=vendor, lot_number__in=set(lot_numbers)
+        ).select_related('test')
+        for lot in lots:
+            self.by_number[lot.lot_number].append(lot)
+
+    def resolve(self, lot_number: str, test_code: str = '', level: str = '') -> QCLot:
+        candidates = self.by_number.get(lot_number, [])
+        if test_code:
+            candidates = [l for l in candidates if l.test.code.upper() == test_code.upper()]
+        if level:
+            candidates = [l for l in candidates if l.level == level.upper()]
+        if len(candidates) > 1:
+            active = [l for l in candidates if l.is_active]
+            candidates = active if len(active) == 1 else candidates
+        if not candidates:
+            raise ValueError(f"No QC lot '{lot_number}' for test '{test_code or '?'}' level '{level or '?'}'")
+        if len(candidates) > 1:
+            raise ValueError(f"QC lot '{lot_number}' is ambiguous — add test_code/level")
+        return candidates[0]
+
+
+def import_qc_results(vendor, rows: List[Dict], user=None, instrument=None,
+                      source: str = 'import', ip_address=None) -> QCImportResult:
+    """
+    Validate, evaluate and store a batch of QC rows for ``vendor``.
+
+    Invalid rows are reported in ``errors`` and skipped; the valid ones are
+    written together.
+    """
+    result = QCImportResult()
+    if not rows:
+        return result
+
+    now = timezone.now()
+    today, now_time = timezone.localdate(), timezone.localtime(now).time()
+
+    lot_index = _LotIndex(vendor, (_clean(r.get('lot_number')) for r in rows))
+
+    serials = {_clean(r.get('instrument')) for r in rows if r.get('instrument')}
+    instruments = {
+        eq.serial_number: eq
+        for eq in Equipment.objects.filter(vendor=vendor, serial_number__in=serials)
+    } if serials else {}
+
+    # ── Build unsaved results ───────────────────────────────────────────────
+    pending: List[QCResult] = []
+    explicit_runs = set()
+    for line_no, row in enumerate(rows, start=1):
+        try:
+            lot = lot_index.resolve(
+                _clean(row.get('lot_number')), _clean(row.get('test_code')), _clean(row.get('level')),
+            )
+            value = to_decimal(_clean(row.get('value')))
+            if value is None:
+                raise ValueError(f"Invalid value '{row.get('value')}'")
+
+            qc = QCResult(
+                vendor=vendor,
+                qc_lot=lot,
+                result_value=value,
+                run_date=_parse_date(row.get('run_date'), today),
+                run_time=_parse_time(row.get('run_time'), now_time),
+                instrument=instruments.get(_clean(row.get('instrument'))) or instrument,
+                comments=_clean(row.get('comments')),
+                entered_by=user,
+            )
+            if row.get('run_number'):
+                qc.run_number = int(row['run_number'])
+                explicit_runs.add(id(qc))
+            qc.calculate_metrics()
+            pending.append(qc)
+        except (ValueError, TypeError, ValidationError) as exc:
+            message = exc.messages[0] if isinstance(exc, ValidationError) else str(exc)
+            result.errors.append(f"Row {line_no}: {message}")
+
+    if not pending:
+        return result
+
+    pending.sort(key=lambda r: (r.run_date, r.run_time))
+    lots = {r.qc_lot_id: r.qc_lot for r in pending}
+
+    # ── Run numbers continue from what is already stored for each lot/day ──
+    run_counts = defaultdict(int)
+    existing = QCResult.objects.filter(
+        vendor=vendor, qc_lot__in=lots.keys(), run_date__in={r.run_date for r in pending},
+    ).values('qc_lot_id', 'run_date').annotate(n=Count('id'))
+    for row in existing:
+        run_counts[(row['qc_lot_id'], row['run_date'])] = row['n']
+
+    for qc in pending:
+        key = (qc.qc_lot_id, qc.run_date)
+        run_counts[key] += 1
+        if id(qc) not in explicit_runs:
+            qc.run_number = run_counts[key]
+
+    # ── Evaluate and write ──────────────────────────────────────────────────
+    with transaction.atomic():
+        engine = WestgardEngine(vendor)
+        engine.load(lots.values())
+        for qc in pending:
+            qc.rule_violations = engine.record(qc)
+
+        result.created = QCResult.objects.bulk_create(pending, batch_size=500)
+
+        engine.assign_ids()
+        engine.persist()
+
+        result.approvals_updated = refresh_test_approvals(vendor, result.created)
+
+        log_writer.write(
+            AuditLog,
+            vendor=vendor,
+            user=user,
+            action=(
+                f"Bulk QC import ({source}): {result.created_count} results, "
+                f"{result.violation_count} with Westgard violations, {result.failed_count} rejected"
+            ),
+            ip_address=ip_address,
+        )
+
+    logger.info(
+        "QC import for vendor %s: %s created, %s rejected",
+        vendor.pk, result.created_count, result.failed_count,
+    )
+    return result
+
+
+def refresh_test_approvals(vendor, results: List[QCResult]) -> int:
+    """
+    Link ``results`` to their daily QCTestApproval and refresh all_levels_passed,
+    touching each (test, day) once. Returns the number of approvals refreshed.
+    """
+    groups: Dict[tuple, List[QCResult]] = defaultdict(list)
+    for qc in results:
+        groups[(qc.qc_lot.test_id, qc.run_date)].append(qc)
+    if not groups:
+        return 0
+
+    test_ids = {test_id for test_id, _ in groups}
+    dates = {run_date for _, run_date in groups}
+
+    QCTestApproval.objects.bulk_create(
+        [QCTestApproval(vendor=vendor, test_id=test_id, date=run_date) for test_id, run_date in groups],
+        ignore_conflicts=True,
+    )
+    approvals = {
+        (a.test_id, a.date): a
+        for a in QCTestApproval.objects.filter(vendor=vendor, test_id__in=test_ids, date__in=dates)
+        if (a.test_id, a.date) in groups
+    }
+
+    Through = QCTestApproval.qc_results.through
+    Through.objects.bulk_create(
+        [
+            Through(qctestapproval_id=approvals[key].pk, qcresult_id=qc.pk)
+            for key, items in groups.items()
+            for qc in items
+        ],
+        ignore_conflicts=True,
+    )
+
+    # All active levels must have been run that day with no FAIL or Westgard rejection
+    active_levels = defaultdict(set)
+    for row in QCLot.objects.filter(vendor=vendor, test_id__in=test_ids, is_active=True).values('test_id', 'level'):
+        active_levels[row['test_id']].add(row['level'])
+
+    run_levels, failed = defaultdict(set), set()
+    for row in QCResult.objects.filter(
+        vendor=vendor, qc_lot__test_id__in=test_ids, run_date__in=dates,
+    ).values('qc_lot__test_id', 'run_date', 'qc_lot__level', 'status', 'rule_violations'):
+        key = (row['qc_lot__test_id'], row['run_date'])
+        run_levels[key].add(row['qc_lot__level'])
+        if row['status'] == 'FAIL' or row['rule_violations']:
+            failed.add(key)
+
+    now = timezone.now()
+    for key, approval in approvals.items():
+        levels = active_levels.get(key[0]) or run_levels[key]
+        approval.all_levels_passed = bool(levels) and levels <= run_levels[key] and key not in failed
+        approval.updated_at = now
+
+    QCTestApproval.objects.bulk_update(approvals.values(), ['all_levels_passed', 'updated_at'])
+    return len(approvals)
+
+
+def import_qc_file(vendor, content: str, fmt: Optional[str] = None, filename: str = '',
+                   **kwargs) -> QCImportResult:
+    """Parse ``content`` (auto-detecting the format when ``fmt`` is empty) and import it."""
+    fmt = fmt or detect_format(filename, content)
+    try:
+        rows = parse_rows(content, fmt)
+    except (ValueError, csv.Error) as exc:
+        return QCImportResult(errors=[f"Could not read {fmt.upper()} file: {exc}"])
+    return import_qc_results(vendor, rows, source=fmt, **kwargs)
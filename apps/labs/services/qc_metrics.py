@@ -0,0 +1,153 @@
+"""
+Monthly QC performance metrics computed in the database.
+
+One grouped query per month returns count, pass/warn/fail tallies, mean and
+variance for every (test, level/lot, instrument) combination. Python then only
+touches O(groups) rows to derive:
+
+    bias %  = (observed mean − QCLot.target_value) / target × 100
+    CV %    = observed SD / observed mean × 100
+    Sigma   = (TEa − |bias %|) / CV %          TEa from VendorTest.tea_percent
+
+A test's Sigma is its worst (lowest) level/instrument Sigma; the overall Sigma
+is the run-weighted mean of test Sigmas.
+
+Summaries are cached per tenant and month. The cache key carries a cheap
+fingerprint (run count + newest change of results, lots and tests in that
+month), so new or edited runs and TEa changes are picked up immediately.
+"""
+import hashlib
+from collections import OrderedDict
+from datetime import date, timedelta
+from math import sqrt
+from typing import Dict, Optional
+
+from django.core.cache import cache
+from django.db.models import Avg, Count, Max, Q, Variance
+
+from ..models import QCResult
+
+CACHE_PREFIX = "qc_monthly"
+CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def month_bounds(year: int, month: int):
+    start = date(year, month, 1)
+    end = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+    return start, end - timedelta(days=1)
+
+
+def _rate(part: int, total: int) -> float:
+    return part / total * 100 if total else 0
+
+
+def sigma_metric(tea: Optional[float], bias: Optional[float], cv: Optional[float]) -> Optional[float]:
+    """(TEa − |bias|) / CV, all in percent. None when any input is missing or CV is 0."""
+    if tea is None or bias is None or not cv:
+        return None
+    return round((tea - abs(bias)) / cv, 2)
+
+
+def _month_results(vendor, year: int, month: int):
+    start, end = month_bounds(year, month)
+    return QCResult.objects.filter(vendor=vendor, run_date__gte=start, run_date__lte=end)
+
+
+def _fingerprint(results) -> str:
+    agg = results.aggregate(
+        n=Count('id'),
+        results=Max('updated_at'),
+        lots=Max('qc_lot__updated_at'),
+        tests=Max('qc_lot__test__updated_at'),
+    )
+    raw = "|".join(str(agg[k]) for k in ('n', 'results', 'lots', 'tests'))
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def compute_monthly_summary(vendor, year: int, month: int) -> Dict:
+    """Grouped aggregation → per-group stats, per-test summary and overall totals."""
+    rows = _month_results(vendor, year, month).values(
+        'qc_lot__test_id', 'qc_lot__test__code', 'qc_lot__test__name', 'qc_lot__test__tea_percent',
+        'qc_lot_id', 'qc_lot__level', 'qc_lot__lot_number', 'qc_lot__target_value',
+        'instrument_id', 'instrument__name',
+    ).annotate(
+        total=Count('id'),
+        passed=Count('id', filter=Q(status='PASS')),
+        warnings=Count('id', filter=Q(status='WARNING')),
+        failed=Count('id', filter=Q(status='FAIL')),
+        observed_mean=Avg('result_value'),
+        observed_var=Variance('result_value', sample=True),
+    ).order_by('qc_lot__test__name', 'qc_lot__level', 'instrument__name')
+
+    tests = OrderedDict()
+    totals = {'total': 0, 'passed': 0, 'warnings': 0, 'failed': 0}
+
+    for row in rows:
+        tea = float(row['qc_lot__test__tea_percent']) if row['qc_lot__test__tea_percent'] is not None else None
+        target = float(row['qc_lot__target_value']) if row['qc_lot__target_value'] is not None else None
+        mean = float(row['observed_mean']) if row['observed_mean'] is not None else None
+        sd = sqrt(float(row['observed_var'])) if row['observed_var'] is not None else None
+
+        bias = round((mean - target) / target * 100, 2) if mean is not None and target else None
+        cv = round(sd / mean * 100, 2) if sd is not None and mean else None
+
+        group = {
+            'lot_id': row['qc_lot_id'],
+            'lot_number': row['qc_lot__lot_number'],
+            'level': row['qc_lot__level'],
+            'instrument': row['instrument__name'] or '—',
+            'total': row['total'],
+            'mean': round(mean, 4) if mean is not None else None,
+            'sd': round(sd, 4) if sd is not None else None,
+            'target': target,
+            'bias': bias,
+            'cv': cv,
+            'sigma': sigma_metric(tea, bias, cv),
+        }
+
+        code = row['qc_lot__test__code']
+        item = tests.get(code)
+        if item is None:
+            item = tests[code] = {
+                'test': {'id': row['qc_lot__test_id'], 'code': code, 'name': row['qc_lot__test__name']},
+                'tea': tea,
+                'total': 0, 'passed': 0, 'warnings': 0, 'failed': 0,
+                'groups': [],
+            }
+        item['groups'].append(group)
+        for key in totals:
+            item[key] += row[key]
+            totals[key] += row[key]
+
+    weighted, weight = 0.0, 0
+    for item in tests.values():
+        t = item['total']
+        item['pass_rate'] = _rate(item['passed'], t)
+        item['warning_rate'] = _rate(item['warnings'], t)
+        item['fail_rate'] = _rate(item['failed'], t)
+        sigmas = [g['sigma'] for g in item['groups'] if g['sigma'] is not None]
+        item['sigma'] = min(sigmas) if sigmas else None
+        if item['sigma'] is not None:
+            weighted += item['sigma'] * t
+            weight += t
+
+    return {
+        **totals,
+        'pass_rate': round(_rate(totals['passed'], totals['total']), 1),
+        'warning_rate': round(_rate(totals['warnings'], totals['total']), 1),
+        'fail_rate': round(_rate(totals['failed'], totals['total']), 1),
+        'overall_sigma': round(weighted / weight, 2) if weight else None,
+        'tests_summary': tests,
+    }
+
+
+def monthly_summary(vendor, year: int, month: int) -> Dict:
+    """Cached compute_monthly_summary (per tenant, month and data fingerprint)."""
+    fingerprint = _fingerprint(_month_results(vendor, year, month))
+    key = f"{CACHE_PREFIX}:{vendor.pk}:{year}-{month:02d}:{fingerprint}"
+
+    summary = cache.get(key)
+    if summary is None:
+        summary = compute_monthly_summary(vendor, year, month)
+        cache.set(key, summary, CACHE_TIMEOUT)
+    return summary
@@ -0,0 +1,188 @@
+"""
+Levey-Jennings series for one test, several lots/levels at once.
+
+One values_list() query loads the window for every requested lot; per-lot
+series are returned as columnar arrays (ready for Chart.js datasets):
+
+    {
+      "test": {...},
+      "series": [
+        {"lot_id": 3, "level": "L1", "lot_number": "A1", "units": "mg/dL",
+         "limits": {"mean": 100.0, "sd": 5.0, "sd_2_low": ..., ...},
+         "x": ["2025-01-31T08:15:00", ...], "value": [...], "z": [...],
+         "status": [...], "running_mean": [...], "running_sd": [...],
+         "total_points": 412, "downsampled": true},
+        ...
+      ]
+    }
+
+Running mean/SD are Welford updates over the full window (before any
+downsampling), so they match what a lab would compute by hand from every run.
+Long windows are reduced to ``max_points`` by min/max bucketing; FAIL points
+are always kept.
+"""
+import hashlib
+from collections import defaultdict
+from datetime import datetime, timedelta
+from math import sqrt
+from typing import Dict, List, Optional
+
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from ..models import QCLot, QCResult
+
+DEFAULT_DAYS = 30
+DEFAULT_MAX_POINTS = 500
+
+
+class Welford:
+    """Online mean / sample SD."""
+
+    __slots__ = ('n', 'mean', '_m2')
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def push(self, value: float) -> None:
+        self.n += 1
+        delta = value - self.mean
+        self.mean += delta / self.n
+        self._m2 += delta * (value - self.mean)
+
+    @property
+    def sd(self) -> float:
+        return sqrt(self._m2 / (self.n - 1)) if self.n > 1 else 0.0
+
+
+def _float(value) -> Optional[float]:
+    return float(value) if value is not None else None
+
+
+def downsample_indices(values: List[float], statuses: List[str], max_points: int) -> List[int]:
+    """
+    Indices to keep so that at most ~max_points remain: first/last of the series,
+    min and max of each bucket, and every FAIL.
+    """
+    n = len(values)
+    if n <= max_points or max_points < 4:
+        return list(range(n))
+
+    keep = {0, n - 1}
+    keep.update(i for i, status in enumerate(statuses) if status == 'FAIL')
+
+    buckets = max(1, max_points // 2)
+    size = n / buckets
+    for b in range(buckets):
+        start, end = int(b * size), min(n, int((b + 1) * size))
+        if start >= end:
+            continue
+        chunk = range(start, end)
+        keep.add(min(chunk, key=values.__getitem__))
+        keep.add(max(chunk, key=values.__getitem__))
+    return sorted(keep)
+
+
+def resolve_lots(vendor, test, lot_ids=None, levels=None):
+    """Lots for the overlay: explicit ids, else the requested (or all active) levels."""
+    lots = QCLot.objects.filter(vendor=vendor, test=test)
+    if lot_ids:
+        lots = lots.filter(id__in=lot_ids)
+    else:
+        lots = lots.filter(is_active=True)
+        if levels:
+            lots = lots.filter(level__in=levels)
+    return list(lots.order_by('level', 'id'))
+
+
+def window_start(days: int):
+    return timezone.now().date() - timedelta(days=days)
+
+
+def series_fingerprint(lots, days: int, max_points: int):
+    """
+    (etag, last_modified) for the requested window — one aggregate query.
+    Changes whenever a run is added, edited or deleted, or a lot's limits change.
+    """
+    if not lots:
+        return None, None
+
+    agg = QCResult.objects.filter(
+        qc_lot__in=lots, run_date__gte=window_start(days),
+    ).aggregate(newest=Max('updated_at'), total=Count('id'))
+
+    lot_stamp = max(lot.updated_at for lot in lots)
+    newest = max(filter(None, [agg['newest'], lot_stamp]))
+
+    raw = "|".join([
+        ",".join(str(lot.pk) for lot in lots),
+        str(days), str(max_points), str(agg['total']),
+        newest.isoformat(), lot_stamp.isoformat(),
+    ])
+    return hashlib.md5(raw.encode()).hexdigest(), newest
+
+
+def build_series(lots, days: int = DEFAULT_DAYS, max_points: int = DEFAULT_MAX_POINTS) -> Dict:
+    """Columnar Levey-Jennings data for ``lots`` (all of the same test)."""
+    columns = defaultdict(lambda: defaultdict(list))
+    rows = QCResult.objects.filter(
+        qc_lot__in=lots, run_date__gte=window_start(days),
+    ).order_by('run_date', 'run_time', 'id').values_list(
+        'qc_lot_id', 'run_date', 'run_time', 'result_value', 'z_score', 'status',
+    )
+    for lot_id, run_date, run_time, value, z, status in rows:
+        col = columns[lot_id]
+        col['x'].append(datetime.combine(run_date, run_time).isoformat() if run_time else run_date.isoformat())
+        col['value'].append(float(value))
+        col['z'].append(_float(z))
+        col['status'].append(status)
+
+    series = []
+    for lot in lots:
+        col = columns.get(lot.pk, {})
+        values = col.get('value', [])
+
+        stats = Welford()
+        running_mean, running_sd = [], []
+        for value in values:
+            stats.push(value)
+            running_mean.append(round(stats.mean, 4))
+            running_sd.append(round(stats.sd, 4))
+
+        keep = downsample_indices(values, col.get('status', []), max_points)
+        pick = lambda seq: [seq[i] for i in keep]
+
+        series.append({
+            'lot_id': lot.pk,
+            'lot_number': lot.lot_number,
+            'level': lot.level,
+            'level_display': lot.get_level_display(),
+            'units': lot.units,
+            'limits': {
+                'mean': _float(lot.mean),
+                'sd': _float(lot.sd),
+                'sd_1_low': _float(lot.limit_1sd_low),
+                'sd_1_high': _float(lot.limit_1sd_high),
+                'sd_2_low': _float(lot.limit_2sd_low),
+                'sd_2_high': _float(lot.limit_2sd_high),
+                'sd_3_low': _float(lot.limit_3sd_low),
+                'sd_3_high': _float(lot.limit_3sd_high),
+            },
+            'x': pick(col.get('x', [])),
+            'value': pick(values),
+            'z': pick(col.get('z', [])),
+            'status': pick(col.get('status', [])),
+            'running_mean': pick(running_mean),
+            'running_sd': pick(running_sd),
+            'observed': {
+                'n': stats.n,
+                'mean': round(stats.mean, 4) if stats.n else None,
+                'sd': round(stats.sd, 4) if stats.n > 1 else None,
+            },
+            'total_points': len(values),
+            'downsampled': len(keep) < len(values),
+        })
+
+    return {'days': days, 'series': series}
@@ -0,0 +1,161 @@
+"""
+Load-balanced instrument routing for pending test assignments.
+
+Replaces the per-assignment `.first()` lookup in auto_assign_instruments,
+which sent every test in a department to the same analyser.
+
+One aggregate query loads each active instrument together with its current
+queue depth (assignments in Pending / Queued / In Progress). Routing then runs
+entirely in memory, and the result is persisted with a single bulk_update
+plus one AuditLog entry.
+
+Preference order for each assignment (within its department):
+  1. Test capability — instrument name/model matches VendorTest.platform
+  2. API-enabled instruments (api_endpoint configured)
+  3. Least-loaded (live queue depth, incremented as tests are routed)
+"""
+import logging
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from apps.core.services.log_writer import log_writer
+from ..models import AuditLog, Equipment, TestAssignment
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_QUEUE_STATUSES = ('P', 'Q', 'I')
+
+
+@dataclass
+class RoutingResult:
+    """Outcome of a routing run."""
+    assigned: List[TestAssignment] = field(default_factory=list)
+    unroutable: List[TestAssignment] = field(default_factory=list)
+    load_by_instrument: Dict[int, int] = field(default_factory=dict)
+
+    @property
+    def assigned_count(self) -> int:
+        return len(self.assigned)
+
+    @property
+    def failed_count(self) -> int:
+        return len(self.unroutable)
+
+
+class InstrumentRouter:
+    """In-memory router over a vendor's active instruments."""
+
+    def __init__(self, vendor):
+        self.vendor = vendor
+        self.instruments_by_department: Dict[int, List[Equipment]] = defaultdict(list)
+        self.load: Dict[int, int] = {}
+        self._load_instruments()
+
+    def _load_instruments(self) -> None:
+        """Department → instrument map and queue depth in one query."""
+        instruments = Equipment.objects.filter(
+            vendor=self.vendor,
+            status='active',
+        ).annotate(
+            queue_depth=Count(
+                'assignments',
+                filter=Q(assignments__status__in=ACTIVE_QUEUE_STATUSES),
+            )
+        ).order_by('id')
+
+        for instrument in instruments:
+            self.instruments_by_department[instrument.department_id].append(instrument)
+            self.load[instrument.id] = instrument.queue_depth
+
+    @staticmethod
+    def _is_capable(instrument: Equipment, platform: str) -> bool:
+        if not platform:
+            return False
+        platform = platform.strip().lower()
+        return platform in instrument.name.lower() or platform in instrument.model.lower()
+
+    def pick(self, assignment: TestAssignment) -> Optional[Equipment]:
+        """Best instrument for one assignment, or None if its department has none."""
+        candidates = self.instruments_by_department.get(assignment.department_id)
+        if not candidates:
+            return None
+
+        platform = assignment.lab_test.platform
+        return min(
+            candidates,
+            key=lambda inst: (
+                not self._is_capable(inst, platform),
+                not bool(inst.api_endpoint),
+                self.load[inst.id],
+                inst.id,
+            ),
+        )
+
+    def route(self, assignments) -> RoutingResult:
+        """Assign instruments in memory; does not touch the database."""
+        result = RoutingResult()
+        now = timezone.now()
+
+        for assignment in assignments:
+            instrument = self.pick(assignment)
+            if instrument is None:
+                result.unroutable.append(assignment)
+                continue
+
+            assignment.instrument = instrument
+            assignment.updated_at = now
+            self.load[instrument.id] += 1
+            result.assigned.append(assignment)
+
+        result.load_by_instrument = dict(self.load)
+        return result
+
+
+def auto_route_pending(vendor, user=None, ip_address=None) -> RoutingResult:
+    """
+    Route every pending, unassigned TestAssignment of ``vendor``.
+
+    Persists with one bulk_update and records a single AuditLog entry.
+    """
+    with transaction.atomic():
+        pending = list(
+            TestAssignment.objects.select_for_update(of=('self',)).filter(
+                vendor=vendor,
+                status='P',
+                instrument__isnull=True,
+            ).select_related('lab_test').only(
+                'id', 'department', 'instrument', 'updated_at', 'lab_test__platform',
+            ).order_by('created_at')
+        )
+
+        if not pending:
+            return RoutingResult()
+
+        router = InstrumentRouter(vendor)
+        result = router.route(pending)
+
+        if result.assigned:
+            TestAssignment.objects.bulk_update(
+                result.assigned, ['instrument', 'updated_at'], batch_size=500
+            )
+            log_writer.write(
+                AuditLog,
+                vendor=vendor,
+                user=user,
+                action=(
+                    f"Auto-assigned instruments to {result.assigned_count} assignments "
+                    f"(load-balanced routing; {result.failed_count} unroutable)"
+                ),
+                ip_address=ip_address,
+            )
+
+    logger.info(
+        "Routed %s assignments for vendor %s (%s unroutable)",
+        result.assigned_count, vendor.pk, result.failed_count,
+    )
+    return result
@@ -0,0 +1,292 @@
+"""
+Incremental multi-rule Westgard engine.
+
+QCResult.save used to re-query the last 10 results of the lot, rebuild the
+z-scores in Decimal and issue a second save just for rule_violations, and it
+could only see one lot/level at a time.
+
+The engine now works over compact rolling windows stored in QCRuleState:
+  - one LOT window per QC lot   (last LOT_WINDOW_SIZE runs of that level)
+  - one TEST window per test    (last TEST_WINDOW_SIZE runs across all levels)
+
+Each window is a chronologically sorted list of small dicts:
+    {"id": 12, "lot": 3, "level": "L1", "z": -1.25, "date": "2025-01-31", "time": "08:15:00", "run": 1}
+
+Rules evaluated for the newest entry (z-scores as floats):
+  1-3s   |z| > 3
+  2-2s   two consecutive runs of the lot > 2 on the same side (across runs)
+         two levels of the same run > 2 on the same side (within run)
+  R-4s   z range between levels of the same run > 4
+  2of32s two of the last three runs of the lot > 2 on the same side
+  3-1s   three consecutive runs of the lot > 1 on the same side
+  4-1s   four consecutive results > 1 on the same side (lot, or across levels)
+  10x    ten consecutive results on the same side of the mean (lot, or across levels)
+
+Every label returned is a rejection. The 1-2s warning is not a rule
+violation; it is carried by QCResult.status ('WARNING') from the 2SD limits.
+
+Windows are tiny (≤ 20 values), so plain Python comparisons are used rather
+than NumPy — array setup would cost more than the evaluation itself.
+"""
+import bisect
+from datetime import datetime
+from typing import Dict, List
+
+from django.utils import timezone
+
+LOT_WINDOW_SIZE = 10
+TEST_WINDOW_SIZE = 20
+
+
+# ─────────────────────────────────────────
+# Window helpers
+# ─────────────────────────────────────────
+
+def make_entry(result) -> Dict:
+    """Compact window entry for a QCResult (z_score must already be set)."""
+    run_date = result.run_date
+    if isinstance(run_date, datetime):
+        run_date = run_date.date()
+    return {
+        "id": result.pk,
+        "lot": result.qc_lot_id,
+        "level": result.qc_lot.level,
+        "z": float(result.z_score) if result.z_score is not None else None,
+        "date": run_date.isoformat(),
+        "time": result.run_time.strftime("%H:%M:%S.%f") if result.run_time else "",
+        "run": result.run_number,
+    }
+
+
+def _sort_key(entry: Dict):
+    # Unsaved entries (id=None) sort after saved ones with the same timestamp
+    return (entry["date"], entry["time"], entry["id"] if entry["id"] is not None else float("inf"))
+
+
+def push(window: List[Dict], entry: Dict, size: int) -> List[Dict]:
+    """Insert ``entry`` in chronological position and keep the newest ``size`` items."""
+    window = [e for e in window if e["id"] is None or e["id"] != entry["id"]]
+    keys = [_sort_key(e) for e in window]
+    window.insert(bisect.bisect_right(keys, _sort_key(entry)), entry)
+    return window[-size:]
+
+
+def _same_side(values: List[float], limit: float) -> bool:
+    return all(v > limit for v in values) or all(v < -limit for v in values)
+
+
+def _upto(window: List[Dict], entry: Dict) -> List[Dict]:
+    """Window truncated at ``entry`` — rules look backwards from the evaluated run."""
+    return window[:window.index(entry) + 1] if entry in window else window
+
+
+def _z_values(window: List[Dict]) -> List[float]:
+    """Newest-first z-scores, skipping runs without a z-score."""
+    return [e["z"] for e in reversed(window) if e["z"] is not None]
+
+
+# ─────────────────────────────────────────
+# Rule evaluation
+# ─────────────────────────────────────────
+
+def evaluate(entry: Dict, lot_window: List[Dict], test_window: List[Dict]) -> List[str]:
+    """
+    Evaluate the full Westgard set for ``entry``.
+
+    ``lot_window`` / ``test_window`` must already contain ``entry``.
+    Returns the list of violation labels (empty when in control).
+    """
+    if entry["z"] is None:
+        return []
+
+    lot_window = _upto(lot_window, entry)
+    test_window = _upto(test_window, entry)
+    z0 = entry["z"]
+    lot_z = _z_values(lot_window)
+    test_z = _z_values(test_window)
+    violations = []
+
+    # ── Single-value rules ──────────────────────────────────────────────────
+    if abs(z0) > 3:
+        violations.append("1₃ₛ: |Z| > 3")
+
+    # ── Within-run rules across levels ──────────────────────────────────────
+    same_run = [
+        e["z"] for e in test_window
+        if e["date"] == entry["date"] and e["run"] == entry["run"]
+        and e["lot"] != entry["lot"] and e["z"] is not None
+    ]
+    if any(_same_side([z0, other], 2) for other in same_run):
+        violations.append("2₂ₛ: Two levels > ±2 in the same run")
+    if same_run and max(same_run + [z0]) - min(same_run + [z0]) > 4:
+        violations.append("R₄ₛ: Range between levels > 4SD")
+
+    # ── Across-run rules within the lot ─────────────────────────────────────
+    if len(lot_z) >= 2 and _same_side(lot_z[:2], 2):
+        violations.append("2₂ₛ: Two consecutive runs > ±2")
+
+    if len(lot_z) >= 3:
+        last3 = lot_z[:3]
+        if sum(1 for z in last3 if z > 2) >= 2 or sum(1 for z in last3 if z < -2) >= 2:
+            violations.append("2of3₂ₛ: Two of three runs > ±2")
+        if _same_side(last3, 1):
+            violations.append("3₁ₛ: Three values > ±1 (same side)")
+
+    if len(lot_z) >= 4 and _same_side(lot_z[:4], 1):
+        violations.append("4₁ₛ: Four values > ±1 (same side)")
+    elif len(test_z) >= 4 and _same_side(test_z[:4], 1):
+        violations.append("4₁ₛ: Four values > ±1 across levels")
+
+    if len(lot_z) >= 10 and _same_side(lot_z[:10], 0):
+        violations.append("10x: Ten on same side of mean")
+    elif len(test_z) >= 10 and _same_side(test_z[:10], 0):
+        violations.append("10x: Ten on same side of mean across levels")
+
+    return violations
+
+
+# ─────────────────────────────────────────
+# Rolling state
+# ─────────────────────────────────────────
+
+def rebuild_window(results) -> List[Dict]:
+    """Build a window from QCResult rows (any order)."""
+    window: List[Dict] = []
+    for result in results:
+        window = push(window, make_entry(result), len(results) or 1)
+    return window
+
+
+class WestgardEngine:
+    """
+    Loads, evaluates and updates the rolling QC state for one or many results.
+
+    Usage (single result, see QCResult.save):
+        engine = WestgardEngine(vendor)
+        engine.load(lots=[qc_lot])
+        violations = engine.record(result)   # z_score must already be set
+        ...save result...
+        engine.assign_ids()
+        engine.persist()
+    """
+
+    def __init__(self, vendor):
+        self.vendor = vendor
+        self._states: Dict[tuple, object] = {}
+        self._dirty: Dict[tuple, object] = {}
+        self._recorded: List[tuple] = []
+
+    # ── Loading ─────────────────────────────────────────────────────────────
+
+    def load(self, lots) -> None:
+        """Load (or rebuild) LOT and TEST state for every lot in ``lots`` in one query."""
+        from django.db.models import Q
+        from ..models import QCRuleState
+
+        lots = list({lot.pk: lot for lot in lots}.values())
+        if not lots:
+            return
+        test_ids = {lot.test_id for lot in lots}
+
+        states = QCRuleState.objects.select_for_update().filter(
+            Q(scope='LOT', qc_lot__in=lots) | Q(scope='TEST', test_id__in=test_ids),
+            vendor=self.vendor,
+        )
+        for state in states:
+            self._states[state.key] = state
+
+        for lot in lots:
+            if ('LOT', lot.pk) not in self._states:
+                self._states[('LOT', lot.pk)] = self._rebuild_lot(lot)
+        for test_id in test_ids:
+            if ('TEST', test_id) not in self._states:
+                self._states[('TEST', test_id)] = self._rebuild_test(test_id)
+
+    def _rebuild_lot(self, lot):
+        from ..models import QCResult, QCRuleState
+
+        recent = list(
+            QCResult.objects.filter(qc_lot=lot).select_related('qc_lot')
+            .order_by('-run_date', '-run_time', '-id')[:LOT_WINDOW_SIZE]
+        )
+        state = QCRuleState(
+            vendor=self.vendor, test_id=lot.test_id, qc_lot=lot, scope='LOT',
+            window=rebuild_window(recent),
+        )
+        self._dirty[state.key] = state
+        return state
+
+    def _rebuild_test(self, test_id):
+        from ..models import QCResult, QCRuleState
+
+        recent = list(
+            QCResult.objects.filter(vendor=self.vendor, qc_lot__test_id=test_id)
+            .select_related('qc_lot')
+            .order_by('-run_date', '-run_time', '-id')[:TEST_WINDOW_SIZE]
+        )
+        state = QCRuleState(
+            vendor=self.vendor, test_id=test_id, qc_lot=None, scope='TEST',
+            window=rebuild_window(recent),
+        )
+        self._dirty[state.key] = state
+        return state
+
+    # ── Evaluation ──────────────────────────────────────────────────────────
+
+    def record(self, result) -> List[str]:
+        """
+        Push ``result`` into its LOT and TEST windows and return its violations.
+
+        May be called before the row is INSERTed (id=None); call ``assign_ids``
+        after saving so the stored windows carry the real primary keys.
+        """
+        entry = make_entry(result)
+        lot_state = self._states[('LOT', result.qc_lot_id)]
+        test_state = self._states[('TEST', result.qc_lot.test_id)]
+
+        lot_state.window = push(lot_state.window, entry, LOT_WINDOW_SIZE)
+        test_state.window = push(test_state.window, entry, TEST_WINDOW_SIZE)
+        self._dirty[lot_state.key] = lot_state
+        self._dirty[test_state.key] = test_state
+        self._recorded.append((entry, result))
+
+        return evaluate(entry, lot_state.window, test_state.window)
+
+    def assign_ids(self) -> None:
+        """Copy primary keys of freshly saved results into their window entries."""
+        for entry, result in self._recorded:
+            entry["id"] = result.pk
+        self._recorded = []
+
+    # ── Persistence ─────────────────────────────────────────────────────────
+
+    def persist(self) -> None:
+        """Write changed windows back (one INSERT batch + one UPDATE batch at most)."""
+        from ..models import QCRuleState
+
+        if not self._dirty:
+            return
+        new = [s for s in self._dirty.values() if s.pk is None]
+        existing = [s for s in self._dirty.values() if s.pk is not None]
+        if new:
+            # A concurrent writer may have created the same state first;
+            # its window wins and ours is rebuilt from the DB next time if missing.
+            QCRuleState.objects.bulk_create(new, ignore_conflicts=True)
+        if existing:
+            now = timezone.now()
+            for state in existing:
+                state.updated_at = now
+            QCRuleState.objects.bulk_update(existing, ['window', 'updated_at'])
+        self._dirty = {}
+
+
+def invalidate(qc_lot) -> None:
+    """Drop cached windows for a lot and its test so they are rebuilt on next use."""
+    from django.db.models import Q
+    from ..models import QCRuleState
+
+    QCRuleState.objects.filter(
+        Q(scope='LOT', qc_lot=qc_lot) | Q(scope='TEST', test_id=qc_lot.test_id),
+        vendor_id=qc_lot.vendor_id,
+    ).delete()
+
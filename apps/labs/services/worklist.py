@@ -0,0 +1,162 @@
+"""
+Live lab worklist: cached status counters and websocket deltas.
+
+Bench screens used to poll assignment_quick_stats, and every poll ran a
+six-way COUNT over the vendor's assignments. Now:
+
+    snapshot(vendor_id, department_id=None) → {'total', 'pending', …}   (cache; one GROUP BY on a miss)
+    assignment_moved(vendor_id, department_id, old, new, …) → counters ± 1, delta pushed
+    publish(vendor_id, department_id, delta)               → tenant (+ department) group
+
+Counters are kept per (vendor, department or all, status) in the default
+cache (Redis when deployed) and moved with atomic incr/decr. A missing
+counter is not touched by deltas: the next snapshot rebuilds it from one
+GROUP BY, and counters expire after COUNTER_TIMEOUT so drift heals.
+
+Groups:
+    worklist_<vendor>                  every change in the lab
+    worklist_<vendor>_<department>     that department's assignments / results
+
+Deltas are small dicts ({"kind": "assignment", "id", "from", "to",
+"counts": {"pending": -1, "queued": 1}}, "result", "sample") that
+WorklistConsumer forwards and the page applies client-side. TestAssignment,
+TestResult and Sample saves publish them once the transaction commits
+(labs/signals.py).
+"""
+
+import asyncio
+import logging
+from collections import Counter
+from typing import Dict, Optional
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.core.cache import cache
+from django.db.models import Count
+
+from ..models import TestAssignment
+
+logger = logging.getLogger(__name__)
+
+COUNTER_KEY = "worklist:{vendor}:{department}:{status}"
+COUNTER_TIMEOUT = 60 * 10
+
+STATUSES = [code for code, _ in TestAssignment.ASSIGNMENT_STATUS]
+
+# Stat card names (assignment_quick_stats keys); other statuses only count in total
+STAT_NAMES = {
+    'P': 'pending',
+    'Q': 'queued',
+    'I': 'in_progress',
+    'A': 'completed',
+    'V': 'verified',
+    'R': 'rejected',
+}
+
+
+def group_name(vendor_id, department_id=None) -> str:
+    if department_id:
+        return f"worklist_{vendor_id}_{department_id}"
+    return f"worklist_{vendor_id}"
+
+
+def _key(vendor_id, department_id, status) -> str:
+    return COUNTER_KEY.format(vendor=vendor_id, department=department_id or '*', status=status)
+
+
+# ── Counters ─────────────────────────────────────────────────────────────────
+
+def counts(vendor_id, department_id=None) -> Dict[str, int]:
+    """Assignments per status code for the lab (or one department)."""
+    keys = {status: _key(vendor_id, department_id, status) for status in STATUSES}
+    cached = cache.get_many(keys.values())
+    if len(cached) == len(keys):
+        return {status: cached[key] for status, key in keys.items()}
+
+    qs = TestAssignment.objects.filter(vendor_id=vendor_id)
+    if department_id:
+        qs = qs.filter(department_id=department_id)
+    found = dict(qs.order_by().values_list('status').annotate(n=Count('id')))
+
+    by_status = {}
+    for status, key in keys.items():
+        if key in cached:
+            by_status[status] = cached[key]
+            continue
+        n = found.get(status, 0)
+        # add() keeps a counter another process rebuilt (and moved) first
+        if not cache.add(key, n, COUNTER_TIMEOUT):
+            n = cache.get(key, n)
+        by_status[status] = n
+    return by_status
+
+
+def snapshot(vendor_id, department_id=None) -> Dict[str, int]:
+    by_status = {status: max(n, 0) for status, n in counts(vendor_id, department_id).items()}
+    stats = {'total': sum(by_status.values())}
+    stats.update({name: by_status[code] for code, name in STAT_NAMES.items()})
+    return stats
+
+
+def _move(vendor_id, department_id, deltas: Dict[str, int]):
+    for scope in (None, department_id):
+        for status, delta in deltas.items():
+            try:
+                cache.incr(_key(vendor_id, scope, status), delta)
+            except ValueError:
+                pass  # not cached: rebuilt on the next snapshot
+
+
+# ── Deltas ───────────────────────────────────────────────────────────────────
+
+def publish(vendor_id, department_id, delta: dict):
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    groups = [group_name(vendor_id)] + ([group_name(vendor_id, department_id)] if department_id else [])
+    message = {"type": "worklist_delta", "delta": delta}
+
+    async def send():
+        await asyncio.gather(*(channel_layer.group_send(group, message) for group in groups))
+
+    try:
+        async_to_sync(send)()
+    except Exception:
+        logger.exception("Worklist delta for vendor %s not published", vendor_id)
+
+
+def assignment_moved(vendor_id, department_id, old: Optional[str], new: Optional[str], assignment_id):
+    """Apply one assignment transition (old/new None for create/delete)."""
+    if old == new:
+        return
+    deltas = Counter()
+    if old:
+        deltas[old] -= 1
+    if new:
+        deltas[new] += 1
+    _move(vendor_id, department_id, deltas)
+
+    stat_counts = {STAT_NAMES[s]: d for s, d in deltas.items() if s in STAT_NAMES}
+    stat_counts['total'] = sum(deltas.values())
+    publish(vendor_id, department_id, {
+        "kind": "assignment",
+        "id": str(assignment_id),
+        "department": department_id,
+        "from": old,
+        "to": new,
+        "counts": {name: d for name, d in stat_counts.items() if d},
+    })
+
+
+def result_moved(vendor_id, department_id, old, new, assignment_id, flag=None):
+    if old == new:
+        return
+    publish(vendor_id, department_id, {
+        "kind": "result", "assignment": str(assignment_id), "from": old, "to": new, "flag": flag,
+    })
+
+
+def sample_moved(vendor_id, old, new, sample_id):
+    if old == new:
+        return
+    publish(vendor_id, None, {"kind": "sample", "id": sample_id, "from": old, "to": new})
@@ -1,13 +1,15 @@
 # apps.labs/signals.py
 import django.dispatch
 from django.dispatch import receiver
-from django.db.models.signals import post_save
-from django.core.mail import send_mail
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
 from django.conf import settings
 from django.template.loader import render_to_string
 from django.utils import timezone
-from .models import TestRequest, TestResult
+from .models import Sample, TestAssignment, TestRequest, TestResult
 from apps.accounts.models import User
+from apps.notification import digest
+from apps.notification.outbox import enqueue_email, enqueue_sms
 import logging
 
 logger = logging.getLogger(__name__)
@@ -132,17 +134,19 @@ View order: {settings.SITE_URL}/laboratory/requests/{test_request.pk}/
 {vendor.name} Laboratory Information System
 """
     
-    try:
-        send_mail(
-            subject,
-            message,
-            settings.DEFAULT_FROM_EMAIL,
-            recipient_emails,
-            fail_silently=False,
+    # One notification per recipient: buffered into a digest unless urgent
+    summary = (
+        f"{test_request.request_id} — {test_request.patient.first_name} {test_request.patient.last_name} — "
+        f"{test_request.requested_tests.count()} test(s), {source_type}"
+    )
+    for email in recipient_emails:
+        digest.notify(
+            email, 'lab_new_order', subject, message, summary,
+            vendor=vendor,
+            urgent=test_request.priority == 'urgent',
+            dedupe_key=f"lab-new-order:{test_request.pk}:{email}",
         )
-        logger.info(f"New order notification sent for {test_request.request_id}")
-    except Exception as e:
-        logger.error(f"Failed to send email for order {test_request.request_id}: {e}")
+    logger.info(f"New order notification queued for {test_request.request_id}")
 
 
 def notify_lab_urgent_order(test_request):
@@ -164,7 +168,9 @@ def notify_lab_urgent_order(test_request):
             try:
                 send_sms(
                     to=manager.contact_phone,
-                    message=f"🚨 URGENT LAB ORDER {test_request.request_id} - Patient: {test_request.patient.patient_id}. Reason: {test_request.urgency_reason[:100]}"
+                    message=f"🚨 URGENT LAB ORDER {test_request.request_id} - Patient: {test_request.patient.patient_id}. Reason: {test_request.urgency_reason[:100]}",
+                    dedupe_key=f"lab-urgent-order:{test_request.pk}:{manager.pk}",
+                    vendor=vendor,
                 )
             except Exception as e:
                 logger.error(f"Failed to send SMS to {manager.email}: {e}")
@@ -234,29 +240,28 @@ View full results: {settings.SITE_URL}/clinician/results/{test_request.pk}/
 {test_request.vendor.name} Laboratory
 """
     
-    try:
-        send_mail(
-            subject,
-            message,
-            settings.DEFAULT_FROM_EMAIL,
-            [clinician.email],
-            fail_silently=False,
+    enqueue_email(
+        subject,
+        message,
+        [clinician.email],
+        dedupe_key=f"clinician-results:{test_request.pk}",
+        vendor=test_request.vendor,
+    )
+
+    # Mark as notified (same transaction as the queued email)
+    test_request.clinician_notified_at = timezone.now()
+    test_request.save(update_fields=['clinician_notified_at'])
+
+    logger.info(f"Clinician notification queued for order {test_request.request_id}")
+
+    # If critical, also send SMS
+    if has_critical and hasattr(clinician, 'contact_phone') and clinician.contact_phone:
+        send_sms(
+            to=clinician.contact_phone,
+            message=f"🚨 CRITICAL LAB RESULTS for patient {test_request.patient.patient_id}. Order: {test_request.request_id}. Please review immediately.",
+            dedupe_key=f"clinician-critical:{test_request.pk}",
+            vendor=test_request.vendor,
         )
-        
-        # Mark as notified
-        test_request.clinician_notified_at = timezone.now()
-        test_request.save(update_fields=['clinician_notified_at'])
-        
-        logger.info(f"Clinician notified for order {test_request.request_id}")
-        
-        # If critical, also send SMS
-        if has_critical and hasattr(clinician, 'contact_phone') and clinician.contact_phone:
-            send_sms(
-                to=clinician.contact_phone,
-                message=f"🚨 CRITICAL LAB RESULTS for patient {test_request.patient.patient_id}. Order: {test_request.request_id}. Please review immediately."
-            )
-    except Exception as e:
-        logger.error(f"Failed to notify clinician for order {test_request.request_id}: {e}")
 
 
 def notify_patient_results_ready(test_request):
@@ -305,26 +310,25 @@ Important Notes:
 {test_request.vendor.name}
 """
     
-    try:
-        send_mail(
-            subject,
-            message,
-            settings.DEFAULT_FROM_EMAIL,
-            [user.email],
-            fail_silently=False,
-        )
-        
-        logger.info(f"Patient notified for order {test_request.request_id}")
-        
-        # Send SMS if configured
-        if hasattr(patient_user, 'preferred_notification'):
-            if patient_user.preferred_notification in ['sms', 'both'] and patient.contact_phone:
-                send_sms(
-                    to=patient.contact_phone,
-                    message=f"Your lab results for order {test_request.request_id} are ready. View at: {settings.SITE_URL}/patient/results/{test_request.pk}/"
-                )
-    except Exception as e:
-        logger.error(f"Failed to notify patient for order {test_request.request_id}: {e}")
+    enqueue_email(
+        subject,
+        message,
+        [user.email],
+        dedupe_key=f"patient-results:{test_request.pk}",
+        vendor=test_request.vendor,
+    )
+
+    logger.info(f"Patient notification queued for order {test_request.request_id}")
+
+    # Send SMS if configured
+    if hasattr(patient_user, 'preferred_notification'):
+        if patient_user.preferred_notification in ['sms', 'both'] and patient.contact_phone:
+            send_sms(
+                to=patient.contact_phone,
+                message=f"Your lab results for order {test_request.request_id} are ready. View at: {settings.SITE_URL}/patient/results/{test_request.pk}/",
+                dedupe_key=f"patient-results-sms:{test_request.pk}",
+                vendor=test_request.vendor,
+            )
 
 
 def notify_critical_result(test_request, test_result):
@@ -340,42 +344,62 @@ def notify_critical_result(test_request, test_result):
 
 # ================== SMS HELPER FUNCTION ==================
 
-def send_sms(to, message):
+def send_sms(to, message, dedupe_key=None, vendor=None):
     """
-    Send SMS via Twilio (or your preferred SMS provider).
+    Queue an SMS on the outbox; drain_outbox sends it via Twilio
+    (apps.notification.channels.sms.deliver) when SMS is configured.
     """
-    try:
-        # Check if SMS is configured
-        if not hasattr(settings, 'TWILIO_ACCOUNT_SID'):
-            logger.info("SMS not configured - skipping")
-            return None
-        
-        from twilio.rest import Client
-        
-        account_sid = settings.TWILIO_ACCOUNT_SID
-        auth_token = settings.TWILIO_AUTH_TOKEN
-        from_number = settings.TWILIO_PHONE_NUMBER
-        
-        if not all([account_sid, auth_token, from_number]):
-            logger.info("SMS credentials incomplete - skipping")
-            return None
-        
-        client = Client(account_sid, auth_token)
-        
-        sms = client.messages.create(
-            body=message,
-            from_=from_number,
-            to=to
-        )
-        
-        logger.info(f"SMS sent to {to}: {sms.sid}")
-        return sms.sid
-        
-    except ImportError:
-        logger.warning("Twilio library not installed - SMS disabled")
-        return None
-    except Exception as e:
-        logger.error(f"SMS send failed: {str(e)}")
-        return None
+    return enqueue_sms(to, message, dedupe_key=dedupe_key, vendor=vendor)
+
+
+# ================== LIVE WORKLIST ==================
+# Status transitions become counter moves + websocket deltas once the
+# transaction commits (labs/services/worklist.py). The previous status is
+# snapshotted in from_db; an instance without a snapshot publishes nothing.
+
+@receiver(post_save, sender=TestAssignment)
+def publish_assignment_transition(sender, instance, created, **kwargs):
+    old = None if created else getattr(instance, '_worklist_status', instance.status)
+    instance._worklist_status = instance.status
+    if old == instance.status:
+        return
+    from .services.worklist import assignment_moved
+    args = (instance.vendor_id, instance.department_id, old, instance.status, instance.pk)
+    transaction.on_commit(lambda: assignment_moved(*args))
+
+
+@receiver(post_delete, sender=TestAssignment)
+def publish_assignment_removed(sender, instance, **kwargs):
+    from .services.worklist import assignment_moved
+    args = (instance.vendor_id, instance.department_id, getattr(instance, '_worklist_status', instance.status), None, instance.pk)
+    transaction.on_commit(lambda: assignment_moved(*args))
+
+
+@receiver(post_save, sender=TestResult)
+def publish_result_transition(sender, instance, created, **kwargs):
+    old = None if created else getattr(instance, '_worklist_status', instance.status)
+    instance._worklist_status = instance.status
+    if old == instance.status:
+        return
+    if 'assignment' in instance._state.fields_cache:
+        vendor_id, department_id = instance.assignment.vendor_id, instance.assignment.department_id
+    else:
+        vendor_id, department_id = TestAssignment.objects.filter(
+            pk=instance.assignment_id
+        ).values_list('vendor_id', 'department_id').first() or (None, None)
+    if not vendor_id:
+        return
+    from .services.worklist import result_moved
+    args = (vendor_id, department_id, old, instance.status, instance.assignment_id, instance.flag)
+    transaction.on_commit(lambda: result_moved(*args))
 
 
+@receiver(post_save, sender=Sample)
+def publish_sample_transition(sender, instance, created, **kwargs):
+    old = None if created else getattr(instance, '_worklist_status', instance.status)
+    instance._worklist_status = instance.status
+    if old == instance.status:
+        return
+    from .services.worklist import sample_moved
+    args = (instance.vendor_id, old, instance.status, instance.sample_id)
+    transaction.on_commit(lambda: sample_moved(*args))
@@ -1,6 +1,7 @@
+from decimal import Decimal
 from django.test import TestCase
 from django.contrib.auth import get_user_model
-from .models import Sample, TestRequest, Patient
+from .models import Sample, TestAssignment, TestRequest, Patient
 from apps.tenants.models import Vendor
 
 # Create your tests here.
@@ -26,3 +27,260 @@ class SampleModelTest(TestCase):
         self.assertNotEqual(sample.sample_id, "")
         self.assertTrue(sample.sample_id.startswith("SMP"))
         print(f"Auto-generated sample_id: {sample.sample_id}")
+
+
+class InstrumentRouterTest(TestCase):
+    def setUp(self):
+        from .models import Department, Equipment, VendorTest
+
+        self.vendor = Vendor.objects.create(name="Routing Vendor", contact_email="routing@vendor.test")
+        self.haem = Department.objects.create(vendor=self.vendor, name="Haematology")
+        self.chem = Department.objects.create(vendor=self.vendor, name="Chemistry")
+        self.fbc = VendorTest.objects.create(
+            vendor=self.vendor, code="FBC", name="Full Blood Count", assigned_department=self.haem
+        )
+        self.glu = VendorTest.objects.create(
+            vendor=self.vendor, code="GLU", name="Glucose", assigned_department=self.chem,
+            platform="Cobas",
+        )
+        self.sysmex_a = Equipment.objects.create(
+            vendor=self.vendor, name="Sysmex A", model="XN-1000", serial_number="SX-A", department=self.haem
+        )
+        self.sysmex_b = Equipment.objects.create(
+            vendor=self.vendor, name="Sysmex B", model="XN-1000", serial_number="SX-B", department=self.haem
+        )
+        self.generic = Equipment.objects.create(
+            vendor=self.vendor, name="Spectro", model="S1", serial_number="SP-1", department=self.chem,
+            api_endpoint="http://lims.local/spectro",
+        )
+        self.cobas = Equipment.objects.create(
+            vendor=self.vendor, name="Cobas c311", model="c311", serial_number="CB-1", department=self.chem
+        )
+
+    def _pending(self, lab_test, count):
+        return [
+            TestAssignment(vendor=self.vendor, lab_test=lab_test, department_id=lab_test.assigned_department_id)
+            for _ in range(count)
+        ]
+
+    def test_least_loaded_spreads_work_across_department(self):
+        from .services.routing import InstrumentRouter
+
+        result = InstrumentRouter(self.vendor).route(self._pending(self.fbc, 10))
+
+        self.assertEqual(result.assigned_count, 10)
+        self.assertEqual(result.load_by_instrument[self.sysmex_a.id], 5)
+        self.assertEqual(result.load_by_instrument[self.sysmex_b.id], 5)
+
+    def test_capability_beats_api_preference(self):
+        from .services.routing import InstrumentRouter
+
+        result = InstrumentRouter(self.vendor).route(self._pending(self.glu, 3))
+
+        self.assertTrue(all(a.instrument == self.cobas for a in result.assigned))
+
+    def test_thousands_route_in_one_pass(self):
+        import time
+        from django.test.utils import CaptureQueriesContext
+        from django.db import connection
+        from .services.routing import InstrumentRouter
+
+        pending = self._pending(self.fbc, 3000) + self._pending(self.glu, 3000)
+        started = time.perf_counter()
+        with CaptureQueriesContext(connection) as queries:
+            result = InstrumentRouter(self.vendor).route(pending)
+
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(result.assigned_count, 6000)
+        self.assertLess(time.perf_counter() - started, 1.0)
+
+
+class WestgardEngineTest(TestCase):
+    def setUp(self):
+        from .models import Department, QCLot, VendorTest
+
+        self.vendor = Vendor.objects.create(name="QC Vendor", contact_email="qc@vendor.test")
+        chem = Department.objects.create(vendor=self.vendor, name="Chemistry")
+        self.glu = VendorTest.objects.create(
+            vendor=self.vendor, code="GLU", name="Glucose", assigned_department=chem
+        )
+        self.low = QCLot.objects.create(
+            vendor=self.vendor, test=self.glu, lot_number="A1", level="L1",
+            target_value=Decimal("100"), sd=Decimal("5"),
+        )
+        self.high = QCLot.objects.create(
+            vendor=self.vendor, test=self.glu, lot_number="A1", level="L3",
+            target_value=Decimal("300"), sd=Decimal("10"),
+        )
+
+    def _run(self, lot, value, run_number=1):
+        from .models import QCResult
+        return QCResult.objects.create(
+            vendor=self.vendor, qc_lot=lot, result_value=Decimal(value), run_number=run_number
+        )
+
+    def test_r4s_across_levels_in_same_run(self):
+        self._run(self.low, "111")           # z = +2.2
+        high = self._run(self.high, "278")   # z = -2.2
+        self.assertIn("R₄ₛ: Range between levels > 4SD", high.rule_violations)
+
+    def test_two_two_s_across_runs_and_state_is_kept(self):
+        from .models import QCRuleState
+
+        self._run(self.low, "111", run_number=1)
+        second = self._run(self.low, "112", run_number=2)
+        self.assertIn("2₂ₛ: Two consecutive runs > ±2", second.rule_violations)
+
+        state = QCRuleState.objects.get(vendor=self.vendor, scope='LOT', qc_lot=self.low)
+        self.assertEqual([e["id"] for e in state.window][-1], second.pk)
+
+    def test_corrective_action_save_keeps_violations(self):
+        result = self._run(self.low, "120")
+        result.corrective_action = "Recalibrated"
+        result.save(update_fields=['corrective_action'])
+        result.refresh_from_db()
+        self.assertIn("1₃ₛ: |Z| > 3", result.rule_violations)
+
+    def test_bulk_import_matches_single_entry_rules(self):
+        from .models import QCTestApproval
+        from .services.qc_import import import_qc_file
+
+        astm = "\r".join([
+            "1H|\\^&|||Cobas",
+            "2O|1|A1^L1||^^^GLU",
+            "3R|1|^^^GLU|111|mg/dL||H||F||||20250131080000",
+            "4O|2|A1^L3||^^^GLU",
+            "5R|1|^^^GLU|278|mg/dL||L||F||||20250131080100",
+            "6O|3|UNKNOWN||^^^GLU",
+            "7R|1|^^^GLU|1|mg/dL||N||F||||20250131080200",
+            "8L|1|N",
+        ])
+        result = import_qc_file(self.vendor, astm)
+
+        self.assertEqual(result.created_count, 2)
+        self.assertEqual(result.failed_count, 1)   # unknown lot is rejected, the rest still imports
+        high = [r for r in result.created if r.qc_lot_id == self.high.pk][0]
+        self.assertIn("R₄ₛ: Range between levels > 4SD", high.rule_violations)
+
+        approval = QCTestApproval.objects.get(vendor=self.vendor, test=self.glu)
+        self.assertEqual(approval.qc_results.count(), 2)
+        self.assertFalse(approval.all_levels_passed)
+
+        csv_result = import_qc_file(self.vendor, "lot_number,level,value,run_date\nA1,L1,100,2025-01-31\nA1,L9,5,2025-01-31\n")
+        self.assertEqual(csv_result.created_count, 1)
+        self.assertEqual(csv_result.created[0].run_number, 2)
+        self.assertEqual(csv_result.failed_count, 1)
+
+    def test_series_overlay_running_stats_and_fingerprint(self):
+        from statistics import mean, stdev
+        from .services import qc_series
+
+        values = ["98", "101", "103", "99", "100"]
+        for i, value in enumerate(values, start=1):
+            self._run(self.low, value, run_number=i)
+        self._run(self.high, "305")
+
+        lots = qc_series.resolve_lots(self.vendor, self.glu)
+        etag, _ = qc_series.series_fingerprint(lots, 30, 500)
+        data = qc_series.build_series(lots)
+
+        low, high = data['series']
+        self.assertEqual((low['level'], high['level']), ("L1", "L3"))
+        self.assertEqual(low['total_points'], 5)
+        self.assertAlmostEqual(low['running_mean'][-1], mean(map(float, values)), places=3)
+        self.assertAlmostEqual(low['running_sd'][-1], stdev(map(float, values)), places=3)
+
+        self._run(self.high, "301")
+        self.assertNotEqual(qc_series.series_fingerprint(lots, 30, 500)[0], etag)
+
+        keep = qc_series.downsample_indices(list(range(1000)), ['PASS'] * 999 + ['FAIL'], 100)
+        self.assertLessEqual(len(keep), 102)
+        self.assertIn(999, keep)
+
+    def test_monthly_summary_sigma_from_tea_bias_and_cv(self):
+        from statistics import mean, stdev
+        from django.utils import timezone
+        from .services import qc_metrics
+
+        self.glu.tea_percent = Decimal("10")
+        self.glu.save()
+        values = ["102", "98", "104", "100", "101"]
+        for i, value in enumerate(values, start=1):
+            self._run(self.low, value, run_number=i)
+
+        today = timezone.now().date()
+        summary = qc_metrics.monthly_summary(self.vendor, today.year, today.month)
+        item = summary["tests_summary"]["GLU"]
+
+        observed = [float(v) for v in values]
+        bias = (mean(observed) - 100) / 100 * 100
+        cv = stdev(observed) / mean(observed) * 100
+        self.assertEqual(summary["total"], 5)
+        self.assertAlmostEqual(item["sigma"], (10 - abs(bias)) / cv, places=1)
+
+        # A new run changes the fingerprint, so the cached summary is not reused
+        self._run(self.low, "130", run_number=6)
+        self.assertEqual(qc_metrics.monthly_summary(self.vendor, today.year, today.month)["total"], 6)
+
+
+class WorklistTest(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        from .models import Department, VendorTest
+
+        cache.clear()
+        self.vendor = Vendor.objects.create(name="Bench Vendor", contact_email="bench@vendor.test")
+        self.haem = Department.objects.create(vendor=self.vendor, name="Haematology")
+        self.fbc = VendorTest.objects.create(
+            vendor=self.vendor, code="FBC", name="Full Blood Count", assigned_department=self.haem
+        )
+        patient = Patient.objects.create(vendor=self.vendor, first_name="Ada", last_name="Obi", gender="F")
+        self.test_request = TestRequest.objects.create(vendor=self.vendor, patient=patient, request_id="REQ-W1")
+        self.sample = Sample.objects.create(
+            vendor=self.vendor, patient=patient, test_request=self.test_request, specimen_type="Blood"
+        )
+
+    def test_transitions_move_counters_and_push_deltas(self):
+        from asgiref.sync import async_to_sync
+        from channels.layers import get_channel_layer
+        from .services import worklist
+
+        layer = get_channel_layer()
+        channel = async_to_sync(layer.new_channel)()
+        async_to_sync(layer.group_add)(worklist.group_name(self.vendor.pk, self.haem.pk), channel)
+        self.assertEqual(worklist.snapshot(self.vendor.pk)['total'], 0)  # rebuilt with one GROUP BY
+
+        with self.captureOnCommitCallbacks(execute=True):
+            created = TestAssignment.objects.create(
+                vendor=self.vendor, request=self.test_request, lab_test=self.fbc,
+                sample=self.sample, department=self.haem,
+            )
+        delta = async_to_sync(layer.receive)(channel)["delta"]
+        self.assertEqual((delta["kind"], delta["to"], delta["counts"]), ("assignment", "P", {"pending": 1, "total": 1}))
+
+        assignment = TestAssignment.objects.get(pk=created.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            assignment.mark_queued()
+            assignment.save(update_fields=['retry_count'])  # no transition, no delta
+        delta = async_to_sync(layer.receive)(channel)["delta"]
+        self.assertEqual(delta["counts"], {"pending": -1, "queued": 1})
+
+        with self.assertNumQueries(0):
+            stats = worklist.snapshot(self.vendor.pk)
+        self.assertEqual((stats['total'], stats['pending'], stats['queued']), (1, 0, 1))
+        # department counters are rebuilt on first read, then kept in step
+        self.assertEqual(worklist.snapshot(self.vendor.pk, self.haem.pk)['queued'], 1)
+
+    def test_quick_stats_reads_cached_counters(self):
+        from django.urls import reverse
+
+        user = get_user_model().objects.create_user(email="bench@lab.test", vendor=self.vendor, role="technologist")
+        self.client.force_login(user)
+        TestAssignment.objects.create(
+            vendor=self.vendor, request=self.test_request, lab_test=self.fbc,
+            sample=self.sample, department=self.haem,
+        )
+        url = reverse('labs:assignment_quick_stats')
+        self.assertEqual(self.client.get(url).json()['pending'], 1)
+        self.assertEqual(self.client.get(url, {'department': self.haem.pk}).json()['total'], 1)
+        self.assertEqual(self.client.get(url, {'department': 'x'}).status_code, 404)
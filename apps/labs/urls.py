@@ -189,13 +189,14 @@ urlpatterns = [
     path('qc/lots/<int:pk>/delete/', qty_control.qclot_delete, name='qclot_delete'),
 
     path("qc/entry/", qty_control.qc_entry_view, name="qc_entry"),
+    path("qc/import/", qty_control.qc_import_view, name="qc_import"),
     path("qc/results/", qty_control.qc_results_list, name="qc_results_list"),
     path("qc/results/<int:pk>/", qty_control.qc_result_detail, name="qc_result_detail"),
 
     # Levey-Jennings Chart
     path("qc/chart/<int:qc_lot_id>/", qty_control.levey_jennings_chart, name="levey_jennings_chart"),
     
-    path("qc/chart/data/<int:qc_lot_id>/", qty_control.levey_jennings_data, name="levey_jennings_data"),
+    path("qc/chart/series/<int:test_id>/", qty_control.qc_series_data, name="qc_series_data"),
 
     path("qc/monthly/", qty_control.qc_monthly_report, name="qc_monthly_report"),
     path("qc/dashboard/", qty_control.qc_dashboard, name="qc_dashboard")
@@ -9,6 +9,8 @@ from django.shortcuts import get_object_or_404, redirect
 from django.urls import reverse, reverse_lazy
 from django.views.decorators.http import require_http_methods, require_POST
 
+from apps.core.services.log_writer import log_writer
+
 # App-Specific Imports
 from ..models import (
     AuditLog,
@@ -21,6 +23,7 @@ from ..services.instruments import (
     fetch_assignment_result,
     send_assignment_to_instrument
 )
+from ..services.routing import auto_route_pending
 
 
 # Logger Setup
@@ -90,7 +93,8 @@ def assign_instrument(request, assignment_id):
             assignment.save(update_fields=['instrument'])
             
             # Create audit log
-            AuditLog.objects.create(
+            log_writer.write(
+                AuditLog,
                 vendor=request.user.vendor,
                 user=request.user,
                 action=(
@@ -143,7 +147,8 @@ def send_to_instrument(request, assignment_id):
         result = send_assignment_to_instrument(assignment_id)
         
         # Log the action
-        AuditLog.objects.create(
+        log_writer.write(
+            AuditLog,
             vendor=assignment.vendor,
             user=request.user,
             action=f"Sent assignment {assignment.id} to instrument {assignment.instrument.name}",
@@ -180,7 +185,8 @@ def fetch_result_from_instrument(request, assignment_id):
         result = fetch_assignment_result(assignment_id)
         
         if result:
-            AuditLog.objects.create(
+            log_writer.write(
+                AuditLog,
                 vendor=assignment.vendor,
                 user=request.user,
                 action=f"Fetched result for assignment {assignment.id} from instrument",
@@ -301,7 +307,8 @@ def bulk_assign_instrument(request):
                 updated_count += 1
             
             # Create audit log
-            AuditLog.objects.create(
+            log_writer.write(
+                AuditLog,
                 vendor=request.user.vendor,
                 user=request.user,
                 action=f"Bulk assigned {updated_count} assignments to {instrument.name}",
@@ -326,59 +333,25 @@ def auto_assign_instruments(request):
     """
     Automatically assign instruments to pending assignments based on:
     1. Test department
-    2. Instrument availability
+    2. Test capability (VendorTest.platform matches the instrument)
     3. API configuration (prefer API-enabled)
+    4. Current queue depth (least-loaded instrument wins)
+
+    Routing is done in memory by InstrumentRouter and saved with one bulk_update.
     """
-    vendor = request.user.vendor
-    
-    # Get all pending assignments without instruments
-    pending_assignments = TestAssignment.objects.filter(
-        vendor=vendor,
-        status='P',
-        instrument__isnull=True
-    ).select_related('lab_test', 'department')
-    
-    if not pending_assignments.exists():
+    result = auto_route_pending(
+        request.user.vendor,
+        user=request.user,
+        ip_address=request.META.get('REMOTE_ADDR'),
+    )
+
+    if not result.assigned and not result.unroutable:
         messages.info(request, "No pending assignments need instrument assignment.")
         return redirect('labs:test_assignment_list')
-    
-    assigned_count = 0
-    failed_count = 0
-    
-    with transaction.atomic():
-        for assignment in pending_assignments:
-            # Try to find suitable instrument
-            # Priority 1: Same department, active, has API endpoint
-            suitable_instrument = Equipment.objects.filter(
-                vendor=vendor,
-                department=assignment.department,
-                status='active'
-            ).exclude(api_endpoint='').first()
-            
-            if not suitable_instrument:
-                # Priority 2: Same department, active (no API required)
-                suitable_instrument = Equipment.objects.filter(
-                    vendor=vendor,
-                    department=assignment.department,
-                    status='active'
-                ).first()
-            
-            if suitable_instrument:
-                assignment.instrument = suitable_instrument
-                assignment.save(update_fields=['instrument'])
-                assigned_count += 1
-            else:
-                failed_count += 1
-        
-        # Create audit log
-        if assigned_count > 0:
-            AuditLog.objects.create(
-                vendor=vendor,
-                user=request.user,
-                action=f"Auto-assigned instruments to {assigned_count} assignments (Smart routing)",
-                ip_address=request.META.get('REMOTE_ADDR')
-            )
-    
+
+    assigned_count = result.assigned_count
+    failed_count = result.failed_count
+
     if assigned_count > 0:
         messages.success(
             request,
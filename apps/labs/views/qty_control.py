@@ -16,8 +16,11 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.utils import timezone
 from datetime import datetime, timedelta
-from ..forms import QCLotForm, QCActionForm, QCEntryForm
+from ..forms import QCLotForm, QCActionForm, QCEntryForm, QCImportForm
 from ..models import QCLot, QCAction, QCResult, QCTestApproval
+from ..services.qc_import import import_qc_file
+from ..services import qc_metrics, qc_series
+from django.views.decorators.http import condition
 import calendar
 from django.db.models import Count, Q
 
@@ -176,78 +179,121 @@ def qc_entry_view(request):
 
     return render(request, "laboratory/qc/entry/qc_entry.html", context)
 
+@login_required
+def qc_import_view(request):
+    """
+    Bulk QC import (CSV / JSON / ASTM).
+
+    - Form upload: renders the import page with a summary.
+    - Raw JSON or ASTM text POSTed from a logged-in session (session cookie
+      plus X-CSRFToken, e.g. a script on the bench PC): returns JSON.
+
+    There is no token-authenticated endpoint; an instrument interface that
+    cannot hold a session has to export a file for upload here.
+    """
+    vendor = request.user.vendor
+    ip_address = request.META.get('REMOTE_ADDR')
+
+    if request.method == "POST" and not request.FILES and request.content_type in ('application/json', 'text/plain'):
+        fmt = 'json' if request.content_type == 'application/json' else 'astm'
+        result = import_qc_file(
+            vendor, request.body.decode('utf-8', errors='replace'), fmt=fmt,
+            user=request.user, ip_address=ip_address,
+        )
+        return JsonResponse({
+            'created': result.created_count,
+            'rejected': result.failed_count,
+            'with_violations': result.violation_count,
+            'errors': result.errors,
+        }, status=200 if result.created_count or not result.errors else 400)
+
+    result = None
+    if request.method == "POST":
+        form = QCImportForm(vendor, request.POST, request.FILES)
+        if form.is_valid():
+            upload = form.cleaned_data['file']
+            result = import_qc_file(
+                vendor,
+                upload.read().decode('utf-8-sig', errors='replace'),
+                fmt=form.cleaned_data['format'],
+                filename=upload.name,
+                user=request.user,
+                instrument=form.cleaned_data['instrument'],
+                ip_address=ip_address,
+            )
+            if result.created_count:
+                messages.success(
+                    request,
+                    f"Imported {result.created_count} QC results "
+                    f"({result.violation_count} with rule violations).",
+                )
+            if result.errors:
+                messages.warning(request, f"{result.failed_count} rows were rejected.")
+    else:
+        form = QCImportForm(vendor)
+
+    return render(request, "laboratory/qc/entry/qc_import.html", {
+        "form": form,
+        "result": result,
+        "today": timezone.now().date(),
+    })
+
+
 # ==========================================
-# LEVEY-JENNINGS CHART - Data Endpoint
+# LEVEY-JENNINGS SERIES - Multi-lot overlay
 # ==========================================
 
+def _series_params(request, test_id):
+    """Parse and memoise series parameters so the ETag check and the view share one lookup."""
+    if not hasattr(request, '_qc_series'):
+        vendor = request.user.vendor
+        test = get_object_or_404(VendorTest, id=test_id, vendor=vendor)
+
+        try:
+            days = min(max(int(request.GET.get('days', qc_series.DEFAULT_DAYS)), 1), 730)
+            max_points = min(max(int(request.GET.get('max_points', qc_series.DEFAULT_MAX_POINTS)), 10), 5000)
+            lot_ids = [int(x) for x in request.GET.get('lots', '').split(',') if x.strip()]
+        except ValueError:
+            days, max_points, lot_ids = qc_series.DEFAULT_DAYS, qc_series.DEFAULT_MAX_POINTS, []
+        levels = [x.strip().upper() for x in request.GET.get('levels', '').split(',') if x.strip()]
+
+        lots = qc_series.resolve_lots(vendor, test, lot_ids=lot_ids, levels=levels)
+        etag, last_modified = qc_series.series_fingerprint(lots, days, max_points)
+        request._qc_series = {
+            'test': test, 'lots': lots, 'days': days, 'max_points': max_points,
+            'etag': etag, 'last_modified': last_modified,
+        }
+    return request._qc_series
+
+
+def _series_etag(request, test_id):
+    return _series_params(request, test_id)['etag']
+
+
+def _series_last_modified(request, test_id):
+    return _series_params(request, test_id)['last_modified']
+
+
 @login_required
-def levey_jennings_data(request, qc_lot_id):
+@condition(etag_func=_series_etag, last_modified_func=_series_last_modified)
+def qc_series_data(request, test_id):
     """
-    API endpoint to get data for Levey-Jennings chart.
-    Returns JSON data for Chart.js.
+    Levey-Jennings data for several lots/levels of one test.
+
+    GET params: lots=1,2  or  levels=L1,L3 (default: all active lots),
+                days (default 30), max_points (default 500).
+    Answers 304 when nothing changed since the browser's copy.
     """
-    vendor = request.user.vendor
-    qc_lot = get_object_or_404(QCLot, id=qc_lot_id, vendor=vendor)
-    
-    # Get date range (default: last 30 days)
-    days = int(request.GET.get('days', 30))
-    start_date = timezone.now().date() - timedelta(days=days)
-    
-    # Get QC results
-    results = QCResult.objects.filter(
-        qc_lot=qc_lot,
-        run_date__gte=start_date
-    ).order_by('run_date', 'run_time')
-    
-    # Build chart data
-    labels = []
-    data_points = []
-    colors = []
-    
-    for result in results:
-        labels.append(result.run_date.strftime('%m/%d'))
-        data_points.append(float(result.result_value))
-        
-        # Color based on status
-        if result.status == 'PASS':
-            colors.append('rgba(75, 192, 192, 1)')  # Green
-        elif result.status == 'WARNING':
-            colors.append('rgba(255, 206, 86, 1)')  # Yellow
-        else:
-            colors.append('rgba(255, 99, 132, 1)')  # Red
-    
-    # Control limits
-    chart_data = {
-        'labels': labels,
-        'datasets': [
-            {
-                'label': 'QC Results',
-                'data': data_points,
-                'borderColor': 'rgba(54, 162, 235, 1)',
-                'backgroundColor': colors,
-                'pointBackgroundColor': colors,
-                'pointBorderColor': colors,
-                'pointRadius': 5,
-                'fill': False,
-            }
-        ],
-        'control_limits': {
-            'mean': float(qc_lot.mean),
-            'sd_2_high': float(qc_lot.limit_2sd_high),
-            'sd_2_low': float(qc_lot.limit_2sd_low),
-            'sd_3_high': float(qc_lot.limit_3sd_high),
-            'sd_3_low': float(qc_lot.limit_3sd_low),
-        },
-        'lot_info': {
-            'test': qc_lot.test.name,
-            'level': qc_lot.get_level_display(),
-            'lot_number': qc_lot.lot_number,
-            'target': float(qc_lot.target_value),
-            'units': qc_lot.units,
-        }
-    }
-    
-    return JsonResponse(chart_data)
+    params = _series_params(request, test_id)
+    test = params['test']
+
+    data = qc_series.build_series(params['lots'], days=params['days'], max_points=params['max_points'])
+    data['test'] = {'id': test.id, 'code': test.code, 'name': test.name}
+
+    response = JsonResponse(data)
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
 
 # ==========================================
 # LEVEY-JENNINGS CHART - View
@@ -276,7 +322,7 @@ def levey_jennings_chart(request, qc_lot_id=None):
         'qc_lot': qc_lot,
         'active_lots': active_lots,
     }
-    return render(request, 'laboratory/qc/levey/levey_jennings.html', context)
+    return render(request, 'laboratory/qc/levey/level_jennings.html', context)
 
 
 @login_required
@@ -380,75 +426,10 @@ def qc_monthly_report(request):
     current_year = timezone.now().year
     years = list(range(current_year - 2, current_year + 1))
 
-    # Calculate date range
-    start_date = datetime(year, month, 1).date()
-    if month == 12:
-        end_date = datetime(year + 1, 1, 1).date() - timedelta(days=1)
-    else:
-        end_date = datetime(year, month + 1, 1).date() - timedelta(days=1)
-    
-    # Query QC results
-    results = QCResult.objects.filter(
-        vendor=vendor,
-        run_date__gte=start_date,
-        run_date__lte=end_date
-    ).select_related('qc_lot__test')
-    
-    total_runs = results.count()
-    passed = results.filter(status='PASS').count()
-    failed = results.filter(status='FAIL').count()
-    warnings = results.filter(status='WARNING').count()
+    start_date, end_date = qc_metrics.month_bounds(year, month)
 
-    # Compute overall rates
-    pass_rate = (passed / total_runs * 100) if total_runs else 0
-    warning_rate = (warnings / total_runs * 100) if total_runs else 0
-    fail_rate = (failed / total_runs * 100) if total_runs else 0
-
-    # Group by test + compute test-level percentages
-    tests_summary = {}
-    
-    for result in results:
-        test = result.qc_lot.test
-        code = test.code
-        
-        if code not in tests_summary:
-            tests_summary[code] = {
-                "test": test,
-                "total": 0,
-                "passed": 0,
-                "failed": 0,
-                "warnings": 0,
-                "pass_rate": 0,
-                "warning_rate": 0,
-                "fail_rate": 0,
-            }
-        
-        tests_summary[code]["total"] += 1
-        
-        if result.status == "PASS":
-            tests_summary[code]["passed"] += 1
-        elif result.status == "FAIL":
-            tests_summary[code]["failed"] += 1
-        else:
-            tests_summary[code]["warnings"] += 1
-
-    # Final computation for each test + sigma conversion
-    for item in tests_summary.values():
-        t = item["total"]
-
-        if t > 0:
-            item["pass_rate"] = item["passed"] / t * 100
-            item["warning_rate"] = item["warnings"] / t * 100
-            item["fail_rate"] = item["failed"] / t * 100
-            # Sigma approximation: pass rate expressed on sigma scale (0–6)
-            item["sigma"] = round((item["pass_rate"] / 100) * 6, 2)
-        else:
-            item["pass_rate"] = 0
-            item["warning_rate"] = 0
-            item["fail_rate"] = 0
-            item["sigma"] = 0
-
-    overall_sigma = round((pass_rate / 100) * 6, 2)
+    # Grouped SQL aggregation, cached per tenant and month
+    summary = qc_metrics.monthly_summary(vendor, year, month)
 
     context = {
         "year": year,
@@ -460,16 +441,16 @@ def qc_monthly_report(request):
         "start_date": start_date,
         "end_date": end_date,
 
-        "total_runs": total_runs,
-        "passed": passed,
-        "failed": failed,
-        "warnings": warnings,
+        "total_runs": summary["total"],
+        "passed": summary["passed"],
+        "failed": summary["failed"],
+        "warnings": summary["warnings"],
 
-        "pass_rate": round(pass_rate, 1),
-        "warning_rate": round(warning_rate, 1),
-        "fail_rate": round(fail_rate, 1),
-        "overall_sigma": overall_sigma,
-        "tests_summary": tests_summary,
+        "pass_rate": summary["pass_rate"],
+        "warning_rate": summary["warning_rate"],
+        "fail_rate": summary["fail_rate"],
+        "overall_sigma": summary["overall_sigma"],
+        "tests_summary": summary["tests_summary"],
     }
     
     return render(request, "laboratory/qc/metric/monthly_report.html", context)
@@ -5,6 +5,7 @@ from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import get_object_or_404, redirect, render
 from django.db import transaction
+from django.db.models import Exists, OuterRef
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.shortcuts import render, redirect, get_object_or_404
@@ -12,7 +13,9 @@ from django.urls import reverse
 from django.utils import timezone
 from apps.billing.models import BillingInformation
 from apps.accounts.decorators import require_capability
+from apps.core.services.log_writer import log_writer
 from ..models import (
+    AuditLog,
     Sample, 
     TestAssignment,
 )
@@ -380,24 +383,39 @@ def sample_bulk_verify(request):
         samples = Sample.objects.filter(
             sample_id__in=sample_ids,
             vendor=vendor
-        ).select_related('test_request', 'test_request__billing_info')
-        
+        )
+
+        # TestRequest.is_paid for the whole selection, in SQL
+        paid = BillingInformation.objects.with_clearance().filter(
+            request_id=OuterRef('test_request_id'), fully_paid=True,
+        )
+        rows = list(
+            samples.annotate(paid=Exists(paid))
+            .values_list('pk', 'sample_id', 'test_request__request_id', 'paid')
+        )
+        cleared = [row for row in rows if row[3]]
+
         verified_count = 0
-        payment_blocked_count = 0
+        payment_blocked_count = len(rows) - len(cleared)
         error_count = 0
-        
-        for sample in samples:
-            # Check payment status
-            if not sample.test_request.is_paid:
-                payment_blocked_count += 1
-                continue
-            
-            try:
-                sample.verify_sample(request.user)
-                verified_count += 1
-            except Exception as e:
-                error_count += 1
-        
+
+        try:
+            with transaction.atomic():
+                verified_count = Sample.objects.filter(
+                    pk__in=[row[0] for row in cleared]
+                ).update(verified_by=request.user, verified_at=timezone.now())
+
+                for _, sample_id, request_id, _ in cleared:
+                    log_writer.write(
+                        AuditLog,
+                        vendor=vendor,
+                        user=request.user,
+                        action=f"Sample {sample_id} verified for TestRequest {request_id}.",
+                    )
+        except Exception:
+            logger.exception("Bulk sample verification failed")
+            verified_count, error_count = 0, len(cleared)
+
         # Show results
         if verified_count > 0:
             messages.success(
@@ -463,7 +481,9 @@ def sample_verify_override_payment(request, sample_id):
                 
                 # Log the override
                 from apps.labs.models import AuditLog
-                AuditLog.objects.create(
+                log_writer.write(
+                    AuditLog,
+                    critical=True,
                     vendor=vendor,
                     user=request.user,
                     action=f"PAYMENT OVERRIDE: Verified sample {sample.sample_id} "
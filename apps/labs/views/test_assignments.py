@@ -18,6 +18,7 @@ from ..models import (
     TestAssignment,
     TestResult,
 )
+from ..services import worklist
 
 # Logger Setup
 logger = logging.getLogger(__name__)
@@ -103,21 +104,28 @@ def test_assignment_list(request):
     order_by = request.GET.get('order_by', '-created_at')
     assignments = assignments.order_by(order_by)
     
-    # Get statistics for dashboard cards
-    stats = {
-        'total': assignments.count(),
-        'pending': assignments.filter(status='P').count(),
-        'queued': assignments.filter(status='Q').count(),
-        'in_progress': assignments.filter(status='I').count(),
-        'completed': assignments.filter(status='A').count(),
-        'verified': assignments.filter(status='V').count(),
-        'rejected': assignments.filter(status='R').count(),
-        # NEW: Unassigned instruments stat
-        'unassigned_instruments': assignments.filter(
-            status='P',
-            instrument__isnull=True
-        ).count(),
-    }
+    # Get statistics for dashboard cards — the cached worklist counters
+    # (kept live over ws/worklist/) unless filtered beyond department
+    live_stats = not any([status_filter, instrument_filter, priority_filter, search_query, date_from, date_to]) and (
+        not department_filter or department_filter.isdigit()
+    )
+    if live_stats:
+        stats = worklist.snapshot(vendor.pk, department_filter or None)
+    else:
+        stats = {
+            'total': assignments.count(),
+            'pending': assignments.filter(status='P').count(),
+            'queued': assignments.filter(status='Q').count(),
+            'in_progress': assignments.filter(status='I').count(),
+            'completed': assignments.filter(status='A').count(),
+            'verified': assignments.filter(status='V').count(),
+            'rejected': assignments.filter(status='R').count(),
+        }
+    # NEW: Unassigned instruments stat
+    stats['unassigned_instruments'] = assignments.filter(
+        status='P',
+        instrument__isnull=True
+    ).count()
     
     # Pagination
     paginator = Paginator(assignments, 25)  # 25 items per page
@@ -138,6 +146,7 @@ def test_assignment_list(request):
         'page_obj': page_obj,
         'assignments': page_obj.object_list,
         'stats': stats,
+        'live_stats': live_stats,
         'departments': departments,
         'instruments': instruments,
         'available_instruments': available_instruments,  # NEW
@@ -205,19 +214,18 @@ def test_assignment_detail(request, assignment_id):
 @login_required
 def assignment_quick_stats(request):
     """
-    AJAX endpoint for real-time stats updates.
+    Current worklist stats (?department=<id> for one department).
+
+    Served from the cached counters in services/worklist.py; open pages get
+    later changes pushed over ws/worklist/ instead of polling this.
     """
     vendor = request.user.vendor
-    
-    stats = TestAssignment.objects.filter(vendor=vendor).aggregate(
-        total=Count('id'),
-        pending=Count('id', filter=Q(status='P')),
-        queued=Count('id', filter=Q(status='Q')),
-        in_progress=Count('id', filter=Q(status='I')),
-        completed=Count('id', filter=Q(status='A')),
-        verified=Count('id', filter=Q(status='V')),
-    )
-    
-    return JsonResponse(stats)
+    department_id = request.GET.get('department') or None
+    if department_id and not (
+        department_id.isdigit() and Department.objects.filter(pk=department_id, vendor=vendor).exists()
+    ):
+        return JsonResponse({'error': 'Unknown department'}, status=404)
+
+    return JsonResponse(worklist.snapshot(vendor.pk, department_id))
 
 
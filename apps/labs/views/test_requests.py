@@ -189,6 +189,16 @@ def test_request_create(request):
                         payment_status='UNPAID',
                     )
 
+                    # Running exposure columns — no query on the provider's history
+                    if insurance_provider and insurance_provider.is_over_credit_limit(
+                        additional=billing.insurance_portion
+                    ):
+                        messages.warning(
+                            request,
+                            f"⚠️ {insurance_provider.name} is over its credit limit of "
+                            f"₦{insurance_provider.credit_limit:,.2f} with this request."
+                        )
+
                     # ── Success ──────────────────────────────────────────────
                     messages.success(
                         request,
@@ -250,7 +260,7 @@ def test_request_update(request, pk):
                     
                     # Update Billing if it exists (Recalculate prices if tests changed)
                     if billing_instance:
-                        billing_instance.recalculate_total() # You'll need this method in Billing model
+                        billing_instance.rebuild_line_items()
                     
                     messages.success(request, f"Request {updated_request.request_id} updated.")
                     return redirect("labs:test_request_list")
@@ -23,6 +23,7 @@ from ..models import (
 )
 
 from ..decorators import require_capability
+from apps.core.services.log_writer import log_writer
 
 from django.conf import settings
 from django.template.loader import render_to_string
@@ -31,6 +32,7 @@ from django.http import HttpResponse
 import tempfile
 
 from django.core.mail import EmailMessage
+from apps.notification.transport import send_now
 
 
 # Logger Setup
@@ -439,7 +441,9 @@ def release_result(request, result_id):
             result.release(request.user)
             
             # Audit log
-            AuditLog.objects.create(
+            log_writer.write(
+                AuditLog,
+                critical=True,
                 vendor=assignment.vendor,
                 user=request.user,
                 action=(
@@ -504,7 +508,9 @@ def amend_result(request, result_id):
                     # Update the model (handles versioning and status)
                     result.amend(new_value=new_value, user=request.user, reason=reason)
                     
-                    AuditLog.objects.create(
+                    log_writer.write(
+                        AuditLog,
+                        critical=True,
                         vendor=request.user.vendor,
                         user=request.user,
                         action=f"AMENDMENT: Result {result.id} (Test: {result.assignment.lab_test.code}) updated.",
@@ -608,10 +614,12 @@ def download_result_pdf(request, result_id):
     return response
 
 
-def send_result_email(result_id, request=None):
+def send_result_email(result_id, request=None, transport=None):
     """
     Unified function to send the same PDF that is downloaded.
-    Pass 'request' to ensure absolute URLs for images.
+    Pass 'request' to ensure absolute URLs for images, and a
+    notification.transport.MailTransport to share one SMTP session
+    across a batch of releases.
     """
     try:
         # 1. Fetch data with all relationships (same as your download view)
@@ -623,7 +631,7 @@ def send_result_email(result_id, request=None):
             'assignment__sample',
             'verified_by',
             'ai_insight',
-        ).get(id=result_id)
+        ).get(id=getattr(result_id, 'pk', result_id))
 
         patient = result.assignment.request.patient
         if not patient.email:
@@ -679,7 +687,7 @@ def send_result_email(result_id, request=None):
         filename = f"Report_{result.assignment.request.request_id}.pdf"
         email.attach(filename, pdf_content, 'application/pdf')
         
-        email.send()
+        send_now(email, vendor=result.assignment.vendor_id, transport=transport)
         return True, "Email sent successfully."
 
     except Exception as e:
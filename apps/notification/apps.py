@@ -5,3 +5,6 @@ class NotificationConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "apps.notification"
 
+
+    def ready(self):
+        import apps.notification.signals
@@ -1,22 +1,36 @@
 # apps/notifications/channels/email.py
-from django.core.mail import send_mail
 from django.template.loader import render_to_string
 
+
 def send_notification(event):
     """
-    Send email notifications based on event type and payload
+    Queue an email notification based on event type and payload
     """
     user_email = event.payload.get("user_email")
     if not user_email:
         return
 
+    send_many(event, [user_email])
+
+
+def send_many(event, addresses):
+    """
+    Queue the event's email to each address, rendering it once.
+    """
+    addresses = [a for a in dict.fromkeys(addresses) if a]
+    if not addresses:
+        return
+
+    from ..outbox import enqueue_email
+
     subject = f"LIMS Notification: {event.event_type.replace('_', ' ').title()}"
     message = render_to_string(f"notifications/{event.event_type}.txt", {"payload": event.payload})
 
-    send_mail(
-        subject,
-        message,
-        "noreply@lims.com",
-        [user_email],
-        fail_silently=False
-    )
+    for address in addresses:
+        enqueue_email(
+            subject,
+            message,
+            [address],
+            from_email="noreply@lims.com",
+            dedupe_key=f"event:{event.id}:email:{address}",
+        )
@@ -1,14 +1,45 @@
 # apps/notifications/channels/sms.py
+import logging
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
 def send_notification(event):
     phone_number = event.payload.get("user_phone")
     if not phone_number:
         return
 
-    message = f"LIMS Alert: {event.event_type.replace('_', ' ').title()}"
+    send_many(event, [phone_number])
+
+
+def send_many(event, phone_numbers):
+    from ..outbox import enqueue_sms
+
+    body = f"LIMS Alert: {event.event_type.replace('_', ' ').title()}"
+    for phone_number in dict.fromkeys(str(p) for p in phone_numbers if p):
+        enqueue_sms(phone_number, body, dedupe_key=f"event:{event.id}:sms:{phone_number}")
+
 
-    # Example using Twilio (assuming client is configured)
-    # from .sms_client import twilio_client
-    # twilio_client.messages.create(body=message, from_="+1234567890", to=phone_number)
+def deliver(to, body):
+    """
+    Send one SMS via Twilio. Returns the message SID, or None when SMS is
+    not configured. Raises on provider errors so the outbox can retry.
+    """
+    account_sid = getattr(settings, 'TWILIO_ACCOUNT_SID', None)
+    auth_token = getattr(settings, 'TWILIO_AUTH_TOKEN', None)
+    from_number = getattr(settings, 'TWILIO_PHONE_NUMBER', None)
+    if not all([account_sid, auth_token, from_number]):
+        logger.info("SMS not configured - skipping message to %s", to)
+        return None
 
-    print(f"SMS to {phone_number}: {message}")  # placeholder for now
+    try:
+        from twilio.rest import Client
+    except ImportError:
+        logger.warning("Twilio library not installed - SMS disabled")
+        return None
 
+    sms = Client(account_sid, auth_token).messages.create(body=body, from_=from_number, to=to)
+    logger.info("SMS sent to %s: %s", to, sms.sid)
+    return sms.sid
@@ -6,8 +6,11 @@ from channels.generic.websocket import AsyncWebsocketConsumer
 # apps/notifications/channels/websocket.py
 from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
+from django.db import transaction
 from apps.notification.models import Notification
-from ..preferences.models import NotificationPreference
+from .. import inbox
+from ..preferences.cache import preferences_for
+import asyncio
 import json
 
 
@@ -39,44 +42,69 @@ class NotificationConsumer(AsyncWebsocketConsumer):
         
 
 
+PUSH_BATCH_SIZE = 100
+
+
+def _message(event, notification):
+    return json.dumps({
+        "id": event.id,
+        "notification_id": notification.pk,
+        "type": event.event_type,
+        "payload": event.payload,
+        "timestamp": str(event.timestamp)
+    })
+
+
+def push(messages):
+    """
+    Send [(user_id, group message), …] to the users' groups. Each batch goes
+    out from one event loop with its group_sends in flight together,
+    instead of one async_to_sync round trip per user.
+    """
+    channel_layer = get_channel_layer()
+    if channel_layer is None or not messages:
+        return
+
+    async def send_batch(batch):
+        await asyncio.gather(*(
+            channel_layer.group_send(f"user_{user_id}", message) for user_id, message in batch
+        ))
+
+    for start in range(0, len(messages), PUSH_BATCH_SIZE):
+        async_to_sync(send_batch)(messages[start:start + PUSH_BATCH_SIZE])
+
+
+def send_many(event, user_ids):
+    """
+    Save one Notification per user (a single bulk_create) and push them.
+    Unread counters move and pushes go out once the transaction commits,
+    so a rollback leaves neither a phantom badge nor a dangling id.
+    Preferences are the caller's job — see engine.fan_out.
+    """
+    notifications = Notification.objects.bulk_create([
+        Notification(user_id=user_id, event_type=event.event_type, payload=event.payload)
+        for user_id in dict.fromkeys(user_ids)
+    ])
+
+    def publish():
+        unread = inbox.notify_created(n.user_id for n in notifications)
+        push([
+            (n.user_id, {"type": "lims_notification", "message": _message(event, n), "unread": unread[n.user_id]})
+            for n in notifications
+        ])
+
+    transaction.on_commit(publish)
+    return notifications
+
+
 def send_notification(event):
     """
     Send event via WebSocket and save it for history.
     """
     user_id = event.payload.get("user_id")
-    if not user_id:
-        return
-
-    # Check user preferences
-    try:
-        prefs = NotificationPreference.objects.get(user_id=user_id)
-        if not prefs.in_app_enabled:
-            return
-    except NotificationPreference.DoesNotExist:
-        pass  # Default allow
-
-    # Save notification
-    Notification.objects.create(
-        user_id=user_id,
-        event_type=event.event_type,
-        payload=event.payload
-    )
-
-    # Send via WebSocket
-    channel_layer = get_channel_layer()
-    group_name = f"user_{user_id}"
-    async_to_sync(channel_layer.group_send)(
-        group_name,
-        {
-            "type": "lims_notification",
-            "message": json.dumps({
-                "id": event.id,
-                "type": event.event_type,
-                "payload": event.payload,
-                "timestamp": str(event.timestamp)
-            })
-        }
-    )
+    if not user_id or not preferences_for([user_id])[user_id].in_app_enabled:
+        return []
+    return send_many(event, [user_id])
 
 # import json
 # from asgiref.sync import async_to_sync
@@ -3,8 +3,12 @@ from channels.generic.websocket import AsyncJsonWebsocketConsumer
 
 
 # apps/notifications/consumers.py
+from asgiref.sync import sync_to_async
 from channels.generic.websocket import AsyncJsonWebsocketConsumer
 
+from . import inbox
+
+
 class NotificationConsumer(AsyncJsonWebsocketConsumer):
     async def connect(self):
         user = self.scope["user"]
@@ -14,6 +18,9 @@ class NotificationConsumer(AsyncJsonWebsocketConsumer):
             self.group_name = f"user_{user.id}"
             await self.channel_layer.group_add(self.group_name, self.channel_name)
             await self.accept()
+            # Current badge count; later changes arrive as deltas
+            unread = await sync_to_async(inbox.unread_count)(user.id)
+            await self.send_json({"type": "unread", "delta": 0, "unread": unread})
 
     async def disconnect(self, code):
         await self.channel_layer.group_discard(self.group_name, self.channel_name)
@@ -23,4 +30,13 @@ class NotificationConsumer(AsyncJsonWebsocketConsumer):
         Receives messages sent to this group.
         """
         await self.send_json(event["message"])
+        if "unread" in event:
+            await self.send_json({"type": "unread", "delta": 1, "unread": event["unread"]})
+
+    async def lims_unread(self, event):
+        """
+        Unread counter changes (inbox.mark_read). ``unread`` is None when
+        the server had no counter cached; clients apply ``delta`` instead.
+        """
+        await self.send_json({"type": "unread", "delta": event["delta"], "unread": event["unread"]})
 
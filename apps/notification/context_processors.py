@@ -0,0 +1,14 @@
+from django.utils.functional import SimpleLazyObject
+
+from . import inbox
+
+
+def notifications(request):
+    """
+    ``unread_count`` for the notification badge, read from the cached
+    counter (inbox.unread_count) only when a template uses it.
+    """
+    user = getattr(request, 'user', None)
+    if not user or not user.is_authenticated:
+        return {'unread_count': 0}
+    return {'unread_count': SimpleLazyObject(lambda: inbox.unread_count(user.pk))}
@@ -0,0 +1,222 @@
+# apps/notification/digest.py
+"""
+Per-recipient coalescing of non-urgent notifications into digests.
+
+    notify(recipient, event_type, subject, body, summary, …) → buffer, or send now if urgent
+    flush_due(batch_size)                                   → due groups → digest emails (worker)
+
+A group is (vendor, recipient, event_type). The first item in a group opens
+a window (NOTIFICATION_DIGEST_WINDOWS[event_type], default
+NOTIFICATION_DIGEST_WINDOW seconds). When the window closes,
+`manage.py flush_digests` sends the group as one email: the original
+message if only one item arrived, otherwise a digest listing each item's
+summary line. Urgent / critical events skip the buffer and go straight to
+the outbox.
+
+Backends (NOTIFICATION_DIGEST_BACKEND):
+  - 'redis'  : sorted sets in the django-redis default connection (default)
+        digest:pending            ZSET  group → window close time
+        digest:items:<group>      ZSET  item JSON → event time
+    A group is read without removing it and only acknowledged (ZREM of the
+    items that were read) once its email is in the outbox, so a failed
+    enqueue leaves the group for the next flush. An item that arrives during
+    a flush is not acknowledged and starts the next window.
+  - 'memory' : per-process equivalent (tests, single-process dev)
+  - 'off'    : no coalescing, every notification is sent as it comes
+
+Items are buffered once the surrounding transaction commits. The digest
+emails go through outbox.enqueue_email, so delivery still has retries,
+dedupe and the mail transport's rate limits.
+"""
+
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+from uuid import uuid4
+
+from django.conf import settings
+from django.db import transaction
+
+from .outbox import enqueue_email
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "digest"
+BATCH_SIZE = 100
+
+# Heading used in digest subjects, per event type
+DIGEST_LABELS = {
+    'lab_new_order': 'new test orders',
+}
+
+
+def _window(event_type: str) -> int:
+    windows = getattr(settings, 'NOTIFICATION_DIGEST_WINDOWS', {})
+    return int(windows.get(event_type, getattr(settings, 'NOTIFICATION_DIGEST_WINDOW', 600)))
+
+
+def _group(vendor_id, recipient: str, event_type: str) -> str:
+    return f"{vendor_id or ''}|{recipient}|{event_type}"
+
+
+# ── Stores ───────────────────────────────────────────────────────────────────
+
+class RedisDigestStore:
+
+    def _redis(self):
+        from django_redis import get_redis_connection
+        return get_redis_connection('default')
+
+    def add(self, group: str, item: str, at: float, due: float):
+        pipe = self._redis().pipeline()
+        pipe.zadd(f"{KEY_PREFIX}:items:{group}", {item: at})
+        pipe.zadd(f"{KEY_PREFIX}:pending", {group: due}, nx=True)  # first item sets the window
+        pipe.execute()
+
+    def due(self, now: float, limit: int) -> List[str]:
+        groups = self._redis().zrangebyscore(f"{KEY_PREFIX}:pending", '-inf', now, start=0, num=limit)
+        return [g.decode() if isinstance(g, bytes) else g for g in groups]
+
+    def read(self, group: str) -> List[str]:
+        items = self._redis().zrange(f"{KEY_PREFIX}:items:{group}", 0, -1)
+        return [i.decode() if isinstance(i, bytes) else i for i in items]
+
+    def ack(self, group: str, items: List[str], next_due: float):
+        redis = self._redis()
+        pipe = redis.pipeline(transaction=True)
+        if items:
+            pipe.zrem(f"{KEY_PREFIX}:items:{group}", *items)
+        pipe.zrem(f"{KEY_PREFIX}:pending", group)
+        pipe.zcard(f"{KEY_PREFIX}:items:{group}")
+        if pipe.execute()[-1]:
+            # items that came in during the flush open the next window
+            redis.zadd(f"{KEY_PREFIX}:pending", {group: next_due}, nx=True)
+
+
+class MemoryDigestStore:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        self.pending: Dict[str, float] = {}
+        self.items: Dict[str, List[Tuple[float, str]]] = defaultdict(list)
+
+    def add(self, group, item, at, due):
+        with self.lock:
+            self.items[group].append((at, item))
+            self.pending.setdefault(group, due)
+
+    def due(self, now, limit):
+        with self.lock:
+            ready = sorted((due, g) for g, due in self.pending.items() if due <= now)
+            return [g for _, g in ready[:limit]]
+
+    def read(self, group):
+        with self.lock:
+            return [item for _, item in sorted(self.items.get(group, []))]
+
+    def ack(self, group, items, next_due):
+        with self.lock:
+            done = set(items)
+            rest = [(at, item) for at, item in self.items.pop(group, []) if item not in done]
+            self.pending.pop(group, None)
+            if rest:
+                self.items[group] = rest
+                self.pending[group] = next_due
+
+
+_redis_store = RedisDigestStore()
+memory_store = MemoryDigestStore()
+
+
+def _store():
+    backend = getattr(settings, 'NOTIFICATION_DIGEST_BACKEND', 'redis')
+    if backend == 'off':
+        return None
+    return memory_store if backend == 'memory' else _redis_store
+
+
+# ── Producer ─────────────────────────────────────────────────────────────────
+
+def _send_now(recipient, subject, body, vendor_id, dedupe_key):
+    enqueue_email(subject, body, [recipient], dedupe_key=dedupe_key, vendor=vendor_id)
+
+
+def notify(recipient: str, event_type: str, subject: str, body: str, summary: str,
+           vendor=None, urgent: bool = False, dedupe_key: Optional[str] = None):
+    """
+    Queue one notification for ``recipient``. ``summary`` is its line in a
+    digest; ``dedupe_key`` guards the immediate (urgent / unbuffered) send.
+    """
+    if not recipient:
+        return
+    vendor_id = getattr(vendor, 'pk', vendor)
+    store = _store()
+    if urgent or store is None:
+        _send_now(recipient, subject, body, vendor_id, dedupe_key)
+        return
+
+    now = time.time()
+    group = _group(vendor_id, recipient, event_type)
+    item = json.dumps({'id': uuid4().hex, 'subject': subject, 'body': body, 'summary': summary, 'at': now})
+
+    def buffer():
+        try:
+            store.add(group, item, now, now + _window(event_type))
+        except Exception:
+            logger.exception("Digest buffer unavailable; sending %s to %s directly", event_type, recipient)
+            _send_now(recipient, subject, body, vendor_id, dedupe_key)
+
+    transaction.on_commit(buffer)
+
+
+# ── Worker ───────────────────────────────────────────────────────────────────
+
+def _digest(event_type: str, items: List[Dict]) -> Tuple[str, str]:
+    label = DIGEST_LABELS.get(event_type, event_type.replace('_', ' '))
+    lines = [f"{len(items)} {label}:", ""]
+    lines += [f"  • {time.strftime('%H:%M', time.localtime(i['at']))}  {i['summary']}" for i in items]
+    return f"{len(items)} {label}", "\n".join(lines) + "\n"
+
+
+def flush_due(batch_size: int = BATCH_SIZE, now: Optional[float] = None) -> int:
+    """
+    Send every group whose window has closed; returns how many groups were sent.
+
+    A group is only removed from the buffer after its email is in the outbox.
+    If enqueueing fails the group stays due and is retried on the next flush;
+    the dedupe key (first item's id) keeps a retry from sending it twice.
+    """
+    store = _store()
+    if store is None:
+        return 0
+    now = time.time() if now is None else now
+    groups = store.due(now, batch_size)
+
+    sent = 0
+    for group in groups:
+        vendor_id, recipient, event_type = group.split('|', 2)
+        raw = store.read(group)
+        if raw:
+            items = [json.loads(r) for r in raw]
+            if len(items) == 1:
+                subject, body = items[0]['subject'], items[0]['body']
+            else:
+                subject, body = _digest(event_type, items)
+            try:
+                enqueue_email(
+                    subject, body, [recipient],
+                    dedupe_key=f"digest:{items[0]['id']}",
+                    vendor=vendor_id or None,
+                )
+            except Exception:
+                logger.exception("Could not queue digest for %s; keeping %d item(s)", group, len(items))
+                continue
+            sent += 1
+        store.ack(group, raw, now + _window(event_type))
+    return sent
@@ -1,13 +1,15 @@
-
 # apps/notifications/engine.py
-from typing import List
+from typing import Iterable, List
+
+from django.contrib.auth import get_user_model
+
 from .domain_events import DomainEvent
 from .channels import websocket, email, sms
-from .preferences.models import NotificationPreference
 from .models import Notification
+from .preferences.cache import DEFAULT_PREFS, preferences_for
+
+DEFAULT_CHANNELS = ["websocket", "email", "sms"]
 
-# Celery task import
-from .tasks import send_email_task, send_sms_task
 
 def dispatch_event(event: DomainEvent, channels: List[str] = None):
     """
@@ -16,36 +18,55 @@ def dispatch_event(event: DomainEvent, channels: List[str] = None):
     """
     # Default channels
     if channels is None:
-        channels = ["websocket", "email", "sms"]
+        channels = DEFAULT_CHANNELS
 
-    # Determine user preferences
+    # Determine user preferences (cached); no specific user → all channels enabled
     user_id = event.payload.get("user_id")
-    if user_id:
-        try:
-            prefs = NotificationPreference.objects.get(user_id=user_id)
-            if prefs.in_app_enabled:
-                # Save to database for history
-                Notification.objects.create(
-                    user_id=user_id,
-                    event_type=event.event_type,
-                    payload=event.payload
-                )
-                websocket.send_notification(event)
-        except NotificationPreference.DoesNotExist:
-            prefs = NotificationPreference(email_enabled=True, sms_enabled=True, in_app_enabled=True)
-    else:
-        # If no specific user, assume all channels enabled
-        prefs = NotificationPreference(email_enabled=True, sms_enabled=True, in_app_enabled=True)
+    prefs = preferences_for([user_id])[user_id] if user_id else DEFAULT_PREFS
 
     # Dispatch channels according to preferences
-    if "websocket" in channels and prefs.in_app_enabled:
-        websocket.send_notification(event)  # synchronous for realtime
+    if "websocket" in channels and user_id and prefs.in_app_enabled:
+        websocket.send_many(event, [user_id])  # saved for history, then pushed
 
     if "email" in channels and prefs.email_enabled:
-        send_email_task.delay(event.__dict__)  # async via Celery
+        email.send_notification(event)  # queued on the outbox
 
     if "sms" in channels and prefs.sms_enabled:
-        send_sms_task.delay(event.__dict__)  # async via Celery
+        sms.send_notification(event)  # queued on the outbox
+
+
+def fan_out(event: DomainEvent, user_ids: Iterable, channels: List[str] = None) -> List[Notification]:
+    """
+    Deliver one event to many users (e.g. a whole department).
+
+    One cached preference lookup for everyone, one bulk_create of
+    Notification rows, batched websocket pushes, and one query for the
+    email addresses / phone numbers of those who want email or SMS.
+    """
+    if channels is None:
+        channels = DEFAULT_CHANNELS
+    prefs = preferences_for(user_ids)
+
+    notifications = []
+    if "websocket" in channels:
+        notifications = websocket.send_many(event, [pk for pk, p in prefs.items() if p.in_app_enabled])
+
+    want_email = {pk for pk, p in prefs.items() if p.email_enabled} if "email" in channels else set()
+    want_sms = {pk for pk, p in prefs.items() if p.sms_enabled} if "sms" in channels else set()
+    if want_email or want_sms:
+        contacts = get_user_model().objects.filter(pk__in=want_email | want_sms).values_list(
+            'pk', 'email', 'contact_number'
+        )
+        addresses, phones = [], []
+        for pk, address, phone in contacts:
+            if pk in want_email:
+                addresses.append(address)
+            if pk in want_sms:
+                phones.append(phone)
+        email.send_many(event, addresses)
+        sms.send_many(event, phones)
+
+    return notifications
 
 
 # Change to this later        
@@ -0,0 +1,136 @@
+# apps/notification/inbox.py
+"""
+Per-user notification inbox.
+
+    unread_count(user_id)                        → int (cache; one COUNT on a miss)
+    page(user_id, cursor=None, limit, unread_only) → (notifications, next_cursor)
+    mark_read(user_id, ids=None)                 → rows marked (ids=None: all)
+    notify_created(user_ids)                     → counters +1 per new notification (after commit)
+
+Unread counts live in the default cache, which is Redis in deployed
+environments. Counters are changed with atomic incr/decr when
+notifications are created or marked read, so the page chrome and the
+unread badge never run COUNT(*). A missing counter is rebuilt from one
+COUNT, which the (user, read, created_at) index answers. Counters expire
+after UNREAD_TIMEOUT, so any drift heals itself.
+
+History is keyset-paginated on (created_at, id): the cursor is the last
+row's position, so page N costs the same as page 1 and new notifications
+don't shift later pages.
+
+Counter changes are pushed to the user's websocket group as "lims_unread"
+messages (NotificationConsumer), with the delta and the new count.
+"""
+
+import base64
+from collections import Counter
+from datetime import datetime
+from typing import Iterable, List, Optional, Tuple
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.core.cache import cache
+from django.db.models import Q
+
+from .models import Notification
+
+UNREAD_KEY = "notification_unread:{pk}"
+UNREAD_TIMEOUT = 60 * 60
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+# ── Unread counter ───────────────────────────────────────────────────────────
+
+def unread_count(user_id) -> int:
+    key = UNREAD_KEY.format(pk=user_id)
+    count = cache.get(key)
+    if count is None:
+        count = Notification.objects.filter(user_id=user_id, read=False).count()
+        # add() keeps a counter another process rebuilt (and incremented) first
+        if not cache.add(key, count, UNREAD_TIMEOUT):
+            count = cache.get(key, count)
+    return max(int(count), 0)
+
+
+def _adjust(user_id, delta: int) -> Optional[int]:
+    """incr/decr an existing counter; a missing one is left to be rebuilt."""
+    try:
+        return cache.incr(UNREAD_KEY.format(pk=user_id), delta)
+    except ValueError:
+        return None
+
+
+def _push(changes: List[Tuple[int, int, Optional[int]]]):
+    """Send (user_id, delta, unread) to each user's websocket group."""
+    channel_layer = get_channel_layer()
+    if channel_layer is None or not changes:
+        return
+    for user_id, delta, unread in changes:
+        async_to_sync(channel_layer.group_send)(
+            f"user_{user_id}", {"type": "lims_unread", "delta": delta, "unread": unread}
+        )
+
+
+def notify_created(user_ids: Iterable) -> dict:
+    """
+    Count new unread notifications. Returns {user_id: new count or None}.
+    Call once the notifications are committed; the websocket push is left
+    to the caller, which already sends one message per notification
+    (channels/websocket.send_many, from transaction.on_commit).
+    """
+    return {
+        user_id: _adjust(user_id, n)
+        for user_id, n in Counter(pk for pk in user_ids if pk).items()
+    }
+
+
+# ── Reads ────────────────────────────────────────────────────────────────────
+
+def _encode(notification) -> str:
+    raw = f"{notification.created_at.isoformat()}|{notification.pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _decode(cursor: str) -> Tuple[datetime, int]:
+    try:
+        created_at, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(created_at), int(pk)
+    except (ValueError, UnicodeDecodeError) as exc:
+        raise ValueError("Invalid cursor") from exc
+
+
+def page(user_id, cursor: Optional[str] = None, limit: int = PAGE_SIZE,
+         unread_only: bool = False) -> Tuple[List[Notification], Optional[str]]:
+    """Newest first. Raises ValueError on a malformed cursor."""
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    qs = Notification.objects.filter(user_id=user_id)
+    if unread_only:
+        qs = qs.filter(read=False)
+    if cursor:
+        created_at, pk = _decode(cursor)
+        qs = qs.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk))
+
+    rows = list(qs.order_by('-created_at', '-pk')[:limit + 1])
+    next_cursor = _encode(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+# ── Writes ───────────────────────────────────────────────────────────────────
+
+def mark_read(user_id, ids: Optional[Iterable[int]] = None) -> int:
+    """Mark the user's notifications read (``ids`` or all); returns rows changed."""
+    qs = Notification.objects.filter(user_id=user_id, read=False)
+    if ids is not None:
+        qs = qs.filter(pk__in=list(ids))
+    marked = qs.update(read=True)
+
+    if ids is None:
+        cache.set(UNREAD_KEY.format(pk=user_id), 0, UNREAD_TIMEOUT)
+        unread = 0
+    elif marked:
+        unread = _adjust(user_id, -marked)
+    else:
+        return 0
+    _push([(user_id, -marked, None if unread is None else max(unread, 0))])
+    return marked
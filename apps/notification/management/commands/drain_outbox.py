@@ -0,0 +1,36 @@
+"""
+Deliver queued emails and SMS (OutboxMessage, status pending).
+
+Run from cron, or as a long-lived worker:
+
+    python manage.py drain_outbox --once
+    python manage.py drain_outbox --sleep 2
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.notification.outbox import BATCH_SIZE, drain
+
+
+class Command(BaseCommand):
+    help = "Send due outbox messages, retrying failures with backoff."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--once', action='store_true', help="Drain the outbox once and exit.")
+        parser.add_argument('--sleep', type=float, default=2.0, help="Seconds to wait when nothing is due.")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        total = 0
+        while True:
+            done = drain(batch_size=batch_size)
+            total += done
+            if done == batch_size:
+                continue
+            if options['once']:
+                break
+            time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(f"Processed {total} outbox message(s)."))
@@ -0,0 +1,36 @@
+"""
+Send notification digests whose coalescing window has closed.
+
+Run from cron, or as a long-lived worker next to drain_outbox:
+
+    python manage.py flush_digests --once
+    python manage.py flush_digests --sleep 30
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.notification.digest import BATCH_SIZE, flush_due
+
+
+class Command(BaseCommand):
+    help = "Turn buffered notifications into one digest email per recipient and event type."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--once', action='store_true', help="Flush due digests once and exit.")
+        parser.add_argument('--sleep', type=float, default=30.0, help="Seconds to wait when nothing is due.")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        total = 0
+        while True:
+            done = flush_due(batch_size=batch_size)
+            total += done
+            if done == batch_size:
+                continue
+            if options['once']:
+                break
+            time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(f"Queued {total} digest(s)."))
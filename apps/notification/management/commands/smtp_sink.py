@@ -0,0 +1,36 @@
+"""
+Run a local SMTP sink for development: accepts every message and prints it.
+
+    python manage.py smtp_sink --port 1025
+    # settings: EMAIL_HOST=127.0.0.1, EMAIL_PORT=1025, EMAIL_USE_TLS=False
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.notification.smtp_sink import SMTPSink
+
+
+class Command(BaseCommand):
+    help = "Run an in-memory SMTP server that accepts and prints every message."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=1025)
+
+    def handle(self, *args, **options):
+        with SMTPSink(options['host'], options['port']) as sink:
+            self.stdout.write(self.style.SUCCESS(f"SMTP sink listening on {sink.host}:{sink.port}"))
+            seen = 0
+            try:
+                while True:
+                    time.sleep(0.5)
+                    for mail_from, rcpts, data in sink.messages[seen:]:
+                        subject = next(
+                            (line[9:] for line in data.decode('utf-8', 'replace').splitlines()
+                             if line.lower().startswith('subject: ')), '',
+                        )
+                        self.stdout.write(f"{mail_from} → {', '.join(rcpts)}: {subject}")
+                    seen = len(sink.messages)
+            except KeyboardInterrupt:
+                self.stdout.write(f"{seen} message(s) in {sink.sessions} session(s).")
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.7 on 2026-10-18 21:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notification', '0002_outboxmessage'),
+        ('tenants', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outboxmessage',
+            name='vendor',
+            field=models.ForeignKey(blank=True, help_text='Tenant the message is throttled under', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='outbox_messages', to='tenants.vendor'),
+        ),
+        migrations.CreateModel(
+            name='MailDeliveryStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('sent', models.PositiveIntegerField(default=0)),
+                ('failed', models.PositiveIntegerField(default=0)),
+                ('sessions', models.PositiveIntegerField(default=0)),
+                ('throttled_ms', models.PositiveBigIntegerField(default=0)),
+                ('vendor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='mail_delivery_stats', to='tenants.vendor')),
+            ],
+            options={
+                'ordering': ['-day'],
+                'unique_together': {('vendor', 'day')},
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-18 22:07
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notification', '0004_notificationpreference'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', 'read', '-created_at'], name='notificatio_user_id_65c135_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='notificatio_user_id_91a2fc_idx'),
+        ),
+    ]
@@ -16,6 +16,98 @@ class Notification(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # unread counts / unread tab (inbox.unread_count, inbox.page)
+            models.Index(fields=['user', 'read', '-created_at']),
+            # keyset-paginated history (inbox.page)
+            models.Index(fields=['user', '-created_at', '-id']),
+        ]
 
     def __str__(self):
         return f"Notification({self.event_type} for {self.user})"
+
+
+class OutboxMessage(models.Model):
+    """
+    An email or SMS waiting to go out. Rows are written in the same
+    transaction as the change that caused them (see outbox.py), so a rolled
+    back save sends nothing, and `manage.py drain_outbox` delivers them
+    with retries and backoff — no request ever waits on SMTP or Twilio.
+
+    dedupe_key is unique: enqueueing the same logical message twice (a
+    signal firing on every save, a retried view) keeps the first row.
+    """
+
+    EMAIL = 'email'
+    SMS = 'sms'
+    CHANNEL_CHOICES = [
+        (EMAIL, 'Email'),
+        (SMS, 'SMS'),
+    ]
+
+    PENDING = 'pending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (SENT, 'Sent'),
+        (FAILED, 'Failed'),
+    ]
+
+    channel = models.CharField(max_length=10, choices=CHANNEL_CHOICES, default=EMAIL)
+    vendor = models.ForeignKey(
+        'tenants.Vendor', on_delete=models.CASCADE, null=True, blank=True,
+        related_name='outbox_messages', help_text="Tenant the message is throttled under"
+    )
+    dedupe_key = models.CharField(max_length=200, unique=True, null=True, blank=True)
+
+    recipients = models.JSONField(default=list)  # email addresses or phone numbers
+    from_email = models.CharField(max_length=254, blank=True)
+    subject = models.CharField(max_length=255, blank=True)
+    body = models.TextField(blank=True)
+    html_body = models.TextField(blank=True)
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=6)
+    available_at = models.DateTimeField(default=timezone.now)  # next attempt; pushed out while one is in flight
+    last_error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['available_at']
+        indexes = [
+            models.Index(fields=['status', 'available_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.channel} to {', '.join(self.recipients)[:60]} ({self.status})"
+
+
+class MailDeliveryStat(models.Model):
+    """
+    Daily mail delivery counters per tenant (vendor NULL = platform mail),
+    bumped with F() once per transport session by transport.MailTransport.
+    """
+    vendor = models.ForeignKey(
+        'tenants.Vendor', on_delete=models.CASCADE, null=True, blank=True,
+        related_name='mail_delivery_stats'
+    )
+    day = models.DateField()
+    sent = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    sessions = models.PositiveIntegerField(default=0)  # SMTP connections opened
+    throttled_ms = models.PositiveBigIntegerField(default=0)  # time spent waiting on rate limits
+
+    class Meta:
+        ordering = ['-day']
+        unique_together = [['vendor', 'day']]
+
+    def __str__(self):
+        return f"{self.vendor or 'platform'} {self.day}: {self.sent} sent, {self.failed} failed"
+
+
+# Registered with this app so its table is migrated (see preferences/cache.py)
+from .preferences.models import NotificationPreference  # noqa: E402,F401
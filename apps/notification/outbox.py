@@ -0,0 +1,129 @@
+# apps/notification/outbox.py
+"""
+Transactional outbox for email and SMS.
+
+    enqueue_email(subject, body, recipients, …) → OutboxMessage (same transaction)
+    enqueue_sms(to, body, …)                    → OutboxMessage
+    drain(batch_size)                           → deliver due messages (worker)
+
+Saves and signals call enqueue_*; nothing talks to SMTP or Twilio until
+`manage.py drain_outbox` picks the row up. If the surrounding transaction
+rolls back, the message goes with it.
+
+drain() claims a batch with select_for_update(skip_locked) and pushes each
+row's available_at out by LEASE before sending, so several workers can run
+side by side and a worker that dies mid-send only delays its batch. A
+failed send is retried after BACKOFF_BASE * 2**(attempts - 1), capped at
+BACKOFF_MAX; after max_attempts the row is marked FAILED.
+
+Email goes out through one transport.MailTransport per batch: one SMTP
+session, throttled per tenant (message.vendor) and per recipient provider.
+"""
+
+import logging
+from datetime import timedelta
+from typing import Iterable, Optional
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives
+from django.db import transaction
+from django.utils import timezone
+
+from .channels import sms
+from .models import OutboxMessage
+from .transport import MailTransport
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = getattr(settings, 'OUTBOX_BATCH_SIZE', 50)
+LEASE = timedelta(minutes=5)
+BACKOFF_BASE = timedelta(seconds=30)
+BACKOFF_MAX = timedelta(hours=2)
+
+
+def _enqueue(channel, recipients, dedupe_key, **fields) -> Optional[OutboxMessage]:
+    recipients = [r for r in recipients if r]
+    if not recipients:
+        return None
+    if dedupe_key:
+        message, _ = OutboxMessage.objects.get_or_create(
+            dedupe_key=dedupe_key[:200],
+            defaults={'channel': channel, 'recipients': recipients, **fields},
+        )
+        return message
+    return OutboxMessage.objects.create(channel=channel, recipients=recipients, **fields)
+
+
+def enqueue_email(subject: str, body: str, recipients: Iterable[str], html_body: str = '',
+                  from_email: Optional[str] = None, dedupe_key: Optional[str] = None, vendor=None):
+    return _enqueue(
+        OutboxMessage.EMAIL, list(recipients), dedupe_key, vendor_id=getattr(vendor, 'pk', vendor),
+        subject=subject[:255], body=body, html_body=html_body,
+        from_email=from_email or '',  # blank: DEFAULT_FROM_EMAIL at send time
+    )
+
+
+def enqueue_sms(to: str, body: str, dedupe_key: Optional[str] = None, vendor=None):
+    return _enqueue(OutboxMessage.SMS, [to], dedupe_key, vendor_id=getattr(vendor, 'pk', vendor), body=body)
+
+
+def backoff(attempts: int) -> timedelta:
+    return min(BACKOFF_BASE * 2 ** max(attempts - 1, 0), BACKOFF_MAX)
+
+
+def _claim(batch_size: int):
+    now = timezone.now()
+    with transaction.atomic():
+        messages = list(
+            OutboxMessage.objects.select_for_update(skip_locked=True)
+            .filter(status=OutboxMessage.PENDING, available_at__lte=now)
+            .order_by('available_at')[:batch_size]
+        )
+        for message in messages:
+            message.attempts += 1
+            message.available_at = now + LEASE
+        OutboxMessage.objects.bulk_update(messages, ['attempts', 'available_at'])
+    return messages
+
+
+def _send(message, transport):
+    if message.channel == OutboxMessage.SMS:
+        for to in message.recipients:
+            sms.deliver(to, message.body)
+        return
+
+    email = EmailMultiAlternatives(
+        subject=message.subject,
+        body=message.body,
+        from_email=message.from_email or settings.DEFAULT_FROM_EMAIL,
+        to=message.recipients,
+    )
+    if message.html_body:
+        email.attach_alternative(message.html_body, "text/html")
+    if not transport.send(email, vendor_id=message.vendor_id):
+        raise RuntimeError("mail backend accepted no messages")
+
+
+def drain(batch_size: int = BATCH_SIZE) -> int:
+    """Deliver up to ``batch_size`` due messages; returns how many were claimed."""
+    messages = _claim(batch_size)
+    if not messages:
+        return 0
+
+    with MailTransport() as transport:
+        for message in messages:
+            try:
+                _send(message, transport)
+            except Exception as e:
+                message.last_error = f"{type(e).__name__}: {e}"[:2000]
+                if message.attempts >= message.max_attempts:
+                    message.status = OutboxMessage.FAILED
+                    logger.error("Outbox message %s failed for good: %s", message.pk, message.last_error)
+                else:
+                    message.available_at = timezone.now() + backoff(message.attempts)
+                    logger.warning("Outbox message %s attempt %d failed: %s", message.pk, message.attempts, e)
+            else:
+                message.status = OutboxMessage.SENT
+                message.sent_at = timezone.now()
+            message.save(update_fields=['status', 'available_at', 'last_error', 'sent_at'])
+    return len(messages)
@@ -0,0 +1,55 @@
+# apps/notification/preferences/cache.py
+"""
+Cached notification preferences.
+
+    preferences_for(user_ids) → {user_id: Prefs}   (one query for the cache misses)
+    invalidate(user_id)
+
+Each user's (email, sms, in_app) flags are cached under their own key, so a
+fan-out to a whole department reads them with one get_many. Users without
+a NotificationPreference row get DEFAULT_PREFS, and that result is cached
+too. Saving or deleting a preference drops the user's key (notification/signals.py).
+"""
+
+from typing import Dict, Iterable, NamedTuple
+
+from django.core.cache import cache
+
+from .models import NotificationPreference
+
+PREF_KEY = "notification_prefs:{pk}"
+PREF_TIMEOUT = 60 * 60 * 24
+
+
+class Prefs(NamedTuple):
+    email_enabled: bool
+    sms_enabled: bool
+    in_app_enabled: bool
+
+
+DEFAULT_PREFS = Prefs(email_enabled=True, sms_enabled=True, in_app_enabled=True)
+
+
+def preferences_for(user_ids: Iterable) -> Dict[int, Prefs]:
+    user_ids = [pk for pk in dict.fromkeys(user_ids) if pk]
+    keys = {pk: PREF_KEY.format(pk=pk) for pk in user_ids}
+    cached = cache.get_many(keys.values())
+
+    prefs = {pk: Prefs(*cached[key]) for pk, key in keys.items() if key in cached}
+    missing = [pk for pk in user_ids if pk not in prefs]
+    if missing:
+        found = {
+            user_id: Prefs(*flags)
+            for user_id, *flags in NotificationPreference.objects.filter(user_id__in=missing).values_list(
+                'user_id', 'email_enabled', 'sms_enabled', 'in_app_enabled'
+            )
+        }
+        fresh = {pk: found.get(pk, DEFAULT_PREFS) for pk in missing}
+        cache.set_many({keys[pk]: tuple(p) for pk, p in fresh.items()}, PREF_TIMEOUT)
+        prefs.update(fresh)
+    return prefs
+
+
+def invalidate(user_id) -> None:
+    if user_id:
+        cache.delete(PREF_KEY.format(pk=user_id))
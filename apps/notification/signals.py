@@ -0,0 +1,11 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+
+# Cached preferences (notification/preferences/cache.py)
+
+@receiver(post_save, sender='notification.NotificationPreference')
+@receiver(post_delete, sender='notification.NotificationPreference')
+def invalidate_cached_preferences(sender, instance, **kwargs):
+    from .preferences.cache import invalidate
+    invalidate(instance.user_id)
@@ -0,0 +1,101 @@
+# apps/notification/smtp_sink.py
+"""
+A local SMTP server that accepts everything and keeps it in memory.
+
+    with SMTPSink() as sink:
+        with override_settings(EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+                               EMAIL_HOST=sink.host, EMAIL_PORT=sink.port, EMAIL_USE_TLS=False):
+            ...
+        sink.messages   → [(mail_from, [rcpt, …], raw bytes), …]
+        sink.sessions   → SMTP connections accepted
+
+Also runnable for local development: `manage.py smtp_sink --port 1025`.
+Speaks just enough SMTP (EHLO/HELO, MAIL, RCPT, DATA, RSET, NOOP, QUIT)
+for smtplib; no TLS or AUTH.
+"""
+
+import socketserver
+import threading
+
+
+class _Handler(socketserver.StreamRequestHandler):
+
+    def reply(self, line: str):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        sink = self.server.sink
+        with sink.lock:
+            sink.sessions += 1
+        self.reply("220 smtp-sink ready")
+        mail_from, rcpts = None, []
+
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode('latin-1').strip()
+            verb = command[:4].upper()
+
+            if verb in ('EHLO', 'HELO'):
+                self.reply("250 smtp-sink")
+            elif verb == 'MAIL':
+                mail_from, rcpts = command.partition(':')[2].strip(), []
+                self.reply("250 OK")
+            elif verb == 'RCPT':
+                rcpts.append(command.partition(':')[2].strip().strip('<>'))
+                self.reply("250 OK")
+            elif verb == 'DATA':
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                lines = []
+                while True:
+                    data = self.rfile.readline()
+                    if not data or data in (b".\r\n", b".\n"):
+                        break
+                    lines.append(data[1:] if data.startswith(b"..") else data)
+                with sink.lock:
+                    sink.messages.append((mail_from, rcpts, b"".join(lines)))
+                mail_from, rcpts = None, []
+                self.reply("250 OK queued")
+            elif verb == 'RSET':
+                mail_from, rcpts = None, []
+                self.reply("250 OK")
+            elif verb == 'NOOP':
+                self.reply("250 OK")
+            elif verb == 'QUIT':
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class SMTPSink:
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0):
+        self.server = _Server((host, port), _Handler)
+        self.server.sink = self
+        self.host, self.port = self.server.server_address[:2]
+        self.messages = []
+        self.sessions = 0
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -1,3 +1,281 @@
-from django.test import TestCase
+import json
+import time
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail import EmailMessage
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.accounts.models import User
+from apps.labs.models import Patient, TestRequest
+from apps.notification import inbox
+from apps.notification.digest import flush_due, memory_store
+from apps.notification.domain_events import DomainEvent
+from apps.notification.engine import dispatch_event, fan_out
+from apps.notification.models import MailDeliveryStat, Notification, NotificationPreference, OutboxMessage
+from apps.notification.outbox import drain, enqueue_email, enqueue_sms
+from apps.notification.smtp_sink import SMTPSink
+from apps.notification.transport import MailTransport, RedisTokenBucket, TokenBucket, reset_buckets
+from apps.tenants.models import Vendor
+
+
+@override_settings(MAIL_RATE_BACKEND='memory')
+class OutboxTest(TestCase):
+    def setUp(self):
+        reset_buckets()
+
+    def test_rolled_back_transaction_queues_nothing(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            enqueue_email("Hello", "Body", ["a@lab.test"])
+            raise RuntimeError
+        self.assertFalse(OutboxMessage.objects.exists())
+
+    def test_dedupe_key_keeps_the_first_message(self):
+        first = enqueue_email("Hello", "Body", ["a@lab.test"], dedupe_key="greeting:1")
+        again = enqueue_email("Hello again", "Body", ["a@lab.test"], dedupe_key="greeting:1")
+        self.assertEqual(first.pk, again.pk)
+        self.assertEqual(OutboxMessage.objects.count(), 1)
+        self.assertIsNone(enqueue_email("Nobody", "Body", [""]))
+
+    def test_drain_sends_in_one_connection_and_marks_sent(self):
+        enqueue_email("One", "Body", ["a@lab.test"], html_body="<p>Body</p>")
+        enqueue_email("Two", "Body", ["b@lab.test"])
+        enqueue_sms("+2348000000000", "Hi")  # SMS not configured: skipped, not an error
+
+        self.assertEqual(drain(), 3)
+        self.assertEqual(sorted(m.subject for m in mail.outbox), ["One", "Two"])
+        self.assertEqual(OutboxMessage.objects.filter(status=OutboxMessage.SENT).count(), 3)
+        self.assertEqual(drain(), 0)
+
+    def test_failures_back_off_then_give_up(self):
+        message = enqueue_email("Flaky", "Body", ["a@lab.test"])
+        with mock.patch('apps.notification.outbox._send', side_effect=OSError("smtp down")):
+            self.assertEqual(drain(), 1)
+            message.refresh_from_db()
+            self.assertEqual((message.status, message.attempts), (OutboxMessage.PENDING, 1))
+            self.assertGreater(message.available_at, timezone.now() + timedelta(seconds=20))
+            self.assertEqual(drain(), 0)  # not due yet
+
+            OutboxMessage.objects.update(available_at=timezone.now(), attempts=message.max_attempts - 1)
+            drain()
+        message.refresh_from_db()
+        self.assertEqual(message.status, OutboxMessage.FAILED)
+        self.assertIn("smtp down", message.last_error)
+
+
+@override_settings(NOTIFICATION_DIGEST_BACKEND='memory', NOTIFICATION_DIGEST_WINDOWS={'lab_new_order': 60})
+class DigestTest(TestCase):
+    def setUp(self):
+        memory_store.clear()
+        self.vendor = Vendor.objects.create(name="Digest Lab", contact_email="digest@vendor.test")
+        User.objects.create_user(email="admin@digest.test", vendor=self.vendor, role="vendor_admin")
+        self.patient = Patient.objects.create(vendor=self.vendor, first_name="Ada", last_name="Obi", gender="F")
+
+    def order(self, request_id, priority="routine"):
+        with self.captureOnCommitCallbacks(execute=True):
+            return TestRequest.objects.create(
+                vendor=self.vendor, patient=self.patient, request_id=request_id, priority=priority,
+            )
+
+    def test_routine_orders_coalesce_into_one_digest(self):
+        for n in range(3):
+            self.order(f"REQ-{n}")
+        self.assertFalse(OutboxMessage.objects.exists())
+
+        self.assertEqual(flush_due(), 0)  # window still open
+        self.assertEqual(flush_due(now=time.time() + 61), 1)
+        message = OutboxMessage.objects.get()
+        self.assertEqual(message.recipients, ["admin@digest.test"])
+        self.assertEqual(message.vendor_id, self.vendor.pk)
+        self.assertTrue(message.subject.startswith("3 new test orders"))
+        for n in range(3):
+            self.assertIn(f"REQ-{n}", message.body)
+        self.assertEqual(flush_due(now=time.time() + 61), 0)
+
+    def test_single_item_is_sent_as_the_original_message(self):
+        self.order("REQ-ONLY")
+        flush_due(now=time.time() + 61)
+        self.assertIn("REQ-ONLY", OutboxMessage.objects.get().subject)
+
+    def test_urgent_orders_bypass_the_buffer(self):
+        test_request = self.order("REQ-STAT", priority="urgent")
+        message = OutboxMessage.objects.get(channel=OutboxMessage.EMAIL)
+        self.assertEqual(message.dedupe_key, f"lab-new-order:{test_request.pk}:admin@digest.test")
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(flush_due(now=time.time() + 61), 0)
+
+    def test_failed_enqueue_keeps_the_group(self):
+        for n in range(2):
+            self.order(f"REQ-{n}")
+        with mock.patch("apps.notification.digest.enqueue_email", side_effect=RuntimeError("outbox down")):
+            self.assertEqual(flush_due(now=time.time() + 61), 0)
+        self.assertFalse(OutboxMessage.objects.exists())
+
+        self.assertEqual(flush_due(now=time.time() + 61), 1)
+        self.assertTrue(OutboxMessage.objects.get().subject.startswith("2 new test orders"))
+
+
+class FanOutTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.vendor = Vendor.objects.create(name="Fan Lab", contact_email="fan@vendor.test")
+        self.users = [
+            User.objects.create_user(email=f"staff{n}@fan.test", vendor=self.vendor, role="technologist")
+            for n in range(4)
+        ]
+        self.ids = [u.pk for u in self.users]
+        NotificationPreference.objects.create(user=self.users[0], in_app_enabled=False)
+
+    def test_one_query_for_preferences_and_one_insert(self):
+        event = DomainEvent("department_notice", {"text": "QC run due"})
+        with self.assertNumQueries(2):
+            notifications = fan_out(event, self.ids, channels=["websocket"])
+        self.assertEqual(sorted(n.user_id for n in notifications), sorted(self.ids[1:]))
+
+        with self.assertNumQueries(1):  # preferences now cached
+            fan_out(event, self.ids, channels=["websocket"])
+
+        NotificationPreference.objects.filter(user=self.users[0]).get().delete()
+        self.assertEqual(len(fan_out(event, self.ids, channels=["websocket"])), 4)
+
+    def test_pushes_to_each_users_group(self):
+        layer = get_channel_layer()
+        channel = async_to_sync(layer.new_channel)()
+        async_to_sync(layer.group_add)(f"user_{self.ids[2]}", channel)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            [notification] = fan_out(DomainEvent("notice", {"n": 1}), [self.ids[2]], channels=["websocket"])
+        message = json.loads(async_to_sync(layer.receive)(channel)["message"])
+        self.assertEqual((message["type"], message["notification_id"]), ("notice", notification.pk))
+
+    def test_dispatch_event_saves_one_notification(self):
+        dispatch_event(DomainEvent("notice", {"user_id": self.ids[1]}), channels=["websocket"])
+        self.assertEqual(Notification.objects.filter(user_id=self.ids[1]).count(), 1)
+
+
+class InboxTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.vendor = Vendor.objects.create(name="Inbox Lab", contact_email="inbox@vendor.test")
+        self.user = User.objects.create_user(email="reader@inbox.test", vendor=self.vendor, role="scientist")
+
+    def test_counter_follows_creates_and_mark_read(self):
+        self.assertEqual(inbox.unread_count(self.user.pk), 0)  # rebuilt with one COUNT
+        for n in range(3):
+            with self.captureOnCommitCallbacks(execute=True):
+                fan_out(DomainEvent("notice", {"n": n}), [self.user.pk], channels=["websocket"])
+        with self.assertNumQueries(0):
+            self.assertEqual(inbox.unread_count(self.user.pk), 3)
+
+        first = Notification.objects.filter(user=self.user).order_by('pk').first()
+        self.client.force_login(self.user)
+        response = self.client.post(
+            reverse('notification:api_mark_read_bulk'), {"ids": [first.pk]}, content_type='application/json'
+        )
+        self.assertEqual((response.json()["marked"], response.json()["unread"]), (1, 2))
+        response = self.client.post(reverse('notification:api_mark_read_bulk'), {"all": True}, content_type='application/json')
+        self.assertEqual(response.json()["unread"], 0)
+        self.assertFalse(Notification.objects.filter(user=self.user, read=False).exists())
+
+    def test_mark_read_pushes_a_delta(self):
+        layer = get_channel_layer()
+        channel = async_to_sync(layer.new_channel)()
+        async_to_sync(layer.group_add)(f"user_{self.user.pk}", channel)
+        inbox.unread_count(self.user.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            [notification] = fan_out(DomainEvent("notice", {}), [self.user.pk], channels=["websocket"])
+        self.assertEqual(async_to_sync(layer.receive)(channel)["unread"], 1)
+
+        inbox.mark_read(self.user.pk, [notification.pk])
+        message = async_to_sync(layer.receive)(channel)
+        self.assertEqual((message["type"], message["delta"], message["unread"]), ("lims_unread", -1, 0))
+
+    def test_rolled_back_notification_is_not_counted(self):
+        inbox.unread_count(self.user.pk)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                fan_out(DomainEvent("notice", {}), [self.user.pk], channels=["websocket"])
+                raise RuntimeError
+        self.assertEqual(callbacks, [])
+        self.assertEqual(inbox.unread_count(self.user.pk), 0)
+
+    def test_keyset_pages_cover_history_once(self):
+        now = timezone.now()
+        Notification.objects.bulk_create(
+            [Notification(user=self.user, event_type="notice", created_at=now) for _ in range(3)]
+            + [Notification(user=self.user, event_type="notice", created_at=now - timedelta(minutes=n)) for n in (1, 2)]
+        )
+        seen, cursor = [], None
+        while True:
+            rows, cursor = inbox.page(self.user.pk, cursor=cursor, limit=2)
+            seen += [n.pk for n in rows]
+            if cursor is None:
+                break
+        self.assertEqual(len(seen), 5)
+        self.assertEqual(seen, [n.pk for n in Notification.objects.filter(user=self.user).order_by('-created_at', '-pk')])
+
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse('notification:api_list'), {"cursor": "nope"}).status_code, 400)
+
+
+@override_settings(MAIL_RATE_BACKEND='memory')
+class MailTransportTest(TestCase):
+    def setUp(self):
+        reset_buckets()
+        self.vendor = Vendor.objects.create(name="Mail Lab", contact_email="mail@vendor.test")
+
+    def test_token_bucket_allows_burst_then_paces(self):
+        now = [0.0]
+        bucket = TokenBucket(rate=2, burst=3, clock=lambda: now[0])
+        self.assertEqual([bucket.reserve() for _ in range(3)], [0.0, 0.0, 0.0])
+        self.assertEqual(bucket.reserve(), 0.5)
+        self.assertEqual(bucket.reserve(), 1.0)
+        now[0] = 10.0
+        self.assertEqual(bucket.reserve(), 0.0)
+
+    def test_shared_bucket_falls_back_to_process_bucket_without_redis(self):
+        bucket = RedisTokenBucket("mail_rate:tenant:test", rate=1, burst=1)  # test cache is locmem
+        with self.assertLogs('apps.notification.transport', 'WARNING'):
+            self.assertEqual(bucket.reserve(), 0.0)
+            self.assertGreater(bucket.reserve(), 0.0)
+
+    def test_one_smtp_session_for_many_messages(self):
+        with SMTPSink() as sink, override_settings(
+            EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+            EMAIL_HOST=sink.host, EMAIL_PORT=sink.port, EMAIL_USE_TLS=False, EMAIL_USE_SSL=False,
+            EMAIL_HOST_USER='', EMAIL_HOST_PASSWORD='',
+        ):
+            for n in range(12):
+                enqueue_email(f"Result {n}", "Body", [f"p{n}@example.com"], from_email="lab@mail.test", vendor=self.vendor)
+            self.assertEqual(drain(batch_size=50), 12)
+
+            with MailTransport(max_per_session=2) as transport:
+                for n in range(3):
+                    transport.send(EmailMessage(f"Extra {n}", "Body", "lab@mail.test", ["x@example.com"]))
+
+        self.assertEqual(len(sink.messages), 15)
+        self.assertEqual(sink.sessions, 1 + 2)
+        self.assertEqual(OutboxMessage.objects.filter(status=OutboxMessage.SENT).count(), 12)
+
+        stat = MailDeliveryStat.objects.get(vendor=self.vendor)
+        self.assertEqual((stat.sent, stat.failed, stat.sessions), (12, 0, 1))
+        self.assertEqual(MailDeliveryStat.objects.get(vendor__isnull=True).sessions, 2)
+
+    @override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+    def test_tenant_limit_waits_instead_of_sending_in_a_burst(self):
+        waits = []
+        with mock.patch('apps.notification.transport.TENANT_RATE', (1.0, 2)):
+            reset_buckets()
+            with MailTransport(sleep=waits.append) as transport:
+                for n in range(4):
+                    transport.send(EmailMessage("Hi", "Body", "lab@mail.test", ["a@example.com"]), vendor_id=self.vendor.pk)
+        self.assertEqual(len(mail.outbox), 4)
+        self.assertEqual(len(waits), 2)
+        self.assertGreater(MailDeliveryStat.objects.get(vendor=self.vendor).throttled_ms, 2000)
@@ -0,0 +1,234 @@
+# apps/notification/transport.py
+"""
+Pooled, rate-limited outbound mail.
+
+    with MailTransport() as transport:            → one SMTP session for many sends
+        transport.send(message, vendor_id=…)      → throttled send, reconnects once
+    send_now(message, vendor=None, transport=None) → single send (or via a transport)
+
+Django's send_mail / EmailMessage.send() open and close an SMTP connection
+per message. MailTransport opens one connection, reuses it for up to
+MAIL_MAX_PER_SESSION messages (then reconnects, since most relays limit
+messages per session), and reconnects once if the server dropped an idle
+session.
+
+Every send takes a token from two buckets: one per tenant (vendor) and one
+per recipient mail provider (the address's domain). When a bucket is
+empty, the send waits. The rates come from settings:
+
+    MAIL_TENANT_RATE    = (messages per second, burst)           default (2, 20)
+    MAIL_PROVIDER_RATES = {'gmail.com': (…), '*': (…)}            default {'*': (5, 50)}
+
+Buckets (MAIL_RATE_BACKEND):
+  - 'redis'  : one hash per bucket in the django-redis default connection
+        mail_rate:<tenant|provider>:<key>   HASH  tokens, updated
+    refilled and taken by one Lua script on Redis' clock, so every drain
+    worker, Celery task and web process shares the same limits (default).
+    If Redis is unreachable the send falls back to a per-process bucket.
+  - 'memory' : per-process buckets (tests, single-process dev)
+
+On close(), the session's counts (sent, failed, sessions opened, time spent
+throttled) are added to MailDeliveryStat with one F() update per tenant.
+smtp_sink.SMTPSink is a local SMTP server to point the backend at in tests.
+"""
+
+import logging
+import smtplib
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.core.mail import get_connection
+from django.db.models import F
+from django.utils import timezone
+
+from .models import MailDeliveryStat
+
+logger = logging.getLogger(__name__)
+
+RATE_KEY = "mail_rate:{kind}:{key}"
+
+TENANT_RATE = getattr(settings, 'MAIL_TENANT_RATE', (2.0, 20))
+PROVIDER_RATES = getattr(settings, 'MAIL_PROVIDER_RATES', {'*': (5.0, 50)})
+MAX_PER_SESSION = getattr(settings, 'MAIL_MAX_PER_SESSION', 100)
+
+
+class TokenBucket:
+    """``rate`` tokens per second, up to ``burst``. reserve() may go into debt."""
+
+    def __init__(self, rate: float, burst: float, clock=time.monotonic):
+        self.rate, self.burst = float(rate), float(burst)
+        self.tokens = self.burst
+        self.clock = clock
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Take one token; returns the seconds to wait before using it."""
+        with self.lock:
+            now = self.clock()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+class RedisTokenBucket:
+    """TokenBucket kept in Redis; reserve() is one atomic script call."""
+
+    RESERVE = """
+    local rate, burst = tonumber(ARGV[1]), tonumber(ARGV[2])
+    local clock = redis.call('TIME')
+    local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+    local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+    local tokens = tonumber(state[1]) or burst
+    local updated = tonumber(state[2]) or now
+    tokens = math.min(burst, tokens + math.max(0, now - updated) * rate) - 1
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+    redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 60)
+    if tokens >= 0 then return '0' end
+    return tostring(-tokens / rate)
+    """
+    _script = None
+
+    def __init__(self, key: str, rate: float, burst: float):
+        self.key = key
+        self.rate, self.burst = float(rate), float(burst)
+        self.fallback = TokenBucket(rate, burst)
+
+    @classmethod
+    def _reserve_script(cls):
+        if cls._script is None:
+            from django_redis import get_redis_connection
+            cls._script = get_redis_connection('default').register_script(cls.RESERVE)
+        return cls._script
+
+    def reserve(self) -> float:
+        try:
+            return float(self._reserve_script()(keys=[self.key], args=[self.rate, self.burst]))
+        except Exception:
+            logger.warning("Mail rate limit %s: Redis unavailable, using this process' bucket", self.key)
+            return self.fallback.reserve()
+
+
+_buckets: Dict[tuple, Optional[TokenBucket]] = {}
+_buckets_lock = threading.Lock()
+
+
+def _bucket(kind: str, key) -> Optional[TokenBucket]:
+    backend = getattr(settings, 'MAIL_RATE_BACKEND', 'redis')
+    with _buckets_lock:
+        if (backend, kind, key) not in _buckets:
+            if kind == 'tenant':
+                limit = TENANT_RATE
+            else:
+                limit = PROVIDER_RATES.get(key, PROVIDER_RATES.get('*'))
+            if not limit:
+                bucket = None
+            elif backend == 'redis':
+                bucket = RedisTokenBucket(RATE_KEY.format(kind=kind, key=key), *limit)
+            else:
+                bucket = TokenBucket(*limit)
+            _buckets[backend, kind, key] = bucket
+        return _buckets[backend, kind, key]
+
+
+def reset_buckets():
+    with _buckets_lock:
+        _buckets.clear()
+
+
+def _domains(message):
+    return {
+        address.rpartition('@')[2].strip(' >').lower()
+        for address in message.recipients() if '@' in address
+    }
+
+
+class MailTransport:
+
+    def __init__(self, connection=None, max_per_session: int = MAX_PER_SESSION, sleep=time.sleep):
+        self.connection = connection or get_connection()
+        self.max_per_session = max_per_session
+        self.sleep = sleep
+        self.opened = False
+        self.in_session = 0
+        self.stats = defaultdict(Counter)  # vendor_id → sent / failed / sessions / throttled_ms
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _ensure_open(self, vendor_id):
+        if self.opened and self.in_session < self.max_per_session:
+            return
+        if self.opened:
+            self.connection.close()
+        self.connection.open()
+        self.opened, self.in_session = True, 0
+        self.stats[vendor_id]['sessions'] += 1
+
+    def _throttle(self, message, vendor_id):
+        buckets = [_bucket('tenant', vendor_id)] + [_bucket('provider', d) for d in _domains(message)]
+        wait = max((b.reserve() for b in buckets if b is not None), default=0.0)
+        if wait > 0:
+            self.stats[vendor_id]['throttled_ms'] += int(wait * 1000)
+            self.sleep(wait)
+
+    def send(self, message, vendor_id=None) -> bool:
+        """Send one EmailMessage on the shared connection. Raises on failure."""
+        self._throttle(message, vendor_id)
+        message.connection = self.connection
+        try:
+            for attempt in (1, 2):
+                self._ensure_open(vendor_id)
+                try:
+                    sent = self.connection.send_messages([message])
+                    break
+                except smtplib.SMTPServerDisconnected:
+                    self.connection.close()
+                    self.opened = False
+                    if attempt == 2:
+                        raise
+                    logger.info("Mail transport: session dropped, reconnecting")
+        except Exception:
+            self.stats[vendor_id]['failed'] += 1
+            raise
+
+        self.in_session += 1
+        self.stats[vendor_id]['sent' if sent else 'failed'] += 1
+        return bool(sent)
+
+    def close(self):
+        if self.opened:
+            try:
+                self.connection.close()
+            finally:
+                self.opened = False
+        flush_stats(self.stats)
+        self.stats = defaultdict(Counter)
+
+
+def flush_stats(stats):
+    day = timezone.localdate()
+    for vendor_id, counts in stats.items():
+        if not any(counts.values()):
+            continue
+        row, _ = MailDeliveryStat.objects.get_or_create(vendor_id=vendor_id, day=day)
+        MailDeliveryStat.objects.filter(pk=row.pk).update(**{
+            field: F(field) + counts[field]
+            for field in ('sent', 'failed', 'sessions', 'throttled_ms') if counts[field]
+        })
+
+
+def send_now(message, vendor=None, transport: Optional[MailTransport] = None) -> bool:
+    """Send through ``transport`` when given, else through a one-message transport."""
+    vendor_id = getattr(vendor, 'pk', vendor)
+    if transport is not None:
+        return transport.send(message, vendor_id=vendor_id)
+    with MailTransport() as one_off:
+        return one_off.send(message, vendor_id=vendor_id)
@@ -11,6 +11,8 @@ urlpatterns = [
     # Your existing API Endpoints
     path("api/", views.NotificationListView.as_view(), name="api_list"),
     path("api/<int:notification_id>/read/", views.mark_notification_read, name="api_mark_read"),
+    path("api/read/", views.mark_notifications_read, name="api_mark_read_bulk"),
+    path("api/unread/", views.unread_count, name="api_unread"),
 ]
 
 
@@ -4,42 +4,79 @@
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
 
+from . import inbox
+
 @login_required
 def notification_inbox_view(request):
-    return render(request, "laboratory/notification/inbox.html")
+    return render(request, "laboratory/note/inbox.html")
 
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from .models import Notification
 
+
+def _serialize(n):
+    return {
+        "id": n.id,
+        "event_type": n.event_type,
+        "payload": n.payload,
+        "read": n.read,
+        "created_at": n.created_at
+    }
+
+
 class NotificationListView(APIView):
+    """
+    GET ?cursor=&limit=&unread=1 → {"results": [...], "next": cursor or null, "unread": n}
+    """
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        notifications = Notification.objects.filter(user=request.user).order_by('-created_at')[:50]
-        return Response([
-            {
-                "id": n.id,
-                "event_type": n.event_type,
-                "payload": n.payload,
-                "read": n.read,
-                "created_at": n.created_at
-            } for n in notifications
-        ])
+        try:
+            notifications, next_cursor = inbox.page(
+                request.user.pk,
+                cursor=request.query_params.get("cursor"),
+                limit=request.query_params.get("limit", inbox.PAGE_SIZE),
+                unread_only=request.query_params.get("unread") in ("1", "true"),
+            )
+        except ValueError:
+            return Response({"status": "bad_request", "detail": "Invalid cursor or limit."}, status=400)
+        return Response({
+            "results": [_serialize(n) for n in notifications],
+            "next": next_cursor,
+            "unread": inbox.unread_count(request.user.pk),
+        })
 
 # apps/notifications/views.py
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def unread_count(request):
+    return Response({"unread": inbox.unread_count(request.user.pk)})
+
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
 def mark_notification_read(request, notification_id):
-    try:
-        notification = Notification.objects.get(id=notification_id, user=request.user)
-        notification.read = True
-        notification.save()
-        return Response({"status": "success"})
-    except Notification.DoesNotExist:
+    if not Notification.objects.filter(id=notification_id, user=request.user).exists():
         return Response({"status": "not_found"}, status=404)
+    inbox.mark_read(request.user.pk, [notification_id])
+    return Response({"status": "success"})
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def mark_notifications_read(request):
+    """
+    Bulk mark-read. Body: {"ids": [1, 2, …]} or {"all": true}.
+    """
+    if request.data.get("all"):
+        marked = inbox.mark_read(request.user.pk)
+    else:
+        ids = request.data.get("ids")
+        if not isinstance(ids, list) or not all(isinstance(i, int) for i in ids):
+            return Response({"status": "bad_request", "detail": "Send 'ids' (a list of ids) or 'all'."}, status=400)
+        marked = inbox.mark_read(request.user.pk, ids)
+    return Response({"status": "success", "marked": marked, "unread": inbox.unread_count(request.user.pk)})
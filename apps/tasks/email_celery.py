@@ -24,7 +24,7 @@ SCALABILITY BENEFITS:
 
 from celery import shared_task
 from django.contrib.auth import get_user_model
-from django.core.mail import send_mail
+from django.core.mail import EmailMultiAlternatives
 from django.template.loader import render_to_string
 from django.conf import settings
 from apps.tenants.models import Vendor
@@ -36,6 +36,24 @@ logger = logging.getLogger(__name__)
 User = get_user_model()
 
 
+def _send(subject, text_body, html_body, recipient, vendor=None):
+    """
+    One message through notification.transport (shared rate limits and
+    delivery stats) instead of send_mail's throwaway connection.
+    """
+    from apps.notification.transport import send_now
+
+    email = EmailMultiAlternatives(
+        subject=subject,
+        body=text_body,
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[recipient],
+    )
+    if html_body:
+        email.attach_alternative(html_body, "text/html")
+    return send_now(email, vendor=vendor)
+
+
 @shared_task(bind=True, max_retries=3, default_retry_delay=60)
 def send_password_reset_email(self, user_id, reset_url, tenant_id=None):
     """
@@ -88,14 +106,7 @@ def send_password_reset_email(self, user_id, reset_url, tenant_id=None):
         email_subject = f"Password Reset Request - {context['vendor_name']}"
         
         # Send email
-        send_mail(
-            subject=email_subject,
-            message=email_body_text,
-            html_message=email_body_html,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[user.email],
-            fail_silently=False,
-        )
+        _send(email_subject, email_body_text, email_body_html, user.email, vendor=tenant)
         
         logger.info(
             f"Password reset email sent successfully: "
@@ -157,13 +168,9 @@ def send_password_changed_notification(self, user_id):
             context
         )
         
-        send_mail(
-            subject=f"Your Password Was Changed - {context['vendor_name']}",
-            message=email_body_text,
-            html_message=email_body_html,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[user.email],
-            fail_silently=False,
+        _send(
+            f"Your Password Was Changed - {context['vendor_name']}",
+            email_body_text, email_body_html, user.email, vendor=tenant,
         )
         
         logger.info(
@@ -227,14 +234,7 @@ def send_welcome_email(user_id):
             context
         )
         
-        send_mail(
-            subject=f"Welcome to {context['vendor_name']}!",
-            message='',
-            html_message=email_body,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[user.email],
-            fail_silently=True,
-        )
+        _send(f"Welcome to {context['vendor_name']}!", '', email_body, user.email, vendor=tenant)
         
         logger.info(f"Welcome email sent to {user.email}")
     
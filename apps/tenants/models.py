@@ -75,16 +75,18 @@ class Vendor(models.Model):
 
         super().save(*args, **kwargs)
 
-        # Send activation email synchronously (NO Celery)
+        # Queue the activation email on the outbox; the flag and the message
+        # commit together, and drain_outbox does the sending
         if (
             not is_new
             and self.is_active
             and not self.__original_is_active
             and not self.activation_email_sent
         ):
-            send_vendor_activation_email(self)
-            self.activation_email_sent = True
-            super().save(update_fields=["activation_email_sent"])
+            with transaction.atomic():
+                send_vendor_activation_email(self)
+                self.activation_email_sent = True
+                super().save(update_fields=["activation_email_sent"])
 
         self.__original_is_active = self.is_active
 
@@ -1,4 +1,3 @@
-from django.core.mail import EmailMultiAlternatives
 from django.template.loader import render_to_string
 from django.utils.html import strip_tags
 from django.conf import settings
@@ -7,7 +6,7 @@ from django.urls import reverse
 
 def send_vendor_onboarding_emails(vendor, user):
     """
-    Sends structured HTML onboarding emails to Vendor and Platform Admin.
+    Queues structured HTML onboarding emails to Vendor and Platform Admin.
     """
     # 1. Prepare Data Context
     context = {
@@ -23,7 +22,9 @@ def send_vendor_onboarding_emails(vendor, user):
         subject="Vendor Onboarding Request Received",
         template_name='emails/onboarding/vendor_notification.html',
         context=context,
-        recipient_list=[user.email]
+        recipient_list=[user.email],
+        dedupe_key=f"vendor-onboarding:{vendor.pk}:vendor",
+        vendor=vendor,
     )
 
     # 3. Email to Platform Admin
@@ -31,24 +32,29 @@ def send_vendor_onboarding_emails(vendor, user):
         subject="New Vendor Onboarding Request",
         template_name='emails/onboarding/admin_notification.html',
         context=context,
-        recipient_list=[settings.DEFAULT_FROM_EMAIL]
+        recipient_list=[settings.DEFAULT_FROM_EMAIL],
+        dedupe_key=f"vendor-onboarding:{vendor.pk}:admin",
+        vendor=vendor,
     )
 
-def send_html_email(subject, template_name, context, recipient_list):
+def send_html_email(subject, template_name, context, recipient_list, dedupe_key=None, vendor=None):
     """
-    Helper function to handle HTML rendering and sending.
+    Helper function to handle HTML rendering and queue the email on the
+    outbox (apps.notification.outbox); drain_outbox does the SMTP part.
     """
+    from apps.notification.outbox import enqueue_email
+
     html_content = render_to_string(template_name, context)
     text_content = strip_tags(html_content)  # Fallback for old email clients
 
-    email = EmailMultiAlternatives(
-        subject=subject,
-        body=text_content,
-        from_email=settings.DEFAULT_FROM_EMAIL,
-        to=recipient_list
+    enqueue_email(
+        subject,
+        text_content,
+        recipient_list,
+        html_body=html_content,
+        dedupe_key=dedupe_key,
+        vendor=vendor,
     )
-    email.attach_alternative(html_content, "text/html")
-    email.send(fail_silently=False)
 
 
 """
@@ -74,17 +80,14 @@ def send_vendor_activation_email(vendor):
         'platform_name': settings.SITE_NAME,
     }
 
-    html_content = render_to_string('emails/onboarding/domain_activation.html', context)
-    text_content = strip_tags(html_content)
-
-    email = EmailMultiAlternatives(
+    send_html_email(
         subject=subject,
-        body=text_content,
-        from_email=settings.DEFAULT_FROM_EMAIL,
-        to=[vendor.contact_email],
+        template_name='emails/onboarding/domain_activation.html',
+        context=context,
+        recipient_list=[vendor.contact_email],
+        dedupe_key=f"vendor-activation:{vendor.pk}",
+        vendor=vendor,
     )
-    email.attach_alternative(html_content, "text/html")
-    email.send()
 
 
 # from django.core.mail import send_mail
@@ -20,12 +20,13 @@ os.environ.setdefault("DJANGO_SETTINGS_MODULE", "lims_auth.settings")
 # application = get_asgi_application()
 
 from apps.notification import routing
+from apps.labs import routing as labs_routing
 
 application = ProtocolTypeRouter({
     "http": get_asgi_application(),
     "websocket": AllowedHostsOriginValidator(
         AuthMiddlewareStack(
-            URLRouter(routing.websocket_urlpatterns)
+            URLRouter(routing.websocket_urlpatterns + labs_routing.websocket_urlpatterns)
         )
     ),
 })
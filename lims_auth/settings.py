@@ -111,7 +111,7 @@ TEMPLATES = [
                 "apps.accounts.context_processors.vendor_context",  # vendor attributes
                 "apps.tenants.context_processors.vendor_context",  # vendor attributes
                 "apps.core.context_processors.platform_urls",  # platform URLs
-                # 'apps.notification.context_processors.notifications', 
+                "apps.notification.context_processors.notifications",  # unread badge (cached counter)
             ],
         },
     },
@@ -175,6 +175,23 @@ PHONENUMBER_DEFAULT_REGION = "NG"
 
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
+# Paystack (vendor keys override these; webhooks are signed with the secret key)
+PAYSTACK_SECRET_KEY = os.getenv("PAYSTACK_SECRET_KEY", "")
+PAYSTACK_PUBLIC_KEY = os.getenv("PAYSTACK_PUBLIC_KEY", "")
+
+# Buffered audit / instrument log writer (apps.core.services.log_writer)
+LOG_WRITER_BACKEND = os.getenv("LOG_WRITER_BACKEND", "memory")  # memory | redis | sync
+LOG_WRITER_BATCH_SIZE = 100
+LOG_WRITER_FLUSH_INTERVAL = 5  # seconds
+
+# Notification digests (apps.notification.digest, flushed by `manage.py flush_digests`)
+NOTIFICATION_DIGEST_BACKEND = os.getenv("NOTIFICATION_DIGEST_BACKEND", "redis")  # redis | memory | off
+NOTIFICATION_DIGEST_WINDOW = 600  # seconds
+NOTIFICATION_DIGEST_WINDOWS = {'lab_new_order': 900}
+
+# Outbound mail rate limits (apps.notification.transport), shared by all workers
+MAIL_RATE_BACKEND = os.getenv("MAIL_RATE_BACKEND", "redis")  # redis | memory
+
 if ENVIRONMENT == "production":
     # Production settings
     # DEBUG = False